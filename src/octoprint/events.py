@@ -14,6 +14,7 @@ except ImportError:
 	import Queue as queue
 import threading
 import collections
+import time
 
 from octoprint.settings import settings
 import octoprint.plugin
@@ -60,6 +61,7 @@ class Events(object):
 
 	# SD Upload
 	TRANSFER_STARTED = "TransferStarted"
+	TRANSFER_PROGRESS = "TransferProgress"
 	TRANSFER_DONE = "TransferDone"
 
 	# print job
@@ -103,6 +105,7 @@ class Events(object):
 	SLICING_DONE = "SlicingDone"
 	SLICING_FAILED = "SlicingFailed"
 	SLICING_CANCELLED = "SlicingCancelled"
+	SLICING_QUEUE_POSITION = "SlicingQueuePosition"
 	SLICING_PROFILE_ADDED = "SlicingProfileAdded"
 	SLICING_PROFILE_MODIFIED = "SlicingProfileModified"
 	SLICING_PROFILE_DELETED = "SlicingProfileDeleted"
@@ -130,16 +133,32 @@ def eventManager():
 class EventManager(object):
 	"""
 	Handles receiving events and dispatching them to subscribers
+
+	Every subscriber (a subscribed callback or an :class:`~octoprint.plugin.EventHandlerPlugin`) gets its own delivery
+	queue and worker, so that a slow subscriber only delays its own events. Events queued up for a subscriber are
+	delivered in batches, in the order they were fired. Handlers taking longer than ``slow_handler_threshold`` seconds
+	and subscribers with more than ``backlog_warning`` undelivered events are logged, :meth:`get_metrics` provides
+	the numbers per subscriber.
 	"""
 
-	def __init__(self):
+	def __init__(self, slow_handler_threshold=None, backlog_warning=None):
 		self._registeredListeners = collections.defaultdict(list)
 		self._logger = logging.getLogger(__name__)
 
+		if slow_handler_threshold is None:
+			slow_handler_threshold = _settings_value("getFloat", ["events", "slowHandlerThreshold"], 1.0)
+		if backlog_warning is None:
+			backlog_warning = _settings_value("getInt", ["events", "backlogWarning"], 50)
+		self._slow_handler_threshold = slow_handler_threshold
+		self._backlog_warning = backlog_warning
+
 		self._shutdown_signaled = False
 
 		self._queue = queue.Queue()
 
+		self._subscribers = dict()
+		self._subscribers_mutex = threading.RLock()
+
 		self._worker = threading.Thread(target=self._work)
 		self._worker.daemon = True
 		self._worker.start()
@@ -147,29 +166,41 @@ class EventManager(object):
 	def _work(self):
 		try:
 			while not self._shutdown_signaled:
-				event, payload = self._queue.get(True)
+				event, payload, fired = self._queue.get(True)
 				if event == Events.SHUTDOWN:
 					# we've got the shutdown event here, stop event loop processing after this has been processed
 					self._logger.info("Processing shutdown event, this will be our last event")
 					self._shutdown_signaled = True
 
-				eventListeners = self._registeredListeners[event]
 				self._logger.debug("Firing event: %s (Payload: %r)" % (event, payload))
 
+				with self._subscribers_mutex:
+					eventListeners = list(self._registeredListeners[event])
 				for listener in eventListeners:
 					self._logger.debug("Sending action to %r" % listener)
-					try:
-						listener(event, payload)
-					except:
-						self._logger.exception("Got an exception while sending event %s (Payload: %r) to %s" % (event, payload, listener))
-
-				octoprint.plugin.call_plugin(octoprint.plugin.types.EventHandlerPlugin,
-				                             "on_event",
-				                             args=(event, payload))
+					self._get_subscriber(listener, listener, _callback_name(listener)).deliver(event, payload, fired)
+
+				for plugin in octoprint.plugin.plugin_manager().get_implementations(octoprint.plugin.types.EventHandlerPlugin):
+					if hasattr(plugin, "on_event"):
+						self._get_subscriber(plugin, plugin.on_event, plugin._identifier).deliver(event, payload, fired)
+
+			with self._subscribers_mutex:
+				for subscriber in self._subscribers.values():
+					subscriber.stop()
 			self._logger.info("Event loop shut down")
 		except:
 			self._logger.exception("Ooops, the event bus worker loop crashed")
 
+	def _get_subscriber(self, key, callback, name):
+		with self._subscribers_mutex:
+			subscriber = self._subscribers.get(key)
+			if subscriber is None:
+				subscriber = _EventSubscriber(name, callback, self._logger,
+				                              slow_handler_threshold=self._slow_handler_threshold,
+				                              backlog_warning=self._backlog_warning)
+				self._subscribers[key] = subscriber
+			return subscriber
+
 	def fire(self, event, payload=None):
 		"""
 		Fire an event to anyone subscribed to it
@@ -181,7 +212,8 @@ class EventManager(object):
 		payload being a payload object specific to the event.
 		"""
 
-		self._queue.put((event, payload))
+		fired = time.time()
+		self._queue.put((event, payload, fired))
 
 		if event == Events.UPDATED_FILES and "type" in payload and payload["type"] == "printables":
 			# when sending UpdatedFiles with type "printables", also send another event with deprecated type "gcode"
@@ -189,18 +221,19 @@ class EventManager(object):
 			import copy
 			legacy_payload = copy.deepcopy(payload)
 			legacy_payload["type"] = "gcode"
-			self._queue.put((event, legacy_payload))
+			self._queue.put((event, legacy_payload, fired))
 
 	def subscribe(self, event, callback):
 		"""
 		Subscribe a listener to an event -- pass in the event name (as a string) and the callback object
 		"""
 
-		if callback in self._registeredListeners[event]:
-			# callback is already subscribed to the event
-			return
+		with self._subscribers_mutex:
+			if callback in self._registeredListeners[event]:
+				# callback is already subscribed to the event
+				return
 
-		self._registeredListeners[event].append(callback)
+			self._registeredListeners[event].append(callback)
 		self._logger.debug("Subscribed listener %r for event %s" % (callback, event))
 
 	def unsubscribe (self, event, callback):
@@ -208,17 +241,155 @@ class EventManager(object):
 		Unsubscribe a listener from an event -- pass in the event name (as string) and the callback object
 		"""
 
-		if not callback in self._registeredListeners[event]:
-			# callback not subscribed to event, just return
-			return
+		with self._subscribers_mutex:
+			if not callback in self._registeredListeners[event]:
+				# callback not subscribed to event, just return
+				return
+
+			self._registeredListeners[event].remove(callback)
 
-		self._registeredListeners[event].remove(callback)
+			if callback in self._subscribers and not any(callback in listeners for listeners in self._registeredListeners.values()):
+				# not subscribed to anything any more, stop its worker once it delivered what's still queued
+				self._subscribers.pop(callback).stop()
 		self._logger.debug("Unsubscribed listener %r for event %s" % (callback, event))
 
+	def get_metrics(self):
+		"""
+		Returns delivery metrics per subscriber name: ``queued`` (events waiting for delivery right now),
+		``delivered``, ``maxBacklog``, ``maxLatency`` (longest time from firing an event to the start of its delivery
+		in seconds), ``averageDuration`` and ``maxDuration`` (time spent in the handler in seconds) and ``slow``
+		(number of deliveries that took longer than the slow handler threshold).
+		"""
+		with self._subscribers_mutex:
+			subscribers = list(self._subscribers.values())
+
+		result = dict()
+		for subscriber in subscribers:
+			name = subscriber.name
+			count = 1
+			while name in result:
+				# several instances of the same class subscribed
+				count += 1
+				name = "{} ({})".format(subscriber.name, count)
+			result[name] = subscriber.metrics
+		return result
+
 	def join(self, timeout=None):
+		deadline = time.time() + timeout if timeout is not None else None
+
 		self._worker.join(timeout)
+		with self._subscribers_mutex:
+			subscribers = list(self._subscribers.values())
+		for subscriber in subscribers:
+			subscriber.join(max(0, deadline - time.time()) if deadline is not None else None)
+
+		return self._worker.is_alive() or any(subscriber.is_alive() for subscriber in subscribers)
+
+
+class _EventSubscriber(object):
+	"""
+	Delivery queue and worker of a single event subscriber, see :class:`EventManager`.
+	"""
+
+	def __init__(self, name, callback, logger, slow_handler_threshold=1.0, backlog_warning=50):
+		self.name = name
+		self._callback = callback
+		self._logger = logger
+		self._slow_handler_threshold = slow_handler_threshold
+		self._backlog_warning = backlog_warning
+
+		self._queue = queue.Queue()
+
+		self._delivered = 0
+		self._max_backlog = 0
+		self._max_latency = 0.0
+		self._total_duration = 0.0
+		self._max_duration = 0.0
+		self._slow = 0
+
+		self._worker = threading.Thread(target=self._work, name="octoprint.events.subscriber.{}".format(name))
+		self._worker.daemon = True
+		self._worker.start()
+
+	@property
+	def metrics(self):
+		return dict(queued=self._queue.qsize(),
+		            delivered=self._delivered,
+		            maxBacklog=self._max_backlog,
+		            maxLatency=self._max_latency,
+		            averageDuration=self._total_duration / self._delivered if self._delivered else 0.0,
+		            maxDuration=self._max_duration,
+		            slow=self._slow)
+
+	def deliver(self, event, payload, fired):
+		self._queue.put((event, payload, fired))
+
+		backlog = self._queue.qsize()
+		if backlog > self._max_backlog:
+			self._max_backlog = backlog
+			if backlog == self._backlog_warning:
+				self._logger.warn("Event subscriber {} is falling behind, {} events are waiting for delivery".format(self.name, backlog))
+
+	def stop(self):
+		self._queue.put(None)
+
+	def join(self, timeout=None):
+		self._worker.join(timeout)
+
+	def is_alive(self):
 		return self._worker.is_alive()
 
+	def _work(self):
+		while True:
+			# wait for the next event, then take everything else that queued up in the meantime along as one batch
+			batch = [self._queue.get(True)]
+			try:
+				while True:
+					batch.append(self._queue.get_nowait())
+			except queue.Empty:
+				pass
+
+			for item in batch:
+				if item is None:
+					return
+
+				event, payload, fired = item
+				start = time.time()
+				try:
+					self._callback(event, payload)
+				except:
+					self._logger.exception("Got an exception while sending event %s (Payload: %r) to %s" % (event, payload, self.name))
+				end = time.time()
+
+				duration = end - start
+				self._delivered += 1
+				self._total_duration += duration
+				self._max_duration = max(self._max_duration, duration)
+				self._max_latency = max(self._max_latency, start - fired)
+
+				if duration > self._slow_handler_threshold:
+					self._slow += 1
+					self._logger.warn("Event subscriber {} took {:.2f}s to handle event {}, {:.2f}s after it was fired".format(self.name, duration, event, end - fired))
+
+
+def _callback_name(callback):
+	name = getattr(callback, "__name__", None)
+	if name is None:
+		return repr(callback)
+
+	owner = getattr(callback, "__self__", None)
+	if owner is not None:
+		return "{}.{}".format(owner.__class__.__name__, name)
+	return name
+
+
+def _settings_value(getter, path, default):
+	try:
+		return getattr(settings(), getter)(path)
+	except ValueError:
+		# settings not yet initialized
+		return default
+
 
 class GenericEventListener(object):
 	"""
@@ -15,7 +15,7 @@ from octoprint.events import eventManager, Events
 from octoprint.settings import settings
 
 from .destinations import FileDestinations
-from .analysis import QueueEntry, AnalysisQueue
+from .analysis import QueueEntry, AnalysisQueue, AnalysisResultCache
 from .storage import LocalFileStorage
 from .util import AbstractFileWrapper, StreamWrapper, DiskFileWrapper
 
@@ -171,7 +171,7 @@ class FileManager(object):
 		self._slicing_jobs_mutex = threading.Lock()
 
 		self._slicing_progress_callbacks = []
-		self._last_slicing_progress = None
+		self._last_slicing_progress = dict()
 
 		self._progress_plugins = []
 		self._preprocessor_hooks = dict()
@@ -179,6 +179,12 @@ class FileManager(object):
 		import octoprint.settings
 		self._recovery_file = os.path.join(octoprint.settings.settings().getBaseFolder("data"), "print_recovery_data.yaml")
 
+		self._analysis_cache = None
+		analysis_cache_size = octoprint.settings.settings().getInt(["gcodeAnalysis", "cache_size"])
+		if analysis_cache_size:
+			self._analysis_cache = AnalysisResultCache(os.path.join(octoprint.settings.settings().getBaseFolder("data"), "analysis_cache.json"),
+			                                           size=analysis_cache_size)
+
 	def initialize(self):
 		self.reload_plugins()
 
@@ -219,6 +225,8 @@ class FileManager(object):
 
 			# we'll use the default printer profile for the backlog since we don't know better
 			queue_entry = QueueEntry(file_name, entry, file_type, storage_type, path, self._printer_profile_manager.get_default())
+			if self._analysis_from_cache(queue_entry):
+				continue
 			if self._analysis_queue.enqueue(queue_entry, high_priority=high_priority):
 				counter += 1
 
@@ -253,7 +261,8 @@ class FileManager(object):
 		return self._slicing_manager.default_slicer
 
 	def slice(self, slicer_name, source_location, source_path, dest_location, dest_path, resolution=None, nozzle_size=None,
-	          position=None, profile=None, printer_profile_id=None, overrides=None, callback=None, callback_args=None):
+	          position=None, profile=None, printer_profile_id=None, overrides=None, callback=None, callback_args=None,
+	          high_priority=False):
 		absolute_source_path = self.path_on_disk(source_location, source_path)
 
 		def stlProcessed(source_location, source_path, tmp_path, dest_location, dest_path, start_time, printer_profile_id, callback, callback_args, _error=None, _cancelled=False, _analysis=None):
@@ -321,6 +330,7 @@ class FileManager(object):
 						del self._slicing_jobs[source_job_key]
 					if dest_job_key in self._slicing_jobs:
 						del self._slicing_jobs[dest_job_key]
+					self._last_slicing_progress.pop(dest_job_key, None)
 
 		slicer = self._slicing_manager.get_slicer(slicer_name)
 
@@ -361,19 +371,33 @@ class FileManager(object):
 									nozzle_size=nozzle_size,
 		                            printer_profile_id=printer_profile_id,
 		                            on_progress=self.on_slicing_progress,
-		                            on_progress_args=(slicer_name, source_location, source_path, dest_location, dest_path))
+		                            on_progress_args=(slicer_name, source_location, source_path, dest_location, dest_path),
+		                            high_priority=high_priority,
+		                            on_queue_position=self.on_slicing_queue_position,
+		                            on_queue_position_args=(source_location, source_path, dest_location, dest_path))
+
+	def on_slicing_queue_position(self, source_location, source_path, dest_location, dest_path, _position=None, _queued=None):
+		eventManager().fire(Events.SLICING_QUEUE_POSITION, dict(stl=source_path,
+		                                                        stl_location=source_location,
+		                                                        gcode=dest_path,
+		                                                        gcode_location=dest_location,
+		                                                        position=_position,
+		                                                        queued=_queued))
 
 	def on_slicing_progress(self, slicer, source_location, source_path, dest_location, dest_path, _progress=None):
 		if not _progress:
 			return
 
 		progress_int = int(_progress * 100)
-		
-		print("PROGRESS: ")
-		print(_progress)
-		
-		if self._last_slicing_progress != progress_int:
-			self._last_slicing_progress = progress_int
+
+		# several jobs might be slicing at once, so the last progress is tracked per job
+		dest_job_key = (dest_location, dest_path)
+		with self._slicing_jobs_mutex:
+			changed = self._last_slicing_progress.get(dest_job_key) != progress_int
+			if changed:
+				self._last_slicing_progress[dest_job_key] = progress_int
+
+		if changed:
 			for callback in self._slicing_progress_callbacks:
 				try: callback.sendSlicingProgress(slicer, source_location, source_path, dest_location, dest_path, progress_int)
 				except: self._logger.exception("Exception while pushing slicing progress")
@@ -436,7 +460,7 @@ class FileManager(object):
 
 		if analysis is None:
 			queue_entry = self._analysis_queue_entry(destination, path_in_storage, printer_profile=printer_profile)
-			if queue_entry:
+			if queue_entry and not self._analysis_from_cache(queue_entry):
 				self._analysis_queue.enqueue(queue_entry, high_priority=True)
 		else:
 			self._add_analysis_result(destination, path, analysis)
@@ -465,7 +489,7 @@ class FileManager(object):
 		path_in_storage = self._storage(destination).copy_file(source, dst)
 		if not self.has_analysis(destination, path_in_storage):
 			queue_entry = self._analysis_queue_entry(destination, path_in_storage)
-			if queue_entry:
+			if queue_entry and not self._analysis_from_cache(queue_entry):
 				self._analysis_queue.enqueue(queue_entry)
 
 		_, name = self._storage(destination).split_path(path_in_storage)
@@ -481,7 +505,7 @@ class FileManager(object):
 		path = self._storage(destination).move_file(source, dst)
 		if not self.has_analysis(destination, path):
 			queue_entry = self._analysis_queue_entry(destination, path)
-			if queue_entry:
+			if queue_entry and not self._analysis_from_cache(queue_entry):
 				self._analysis_queue.enqueue(queue_entry)
 
 		source_path_in_storage = self._storage(destination).path_in_storage(source)
@@ -641,6 +665,9 @@ class FileManager(object):
 	def last_modified(self, destination, path=None, recursive=False):
 		return self._storage(destination).last_modified(path=path, recursive=recursive)
 
+	def version(self, destination):
+		return self._storage(destination).version
+
 	def _storage(self, destination):
 		if not destination in self._storage_managers:
 			raise NoSuchStorage("No storage configured for destination {destination}".format(**locals()))
@@ -656,6 +683,66 @@ class FileManager(object):
 	def _on_analysis_finished(self, entry, result):
 		self._add_analysis_result(entry.location, entry.path, result)
 
+		cache_key = self._analysis_cache_key(entry)
+		if cache_key is not None:
+			self._analysis_cache.put(cache_key, result)
+
+	def _analysis_cache_key(self, entry):
+		if self._analysis_cache is None or not entry.location in self._storage_managers:
+			return None
+
+		try:
+			metadata = self._storage_managers[entry.location].get_metadata(entry.path)
+		except:
+			self._logger.exception("Error while fetching metadata of {} for the analysis cache".format(entry))
+			return None
+
+		if not metadata or not "hash" in metadata:
+			return None
+
+		import octoprint.settings
+		return self._analysis_cache.key(metadata["hash"], entry.type, entry.printer_profile,
+		                                analyser=octoprint.settings.settings().get(["gcodeAnalysis", "analyser"]),
+		                                g90_influences_extruder=octoprint.settings.settings().getBoolean(["feature", "g90InfluencesExtruder"]),
+		                                filament_diameter=self._analysis_filament_diameter())
+
+	def _analysis_filament_diameter(self):
+		# the analysis computes the extruded volume with the filament diameter of the connected printer
+		try:
+			from octoprint.server import printer
+			if printer is None or not hasattr(printer, "getFilamentSettingsForPrinter"):
+				return None
+			filament_diameter, _ = printer.getFilamentSettingsForPrinter()
+			return filament_diameter
+		except:
+			# e.g. no printer connected yet
+			self._logger.debug("Could not fetch the filament diameter for the analysis cache", exc_info=True)
+			return None
+
+	def _analysis_from_cache(self, entry):
+		"""
+		Applies a cached analysis result for the contents of ``entry`` if there is one, in which case the entry
+		doesn't need to be enqueued for analysis and True is returned.
+		"""
+		cache_key = self._analysis_cache_key(entry)
+		if cache_key is None:
+			return False
+
+		result = self._analysis_cache.get(cache_key)
+		if result is None:
+			return False
+
+		self._logger.debug("Using cached analysis result for {}".format(entry))
+		self._add_analysis_result(entry.location, entry.path, result)
+		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"name": entry.name,
+		                                                        "path": entry.path,
+		                                                        "origin": entry.location,
+		                                                        "result": result,
+
+		                                                        # TODO: deprecated, remove in a future release
+		                                                        "file": entry.path})
+		return True
+
 	def _analysis_queue_entry(self, destination, path, printer_profile=None):
 		if printer_profile is None:
 			printer_profile = self._printer_profile_manager.get_current_or_default()
@@ -6,6 +6,7 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
 
+import atexit
 import logging
 try:
 	import queue
@@ -14,8 +15,14 @@ except ImportError:
 import os
 import threading
 import collections
+import multiprocessing
 import time
 import math
+import copy
+import hashlib
+import json
+
+import pylru
 
 from octoprint.events import Events, eventManager
 from octoprint.settings import settings
@@ -70,15 +77,28 @@ class AnalysisQueue(object):
 		self._logger = logging.getLogger(__name__)
 		self._callbacks = []
 
+		self._pool = None
+		if settings().get(["gcodeAnalysis", "backend"]) == "process":
+			try:
+				self._pool = AnalysisWorkerPool(settings().getInt(["gcodeAnalysis", "workers"]))
+				self._logger.info("Analysing files in {} worker processes".format(self._pool.workers))
+			except Exception:
+				self._logger.exception("Could not start analysis worker processes, analysing files in the server process instead")
+
 		analyser = settings().get(['gcodeAnalysis', 'analyser'])
 
 		if analyser is not None and (analyser=='BVC'):
+			gcode_queue_class = BVCGcodeAnalysisQueue
+		else:
+			gcode_queue_class = GcodeAnalysisQueue
+
+		if self._pool is not None:
 			self._queues = dict(
-				gcode=BVCGcodeAnalysisQueue(self._analysis_finished)
+				gcode=SharedAnalysisQueue(gcode_queue_class, self._analysis_finished, self._pool)
 			)
 		else:
 			self._queues = dict(
-				gcode=GcodeAnalysisQueue(self._analysis_finished)
+				gcode=gcode_queue_class(self._analysis_finished)
 			)
 
 	def register_finish_callback(self, callback):
@@ -123,6 +143,120 @@ class AnalysisQueue(object):
 		                                                        # TODO: deprecated, remove in a future release
 		                                                        "file": entry.path})
 
+class AnalysisResultCache(object):
+	"""
+	Persistent LRU cache of analysis results, keyed by the content hash of the analysed file plus the settings and
+	printer profile parameters the result depends on (see :meth:`key`). Allows reusing the result for files with
+	identical contents, e.g. re-uploads under a different name, copies or identical slicer output.
+
+	The cache holds at most ``size`` results, the least recently used ones are evicted first. Changes are written
+	to ``path`` at most every ``save_delay`` seconds and on :meth:`flush`.
+
+	Arguments:
+	    path (str): Path of the file to persist the cache in.
+	    size (int): Maximum number of results to keep.
+	    save_delay (float): Time in seconds to collect changes for before writing them to ``path``.
+	"""
+
+	def __init__(self, path, size=1000, save_delay=10.0):
+		self._logger = logging.getLogger(__name__)
+		self._path = path
+		self._save_delay = save_delay
+		self._mutex = threading.RLock()
+		self._cache = pylru.lrucache(size)
+		self._dirty = False
+		self._save_timer = None
+		self._load()
+
+		atexit.register(self.flush)
+
+	@classmethod
+	def key(cls, file_hash, file_type, printer_profile, analyser=None, g90_influences_extruder=False, filament_diameter=None):
+		"""
+		Arguments:
+		    file_hash (str): Hash of the contents of the analysed file.
+		    file_type (str): Type of the analysed file.
+		    printer_profile (dict): Printer profile the file is analysed for.
+		    analyser (str): The configured analyser, ``gcodeAnalysis.analyser``.
+		    g90_influences_extruder (bool): Whether G90 influences the extruder, ``feature.g90InfluencesExtruder``.
+		    filament_diameter (float): Filament diameter the extruded volume is computed with.
+
+		Returns:
+		    str: The cache key.
+		"""
+		parameters = dict(type=file_type,
+		                  analyser=analyser,
+		                  g90InfluencesExtruder=g90_influences_extruder,
+		                  filamentDiameter=filament_diameter)
+		if printer_profile:
+			axes = printer_profile.get("axes", dict())
+			parameters["speed"] = [axes.get(axis, dict()).get("speed") for axis in ("x", "y")]
+			parameters["offsets"] = printer_profile.get("extruder", dict()).get("offsets")
+
+		return hashlib.sha1((file_hash + json.dumps(parameters, sort_keys=True)).encode("utf-8")).hexdigest()
+
+	def get(self, key):
+		with self._mutex:
+			if not key in self._cache:
+				return None
+			return copy.deepcopy(self._cache[key])
+
+	def put(self, key, result):
+		if result is None:
+			return
+
+		with self._mutex:
+			self._cache[key] = copy.deepcopy(result)
+			self._dirty = True
+
+			if self._save_timer is None:
+				self._save_timer = threading.Timer(self._save_delay, self.flush)
+				self._save_timer.daemon = True
+				self._save_timer.start()
+
+	def flush(self):
+		"""
+		Writes pending changes to disk right away.
+		"""
+		with self._mutex:
+			if self._save_timer is not None:
+				self._save_timer.cancel()
+				self._save_timer = None
+
+			if not self._dirty:
+				return
+			self._dirty = False
+			self._save()
+
+	def _load(self):
+		if not os.path.isfile(self._path):
+			return
+
+		try:
+			with open(self._path) as f:
+				entries = json.load(f)
+		except:
+			self._logger.exception("Could not read analysis cache from {}, starting with an empty one".format(self._path))
+			return
+
+		# entries are persisted from least to most recently used
+		for entry in entries:
+			self._cache[entry["key"]] = entry["result"]
+
+	def _save(self):
+		from octoprint.util import atomic_write
+
+		# lrucache iterates from most to least recently used
+		entries = [dict(key=key, result=result) for key, result in self._cache.items()]
+		entries.reverse()
+
+		try:
+			with atomic_write(self._path, mode="w") as f:
+				json.dump(entries, f)
+		except:
+			self._logger.exception("Could not write analysis cache to {}".format(self._path))
+
+
 class AbstractAnalysisQueue(object):
 	"""
 	The :class:`AbstractAnalysisQueue` is the parent class of all specific analysis queues such as the
@@ -133,6 +267,10 @@ class AbstractAnalysisQueue(object):
 	    finished_callback (callable): Callback that will be called upon finishing analysis of an entry in the queue.
 	        The callback will be called with the analyzed entry as the first argument and the analysis result as
 	        returned from the queue implementation as the second parameter.
+	    pool (AnalysisWorkerPool): Optional pool of worker processes to run the actual analysis in, see
+	        :meth:`_run_in_pool`. If not set the analysis runs in the queue's worker thread.
+	    slot (int): Slot of the ``pool`` reserved for this queue.
+	    entries (PriorityQueue): Optional queue of entries to process, allows several queues to share their work.
 
 	.. automethod:: _do_analysis
 
@@ -144,11 +282,15 @@ class AbstractAnalysisQueue(object):
 	HIGH_PRIO = 50
 	HIGH_PRIO_ABORTED = 0
 
-	def __init__(self, finished_callback):
+	def __init__(self, finished_callback, pool=None, slot=0, entries=None):
 		self._logger = logging.getLogger(__name__)
 
 		self._finished_callback = finished_callback
 
+		self._pool = pool
+		self._slot = slot
+		self._reenqueue = True
+
 		self._active = threading.Event()
 		self._active.set()
 
@@ -158,7 +300,7 @@ class AbstractAnalysisQueue(object):
 		self._currentFile = None
 		self._currentProgress = None
 
-		self._queue = queue.PriorityQueue()
+		self._queue = entries if entries is not None else queue.PriorityQueue()
 		self._current = None
 		self._current_highprio = False
 
@@ -294,6 +436,129 @@ class AbstractAnalysisQueue(object):
 		"""
 		pass
 
+	def _run_in_pool(self, func, *args):
+		"""
+		Runs ``func`` with this queue's pool slot and ``args`` in a worker process of the pool and returns its
+		result. Progress reported by the worker is tracked, an abort requested through :meth:`_abort_in_pool`
+		is raised as :class:`AnalysisAborted`.
+		"""
+		self._reenqueue = True
+
+		def progress_callback(progress):
+			self._current_progress = progress
+
+		try:
+			return self._pool.run(self._slot, func, *args, progress_callback=progress_callback)
+		except AnalysisAborted:
+			raise AnalysisAborted(reenqueue=self._reenqueue)
+
+	def _abort_in_pool(self, reenqueue=True):
+		self._reenqueue = reenqueue
+		self._pool.abort(self._slot)
+
+
+class AnalysisWorkerPool(object):
+	"""
+	A pool of worker processes the :class:`AbstractAnalysisQueue` implementations can run their CPU bound analysis
+	in, so that it neither competes with the server for the GIL nor is limited to a single core.
+
+	Every queue using the pool reserves a slot. Through the slot the pool shares an abort flag and the analysis
+	progress with the worker process currently analysing for that queue, see ``_pool_worker_throttle``.
+
+	Arguments:
+	    workers (int): Number of worker processes to start, defaults to the number of CPUs.
+	"""
+
+	poll_interval = 0.1
+
+	def __init__(self, workers=None):
+		if not workers:
+			workers = multiprocessing.cpu_count()
+		self.workers = workers
+
+		self._abort_flags = multiprocessing.Array("b", workers, lock=False)
+		self._progress = multiprocessing.Array("d", workers, lock=False)
+		self._pool = multiprocessing.Pool(processes=workers,
+		                                  initializer=_init_pool_worker,
+		                                  initargs=(self._abort_flags, self._progress))
+
+	def run(self, slot, func, *args, **kwargs):
+		"""
+		Runs ``func(slot, *args)`` in a worker process and blocks until it returns, reporting the progress of the
+		worker to the optional ``progress_callback`` keyword argument. Raises :class:`AnalysisAborted` if
+		:meth:`abort` was called for the slot in the meantime.
+		"""
+		progress_callback = kwargs.get("progress_callback")
+
+		self._abort_flags[slot] = 0
+		self._progress[slot] = 0.0
+
+		result = self._pool.apply_async(func, (slot,) + args)
+		while not result.ready():
+			result.wait(self.poll_interval)
+			if progress_callback is not None:
+				progress_callback(self._progress[slot])
+
+		try:
+			return result.get()
+		except Exception:
+			if self._abort_flags[slot]:
+				raise AnalysisAborted()
+			raise
+
+	def abort(self, slot):
+		self._abort_flags[slot] = 1
+
+
+class SharedAnalysisQueue(object):
+	"""
+	Distributes the entries of one type over one :class:`AbstractAnalysisQueue` per worker process of an
+	:class:`AnalysisWorkerPool`, all sharing the same priority queue. Offers the same interface as a single queue.
+
+	Arguments:
+	    queue_class (class): The :class:`AbstractAnalysisQueue` implementation to create the queues from.
+	    finished_callback (callable): Callback that will be called upon finishing analysis of an entry.
+	    pool (AnalysisWorkerPool): The pool to run the analyses in.
+	"""
+
+	def __init__(self, queue_class, finished_callback, pool):
+		entries = queue.PriorityQueue()
+		self._queues = [queue_class(finished_callback, pool=pool, slot=slot, entries=entries)
+		                for slot in range(pool.workers)]
+
+	def enqueue(self, entry, high_priority=False):
+		# an idle queue will pick up the entry right away, otherwise a high priority entry has to take the place
+		# of a running low priority one, which is done by enqueuing through the queue running it
+		target = None
+		for q in self._queues:
+			if q._current is None:
+				target = q
+				break
+		if target is None and high_priority:
+			for q in self._queues:
+				if not q._current_highprio:
+					target = q
+					break
+		if target is None:
+			target = self._queues[0]
+		target.enqueue(entry, high_priority=high_priority)
+
+	def dequeue(self, location, path):
+		for q in self._queues:
+			q.dequeue(location, path)
+
+	def dequeue_folder(self, location, path):
+		for q in self._queues:
+			q.dequeue_folder(location, path)
+
+	def pause(self):
+		for q in self._queues:
+			q.pause()
+
+	def resume(self):
+		for q in self._queues:
+			q.resume()
+
 
 class GcodeAnalysisQueue(AbstractAnalysisQueue):
 	"""
@@ -315,10 +580,22 @@ class GcodeAnalysisQueue(AbstractAnalysisQueue):
 	     * The extruded volume in cm³
 	"""
 
+	def __init__(self, finished_callback, **kwargs):
+		self._gcode = None
+		AbstractAnalysisQueue.__init__(self, finished_callback, **kwargs)
+
 	def _do_analysis(self, high_priority=False):
 		try:
 			throttle = settings().getFloat(["gcodeAnalysis", "throttle_highprio"]) if high_priority else settings().getFloat(["gcodeAnalysis", "throttle_normalprio"])
 			throttle_lines = settings().getInt(["gcodeAnalysis", "throttle_lines"])
+
+			if self._pool is not None:
+				# worker processes can't access the settings, so the analysis gets them supplied
+				return self._run_in_pool(_analyse_gcode, self._current.absolute_path, self._current.printer_profile,
+				                         throttle, throttle_lines,
+				                         settings().getBoolean(["feature", "g90InfluencesExtruder"]),
+				                         settings().getInt(["gcodeAnalysis", "maxExtruders"]))
+
 			if throttle > 0:
 				def throttle_callback(filePos, readBytes):
 					if filePos % throttle_lines == 0:
@@ -327,33 +604,21 @@ class GcodeAnalysisQueue(AbstractAnalysisQueue):
 			else:
 				throttle_callback = None
 
-			result = dict()
 			cb=dict()
 			self._gcode = gcodeInterpreter.gcode(cb)
 
 			self._gcode.load(self._current.absolute_path, self._current.printer_profile, throttle=throttle_callback)
 
-			result["gcode_check_progress"] = cb
-			result["printingArea"] = self._gcode.printing_area
-			result["dimensions"] = self._gcode.dimensions
-			if self._gcode.totalMoveTimeMinute:
-				result["estimatedPrintTime"] = self._gcode.totalMoveTimeMinute * 60
-			if self._gcode.extrusionAmount:
-				result["filament"] = dict()
-				for i in range(len(self._gcode.extrusionAmount)):
-					result["filament"]["tool%d" % i] = {
-						"length": self._gcode.extrusionAmount[i],
-						"volume": self._gcode.extrusionVolume[i]
-					}
-			return result
+			return _gcode_analysis_result(self._gcode, cb)
 		except gcodeInterpreter.AnalysisAborted as ex:
-			print("ex.")
 			raise AnalysisAborted(reenqueue=ex.reenqueue)
 		finally:
 			self._gcode = None
 
 	def _do_abort(self, reenqueue=True):
-		if self._gcode:
+		if self._pool is not None:
+			self._abort_in_pool(reenqueue=reenqueue)
+		elif self._gcode:
 			self._gcode.abort(reenqueue=reenqueue)
 
 
@@ -377,13 +642,45 @@ class BVCGcodeAnalysisQueue(AbstractAnalysisQueue):
 	     * The extruded volume in cm³
 	"""
 
+	def __init__(self, finished_callback, **kwargs):
+		self._gcoder = None
+		AbstractAnalysisQueue.__init__(self, finished_callback, **kwargs)
+
 	def _do_analysis(self, high_priority=False):
 		try:
-			gcoder_result = bvcGcoder.analyse(self._current.absolute_path)
+			throttle = settings().getFloat(["gcodeAnalysis", "throttle_highprio"]) if high_priority else settings().getFloat(["gcodeAnalysis", "throttle_normalprio"])
+			throttle_lines = settings().getInt(["gcodeAnalysis", "throttle_lines"])
+
+			if self._pool is not None:
+				gcoder_result = self._run_in_pool(_analyse_bvc, self._current.absolute_path, throttle, throttle_lines)
+			else:
+				if throttle > 0:
+					def throttle_callback(lineNo, readBytes):
+						if lineNo % throttle_lines == 0:
+							time.sleep(throttle)
+				else:
+					throttle_callback = None
+
+				def progress_callback(progress):
+					self._current_progress = progress
+
+				self._gcoder = bvcGcoder.GCodeAnalyser()
+				self._gcoder.load(self._current.absolute_path, progress_callback=progress_callback, throttle=throttle_callback)
+				gcoder_result = self._gcoder.result()
 
 			result = dict()
-			result["printingArea"] = None
-			result["dimensions"] = None
+			xdims = gcoder_result["xdims"]
+			ydims = gcoder_result["ydims"]
+			zdims = gcoder_result["zdims"]
+			result["printingArea"] = dict(minX=xdims["min"],
+			                              minY=ydims["min"],
+			                              minZ=zdims["min"],
+			                              maxX=xdims["max"],
+			                              maxY=ydims["max"],
+			                              maxZ=zdims["max"])
+			result["dimensions"] = dict(width=xdims["width"],
+			                            depth=ydims["width"],
+			                            height=zdims["width"])
 			if 'estimated_duration' in gcoder_result:
 				result["estimatedPrintTime"] = gcoder_result['estimated_duration']
 			if 'filament_used' in gcoder_result:
@@ -406,9 +703,80 @@ class BVCGcodeAnalysisQueue(AbstractAnalysisQueue):
 				result['gcodeLines'] = gcoder_result['gcode_lines']
 
 			return result
+		except bvcGcoder.AnalysisAborted as ex:
+			raise AnalysisAborted(reenqueue=ex.reenqueue)
+		except AnalysisAborted:
+			raise
 		except Exception as ex:
 			self._logger.error(ex)
+		finally:
+			self._gcoder = None
 
 	def _do_abort(self, reenqueue=True):
-		# TODO: We should implement a way to abort the analysis in the bvc_gcoder
-		pass
+		if self._pool is not None:
+			self._abort_in_pool(reenqueue=reenqueue)
+		elif self._gcoder:
+			self._gcoder.abort(reenqueue=reenqueue)
+
+
+def _gcode_analysis_result(gcode, cb):
+	result = dict()
+	result["gcode_check_progress"] = cb
+	result["printingArea"] = gcode.printing_area
+	result["dimensions"] = gcode.dimensions
+	if gcode.totalMoveTimeMinute:
+		result["estimatedPrintTime"] = gcode.totalMoveTimeMinute * 60
+	if gcode.extrusionAmount:
+		result["filament"] = dict()
+		for i in range(len(gcode.extrusionAmount)):
+			result["filament"]["tool%d" % i] = {
+				"length": gcode.extrusionAmount[i],
+				"volume": gcode.extrusionVolume[i]
+			}
+	return result
+
+
+##~~ Everything below runs in the worker processes of an AnalysisWorkerPool
+
+
+_pool_abort_flags = None
+_pool_progress = None
+
+
+def _init_pool_worker(abort_flags, progress):
+	global _pool_abort_flags, _pool_progress
+	_pool_abort_flags = abort_flags
+	_pool_progress = progress
+
+
+def _pool_worker_throttle(slot, path, throttle, throttle_lines):
+	"""
+	Creates the throttle callback for an analysis running in a worker process. Besides applying the configured
+	throttle it aborts the analysis once the :class:`AnalysisWorkerPool` flags the slot and reports the progress
+	through the file back to it.
+	"""
+	file_size = os.stat(path).st_size
+
+	def throttle_callback(lineNo, readBytes):
+		if _pool_abort_flags[slot]:
+			raise AnalysisAborted()
+		if lineNo % 1000 == 0 and file_size:
+			_pool_progress[slot] = min(float(readBytes) / file_size, 1.0)
+		if throttle > 0 and lineNo % throttle_lines == 0:
+			time.sleep(throttle)
+
+	return throttle_callback
+
+
+def _analyse_gcode(slot, path, printer_profile, throttle, throttle_lines, g90_extruder, max_extruders):
+	cb = dict()
+	gcode = gcodeInterpreter.gcode(cb)
+	gcode.load(path, printer_profile, throttle=_pool_worker_throttle(slot, path, throttle, throttle_lines),
+	           g90_extruder=g90_extruder, max_extruders=max_extruders)
+	return _gcode_analysis_result(gcode, cb)
+
+
+def _analyse_bvc(slot, path, throttle, throttle_lines):
+	gcoder = bvcGcoder.GCodeAnalyser()
+	gcoder.load(path, throttle=_pool_worker_throttle(slot, path, throttle, throttle_lines))
+	return gcoder.result()
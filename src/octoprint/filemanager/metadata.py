@@ -0,0 +1,580 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2018 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import json
+import logging
+import os
+import pylru
+import threading
+import time
+import yaml
+
+from octoprint.util import atomic_write
+
+
+LINK_RELS = ("model", "machinecode")
+"""Link relations which point at sibling files by hash and need to be cleaned up on removal."""
+
+
+class FrozenDict(dict):
+	"""
+	Read-only ``dict`` used for views on cached metadata. Use :func:`thaw` to get a modifiable copy.
+	"""
+
+	def _read_only(self, *args, **kwargs):
+		raise TypeError("Metadata views are read-only, use thaw() to get a modifiable copy")
+
+	__setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+	def __copy__(self):
+		return dict(self)
+
+	def __deepcopy__(self, memo):
+		return thaw(self)
+
+	def __reduce__(self):
+		return dict, (dict(self),)
+
+
+class FrozenList(list):
+	"""
+	Read-only ``list`` used for views on cached metadata. Use :func:`thaw` to get a modifiable copy.
+	"""
+
+	def _read_only(self, *args, **kwargs):
+		raise TypeError("Metadata views are read-only, use thaw() to get a modifiable copy")
+
+	__setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _read_only
+	append = extend = insert = pop = remove = reverse = sort = _read_only
+
+	def __copy__(self):
+		return list(self)
+
+	def __deepcopy__(self, memo):
+		return thaw(self)
+
+	def __reduce__(self):
+		return list, (list(self),)
+
+
+def freeze(obj):
+	"""
+	Converts ``obj`` into a read-only structure of :class:`FrozenDict` and :class:`FrozenList` instances.
+
+	Already frozen parts are shared instead of copied, so freezing an updated folder only pays for the changed
+	entries.
+	"""
+	if isinstance(obj, (FrozenDict, FrozenList)):
+		return obj
+	elif isinstance(obj, dict):
+		return FrozenDict((key, freeze(value)) for key, value in obj.items())
+	elif isinstance(obj, (list, tuple)):
+		return FrozenList(freeze(value) for value in obj)
+	else:
+		return obj
+
+
+def thaw(obj):
+	"""
+	Returns a modifiable deep copy of the (possibly frozen) metadata ``obj``.
+	"""
+	if isinstance(obj, dict):
+		return dict((key, thaw(value)) for key, value in obj.items())
+	elif isinstance(obj, (list, tuple)):
+		return [thaw(value) for value in obj]
+	else:
+		return obj
+
+
+class _MetadataDumper(yaml.SafeDumper):
+	pass
+
+_MetadataDumper.add_representer(FrozenDict, yaml.representer.SafeRepresenter.represent_dict)
+_MetadataDumper.add_representer(FrozenList, yaml.representer.SafeRepresenter.represent_list)
+
+
+class MetadataBackend(object):
+	"""
+	Interface of metadata backends for the :class:`~octoprint.filemanager.storage.LocalFileStorage`.
+
+	Metadata is organized per folder, indexed by the sanitized names of the entries within that folder. All
+	``path`` arguments are absolute paths on disk to the folder holding the entries.
+
+	Metadata returned by a backend is a read-only view which may be shared with other readers. Callers which want
+	to modify it need to :func:`thaw` it first.
+	"""
+
+	def initialize(self):
+		"""
+		Called once by the storage on startup, before the metadata of the storage is first accessed.
+		"""
+		pass
+
+	def close(self):
+		"""
+		Releases any resources held by the backend.
+		"""
+		pass
+
+	def get_folder(self, path):
+		"""
+		Retrieves all metadata entries of the folder ``path``.
+
+		Arguments:
+		    path (str): the folder for which to retrieve the metadata
+
+		Returns:
+		    dict: a read-only dictionary mapping entry names to their metadata
+		"""
+		raise NotImplementedError()
+
+	def get_entry(self, path, name, default=None):
+		"""
+		Retrieves the metadata entry ``name`` in the folder ``path``.
+
+		Arguments:
+		    path (str): the folder containing the entry
+		    name (str): the name of the entry
+		    default: value to return if there is no such entry
+
+		Returns:
+		    dict: a read-only view on the metadata of the entry
+		"""
+		raise NotImplementedError()
+
+	def set_entry(self, path, name, data):
+		"""
+		Replaces the metadata entry ``name`` in the folder ``path`` with ``data``.
+		"""
+		self.set_entries(path, {name: data})
+
+	def set_entries(self, path, entries):
+		"""
+		Replaces all metadata entries contained in ``entries`` in the folder ``path`` within one transaction.
+
+		Arguments:
+		    path (str): the folder containing the entries
+		    entries (dict): a dictionary mapping entry names to their new metadata
+		"""
+		raise NotImplementedError()
+
+	def remove_entry(self, path, name):
+		"""
+		Removes the metadata entry ``name`` from the folder ``path``, together with all ``model`` and ``machinecode``
+		links of its siblings that point to it.
+		"""
+		raise NotImplementedError()
+
+	def delete_folder(self, path):
+		"""
+		Removes the metadata of the folder ``path`` and all of its sub folders.
+		"""
+		raise NotImplementedError()
+
+	def copy_folder(self, source, destination):
+		"""
+		Called after the folder ``source`` has been copied to ``destination`` on disk.
+		"""
+		raise NotImplementedError()
+
+	def move_folder(self, source, destination):
+		"""
+		Called after the folder ``source`` has been moved to ``destination`` on disk.
+		"""
+		raise NotImplementedError()
+
+	def last_modified(self, path):
+		"""
+		Retrieves the timestamp of the last metadata modification within the folder ``path``.
+
+		Returns:
+		    float: the timestamp of the last modification or ``None`` if unknown
+		"""
+		raise NotImplementedError()
+
+
+def _without_links_to(entry, hash):
+	"""Returns a copy of ``entry`` without links to ``hash`` or ``None`` if there are no such links."""
+	if not isinstance(entry, dict) or not "links" in entry:
+		return None
+
+	links = [link for link in entry["links"] if not ("hash" in link and link["hash"] == hash and link.get("rel") in LINK_RELS)]
+	if len(links) == len(entry["links"]):
+		return None
+
+	result = dict(entry)
+	result["links"] = links
+	return result
+
+
+class YamlMetadataBackend(MetadataBackend):
+	"""
+	Metadata backend which keeps the metadata inside ``.metadata.yaml`` files in the respective folders. Access is
+	managed through an LRU cache to minimize the parsing overhead.
+
+	The cache holds frozen folders which are handed out to readers as they are. Writers replace the changed entries
+	in a shallow copy of the folder, sharing all unchanged entries with the previous version (copy-on-write).
+	"""
+
+	filename = ".metadata.yaml"
+
+	def __init__(self, cache_size=10):
+		self._logger = logging.getLogger(__name__)
+		self._lock = threading.RLock()
+		self._cache = pylru.lrucache(cache_size)
+
+	def get_folder(self, path):
+		with self._lock:
+			return self._load(path)
+
+	def get_entry(self, path, name, default=None):
+		with self._lock:
+			return self._load(path).get(name, default)
+
+	def set_entries(self, path, entries):
+		with self._lock:
+			metadata = dict(self._load(path))
+			for name, data in entries.items():
+				metadata[name] = freeze(data)
+			self._save(path, FrozenDict(metadata))
+
+	def remove_entry(self, path, name):
+		with self._lock:
+			metadata = dict(self._load(path))
+			if not name in metadata:
+				return
+
+			if isinstance(metadata[name], dict) and "hash" in metadata[name]:
+				hash = metadata[name]["hash"]
+				for other, m in metadata.items():
+					updated = _without_links_to(m, hash)
+					if updated is not None:
+						metadata[other] = freeze(updated)
+
+			del metadata[name]
+			self._save(path, FrozenDict(metadata))
+
+	def delete_folder(self, path):
+		with self._lock:
+			metadata_path = os.path.join(path, self.filename)
+			if os.path.exists(metadata_path):
+				try:
+					os.remove(metadata_path)
+				except:
+					self._logger.exception("Error while deleting {} from {}".format(self.filename, path))
+			self._forget(path)
+
+	def copy_folder(self, source, destination):
+		# the metadata files get copied along with the folder
+		pass
+
+	def move_folder(self, source, destination):
+		# the metadata files get moved along with the folder, we only need to drop what we cached for the source
+		with self._lock:
+			self._forget(source)
+
+	def last_modified(self, path):
+		metadata_path = os.path.join(path, self.filename)
+		if os.path.exists(metadata_path):
+			return os.stat(metadata_path).st_mtime
+		return None
+
+	def _forget(self, path):
+		prefix = path + os.sep
+		for cached in list(self._cache.keys()):
+			if cached == path or cached.startswith(prefix):
+				del self._cache[cached]
+
+	def _load(self, path):
+		if path in self._cache:
+			return self._cache[path]
+
+		metadata = load_yaml_metadata(path, logger=self._logger)
+		if metadata is None:
+			return FrozenDict()
+
+		metadata = freeze(metadata)
+		self._cache[path] = metadata
+		return metadata
+
+	def _save(self, path, metadata):
+		metadata_path = os.path.join(path, self.filename)
+		try:
+			with atomic_write(metadata_path) as f:
+				yaml.dump(metadata, stream=f, Dumper=_MetadataDumper, default_flow_style=False, indent="  ", allow_unicode=True)
+		except:
+			self._logger.exception("Error while writing {} to {}".format(self.filename, path))
+		else:
+			self._cache[path] = metadata
+
+
+def load_yaml_metadata(path, logger=None):
+	"""
+	Loads the ``.metadata.yaml`` file in the folder ``path``.
+
+	Returns:
+	    dict: the metadata stored in the folder or ``None`` if there is none or it could not be read
+	"""
+	metadata_path = os.path.join(path, YamlMetadataBackend.filename)
+	if not os.path.exists(metadata_path):
+		return None
+
+	try:
+		with open(metadata_path) as f:
+			metadata = yaml.safe_load(f)
+	except:
+		if logger is not None:
+			logger.exception("Error while reading {} from {}".format(YamlMetadataBackend.filename, path))
+		return None
+
+	if not isinstance(metadata, dict):
+		return None
+	return metadata
+
+
+class SqliteMetadataBackend(MetadataBackend):
+	"""
+	Metadata backend which keeps the metadata of all folders of a storage in one embedded SQLite database.
+
+	Every entry is stored as its own row, so updating a single file only touches that file's row within a
+	transaction instead of rewriting the metadata of the whole folder. Hashes and ``model``/``machinecode`` link
+	targets are indexed, which allows finding the entries linking to a removed file without scanning the folder.
+
+	On first initialization all existing ``.metadata.yaml`` files below the storage's base folder are imported. The
+	YAML files are left in place.
+
+	Decoded folders are kept in a copy-on-write LRU cache, just like in the :class:`YamlMetadataBackend`.
+	"""
+
+	filename = ".metadata.db"
+
+	SCHEMA_VERSION = 1
+
+	def __init__(self, basefolder, database=None, cache_size=10):
+		self._logger = logging.getLogger(__name__)
+		self._basefolder = basefolder
+		self._lock = threading.RLock()
+		self._cache = pylru.lrucache(cache_size)
+
+		if database is None:
+			database = os.path.join(basefolder, self.filename)
+		self._database = database
+
+		import sqlite3
+		self._connection = sqlite3.connect(database, check_same_thread=False)
+		self._connection.execute("PRAGMA journal_mode=WAL")
+		self._connection.execute("PRAGMA synchronous=NORMAL")
+
+	def initialize(self):
+		with self._lock:
+			version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+			if version >= self.SCHEMA_VERSION:
+				return
+
+			with self._connection:
+				self._connection.execute("CREATE TABLE IF NOT EXISTS entries (folder TEXT NOT NULL, name TEXT NOT NULL, hash TEXT, data TEXT NOT NULL, PRIMARY KEY (folder, name))")
+				self._connection.execute("CREATE INDEX IF NOT EXISTS entries_hash ON entries (folder, hash)")
+				self._connection.execute("CREATE TABLE IF NOT EXISTS links (folder TEXT NOT NULL, name TEXT NOT NULL, rel TEXT NOT NULL, hash TEXT NOT NULL)")
+				self._connection.execute("CREATE INDEX IF NOT EXISTS links_source ON links (folder, name)")
+				self._connection.execute("CREATE INDEX IF NOT EXISTS links_target ON links (folder, hash)")
+				self._connection.execute("CREATE TABLE IF NOT EXISTS folders (folder TEXT NOT NULL PRIMARY KEY, modified REAL NOT NULL)")
+
+				migrated = self._migrate_yaml()
+
+				self._connection.execute("PRAGMA user_version = {:d}".format(self.SCHEMA_VERSION))
+
+			if migrated:
+				self._logger.info("Migrated the metadata of {} folders in {} to {}".format(migrated, self._basefolder, self._database))
+
+	def close(self):
+		with self._lock:
+			self._connection.close()
+
+	def get_folder(self, path):
+		folder = self._folder(path)
+		with self._lock:
+			if folder in self._cache:
+				return self._cache[folder]
+
+			rows = self._connection.execute("SELECT name, data FROM entries WHERE folder = ?", (folder,)).fetchall()
+			metadata = FrozenDict((name, freeze(json.loads(data))) for name, data in rows)
+			self._cache[folder] = metadata
+			return metadata
+
+	def get_entry(self, path, name, default=None):
+		folder = self._folder(path)
+		with self._lock:
+			if folder in self._cache:
+				return self._cache[folder].get(name, default)
+
+			row = self._connection.execute("SELECT data FROM entries WHERE folder = ? AND name = ?", (folder, name)).fetchone()
+		if row is None:
+			return default
+		return freeze(json.loads(row[0]))
+
+	def set_entries(self, path, entries):
+		folder = self._folder(path)
+		with self._lock:
+			with self._connection:
+				for name, data in entries.items():
+					self._write_entry(folder, name, data)
+				self._touch(folder)
+
+			if folder in self._cache:
+				metadata = dict(self._cache[folder])
+				for name, data in entries.items():
+					metadata[name] = freeze(data)
+				self._cache[folder] = FrozenDict(metadata)
+
+	def remove_entry(self, path, name):
+		folder = self._folder(path)
+		with self._lock:
+			with self._connection:
+				row = self._connection.execute("SELECT hash FROM entries WHERE folder = ? AND name = ?", (folder, name)).fetchone()
+				if row is None:
+					return
+
+				hash = row[0]
+				if hash is not None:
+					linking = self._connection.execute("SELECT DISTINCT links.name, entries.data FROM links JOIN entries ON links.folder = entries.folder AND links.name = entries.name "
+					                                   "WHERE links.folder = ? AND links.hash = ? AND links.rel IN (?, ?) AND links.name != ?",
+					                                   (folder, hash) + LINK_RELS + (name,)).fetchall()
+					for linking_name, data in linking:
+						updated = _without_links_to(json.loads(data), hash)
+						if updated is not None:
+							self._write_entry(folder, linking_name, updated)
+
+				self._connection.execute("DELETE FROM entries WHERE folder = ? AND name = ?", (folder, name))
+				self._connection.execute("DELETE FROM links WHERE folder = ? AND name = ?", (folder, name))
+				self._touch(folder)
+
+			self._forget(folder)
+
+	def delete_folder(self, path):
+		folder = self._folder(path)
+		with self._lock:
+			with self._connection:
+				for table in ("entries", "links", "folders"):
+					self._connection.execute("DELETE FROM {table} WHERE {where}".format(table=table, where=self._subtree_clause()),
+					                         self._subtree_args(folder))
+
+			self._forget(folder)
+
+	def copy_folder(self, source, destination):
+		source_folder = self._folder(source)
+		destination_folder = self._folder(destination)
+		with self._lock:
+			with self._connection:
+				args = (destination_folder, len(source_folder) + 1) + self._subtree_args(source_folder)
+				self._connection.execute("INSERT OR REPLACE INTO entries (folder, name, hash, data) "
+				                         "SELECT ? || substr(folder, ?), name, hash, data FROM entries WHERE " + self._subtree_clause(), args)
+				self._connection.execute("INSERT INTO links (folder, name, rel, hash) "
+				                         "SELECT ? || substr(folder, ?), name, rel, hash FROM links WHERE " + self._subtree_clause(), args)
+				self._connection.execute("INSERT OR REPLACE INTO folders (folder, modified) "
+				                         "SELECT ? || substr(folder, ?), modified FROM folders WHERE " + self._subtree_clause(), args)
+				self._touch(destination_folder)
+
+			self._forget(destination_folder)
+
+	def move_folder(self, source, destination):
+		source_folder = self._folder(source)
+		destination_folder = self._folder(destination)
+		with self._lock:
+			with self._connection:
+				args = (destination_folder, len(source_folder) + 1) + self._subtree_args(source_folder)
+				for table in ("entries", "links", "folders"):
+					self._connection.execute("UPDATE {table} SET folder = ? || substr(folder, ?) WHERE {where}".format(table=table, where=self._subtree_clause()), args)
+				self._touch(destination_folder)
+
+			self._forget(source_folder)
+			self._forget(destination_folder)
+
+	def last_modified(self, path):
+		folder = self._folder(path)
+		with self._lock:
+			row = self._connection.execute("SELECT modified FROM folders WHERE folder = ?", (folder,)).fetchone()
+		if row is None:
+			return None
+		return row[0]
+
+	##~~ internals
+
+	def _folder(self, path):
+		folder = os.path.relpath(path, self._basefolder)
+		if folder == os.curdir:
+			return ""
+		return folder.replace(os.sep, "/")
+
+	def _forget(self, folder):
+		prefix = folder + "/"
+		for cached in list(self._cache.keys()):
+			if cached == folder or cached.startswith(prefix):
+				del self._cache[cached]
+
+	def _subtree_clause(self):
+		return "(folder = ? OR substr(folder, 1, ?) = ?)"
+
+	def _subtree_args(self, folder):
+		prefix = folder + "/"
+		return folder, len(prefix), prefix
+
+	def _write_entry(self, folder, name, data):
+		hash = data.get("hash") if isinstance(data, dict) else None
+		self._connection.execute("INSERT OR REPLACE INTO entries (folder, name, hash, data) VALUES (?, ?, ?, ?)",
+		                         (folder, name, hash, json.dumps(data)))
+
+		self._connection.execute("DELETE FROM links WHERE folder = ? AND name = ?", (folder, name))
+		if isinstance(data, dict) and "links" in data:
+			links = [(folder, name, link["rel"], link["hash"]) for link in data["links"]
+			         if "rel" in link and "hash" in link]
+			if links:
+				self._connection.executemany("INSERT INTO links (folder, name, rel, hash) VALUES (?, ?, ?, ?)", links)
+
+	def _touch(self, folder):
+		self._connection.execute("INSERT OR REPLACE INTO folders (folder, modified) VALUES (?, ?)", (folder, time.time()))
+
+	def _migrate_yaml(self):
+		migrated = 0
+		for root, dirs, files in os.walk(self._basefolder):
+			if not YamlMetadataBackend.filename in files:
+				continue
+
+			metadata = load_yaml_metadata(root, logger=self._logger)
+			if not metadata:
+				continue
+
+			folder = self._folder(root)
+			for name, data in metadata.items():
+				if not isinstance(data, dict):
+					continue
+				try:
+					self._write_entry(folder, name, data)
+				except (TypeError, ValueError):
+					self._logger.exception("Could not migrate metadata of {} in {}".format(name, root))
+			self._touch(folder)
+			migrated += 1
+
+		return migrated
+
+
+def create_backend(name, basefolder):
+	"""
+	Creates the metadata backend ``name`` for a storage located at ``basefolder``.
+
+	Arguments:
+	    name (str): ``yaml`` or ``sqlite``
+	    basefolder (str): the base folder of the storage
+
+	Returns:
+	    MetadataBackend: the backend
+	"""
+	if name == "sqlite":
+		return SqliteMetadataBackend(basefolder)
+	elif name == "yaml" or name is None:
+		return YamlMetadataBackend()
+	else:
+		raise ValueError("Unknown metadata backend: {}".format(name))
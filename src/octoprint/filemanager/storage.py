@@ -8,23 +8,26 @@ __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms
 
 import logging
 import os
-import pylru
 import shutil
 import sys
+import time
 
 try:
 	from os import scandir, walk
 except ImportError:
 	from scandir import scandir, walk
 
-from octoprint.util import atomic_write
 from contextlib import contextmanager
-from copy import deepcopy
 
 import octoprint.filemanager
 
+from octoprint.filemanager.metadata import create_backend as create_metadata_backend, thaw
+from octoprint.filemanager.util import AbstractFileWrapper, create_hash, hash_file
+
 from octoprint.util import is_hidden_path
 
+from watchdog.events import FileSystemEventHandler
+
 class StorageInterface(object):
 	"""
 	Interface of storage adapters for OctoPrint.
@@ -393,6 +396,14 @@ class StorageInterface(object):
 		"""
 		raise NotImplementedError()
 
+	@property
+	def version(self):
+		"""
+		A counter which increases with every change to the files, folders or metadata in the storage, or ``None`` if
+		the storage doesn't track its changes. Can be used to detect whether a previous listing is still current.
+		"""
+		return None
+
 
 class StorageError(Exception):
 	UNKNOWN = "unknown"
@@ -418,19 +429,33 @@ class LocalFileStorage(StorageInterface):
 	"""
 	The ``LocalFileStorage`` is a storage implementation which holds all files, folders and metadata on disk.
 
-	Metadata is managed inside ``.metadata.yaml`` files in the respective folders, indexed by the sanitized filenames
-	stored within the folder. Metadata access is managed through an LRU cache to minimize access overhead.
+	Metadata is managed by a pluggable :class:`~octoprint.filemanager.metadata.MetadataBackend`, indexed by the
+	sanitized filenames stored within each folder. By default it is kept inside ``.metadata.yaml`` files in the
+	respective folders, alternatively all metadata can be kept in one embedded SQLite database.
+
+	Listings are answered from an in-memory index of the folders, which is kept up to date by the storage's own
+	operations and, if enabled, a watchdog observing the base folder for changes done from outside. Without the
+	watchdog the index of a folder is revalidated against the folder's modification time.
 
 	This storage type implements :func:`path_on_disk`.
 	"""
 
-	def __init__(self, basefolder, create=False):
+	MTIME_RESOLUTION = 2.0
+	"""Assumed resolution of the folder modification times of the underlying file system, in seconds."""
+
+	def __init__(self, basefolder, create=False, metadata_backend="yaml", watch=False, hash_algorithm="sha1"):
 		"""
 		Initializes a ``LocalFileStorage`` instance under the given ``basefolder``, creating the necessary folder
 		if necessary and ``create`` is set to ``True``.
 
-		:param string basefolder: the path to the folder under which to create the storage
-		:param bool create:       ``True`` if the folder should be created if it doesn't exist yet, ``False`` otherwise
+		:param string basefolder:       the path to the folder under which to create the storage
+		:param bool create:             ``True`` if the folder should be created if it doesn't exist yet, ``False`` otherwise
+		:param string metadata_backend: the metadata backend to use, either ``yaml`` or ``sqlite``
+		:param bool watch:              ``True`` if the base folder should be watched for changes done outside of the
+		                                storage, ``False`` otherwise
+		:param string hash_algorithm:   the algorithm used for the file hashes in the metadata, ``sha1`` or the faster
+		                                but non-cryptographic ``fingerprint``. It's stored alongside each hash, existing
+		                                hashes keep their algorithm until their file changes
 		"""
 		self._logger = logging.getLogger(__name__)
 
@@ -444,7 +469,14 @@ class LocalFileStorage(StorageInterface):
 		self._metadata_lock_mutex = threading.RLock()
 		self._metadata_locks = dict()
 
-		self._metadata_cache = pylru.lrucache(10)
+		self._metadata = create_metadata_backend(metadata_backend, self.basefolder)
+		self._hash_algorithm = hash_algorithm
+
+		self._index_lock = threading.RLock()
+		self._index = dict()
+		self._version = 0
+		self._last_change = None
+		self._watcher = None
 
 		from slugify import Slugify
 		self._slugify = Slugify()
@@ -453,9 +485,20 @@ class LocalFileStorage(StorageInterface):
 		self._old_metadata = None
 		self._initialize_metadata()
 
+		last_modified = self._last_modified_on_disk(self.basefolder, recursive=True)
+		if self._last_change is None or last_modified > self._last_change:
+			self._last_change = last_modified
+		if watch:
+			try:
+				self._watcher = self._start_watcher()
+			except:
+				self._logger.exception("Could not start watching {} for changes".format(self.basefolder))
+
 	def _initialize_metadata(self):
 		self._logger.info("Initializing the file metadata for {}...".format(self.basefolder))
 
+		self._metadata.initialize()
+
 		old_metadata_path = os.path.join(self.basefolder, "metadata.yaml")
 		backup_path = os.path.join(self.basefolder, "metadata.yaml.backup")
 
@@ -520,16 +563,28 @@ class LocalFileStorage(StorageInterface):
 				for sub_entry in self._analysis_backlog_generator(entry.path):
 					yield self.join_path(entry.name, sub_entry[0]), sub_entry[1], sub_entry[2]
 
+	@property
+	def version(self):
+		if self._watcher is None:
+			self._validate_index()
+		return self._version
+
 	def last_modified(self, path=None, recursive=False):
 		if path is None:
-			path = self.basefolder
+			# the index knows when the storage last changed
+			if self._watcher is None:
+				self._validate_index()
+			return self._last_change
 		else:
 			path = os.path.join(self.basefolder, path)
 
+		return self._last_modified_on_disk(path, recursive=recursive)
+
+	def _last_modified_on_disk(self, path, recursive=False):
 		def last_modified_for_path(p):
-			metadata = os.path.join(p, ".metadata.yaml")
-			if os.path.exists(metadata):
-				return max(os.stat(p).st_mtime, os.stat(metadata).st_mtime)
+			metadata = self._metadata.last_modified(p)
+			if metadata is not None:
+				return max(os.stat(p).st_mtime, metadata)
 			else:
 				return os.stat(p).st_mtime
 
@@ -574,6 +629,7 @@ class LocalFileStorage(StorageInterface):
 				raise StorageError("{name} does already exist in {path}".format(**locals()), code=StorageError.ALREADY_EXISTS)
 		else:
 			os.mkdir(folder_path)
+			self._index_changed(path)
 
 		return self.path_in_storage((path, name))
 
@@ -598,6 +654,8 @@ class LocalFileStorage(StorageInterface):
 		shutil.rmtree(folder_path)
 
 		self._delete_metadata(folder_path)
+		self._index_changed(folder_path, subtree=True)
+		self._index_changed(path)
 
 	def _get_source_destination_data(self, source, destination):
 		"""Prepares data dicts about source and destination for copy/move."""
@@ -635,6 +693,9 @@ class LocalFileStorage(StorageInterface):
 		except Exception as e:
 			raise StorageError("Could not copy %s in %s to %s in %s" % (source_data["name"], source_data["path"], destination_data["name"], destination_data["path"]), cause=e)
 
+		self._metadata.copy_folder(source_data["fullpath"], destination_data["fullpath"])
+		self._index_changed(destination_data["path"])
+
 		return self.path_in_storage(destination_data["fullpath"])
 
 	def move_folder(self, source, destination):
@@ -645,7 +706,10 @@ class LocalFileStorage(StorageInterface):
 		except Exception as e:
 			raise StorageError("Could not move %s in %s to %s in %s" % (source_data["name"], source_data["path"], destination_data["name"], destination_data["path"]), cause=e)
 
-		self._delete_metadata(source_data["fullpath"])
+		self._metadata.move_folder(source_data["fullpath"], destination_data["fullpath"])
+		self._index_changed(source_data["fullpath"], subtree=True)
+		self._index_changed(source_data["path"])
+		self._index_changed(destination_data["path"])
 
 		return self.path_in_storage(destination_data["fullpath"])
 
@@ -664,15 +728,25 @@ class LocalFileStorage(StorageInterface):
 		if not os.path.exists(path):
 			os.makedirs(path)
 
-		# save the file
-		file_object.save(file_path)
+		# save the file, hashing it on the way if possible
+		hash = create_hash(self._hash_algorithm)
+		if isinstance(file_object, AbstractFileWrapper):
+			file_hash = file_object.save_hashed(file_path, hash)
+		else:
+			file_object.save(file_path)
+			hash_file(file_path, hash)
+			file_hash = hash.hexdigest()
 
 		# save the file's hash to the metadata of the folder
-		file_hash = self._create_hash(file_path)
-		metadata = self._get_metadata_entry(path, name, default=dict())
-		if not "hash" in metadata or metadata["hash"] != file_hash:
+		metadata = self._get_metadata_entry(path, name, default=dict(), view=True)
+		if "hash" in metadata and self._get_hash_algorithm(metadata) != self._hash_algorithm:
+			# stored with another algorithm -> compare with the file's hash in that one, links to the file use it too
+			unchanged = metadata["hash"] == self._create_hash(file_path, algorithm=self._get_hash_algorithm(metadata))
+		else:
+			unchanged = "hash" in metadata and metadata["hash"] == file_hash
+		if not unchanged:
 			# hash changed -> throw away old metadata
-			self._update_metadata_entry(path, name, dict(hash=file_hash))
+			self._update_metadata_entry(path, name, dict(hash=file_hash, hashAlgorithm=self._hash_algorithm))
 
 		# process any links that were also provided for adding to the file
 		if not links:
@@ -685,6 +759,7 @@ class LocalFileStorage(StorageInterface):
 
 		# touch the file to set last access and modification time to now
 		os.utime(file_path, None)
+		self._index_changed(path)
 
 		return self.path_in_storage((path, name))
 
@@ -703,6 +778,7 @@ class LocalFileStorage(StorageInterface):
 			raise StorageError("Could not delete {name} in {path}".format(**locals()), cause=e)
 
 		self._remove_metadata_entry(path, name)
+		self._index_changed(path)
 
 	def copy_file(self, source, destination):
 		source_data, destination_data = self._get_source_destination_data(source, destination)
@@ -714,6 +790,7 @@ class LocalFileStorage(StorageInterface):
 
 		self._copy_metadata_entry(source_data["path"], source_data["name"],
 		                          destination_data["path"], destination_data["name"])
+		self._index_changed(destination_data["path"])
 
 		return self.path_in_storage(destination_data["fullpath"])
 
@@ -728,11 +805,14 @@ class LocalFileStorage(StorageInterface):
 		self._copy_metadata_entry(source_data["path"], source_data["name"],
 		                          destination_data["path"], destination_data["name"],
 		                          delete_source=True)
+		self._index_changed(source_data["path"])
+		self._index_changed(destination_data["path"])
 
 		return self.path_in_storage(destination_data["fullpath"])
 
 	def has_analysis(self, path):
-		metadata = self.get_metadata(path)
+		path, name = self.sanitize(path)
+		metadata = self._get_metadata_entry(path, name, default=dict(), view=True)
 		return "analysis" in metadata
 
 	def get_metadata(self, path):
@@ -761,42 +841,44 @@ class LocalFileStorage(StorageInterface):
 
 	def remove_history(self, path, index):
 		path, name = self.sanitize(path)
-		self._update_history(name, path, index)
+		self._delete_history(name, path, index)
 
 	def set_additional_metadata(self, path, key, data, overwrite=False, merge=False):
 		path, name = self.sanitize(path)
-		metadata = self._get_metadata(path)
-		metadata_dirty = False
+		with self._get_metadata_lock(path):
+			entry = self._get_metadata_entry(path, name)
+			metadata_dirty = False
 
-		if not name in metadata:
-			return
+			if entry is None:
+				return
 
-		if not key in metadata[name] or overwrite:
-			metadata[name][key] = data
-			metadata_dirty = True
-		elif key in metadata[name] and isinstance(metadata[name][key], dict) and isinstance(data, dict) and merge:
-			current_data = metadata[name][key]
+			if not key in entry or overwrite:
+				entry[key] = data
+				metadata_dirty = True
+			elif key in entry and isinstance(entry[key], dict) and isinstance(data, dict) and merge:
+				current_data = entry[key]
 
-			import octoprint.util
-			new_data = octoprint.util.dict_merge(current_data, data)
-			metadata[name][key] = new_data
-			metadata_dirty = True
+				import octoprint.util
+				new_data = octoprint.util.dict_merge(current_data, data)
+				entry[key] = new_data
+				metadata_dirty = True
 
-		if metadata_dirty:
-			self._save_metadata(path, metadata)
+			if metadata_dirty:
+				self._update_metadata_entry(path, name, entry)
 
 	def remove_additional_metadata(self, path, key):
 		path, name = self.sanitize(path)
-		metadata = self._get_metadata(path)
+		with self._get_metadata_lock(path):
+			entry = self._get_metadata_entry(path, name)
 
-		if not name in metadata:
-			return
+			if entry is None:
+				return
 
-		if not key in metadata[name]:
-			return
+			if not key in entry:
+				return
 
-		del metadata[name][key]
-		self._save_metadata(path, metadata)
+			del entry[key]
+			self._update_metadata_entry(path, name, entry)
 
 	def split_path(self, path):
 		split = path.split("/")
@@ -929,52 +1011,53 @@ class LocalFileStorage(StorageInterface):
 	##~~ internals
 
 	def _add_history(self, name, path, data):
-		metadata = self._get_metadata(path)
-
-		if not name in metadata:
-			metadata[name] = dict()
+		with self._get_metadata_lock(path):
+			entry = self._get_metadata_entry(path, name, default=dict())
 
-		if not "hash" in metadata[name]:
-			metadata[name]["hash"] = self._create_hash(os.path.join(path, name))
+			if not "hash" in entry:
+				entry["hash"] = self._create_hash(os.path.join(path, name))
+				entry["hashAlgorithm"] = self._hash_algorithm
 
-		if not "history" in metadata[name]:
-			metadata[name]["history"] = []
+			if not "history" in entry:
+				entry["history"] = []
 
-		metadata[name]["history"].append(data)
-		self._calculate_stats_from_history(name, path, metadata=metadata, save=False)
-		self._save_metadata(path, metadata)
+			entry["history"].append(data)
+			self._calculate_stats_from_history(name, path, entry=entry, save=False)
+			self._update_metadata_entry(path, name, entry)
 
 	def _update_history(self, name, path, index, data):
-		metadata = self._get_metadata(path)
+		with self._get_metadata_lock(path):
+			entry = self._get_metadata_entry(path, name)
 
-		if not name in metadata or not "history" in metadata[name]:
-			return
+			if entry is None or not "history" in entry:
+				return
 
-		try:
-			metadata[name]["history"][index].update(data)
-			self._calculate_stats_from_history(name, path, metadata=metadata, save=False)
-			self._save_metadata(path, metadata)
-		except IndexError:
-			pass
+			try:
+				entry["history"][index].update(data)
+				self._calculate_stats_from_history(name, path, entry=entry, save=False)
+				self._update_metadata_entry(path, name, entry)
+			except IndexError:
+				pass
 
 	def _delete_history(self, name, path, index):
-		metadata = self._get_metadata(path)
+		with self._get_metadata_lock(path):
+			entry = self._get_metadata_entry(path, name)
 
-		if not name in metadata or not "history" in metadata[name]:
-			return
+			if entry is None or not "history" in entry:
+				return
 
-		try:
-			del metadata[name]["history"][index]
-			self._calculate_stats_from_history(name, path, metadata=metadata, save=False)
-			self._save_metadata(path, metadata)
-		except IndexError:
-			pass
+			try:
+				del entry["history"][index]
+				self._calculate_stats_from_history(name, path, entry=entry, save=False)
+				self._update_metadata_entry(path, name, entry)
+			except IndexError:
+				pass
 
-	def _calculate_stats_from_history(self, name, path, metadata=None, save=True):
-		if metadata is None:
-			metadata = self._get_metadata(path)
+	def _calculate_stats_from_history(self, name, path, entry=None, save=True):
+		if entry is None:
+			entry = self._get_metadata_entry(path, name)
 
-		if not name in metadata or not "history" in metadata[name]:
+		if entry is None or not "history" in entry:
 			return
 
 		# collect data from history
@@ -982,7 +1065,7 @@ class LocalFileStorage(StorageInterface):
 		last_print = dict()
 
 
-		for history_entry in metadata[name]["history"]:
+		for history_entry in entry["history"]:
 			if not "printTime" in history_entry or not "success" in history_entry or not history_entry["success"] or not "printerProfile" in history_entry:
 				continue
 
@@ -1017,22 +1100,22 @@ class LocalFileStorage(StorageInterface):
 				continue
 			statistics["lastPrintTime"][printer_profile] = last_print[printer_profile]["printTime"]
 
-		metadata[name]["statistics"] = statistics
+		entry["statistics"] = statistics
 
 		if save:
-			self._save_metadata(path, metadata)
+			self._update_metadata_entry(path, name, entry)
 
 	def _get_links(self, name, path, searched_rel):
-		metadata = self._get_metadata(path)
+		entry = self._get_metadata_entry(path, name, view=True)
 		result = []
 
-		if not name in metadata:
+		if entry is None:
 			return result
 
-		if not "links" in metadata[name]:
+		if not "links" in entry:
 			return result
 
-		for data in metadata[name]["links"]:
+		for data in entry["links"]:
 			if not "rel" in data or not data["rel"] == searched_rel:
 				continue
 			result.append(data)
@@ -1043,130 +1126,219 @@ class LocalFileStorage(StorageInterface):
 		if file_type:
 			file_type = file_type[0]
 
-		metadata = self._get_metadata(path)
-		metadata_dirty = False
+		with self._get_metadata_lock(path):
+			# only the entries taking part in the links are fetched and written back
+			entries = dict()
+			entries[name] = self._get_metadata_entry(path, name, default=dict())
+			metadata_dirty = False
+
+			if not "hash" in entries[name]:
+				entries[name]["hash"] = self._create_hash(os.path.join(path, name))
+				entries[name]["hashAlgorithm"] = self._hash_algorithm
+
+			if not "links" in entries[name]:
+				entries[name]["links"] = []
+
+			for rel, data in links:
+				if (rel == "model" or rel == "machinecode") and "name" in data:
+					if file_type == "model" and rel == "model":
+						# adding a model link to a model doesn't make sense
+						return
+					elif file_type == "machinecode" and rel == "machinecode":
+						# adding a machinecode link to a machinecode doesn't make sense
+						return
+
+					ref_path = os.path.join(path, data["name"])
+					if not os.path.exists(ref_path):
+						# file doesn't exist, we won't create the link
+						continue
 
-		if not name in metadata:
-			metadata[name] = dict()
+					if not data["name"] in entries:
+						entries[data["name"]] = self._get_metadata_entry(path, data["name"])
+					target = entries[data["name"]]
 
-		if not "hash" in metadata[name]:
-			metadata[name]["hash"] = self._create_hash(os.path.join(path, name))
+					# fetch hash of target file
+					if target is not None and "hash" in target:
+						hash = target["hash"]
+					else:
+						hash = self._create_hash(ref_path)
+						if target is None:
+							target = entries[data["name"]] = dict(
+								hash=hash,
+								hashAlgorithm=self._hash_algorithm,
+								links=[]
+							)
+						else:
+							target["hash"] = hash
+							target["hashAlgorithm"] = self._hash_algorithm
+
+					if "hash" in data and not data["hash"] == hash:
+						# file doesn't have the correct hash, we won't create the link
+						continue
 
-		if not "links" in metadata[name]:
-			metadata[name]["links"] = []
+					if not "links" in target:
+						target["links"] = []
 
-		for rel, data in links:
-			if (rel == "model" or rel == "machinecode") and "name" in data:
-				if file_type == "model" and rel == "model":
-					# adding a model link to a model doesn't make sense
-					return
-				elif file_type == "machinecode" and rel == "machinecode":
-					# adding a machinecode link to a machinecode doesn't make sense
-					return
+					# add reverse link to link target file
+					target["links"].append(
+						dict(rel="machinecode" if rel == "model" else "model", name=name, hash=entries[name]["hash"])
+					)
+					metadata_dirty = True
 
-				ref_path = os.path.join(path, data["name"])
-				if not os.path.exists(ref_path):
-					# file doesn't exist, we won't create the link
-					continue
+					link_dict = dict(
+						rel=rel,
+						name=data["name"],
+						hash=hash
+					)
 
-				# fetch hash of target file
-				if data["name"] in metadata and "hash" in metadata[data["name"]]:
-					hash = metadata[data["name"]]["hash"]
-				else:
-					hash = self._create_hash(ref_path)
-					if not data["name"] in metadata:
-						metadata[data["name"]] = dict(
-							hash=hash,
-							links=[]
-						)
-					else:
-						metadata[data["name"]]["hash"] = hash
+				elif rel == "web" and "href" in data:
+					link_dict = dict(
+						rel=rel,
+						href=data["href"]
+					)
+					if "retrieved" in data:
+						link_dict["retrieved"] = data["retrieved"]
 
-				if "hash" in data and not data["hash"] == hash:
-					# file doesn't have the correct hash, we won't create the link
+				else:
 					continue
 
-				if not "links" in metadata[data["name"]]:
-					metadata[data["name"]]["links"] = []
-
-				# add reverse link to link target file
-				metadata[data["name"]]["links"].append(
-					dict(rel="machinecode" if rel == "model" else "model", name=name, hash=metadata[name]["hash"])
-				)
-				metadata_dirty = True
+				if link_dict:
+					entries[name]["links"].append(link_dict)
+					metadata_dirty = True
 
-				link_dict = dict(
-					rel=rel,
-					name=data["name"],
-					hash=hash
-				)
+			if metadata_dirty:
+				self._update_metadata_entries(path, dict((k, v) for k, v in entries.items() if v is not None))
 
-			elif rel == "web" and "href" in data:
-				link_dict = dict(
-					rel=rel,
-					href=data["href"]
-				)
-				if "retrieved" in data:
-					link_dict["retrieved"] = data["retrieved"]
+	def _remove_links(self, name, path, links):
+		with self._get_metadata_lock(path):
+			entries = dict()
+			entries[name] = self._get_metadata_entry(path, name)
+			metadata_dirty = False
 
+			if entries[name] is None or not "hash" in entries[name]:
+				hash = self._create_hash(os.path.join(path, name))
 			else:
-				continue
+				hash = entries[name]["hash"]
 
-			if link_dict:
-				metadata[name]["links"].append(link_dict)
-				metadata_dirty = True
+			for rel, data in links:
+				if (rel == "model" or rel == "machinecode") and "name" in data:
+					if not data["name"] in entries:
+						entries[data["name"]] = self._get_metadata_entry(path, data["name"])
+					target = entries[data["name"]]
 
-		if metadata_dirty:
-			self._save_metadata(path, metadata)
+					if target is not None and "links" in target:
+						ref_rel = "model" if rel == "machinecode" else "machinecode"
+						for link in list(target["links"]):
+							if link["rel"] == ref_rel and "name" in link and link["name"] == name and "hash" in link and link["hash"] == hash:
+								target["links"].remove(link)
+								metadata_dirty = True
 
-	def _remove_links(self, name, path, links):
-		metadata = self._get_metadata(path)
-		metadata_dirty = False
+				if entries[name] is not None and "links" in entries[name]:
+					for link in list(entries[name]["links"]):
+						if not link["rel"] == rel:
+							continue
 
-		if not name in metadata or not "hash" in metadata[name]:
-			hash = self._create_hash(os.path.join(path, name))
-		else:
-			hash = metadata[name]["hash"]
-
-		for rel, data in links:
-			if (rel == "model" or rel == "machinecode") and "name" in data:
-				if data["name"] in metadata and "links" in metadata[data["name"]]:
-					ref_rel = "model" if rel == "machinecode" else "machinecode"
-					for link in metadata[data["name"]]["links"]:
-						if link["rel"] == ref_rel and "name" in link and link["name"] == name and "hash" in link and link["hash"] == hash:
-							metadata[data["name"]]["links"].remove(link)
-							metadata_dirty = True
-
-			if "links" in metadata[name]:
-				for link in metadata[name]["links"]:
-					if not link["rel"] == rel:
-						continue
+						matches = True
+						for k, v in data.items():
+							if not k in link or not link[k] == v:
+								matches = False
+								break
 
-					matches = True
-					for k, v in data.items():
-						if not k in link or not link[k] == v:
-							matches = False
-							break
+						if not matches:
+							continue
 
-					if not matches:
-						continue
+						entries[name]["links"].remove(link)
+						metadata_dirty = True
 
-					metadata[name]["links"].remove(link)
-					metadata_dirty = True
-
-		if metadata_dirty:
-			self._save_metadata(path, metadata)
+			if metadata_dirty:
+				self._update_metadata_entries(path, dict((k, v) for k, v in entries.items() if v is not None))
 
 	def _list_folder(self, path, base="", entry_filter=None, recursive=True, **kwargs):
 		if entry_filter is None:
 			entry_filter = kwargs.get("filter", None)
 
+		index = self._get_index(path, base)
+
+		result = dict()
+		for entry_name, (entry_data, extended_entry_data) in index["files"].items():
+			if not entry_filter or entry_filter(entry_name, entry_data):
+				# only add files passing the optional filter, as a shallow copy to protect the index
+				result[entry_name] = dict(extended_entry_data)
+
+		# folder recursion
+		for entry_name, entry_path in index["folders"].items():
+			path_in_location = base + entry_name
+
+			entry_data = dict(
+				name=entry_name,
+				path=path_in_location,
+				type="folder",
+				type_path=["folder"]
+			)
+			if recursive:
+				sub_result = self._list_folder(entry_path, base=path_in_location + "/", entry_filter=entry_filter,
+				                               recursive=recursive)
+				entry_data["children"] = sub_result
+
+			if not entry_filter or entry_filter(entry_name, entry_data):
+				def get_size():
+					total_size = 0
+					for element in entry_data["children"].values():
+						if "size" in element:
+							total_size += element["size"]
+
+					return total_size
+
+				# only add folders passing the optional filter
+				extended_entry_data = dict()
+				extended_entry_data.update(entry_data)
+				if recursive:
+					extended_entry_data["size"] = get_size()
+
+				result[entry_name] = extended_entry_data
+
+		return result
+
+	def _get_index(self, path, base):
+		with self._index_lock:
+			index = self._index.get(path)
+			if index is not None and index["base"] == base and (self._watcher is not None or self._is_index_current(path, index)):
+				return index
+			version = self._version
+
+		index = self._scan_folder(path, base)
+
+		with self._index_lock:
+			if self._version == version + index["changes"]:
+				# nothing else changed while we were scanning, the scan result can be used from now on
+				self._index[path] = index
+		return index
+
+	def _is_index_current(self, path, index):
+		try:
+			mtime = os.stat(path).st_mtime
+		except OSError:
+			return False
+
+		# a folder's mtime only changes when entries are added, removed or renamed. It might not change for changes
+		# done in quick succession on file systems with a coarse timestamp resolution, so we don't trust indices which
+		# were created right after a modification
+		return mtime == index["mtime"] and index["scanned"] - mtime > self.MTIME_RESOLUTION
+
+	def _scan_folder(self, path, base):
+		scanned = time.time()
+		try:
+			mtime = os.stat(path).st_mtime
+		except OSError:
+			mtime = None
+
 		metadata = self._get_metadata(path)
 		if not metadata:
 			metadata = dict()
-		metadata_dirty = False
+		new_metadata = dict()
 
-		result = dict()
+		files = dict()
+		folders = dict()
 		for entry in scandir(path):
 			if is_hidden_path(entry.name):
 				# no hidden files and folders
@@ -1193,7 +1365,7 @@ class LocalFileStorage(StorageInterface):
 				# error while trying to rename the file, we'll continue here and ignore it
 				continue
 
-			path_in_location = entry_name if not base else base + entry_name
+			path_in_location = base + entry_name
 
 			# file handling
 			if entry_is_file:
@@ -1207,73 +1379,117 @@ class LocalFileStorage(StorageInterface):
 				if entry_name in metadata and isinstance(metadata[entry_name], dict):
 					entry_data = metadata[entry_name]
 				else:
-					entry_data = self._add_basic_metadata(path, entry_name, save=False, metadata=metadata)
-					metadata_dirty = True
+					entry_data = self._add_basic_metadata(path, entry_name, save=False)
+					new_metadata[entry_name] = entry_data
 
 				# TODO extract model hash from source if possible to recreate link
 
-				if not entry_filter or entry_filter(entry_name, entry_data):
-					# only add files passing the optional filter
-					extended_entry_data = dict()
-					extended_entry_data.update(entry_data)
-					extended_entry_data["name"] = entry_name
-					extended_entry_data["path"] = path_in_location
-					extended_entry_data["type"] = file_type
-					extended_entry_data["typePath"] = type_path
-					stat = entry_stat
-					if stat:
-						extended_entry_data["size"] = stat.st_size
-						extended_entry_data["date"] = int(stat.st_mtime)
-
-					result[entry_name] = extended_entry_data
-
-			# folder recursion
+				extended_entry_data = dict()
+				extended_entry_data.update(entry_data)
+				extended_entry_data["name"] = entry_name
+				extended_entry_data["path"] = path_in_location
+				extended_entry_data["type"] = file_type
+				extended_entry_data["typePath"] = type_path
+				stat = entry_stat
+				if stat:
+					extended_entry_data["size"] = stat.st_size
+					extended_entry_data["date"] = int(stat.st_mtime)
+
+				files[entry_name] = (entry_data, extended_entry_data)
+
+			# folder handling
 			elif entry_is_dir:
-				entry_data = dict(
-					name=entry_name,
-					path=path_in_location,
-					type="folder",
-					type_path=["folder"]
-				)
-				if recursive:
-					sub_result = self._list_folder(entry_path, base=path_in_location + "/", entry_filter=entry_filter,
-					                               recursive=recursive)
-					entry_data["children"] = sub_result
+				folders[entry_name] = entry_path
+
+		# TODO recreate links if we have metadata less entries
 
-				if not entry_filter or entry_filter(entry_name, entry_data):
-					def get_size():
-						total_size = 0
-						for element in entry_data["children"].values():
-							if "size" in element:
-								total_size += element["size"]
+		# save metadata
+		if new_metadata:
+			self._update_metadata_entries(path, new_metadata)
 
-						return total_size
+		return dict(base=base,
+		            files=files,
+		            folders=folders,
+		            mtime=mtime,
+		            scanned=scanned,
+		            changes=1 if new_metadata else 0)
 
-					# only add folders passing the optional filter
-					extended_entry_data = dict()
-					extended_entry_data.update(entry_data)
-					if recursive:
-						extended_entry_data["size"] = get_size()
+	def _index_changed(self, path, subtree=False):
+		"""
+		Drops the index of ``path`` (and of all its sub folders if ``subtree`` is set) and bumps the storage version.
+		"""
+		with self._index_lock:
+			if subtree:
+				prefix = path + os.sep
+				for indexed in list(self._index.keys()):
+					if indexed == path or indexed.startswith(prefix):
+						del self._index[indexed]
+			else:
+				self._index.pop(path, None)
 
-					result[entry_name] = extended_entry_data
+			self._version += 1
+			self._last_change = time.time()
 
-		# TODO recreate links if we have metadata less entries
+	def _validate_index(self):
+		"""
+		Rescans all folders whose indices might no longer be current due to changes done outside of the storage. An
+		index is only dropped (bumping the storage version) if the rescan found its entries changed, else it's
+		replaced by the rescan.
+		"""
+		with self._index_lock:
+			stale = [(path, index) for path, index in self._index.items() if not self._is_index_current(path, index)]
 
-		# save metadata
-		if metadata_dirty:
-			self._save_metadata(path, metadata)
+		for path, index in stale:
+			try:
+				rescanned = self._scan_folder(path, index["base"])
+			except OSError:
+				# the folder is gone
+				rescanned = None
+
+			with self._index_lock:
+				if self._index.get(path) is not index:
+					# the index was dropped or replaced in the meantime
+					continue
 
-		return result
+				if rescanned is not None and not rescanned["changes"] \
+						and rescanned["files"] == index["files"] and rescanned["folders"] == index["folders"]:
+					self._index[path] = rescanned
+				else:
+					self._index_changed(path)
+
+	def _start_watcher(self):
+		from watchdog.observers import Observer
+
+		observer = Observer()
+		observer.schedule(_IndexWatchdogHandler(self), self.basefolder, recursive=True)
+		observer.start()
+		return observer
+
+	def _on_filesystem_event(self, event):
+		paths = [event.src_path]
+		if hasattr(event, "dest_path"):
+			paths.append(event.dest_path)
+
+		for path in paths:
+			if is_hidden_path(path):
+				# metadata files and the like
+				continue
+
+			if event.is_directory and event.event_type == "modified":
+				self._index_changed(path)
+				continue
 
-	def _add_basic_metadata(self, path, entry, additional_metadata=None, save=True, metadata=None):
+			if event.is_directory:
+				self._index_changed(path, subtree=True)
+			self._index_changed(os.path.dirname(path))
+
+	def _add_basic_metadata(self, path, entry, additional_metadata=None, save=True):
 		if additional_metadata is None:
 			additional_metadata = dict()
 
-		if metadata is None:
-			metadata = self._get_metadata(path)
-
 		entry_data = dict(
 			hash=self._create_hash(os.path.join(path, entry)),
+			hashAlgorithm=self._hash_algorithm,
 			links=[],
 			notes=[]
 		)
@@ -1283,57 +1499,51 @@ class LocalFileStorage(StorageInterface):
 			entry_data["analysis"] = self._old_metadata[entry]["gcodeAnalysis"]
 
 		entry_data.update(additional_metadata)
-		metadata[entry] = entry_data
 
 		if save:
-			self._save_metadata(path, metadata)
+			self._update_metadata_entry(path, entry, entry_data)
 
 		return entry_data
 
-	def _create_hash(self, path):
-		import hashlib
-
-		blocksize = 65536
-		hash = hashlib.sha1()
-		with open(path, "rb") as f:
-			buffer = f.read(blocksize)
-			while len(buffer) > 0:
-				hash.update(buffer)
-				buffer = f.read(blocksize)
-
+	def _create_hash(self, path, algorithm=None):
+		hash = create_hash(algorithm if algorithm is not None else self._hash_algorithm)
+		hash_file(path, hash)
 		return hash.hexdigest()
 
-	def _get_metadata_entry(self, path, name, default=None):
+	@staticmethod
+	def _get_hash_algorithm(entry):
+		# entries from before the algorithm was stored alongside the hash were all hashed with sha1
+		return entry.get("hashAlgorithm", "sha1")
+
+	def _get_metadata_entry(self, path, name, default=None, view=False):
+		"""
+		Returns a modifiable copy of the metadata entry ``name`` in ``path``, or, if ``view`` is ``True``, a cheap
+		read-only view on it.
+		"""
 		with self._get_metadata_lock(path):
-			metadata = self._get_metadata(path)
-			return metadata.get(name, default)
+			entry = self._metadata.get_entry(path, name)
+			if entry is None:
+				return default
+			return entry if view else thaw(entry)
 
 	def _remove_metadata_entry(self, path, name):
 		with self._get_metadata_lock(path):
-			metadata = self._get_metadata(path)
-			if not name in metadata:
-				return
-
-			if "hash" in metadata[name]:
-				hash = metadata[name]["hash"]
-				for m in metadata.values():
-					if not "links" in m:
-						continue
-					links_hash = lambda link: "hash" in link and link["hash"] == hash and "rel" in link and (link["rel"] == "model" or link["rel"] == "machinecode")
-					m["links"] = [link for link in m["links"] if not links_hash(link)]
-
-			del metadata[name]
-			self._save_metadata(path, metadata)
+			self._metadata.remove_entry(path, name)
+			self._index_changed(path)
 
 	def _update_metadata_entry(self, path, name, data):
 		with self._get_metadata_lock(path):
-			metadata = self._get_metadata(path)
-			metadata[name] = data
-			self._save_metadata(path, metadata)
+			self._metadata.set_entry(path, name, data)
+			self._index_changed(path)
+
+	def _update_metadata_entries(self, path, entries):
+		with self._get_metadata_lock(path):
+			self._metadata.set_entries(path, entries)
+			self._index_changed(path)
 
 	def _copy_metadata_entry(self, source_path, source_name, destination_path, destination_name, delete_source=False):
 		with self._get_metadata_lock(source_path):
-			source_data = self._get_metadata_entry(source_path, source_name, default=dict())
+			source_data = self._get_metadata_entry(source_path, source_name, default=dict(), view=True)
 			if not source_data:
 				return
 
@@ -1344,45 +1554,16 @@ class LocalFileStorage(StorageInterface):
 			self._update_metadata_entry(destination_path, destination_name, source_data)
 
 	def _get_metadata(self, path):
+		"""
+		Returns a read-only view on the metadata of all entries in ``path``.
+		"""
 		with self._get_metadata_lock(path):
-			if path in self._metadata_cache:
-				return deepcopy(self._metadata_cache[path])
-
-			metadata_path = os.path.join(path, ".metadata.yaml")
-			if os.path.exists(metadata_path):
-				with open(metadata_path) as f:
-					try:
-						import yaml
-						metadata = yaml.safe_load(f)
-					except:
-						self._logger.exception("Error while reading .metadata.yaml from {path}".format(**locals()))
-					else:
-						self._metadata_cache[path] = deepcopy(metadata)
-						return metadata
-			return dict()
-
-	def _save_metadata(self, path, metadata):
-		with self._get_metadata_lock(path):
-			metadata_path = os.path.join(path, ".metadata.yaml")
-			try:
-				import yaml
-				with atomic_write(metadata_path) as f:
-					yaml.safe_dump(metadata, stream=f, default_flow_style=False, indent="  ", allow_unicode=True)
-			except:
-				self._logger.exception("Error while writing .metadata.yaml to {path}".format(**locals()))
-			else:
-				self._metadata_cache[path] = deepcopy(metadata)
+			return self._metadata.get_folder(path)
 
 	def _delete_metadata(self, path):
 		with self._get_metadata_lock(path):
-			metadata_path = os.path.join(path, ".metadata.yaml")
-			if os.path.exists(metadata_path):
-				try:
-					os.remove(metadata_path)
-				except:
-					self._logger.exception("Error while deleting .metadata.yaml from {path}".format(**locals()))
-			if path in self._metadata_cache:
-				del self._metadata_cache[path]
+			self._metadata.delete_folder(path)
+			self._index_changed(path, subtree=True)
 
 	@contextmanager
 	def _get_metadata_lock(self, path):
@@ -1403,3 +1584,83 @@ class LocalFileStorage(StorageInterface):
 				del self._metadata_locks[path]
 			else:
 				self._metadata_locks[path] = (counter, lock)
+
+
+def benchmark_cli():
+	"""
+	Usage: python -m octoprint.filemanager.storage [<files>] [<history>] [<runs>]
+
+	Creates a temporary storage with <files> files (default 2000), each with <history> print history entries
+	(default 50), for every metadata backend. Reports the time needed per run (default 5) for listing all files and
+	for fetching the metadata of every file.
+	"""
+
+	import sys
+	import tempfile
+	import time
+
+	files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	history = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+	runs = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+	# init settings and plugin manager, needed for the supported file extensions
+	from octoprint.settings import settings
+	settings(init=True)
+
+	import octoprint.plugin
+	octoprint.plugin.plugin_manager(init=True, plugin_folders=[], plugin_entry_points=[], plugin_disabled_list=[])
+
+	for backend in ("yaml", "sqlite"):
+		basefolder = tempfile.mkdtemp()
+		try:
+			storage = LocalFileStorage(basefolder, metadata_backend=backend)
+
+			entries = dict()
+			for index in range(files):
+				name = "file_{}.gcode".format(index)
+				with open(os.path.join(basefolder, name), "w") as f:
+					f.write("G1 X{} Y{}\n".format(index, index))
+				entries[name] = dict(hash="{:040x}".format(index),
+				                     links=[],
+				                     notes=[],
+				                     analysis=dict(estimatedPrintTime=3600.0,
+				                                   filament=dict(tool0=dict(length=1000.0, volume=10.0))),
+				                     history=[dict(timestamp=1500000000 + run,
+				                                   success=True,
+				                                   printTime=3600.0 + run,
+				                                   printerProfile="_default") for run in range(history)])
+			storage._update_metadata_entries(storage.basefolder, entries)
+
+			for run in range(runs):
+				start = time.time()
+				storage.list_files()
+				list_duration = time.time() - start
+
+				start = time.time()
+				for name in entries:
+					storage.has_analysis(name)
+				lookup_duration = time.time() - start
+
+				print("{}, run {}: list_files {:.1f}ms, has_analysis per file {:.1f}us".format(backend,
+				                                                                              run + 1,
+				                                                                              list_duration * 1000,
+				                                                                              lookup_duration / files * 1000000))
+		finally:
+			shutil.rmtree(basefolder)
+
+
+class _IndexWatchdogHandler(FileSystemEventHandler):
+	"""
+	Keeps the index of a :class:`LocalFileStorage` up to date with changes done outside of the storage.
+	"""
+
+	def __init__(self, storage):
+		FileSystemEventHandler.__init__(self)
+		self._storage = storage
+
+	def on_any_event(self, event):
+		self._storage._on_filesystem_event(event)
+
+
+if __name__ == "__main__":
+	benchmark_cli()
@@ -5,10 +5,76 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2015 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
+import hashlib
 import io
+import os
+import zlib
 
 from octoprint.util import atomic_write
 
+HASH_BLOCKSIZE = 65536
+
+class Fingerprint(object):
+	"""
+	A fast, non-cryptographic alternative to the hash objects of :mod:`hashlib`, combining the size, CRC32 and
+	Adler-32 checksums of the data.
+
+	Good enough to tell files apart for deduplication and as cache key, but not suitable to protect against deliberate
+	collisions.
+	"""
+
+	name = "fingerprint"
+
+	def __init__(self):
+		self._size = 0
+		self._crc32 = 0
+		self._adler32 = 1
+
+	def update(self, data):
+		self._size += len(data)
+		self._crc32 = zlib.crc32(data, self._crc32)
+		self._adler32 = zlib.adler32(data, self._adler32)
+
+	def hexdigest(self):
+		return "{:x}{:08x}{:08x}".format(self._size, self._crc32 & 0xffffffff, self._adler32 & 0xffffffff)
+
+def create_hash(algorithm="sha1"):
+	"""
+	Creates a new hash object for ``algorithm``.
+
+	Arguments:
+	    algorithm (str): ``fingerprint`` for a :class:`.Fingerprint`, else the name of an algorithm supported by
+	        :func:`hashlib.new`
+
+	Returns:
+	    A new hash object supporting ``update`` and ``hexdigest``.
+	"""
+	if algorithm == Fingerprint.name:
+		return Fingerprint()
+	return hashlib.new(algorithm)
+
+def hash_file(path, hash):
+	"""
+	Reads the file at ``path`` into the hash object ``hash``.
+	"""
+	with io.open(path, "rb") as f:
+		buffer = f.read(HASH_BLOCKSIZE)
+		while len(buffer) > 0:
+			hash.update(buffer)
+			buffer = f.read(HASH_BLOCKSIZE)
+
+def copy_and_hash(source, destination, hash=None):
+	"""
+	Copies the stream ``source`` to the stream ``destination``, feeding everything copied into the hash object
+	``hash`` on the way if provided.
+	"""
+	buffer = source.read(HASH_BLOCKSIZE)
+	while buffer:
+		if hash is not None:
+			hash.update(buffer)
+		destination.write(buffer)
+		buffer = source.read(HASH_BLOCKSIZE)
+
 class AbstractFileWrapper(object):
 	"""
 	Wrapper for file representations to save to storages.
@@ -29,6 +95,24 @@ class AbstractFileWrapper(object):
 		"""
 		raise NotImplementedError()
 
+	def save_hashed(self, path, hash):
+		"""
+		Saves the file's content to the given absolute path and feeds it into the hash object ``hash``.
+
+		The default implementation reads the saved file back from disk. Sub classes should override this to hash the
+		content while saving it, if possible.
+
+		Arguments:
+		    path (str): The absolute path to where to save the file
+		    hash: A hash object as provided by :mod:`hashlib` or :func:`create_hash`
+
+		Returns:
+		    str: The hex digest of the file's content
+		"""
+		self.save(path)
+		hash_file(path, hash)
+		return hash.hexdigest()
+
 	def stream(self):
 		"""
 		Returns a Python stream object (subclass of io.IOBase) representing the file's contents.
@@ -44,16 +128,23 @@ class DiskFileWrapper(AbstractFileWrapper):
 	will either copy the file to the new path (preserving file attributes) or -- if `move` is `True` (the default) --
 	move the file.
 
+	If the hex ``digest`` of the file is already known, for example because it was computed while receiving an upload,
+	:meth:`save_hashed` doesn't read the file for hashing as long as ``hash_algorithm`` matches the requested one.
+
 	Arguments:
 	    filename (str): The file's name
 	    path (str): The file's absolute path
 	    move (boolean): Whether to move the file upon saving (True, default) or copying.
+	    digest (str): The file's hex digest, if known
+	    hash_algorithm (str): The algorithm ``digest`` was computed with, see :func:`create_hash`
 	"""
 
-	def __init__(self, filename, path, move=True):
+	def __init__(self, filename, path, move=True, digest=None, hash_algorithm=None):
 		AbstractFileWrapper.__init__(self, filename)
 		self.path = path
 		self.move = move
+		self.digest = digest
+		self.hash_algorithm = hash_algorithm
 
 	def save(self, path):
 		import shutil
@@ -63,6 +154,37 @@ class DiskFileWrapper(AbstractFileWrapper):
 		else:
 			shutil.copy2(self.path, path)
 
+	def save_hashed(self, path, hash):
+		import shutil
+
+		digest = None
+		# hashlib reports the names of some algorithms in upper case, depending on the Python version
+		if self.digest is not None and self.hash_algorithm is not None and self.hash_algorithm.lower() == getattr(hash, "name", "").lower():
+			digest = self.digest
+
+		if self.move:
+			try:
+				# cheap if on the same file system, we only have to read the file if we don't know its digest yet
+				os.rename(self.path, path)
+			except OSError:
+				pass
+			else:
+				if digest is not None:
+					return digest
+				hash_file(path, hash)
+				return hash.hexdigest()
+
+		# we need to copy the data, so hash it while we are at it instead of reading it twice
+		with io.open(self.path, "rb") as source:
+			with io.open(path, "wb") as dest:
+				copy_and_hash(source, dest, hash=hash if digest is None else None)
+		shutil.copystat(self.path, path)
+
+		if self.move:
+			os.remove(self.path)
+
+		return digest if digest is not None else hash.hexdigest()
+
 	def stream(self):
 		return io.open(self.path, "rb")
 
@@ -85,11 +207,19 @@ class StreamWrapper(AbstractFileWrapper):
 		Will dump the contents of all streams provided during construction into the target file, in the order they were
 		provided.
 		"""
-		import shutil
+		self._save(path)
+
+	def save_hashed(self, path, hash):
+		"""
+		Like :meth:`save`, feeding the contents into ``hash`` while they are written.
+		"""
+		self._save(path, hash=hash)
+		return hash.hexdigest()
 
+	def _save(self, path, hash=None):
 		with atomic_write(path, "wb") as dest:
 			with self.stream() as source:
-				shutil.copyfileobj(source, dest)
+				copy_and_hash(source, dest, hash=hash)
 
 	def stream(self):
 		"""
@@ -1893,6 +1893,25 @@ class SlicerPlugin(OctoPrintPlugin):
 		"""
 		pass
 
+	def get_slicer_cache_statistics(self):
+		"""
+		Retrieves statistics about the slicer's cache of slicing results, if it has one.
+
+		Implementations caching slicing results should return a :class:`dict` with at least the keys ``hits`` and
+		``misses`` (lookups since startup that could respectively could not be served from the cache), ``entries``
+		(number of cached results), ``size`` and ``maxSize`` (current and maximum size of the cache in bytes).
+
+		Returns:
+		    dict: The cache statistics, or None if the slicer doesn't cache slicing results (the default).
+		"""
+		return None
+
+	def clear_slicer_cache(self):
+		"""
+		Removes all cached slicing results, if the slicer caches them.
+		"""
+		pass
+
 
 class ProgressPlugin(OctoPrintPlugin):
 	"""
@@ -9,7 +9,6 @@ import logging
 import logging.handlers
 import os
 import flask
-import math
 import json
 
 import octoprint.plugin
@@ -19,6 +18,8 @@ from octoprint.settings import settings
 from octoprint.util.paths import normalize as normalize_path
 
 from .profileReader import ProfileReader
+from .engineOutput import EngineOutput
+from .sliceCache import SliceCache
 
 class CuraPlugin(octoprint.plugin.SlicerPlugin,
                  octoprint.plugin.SettingsPlugin,
@@ -37,6 +38,13 @@ class CuraPlugin(octoprint.plugin.SlicerPlugin,
 		self._cancelled_jobs = []
 		self._job_mutex = threading.Lock()
 
+		self._slice_cache = None
+
+	def initialize(self):
+		cache_size = self._settings.get_int(["slice_cache_size"])
+		if cache_size:
+			self._slice_cache = SliceCache(os.path.join(self.get_plugin_data_folder(), "slices"), cache_size * 1024 * 1024)
+
 	##~~ TemplatePlugin API
 
 	def get_template_vars(self):
@@ -154,7 +162,8 @@ class CuraPlugin(octoprint.plugin.SlicerPlugin,
 		return dict(
 			cura_engine=None,
 			default_profile=None,
-			debug_logging=True
+			debug_logging=True,
+			slice_cache_size=256 # MB of sliced G-code to keep for identical slicing jobs, 0 to disable
 		)
 
 	##~~ SlicerPlugin API
@@ -215,74 +224,82 @@ class CuraPlugin(octoprint.plugin.SlicerPlugin,
 
 	def do_slice(self, model_path, printer_profile, model_path1=None, machinecode_path=None, profile_path=None, position=None, overrides=None, resolution=None, nozzle_size=None, on_progress=None, on_progress_args=None, on_progress_kwargs=None):
 		try:
+			if not profile_path:
+				profile_path = self._settings.get(["default_profile"])
+			else :
+				profile_path = self._desanitize(profile_path)
+
+			if not machinecode_path:
+				path, _ = os.path.splitext(model_path)
+				machinecode_path = path + ".gco"
+
+			with self._job_mutex:
+				# registered without a command until CuraEngine runs, so an early cancellation is not lost
+				self._slicing_commands[machinecode_path] = None
+
+			if position and isinstance(position, dict) and "x" in position and "y" in position:
+				posX = position["x"]
+				posY = position["y"]
+			else:
+				posX = None
+				posY = None
+
+			if on_progress:
+				if not on_progress_args:
+					on_progress_args = ()
+				if not on_progress_kwargs:
+					on_progress_kwargs = dict()
+
+			self._cura_logger.info(u"### Slicing %s to %s using profile stored at %s" % (model_path, machinecode_path, profile_path))
+			from octoprint.server import slicingManager
+			profile_default_printer_path = slicingManager.get_slicer_profile_path("curaX") + '/Printers/fdmprinter.def.json'
+			preset = ProfileReader.getSlicePreset(printer_profile["name"], str(nozzle_size), profile_path, resolution)
+			overrides_delta = ProfileReader.getOverridesDelta(preset, overrides)
+			engine_settings, extruder_settings = preset.settings(overrides_delta)
+
+			executable = normalize_path(self._settings.get(["cura_engine"]))
+			if not executable:
+				return False, "Path to CuraEngine is not configured "
+
+			working_dir, _ = os.path.split(executable)
+			args = [executable, 'slice', '-v', '-p', '-j', profile_default_printer_path] + preset.arguments(overrides_delta)
+			if extruder_settings is not None:
+				args += ["-o", machinecode_path, "-e0", "-l", model_path, "-e1", "-l", model_path1, "-s", "extruder_nr=1"]
+
+			else:
+				args += ["-o", machinecode_path, "-l", model_path]
+
+			slice_cache_key = None
+			if self._slice_cache is not None:
+				slice_cache_key = SliceCache.key([model_path, model_path1], engine_settings, extruder_settings,
+				                                 engine=self._engine_identifier(executable, profile_default_printer_path))
+				hit, analysis = self._slice_cache.get(slice_cache_key, machinecode_path)
+				if hit:
+					self._cura_logger.info(u"### Using cached result %s" % slice_cache_key)
+					return True, dict(analysis=analysis)
+
+			self._logger.info(u"Running %r in %s" % (" ".join(args), working_dir))
+
+			import sarge
+			import sys
+			if sys.platform == 'win32':		## Windows
+				p = sarge.run(args, cwd=working_dir, async=True, stdout=sarge.Capture(), stderr=sarge.Capture())
+			else:							## other operative systems: Mac & Linux
+				p = sarge.run(args, cwd=working_dir, async_=True, stdout=sarge.Capture(), stderr=sarge.Capture())
+				
+			p.wait_events()
 			with self._job_mutex:
-				if not profile_path:
-					profile_path = self._settings.get(["default_profile"])
-				else :
-					profile_path = self._desanitize(profile_path)
-
-				if not machinecode_path:
-					path, _ = os.path.splitext(model_path)
-					machinecode_path = path + ".gco"
-
-				if position and isinstance(position, dict) and "x" in position and "y" in position:
-					posX = position["x"]
-					posY = position["y"]
-				else:
-					posX = None
-					posY = None
-
-				if on_progress:
-					if not on_progress_args:
-						on_progress_args = ()
-					if not on_progress_kwargs:
-						on_progress_kwargs = dict()
-
-				self._cura_logger.info(u"### Slicing %s to %s using profile stored at %s" % (model_path, machinecode_path, profile_path))
-				from octoprint.server import slicingManager
-				profile_default_printer_path = slicingManager.get_slicer_profile_path("curaX") + '/Printers/fdmprinter.def.json'
-				engine_settings, extruder_settings = ProfileReader.getSettingsToSlice(printer_profile["name"], str(nozzle_size), profile_path, resolution, overrides)
-
-				executable = normalize_path(self._settings.get(["cura_engine"]))
-				if not executable:
-					return False, "Path to CuraEngine is not configured "
-
-				working_dir, _ = os.path.split(executable)
-				args = [executable, 'slice', '-v', '-p', '-j', profile_default_printer_path]
-				for k, v in engine_settings.items():
-					if 'default_value' in v.keys():
-						args += ["-s", "%s=%s" % (k, str(v['default_value']))]
-					if 'children' in v.keys():
-						args += [["-s","{}={}".format(x, v[x]['default_value'])] for x in v.keys()]
-				if extruder_settings is not None:
-					args += ["-g"]
-					for extruder in extruder_settings:
-						args += ["-e" + str(extruder)]
-
-						for k, v in extruder_settings[extruder].items():
-							args += ["-s", "%s=%s" % (k, str(v['default_value']))]
-
-					args += ["-o", machinecode_path, "-e0", "-l", model_path, "-e1", "-l", model_path1, "-s", "extruder_nr=1"]
-
-				else:
-					args += ["-o", machinecode_path, "-l", model_path]
-
-				self._logger.info(u"Running %r in %s" % (" ".join(args), working_dir))
-
-				import sarge
-				import sys
-				if sys.platform == 'win32':		## Windows
-					p = sarge.run(args, cwd=working_dir, async=True, stdout=sarge.Capture(), stderr=sarge.Capture())
-				else:							## other operative systems: Mac & Linux
-					p = sarge.run(args, cwd=working_dir, async_=True, stdout=sarge.Capture(), stderr=sarge.Capture())
-					
-				p.wait_events()
 				self._slicing_commands[machinecode_path] = p.commands[0]
+				if machinecode_path in self._cancelled_jobs:
+					p.commands[0].terminate()
+
+			engine_output = EngineOutput()
+			if on_progress is not None:
+				if on_progress_args is None:
+					on_progress_args = ()
+				on_progress_kwargs = dict(on_progress_kwargs) if on_progress_kwargs else dict()
 
 			try:
-				layer_count = None
-				
-				analysis = None
 				while p.returncode is None:
 					line = p.stderr.readline(timeout=0.5)
 					if not line:
@@ -291,89 +308,11 @@ class CuraPlugin(octoprint.plugin.SlicerPlugin,
 
 					line = octoprint.util.to_unicode(line, errors="replace")
 					self._cura_logger.debug(line.strip())
-					if on_progress is not None:
-						#### adjusted for compatibility with CURA_STEAMENGINE version 3.4.1
-						#
-						# The CURAENGINE slicing process has three individual steps:
-						#   - inset
-						#   - skin
-						#   - export
-						#
-						# The CURAENGINE reports the continuous progress on stderr.
-						#
-						# The progress per each of the three steps, and the overal progress, get reported on stderr in a line of
-						# the format:
-						#
-						#   Progress:<step>:<current_layer>:<layer_count> \t<overall_progress>
-						#
-						# ... for instance:
-						#	Progress:inset+skin:10:100 	0.049177%
-						#
-						#
-						# Thus, we need to catch the content "<overall_progress>".
-
-						if line.startswith(u"Layer count:") and layer_count is None:
-							try:
-								layer_count = float(line[len(u"Layer count:"):].strip())
-							except:
-								pass
-
-						elif line.startswith(u"Progress:"):
-							split_line = line[len(u"Progress:"):].strip().split("\t")
-							try:
-								_, progress_pct = split_line
-								on_progress_kwargs["_progress"] = 1.0*float(progress_pct[:-1])		##remove o caracter de percentagem, e guarda o valor no formato 0.0-1.0.
-								print("progresso actual: ")
-								print(on_progress_kwargs["_progress"])
-								on_progress(*on_progress_args, **on_progress_kwargs)
-							except:
-								pass
-							print("SPLIT_LINE: ", split_line)
-
-						elif line.startswith(u"Print time:"):
-							try:
-								print_time = int(line[len(u"Print time:"):].strip())
-								if analysis is None:
-									analysis = dict()
-								analysis["estimatedPrintTime"] = print_time
-							except:
-								pass
-
-						elif line.startswith(u"Filament:") or line.startswith(u"Filament2:"):
-							if line.startswith(u"Filament:"):
-								filament_str = line[len(u"Filament:"):].strip()
-								tool_key = "tool0"
-							else:
-								filament_str = line[len(u"Filament2:"):].strip()
-								tool_key = "tool1"
-
-							try:
-								filament = int(filament_str)
-								if analysis is None:
-									analysis = dict()
-								if not "filament" in analysis:
-									analysis["filament"] = dict()
-								if not tool_key in analysis["filament"]:
-									analysis["filament"][tool_key] = dict()
-								analysis["filament"][tool_key]["length"] = filament
-
-								if "filamentDiameter" in engine_settings:
-									filament_diameter = engine_settings["filamentDiameter"]
-								else:
-									# Assumes default diameter value of 1.75
-									filament_diameter = 1.75
-
-								# Used filament volume
-								radius_in_cm = (filament_diameter / 10.0) / 2.0
-								filament_in_cm = filament / 10.0
-								analysis["filament"][tool_key]["volume"] = round(filament_in_cm * math.pi * radius_in_cm * radius_in_cm, 2)
-
-								# Used filament weight
-								filament_density = ProfileReader.getFilamentDensity(profile_path)
-								weight = filament_density * analysis["filament"][tool_key]["volume"]
-								analysis["filament"][tool_key]["weight"] = round(weight, 1)
-							except:
-								pass
+
+					progress = engine_output.parse(line)
+					if progress is not None and on_progress is not None:
+						on_progress_kwargs["_progress"] = progress
+						on_progress(*on_progress_args, **on_progress_kwargs)
 			finally:
 				p.close()
 
@@ -384,6 +323,12 @@ class CuraPlugin(octoprint.plugin.SlicerPlugin,
 
 			self._cura_logger.info(u"### Finished, returncode %d" % p.returncode)
 			if p.returncode == 0:
+				# Assumes default diameter value of 1.75
+				filament_diameter = engine_settings.get("filamentDiameter", 1.75)
+				analysis = engine_output.analysis(filament_diameter=filament_diameter,
+				                                  filament_density=ProfileReader.getFilamentDensity(profile_path))
+				if slice_cache_key is not None:
+					self._slice_cache.put(slice_cache_key, machinecode_path, analysis)
 				return True, dict(analysis=analysis)
 			else:
 				self._logger.warn(u"Could not slice via Cura, got return code %r" % p.returncode)
@@ -414,6 +359,25 @@ class CuraPlugin(octoprint.plugin.SlicerPlugin,
 					command.terminate()
 				self._logger.info(u"Cancelled slicing of %s" % machinecode_path)
 
+	def get_slicer_cache_statistics(self):
+		if self._slice_cache is None:
+			return None
+		return self._slice_cache.statistics()
+
+	def clear_slicer_cache(self):
+		if self._slice_cache is not None:
+			self._slice_cache.clear()
+
+	def _engine_identifier(self, *paths):
+		# results change with the engine build and its definitions
+		identifier = []
+		for path in paths:
+			try:
+				identifier.append("{}:{}".format(path, os.stat(path).st_mtime))
+			except OSError:
+				identifier.append(path)
+		return ";".join(identifier)
+
 	def _load_profile(self, path):
 		import json
 		profile_dict = dict()
@@ -0,0 +1,105 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import math
+import re
+
+class EngineOutput(object):
+	r"""
+	EngineOutput Class
+
+	Parser for the stderr output of CuraEngine (compatible with CURA_STEAMENGINE version 3.4.1). Collects the layer
+	count, print time and used filament per extruder of a slicing job to build its analysis from.
+
+	CuraEngine reports the continuous progress of its slicing steps (inset, skin, export) in lines of the format
+
+	  Progress:<step>:<current_layer>:<layer_count> \t<overall_progress>%
+
+	for instance
+
+	  Progress:inset+skin:10:100 	0.049177%
+
+	with the overall progress as a value between 0 and 1.
+
+
+	parse								Parse a line, returning the reported overall progress if any
+
+	analysis							Analysis of the sliced machine code from the parsed lines
+
+	"""
+
+	PROGRESS = re.compile(r"^Progress:[^\t]*\t\s*(?P<progress>[0-9.eE+-]+)%?\s*$")
+	LAYER_COUNT = re.compile(r"^Layer count:\s*(?P<count>[0-9.]+)")
+	PRINT_TIME = re.compile(r"^Print time:\s*(?P<time>\d+)")
+	FILAMENT = re.compile(r"^Filament(?P<extruder>2?):\s*(?P<length>\d+)")
+
+	def __init__(self):
+		self.layer_count = None
+		self.print_time = None
+		self.filament = dict()
+
+	def parse(self, line):
+		"""
+		Parses a line of CuraEngine output.
+
+		:param line: the line, as unicode
+		:return: the overall progress reported by the line as a value between 0 and 1, None if it's no progress report
+		"""
+		if line.startswith(u"Progress:"):
+			match = self.PROGRESS.match(line)
+			if match is not None:
+				try:
+					return float(match.group("progress"))
+				except ValueError:
+					pass
+			return None
+
+		match = self.LAYER_COUNT.match(line)
+		if match is not None:
+			if self.layer_count is None:
+				self.layer_count = int(float(match.group("count")))
+			return None
+
+		match = self.PRINT_TIME.match(line)
+		if match is not None:
+			self.print_time = int(match.group("time"))
+			return None
+
+		match = self.FILAMENT.match(line)
+		if match is not None:
+			tool_key = "tool1" if match.group("extruder") else "tool0"
+			self.filament[tool_key] = int(match.group("length"))
+
+		return None
+
+	def analysis(self, filament_diameter=1.75, filament_density=None):
+		"""
+		Builds the analysis of the sliced machine code from the parsed lines, with the estimated print time, the
+		used filament per tool (length in mm, volume in cm³ and, if filament_density is given, weight in g) and the
+		layer count.
+
+		:return: the analysis dictionary, None if CuraEngine reported neither print time nor filament
+		"""
+		if self.print_time is None and not self.filament:
+			return None
+
+		analysis = dict()
+		if self.print_time is not None:
+			analysis["estimatedPrintTime"] = self.print_time
+
+		if self.filament:
+			radius_in_cm = (filament_diameter / 10.0) / 2.0
+			analysis["filament"] = dict()
+			for tool_key, length in self.filament.items():
+				volume = round(length / 10.0 * math.pi * radius_in_cm * radius_in_cm, 2)
+				analysis["filament"][tool_key] = dict(length=length, volume=volume)
+				if filament_density is not None:
+					analysis["filament"][tool_key]["weight"] = round(filament_density * volume, 1)
+
+		if self.layer_count is not None:
+			analysis["layerCount"] = self.layer_count
+
+		return analysis
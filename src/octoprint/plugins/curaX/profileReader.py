@@ -9,9 +9,198 @@ import json
 import os
 import logging
 import copy
+import threading
+import time
 
 from octoprint.printer.profile import PrinterProfileManager
 
+from .slicePreset import SlicePreset
+
+class ProfileCatalogue(object):
+	r"""
+	ProfileCatalogue Class
+
+	In-memory index of a curaX profile tree (Printers, Nozzles, Materials, Quality and Variants folders).
+
+	Every profile file is read once and indexed by folder and name, printers additionally by their id. Values
+	derived from the profiles (resolved inherits chains, headers, printer and nozzle compatibility) are memoized
+	until the tree changes. Added or removed files are detected through the folders' modification times on every
+	access, files edited in place through their own modification times, checked at most every CHECK_INTERVAL
+	seconds.
+
+	Profiles returned by lookup are shared and must not be modified, get returns a private copy.
+	"""
+
+	FOLDERS = ("Printers", "Nozzles", "Materials", "Quality", "Variants")
+
+	# Variants (user profiles) override Quality (default profiles) with the same name
+	FILAMENT_FOLDERS = ("Variants", "Quality")
+
+	CHECK_INTERVAL = 2.0
+
+	def __init__(self, path):
+		self._path = path
+		self._logger = logging.getLogger("octoprint.plugin.curaX.profileReader")
+		self._mutex = threading.RLock()
+
+		self._folder_mtimes = dict()
+		self._last_check = None
+
+		# folder -> file name -> (mtime, profile)
+		self._files = dict((folder, dict()) for folder in self.FOLDERS)
+
+		# folder -> name -> file name, exact and lower case
+		self._names = dict()
+		self._lower_names = dict()
+		self._printer_ids = dict()
+		self._memo = dict()
+
+	def lookup(self, folder, name, ignore_case=True):
+		with self._mutex:
+			self._validate()
+			entry = self._entry(folder, name, ignore_case=ignore_case)
+			return self._files[folder][entry][1] if entry is not None else None
+
+	def get(self, folder, name, ignore_case=True):
+		return copy.deepcopy(self.lookup(folder, name, ignore_case=ignore_case))
+
+	def path(self, folder, name, ignore_case=True):
+		with self._mutex:
+			self._validate()
+			entry = self._entry(folder, name, ignore_case=ignore_case)
+			return os.path.join(self._path, folder, entry) if entry is not None else None
+
+	def printer(self, printer_id):
+		with self._mutex:
+			self._validate()
+			entry = self._printer_ids.get(printer_id)
+			return copy.deepcopy(self._files["Printers"][entry][1]) if entry is not None else None
+
+	def filament(self, filament_id):
+		with self._mutex:
+			for folder in self.FILAMENT_FOLDERS:
+				profile = self.lookup(folder, filament_id)
+				if profile is not None:
+					return profile
+		return None
+
+	def filament_path(self, filament_id):
+		with self._mutex:
+			for folder in self.FILAMENT_FOLDERS:
+				path = self.path(folder, filament_id)
+				if path is not None:
+					return path
+		return None
+
+	def memoize(self, key, factory):
+		with self._mutex:
+			self._validate()
+			if key not in self._memo:
+				self._memo[key] = factory()
+			return self._memo[key]
+
+	def invalidate(self):
+		with self._mutex:
+			self._folder_mtimes = dict()
+			self._last_check = None
+
+	def _entry(self, folder, name, ignore_case=True):
+		if name is None:
+			return None
+		if ignore_case:
+			return self._lower_names.get(folder, dict()).get(name.lower())
+		return self._names.get(folder, dict()).get(name)
+
+	def _validate(self):
+		folder_mtimes = dict()
+		for folder in self.FOLDERS:
+			try:
+				folder_mtimes[folder] = os.stat(os.path.join(self._path, folder)).st_mtime
+			except OSError:
+				folder_mtimes[folder] = None
+
+		now = time.time()
+		if folder_mtimes == self._folder_mtimes and self._last_check is not None \
+				and now - self._last_check < self.CHECK_INTERVAL:
+			return
+
+		self._folder_mtimes = folder_mtimes
+		self._last_check = now
+
+		changed = False
+		for folder in self.FOLDERS:
+			changed = self._scan(folder) or changed
+
+		if changed:
+			self._reindex()
+
+	def _scan(self, folder):
+		folder_path = os.path.join(self._path, folder)
+		try:
+			entries = os.listdir(folder_path)
+		except OSError:
+			entries = []
+
+		files = self._files[folder]
+		changed = False
+		seen = set()
+		for entry in entries:
+			if not entry.endswith(".json"):
+				# we are only interested in profiles and no hidden files
+				continue
+
+			file_path = os.path.join(folder_path, entry)
+			try:
+				mtime = os.stat(file_path).st_mtime
+			except OSError:
+				continue
+
+			seen.add(entry)
+			if entry in files and files[entry][0] == mtime:
+				continue
+
+			try:
+				with open(file_path) as data_file:
+					profile = json.load(data_file)
+			except Exception as ex:
+				self._logger.error("Error while reading profile {}: {}".format(file_path, ex))
+				profile = None
+
+			files[entry] = (mtime, profile)
+			changed = True
+
+		for entry in set(files.keys()) - seen:
+			del files[entry]
+			changed = True
+
+		return changed
+
+	def _reindex(self):
+		self._names = dict()
+		self._lower_names = dict()
+		self._printer_ids = dict()
+		self._memo = dict()
+
+		for folder in self.FOLDERS:
+			names = self._names[folder] = dict()
+			lower_names = self._lower_names[folder] = dict()
+			for entry in sorted(self._files[folder].keys()):
+				profile = self._files[folder][entry][1]
+				if profile is None:
+					continue
+
+				name = entry[:-len(".json")]
+				names[name] = entry
+				lower_names.setdefault(name.lower(), entry)
+
+				if folder == "Printers" and isinstance(profile, dict) and "id" in profile:
+					self._printer_ids.setdefault(profile["id"], entry)
+
+
+_catalogues = dict()
+_catalogues_mutex = threading.Lock()
+
+
 class ProfileReader(object):
 
 	# Profile in "Variants" override default profiles with the same name (in folder "Quality") "
@@ -23,6 +212,12 @@ class ProfileReader(object):
 
 	getSettingsToSlice					Get setting for slicing using all profiles: printer, nozzle filament, quality profiles
 
+	getSlicePreset						Get the compiled slice preset for a printer, nozzle, filament and quality
+
+	getOverridesDelta					Get the engine settings overridden by the interface choices
+
+	catalogue							Get the in-memory ProfileCatalogue indexing a profile tree
+
 	overrideCustomValues				Connect interface choises with curaEngine 2 parameters
 	getPrinterJson  					get Printer Overrides
 	getPrinterOverrides					get Printer Overrides
@@ -74,10 +269,32 @@ class ProfileReader(object):
 	"""
 
 
-	# Get setting for slicing using all profiles: printer, nozzle filament, quality profiles
-	# Get from each profile the overrides and also in is parent
+	# Get setting for slicing using all profiles: printer, nozzle filament, quality profiles plus the interface overrides
 	@classmethod
 	def getSettingsToSlice(cls, printer, nozzle, filament, quality, overrides):
+		preset = cls.getSlicePreset(printer, nozzle, filament, quality)
+		return preset.settings(cls.getOverridesDelta(preset, overrides))
+
+	# Get the compiled slice preset for a printer, nozzle, filament and quality, kept until the profiles change
+	@classmethod
+	def getSlicePreset(cls, printer, nozzle, filament, quality):
+		def hashable(value):
+			return tuple(value) if isinstance(value, list) else value
+
+		key = ("slicePreset", printer, hashable(nozzle), hashable(filament), quality)
+		return cls.slicerCatalogue().memoize(key, lambda: cls._compileSlicePreset(printer, nozzle, filament, quality))
+
+	# Get the engine settings overridden by the interface choices, interface choices only apply to single extruders
+	@classmethod
+	def getOverridesDelta(cls, preset, overrides):
+		if not overrides or preset.extruder_settings is not None:
+			return None
+		return cls.overrideCustomValues(preset.engine_settings, overrides)
+
+	# Merge all profiles: printer, nozzle filament, quality profiles
+	# Get from each profile the overrides and also in is parent
+	@classmethod
+	def _compileSlicePreset(cls, printer, nozzle, filament, quality):
 		extruder_settings = None
 		from octoprint.server import slicingManager
 		profile_path = slicingManager.get_slicer_profile_path("curaX")+'/'
@@ -176,13 +393,8 @@ class ProfileReader(object):
 					for k in raw_settings[key].keys():
 						if 'default_value' in raw_settings[key][k].keys():
 							engine_settings[k] = raw_settings[key][k]
-							
-
-			interface_overrides = cls.overrideCustomValues(engine_settings,overrides)
-			# merge interface overrides
-			engine_settings.update(interface_overrides)
 
-		return engine_settings, extruder_settings
+		return SlicePreset(engine_settings, extruder_settings)
 
 	# Connect interface choices with curaEngine 2 parameters
 	# Interfaces choices are: fill_density, platform_adhesion and support
@@ -233,6 +445,21 @@ class ProfileReader(object):
 						#engine_settings = cls.merge_profile_key(engine_settings, "support_bottom_distance", "0.15")
 		return settings
 
+	# get the catalogue of the profile tree in slicer_profile_path
+	@classmethod
+	def catalogue(cls, slicer_profile_path):
+		path = os.path.normpath(slicer_profile_path)
+		with _catalogues_mutex:
+			if path not in _catalogues:
+				_catalogues[path] = ProfileCatalogue(path)
+			return _catalogues[path]
+
+	# get the catalogue of the profile tree of the configured curaX slicer
+	@classmethod
+	def slicerCatalogue(cls):
+		from octoprint.server import slicingManager
+		return cls.catalogue(slicingManager.get_slicer_profile_path("curaX"))
+
 	# get Printer Overrides
 	@classmethod
 	def getPrinterJsonByFileName(cls, name='', slicer_profile_path=''):
@@ -240,84 +467,45 @@ class ProfileReader(object):
 		if slicer_profile_path=='' or name=='':
 			return None
 
-		printer_json = None
-		for entry in os.listdir(slicer_profile_path + "Printers/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if name != entry[:-len(".json")]:
-				continue
-
-			with open(slicer_profile_path + 'Printers/' + entry) as data_file:
-				printer_json = json.load(data_file)
-
+		catalogue = cls.catalogue(slicer_profile_path)
+		printer_json = catalogue.get("Printers", name, ignore_case=False)
 		if printer_json is None:
-			with open(slicer_profile_path + 'Printers/_default.json') as data_file:
-				printer_json = json.load(data_file)
+			printer_json = catalogue.get("Printers", "_default", ignore_case=False)
 
 		return printer_json
 
 	# get Printer Settings
 	@classmethod
 	def getPrinterJsonFileByid(cls, printer_id = '', slicer_profile_path = '', load_parents_inherits=False):
-		logger = logging.getLogger("octoprint.plugin.curaX.profileReader")
 		if slicer_profile_path == '' or printer_id == '':
 			return None
 
-		for entry in os.listdir(slicer_profile_path + "Printers/"):
-			try:
-				filePath = slicer_profile_path + 'Printers/' + entry
-				if filePath.endswith('json'):
-					json_file = json.load(open(slicer_profile_path +'Printers/' + entry))
-					if json_file['id'] == printer_id:
-						# loads any important information from parent profile
-						if load_parents_inherits and 'inherits' in json_file:
-							json_file['inherits'] = ProfileReader.getPrinterJsonFileByid(json_file['inherits'], slicer_profile_path)
-						return json_file
-			except Exception as ex:
-				logger.error(ex)
+		json_file = cls.catalogue(slicer_profile_path).printer(printer_id)
+		if json_file is None:
+			return None
 
-		return None
+		# loads any important information from parent profile
+		if load_parents_inherits and 'inherits' in json_file:
+			json_file['inherits'] = ProfileReader.getPrinterJsonFileByid(json_file['inherits'], slicer_profile_path)
+		return json_file
 
 
 	# get Printer Overrides
 	@classmethod
 	def getPrinterOverrides(cls, printer_id, slicer_profile_path):
-		printer_json = None
-		for entry in os.listdir(slicer_profile_path + "Printers/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if printer_id == entry[:-len(".json")]:
-				with open(slicer_profile_path +'Printers/' + entry) as data_file:
-					printer_json = json.load(data_file)
-				break
-
-		if printer_json is None:
-			with open(slicer_profile_path + 'Printers/_default.json') as data_file:
-				printer_json = json.load(data_file)
-
+		printer_json = cls.getPrinterJsonByFileName(printer_id, slicer_profile_path)
 		return printer_json['overrides']
 
 	# get Nozzle Overrides
 	@classmethod
 	def getNozzleOverrides(cls, nozzle_id, slicer_profile_path):
-		overrides = None
-		for entry in os.listdir(slicer_profile_path + "Nozzles/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if nozzle_id.lower() == entry.lower()[:-len(".json")]:
-				with open(slicer_profile_path +'Nozzles/' + entry) as data_file:
-					nozzle_json = json.load(data_file)
-					overrides = {}
-					for key in nozzle_json['overrides']:
-						overrides.update(nozzle_json['overrides'][key])
-				break
+		nozzle_json = cls.catalogue(slicer_profile_path).get("Nozzles", nozzle_id)
+		if nozzle_json is None:
+			return None
 
+		overrides = {}
+		for key in nozzle_json['overrides']:
+			overrides.update(nozzle_json['overrides'][key])
 		return overrides
 
 	# get Filament and parents Overrides
@@ -325,31 +513,13 @@ class ProfileReader(object):
 	@classmethod
 	def getFilamentOverrides(cls, filament_id, printer_id, nozzle_id, slicer_profile_path, quality=None):
 		overrides_values = {}
-		custom = False
 		logger = logging.getLogger("octoprint.plugin.curaX.profileReader")
-		filament_json = dict()
-
-		for entry in os.listdir(slicer_profile_path + "Variants/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if filament_id.lower() == entry.lower()[:-len(".json")]:
-				with open(slicer_profile_path + 'Variants/' + entry) as data_file:
-					filament_json = json.load(data_file)
-					custom = True
-				break
-
-		if not custom:
-			for entry in os.listdir(slicer_profile_path + "Quality/"):
-				if not entry.endswith(".json"):
-					# we are only interested in profiles and no hidden files
-					continue
 
-				if filament_id.lower() == entry.lower()[:-len(".json")]:
-					with open(slicer_profile_path + 'Quality/' + entry) as data_file:
-						filament_json = json.load(data_file)
-					break
+		filament_json = cls.catalogue(slicer_profile_path).filament(filament_id)
+		if filament_json is None:
+			filament_json = dict()
+		else:
+			filament_json = copy.deepcopy(filament_json)
 
 		# check if printer is compatible
 		if 'PrinterGroups' in filament_json:
@@ -378,34 +548,30 @@ class ProfileReader(object):
 	@classmethod
 	def getFilamentDensity(cls, filament_id):
 		logger = logging.getLogger("octoprint.plugin.curaX.profileReader")
-		from octoprint.server import slicingManager
-		slicer_profile_path = slicingManager.get_slicer_profile_path("curaX") + '/'
-		filament_json = dict()
 		default_value = 1.24
 
-		for entry in os.listdir(slicer_profile_path + "Quality/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if filament_id.lower() == entry.lower()[:-len(".json")]:
-				with open(slicer_profile_path + 'Quality/' + entry) as data_file:
-					filament_json = json.load(data_file)
-				break
-
-		if 'filament_density' not in filament_json:
+		filament_json = cls.slicerCatalogue().lookup("Quality", filament_id)
+		if filament_json is None or 'filament_density' not in filament_json:
 			logger.warning('Filament density setting not present in %s' % filament_id)
 			return default_value
 
 		return filament_json['filament_density']
 
 	# Get parent overrides
-	# all parents are in materials folder
+	# all parents are in materials folder, the resolved inherits chain is kept in the catalogue
 	@classmethod
 	def getParentOverrides(cls, filament_id, nozzle_id, slicer_profile_path):
+		catalogue = cls.catalogue(slicer_profile_path)
+		overrides_values = catalogue.memoize(("parentOverrides", filament_id),
+		                                     lambda: cls._resolveParentOverrides(catalogue, filament_id))
+		return copy.deepcopy(overrides_values)
+
+	@classmethod
+	def _resolveParentOverrides(cls, catalogue, filament_id):
 		overrides_values = {}
-		with open(slicer_profile_path +'Materials/' + filament_id + ".json") as data_file:
-			filament_json = json.load(data_file)
+		filament_json = catalogue.lookup("Materials", filament_id, ignore_case=False)
+		if filament_json is None:
+			raise IOError("No such material profile: {}".format(filament_id))
 
 		# check for overrides
 		if 'overrides' in filament_json:
@@ -413,7 +579,7 @@ class ProfileReader(object):
 				overrides_values.update(filament_json['overrides'][key])
 		# check if has parent, if so, gets overrides
 		if 'inherits' in filament_json:
-			overrides_values = cls.merge_dicts(cls.getParentOverrides(filament_json['inherits'], nozzle_id, slicer_profile_path), overrides_values)
+			overrides_values = cls.merge_dicts(cls._resolveParentOverrides(catalogue, filament_json['inherits']), overrides_values)
 
 		return overrides_values
 
@@ -422,159 +588,95 @@ class ProfileReader(object):
 	# in printer: id, name, metadata, electric_consumption, machine_cost, nozzles_supported, inherits
 	@classmethod
 	def getPrinterHeader(cls, header_id, printer_id, slicer_profile_path):
-		header_value = None
-		printer_json = dict()
-		for entry in os.listdir(slicer_profile_path + "Printers/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if printer_id == entry.lower()[:-len(".json")]:
-				with open(slicer_profile_path +'Printers/' + entry) as data_file:
-					printer_json = json.load(data_file)
-				break
-
-		if header_id in printer_json:
-			header_value = printer_json[header_id]
+		printer_json = cls.catalogue(slicer_profile_path).lookup("Printers", printer_id)
+		if printer_json is None or header_id not in printer_json:
+			return None
 
-		return header_value
+		return copy.deepcopy(printer_json[header_id])
 
 	# get values in header
 	# in filament: id, name, brand, color, inherits, nozzles_supported, unload_temperature, cost
 	@classmethod
 	def getFilamentHeader(cls, header_id, filament_id, slicer_profile_path):
-		header_value = None
-		custom = False
-		filament_json = dict()
+		catalogue = cls.catalogue(slicer_profile_path)
 
-		for entry in os.listdir(slicer_profile_path + "Variants/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
+		def resolve():
+			header_value = None
+			filament_json = catalogue.filament(filament_id)
+			if filament_json is None:
+				return None
 
-			if filament_id.lower() == entry.lower()[:-len(".json")]:
-				with open(slicer_profile_path + 'Variants/' + entry) as data_file:
-					filament_json = json.load(data_file)
-					custom = True
-				break
+			if header_id in filament_json:
+				header_value = filament_json[header_id]
 
-		if not custom:
-			for entry in os.listdir(slicer_profile_path + "Quality/"):
-				if not entry.endswith(".json"):
-					# we are only interested in profiles and no hidden files
-					continue
+			if header_value is None and 'inherits' in filament_json:
+				header_value = cls._resolveParentHeader(catalogue, header_id, filament_json['inherits'])
 
-				if filament_id.lower() == entry.lower()[:-len(".json")]:
-					with open(slicer_profile_path + 'Quality/' + entry) as data_file:
-						filament_json = json.load(data_file)
-					break
+			return header_value
 
-		if header_id in filament_json:
-			header_value = filament_json[header_id]
-
-		if header_value is None and 'inherits' in filament_json:
-			header_value = cls.getParentHeader(header_id, filament_json['inherits'], slicer_profile_path)
-
-		return header_value
+		return copy.deepcopy(catalogue.memoize(("filamentHeader", header_id, filament_id.lower()), resolve))
 
 	@classmethod
 	def getParentHeader(cls, header_id, filament_id, slicer_profile_path):
+		return copy.deepcopy(cls._resolveParentHeader(cls.catalogue(slicer_profile_path), header_id, filament_id))
+
+	@classmethod
+	def _resolveParentHeader(cls, catalogue, header_id, filament_id):
 		header_value = None
-		with open(slicer_profile_path +'Materials/' + filament_id + ".json") as data_file:
-			filament_json = json.load(data_file)
+		filament_json = catalogue.lookup("Materials", filament_id, ignore_case=False)
+		if filament_json is None:
+			raise IOError("No such material profile: {}".format(filament_id))
 
 		if header_id in filament_json:
 			header_value = filament_json[header_id]
 		if header_value is None and 'inherits' in filament_json:
-			header_value = cls.getParentHeader(header_id, filament_json['inherits'], slicer_profile_path)
+			header_value = cls._resolveParentHeader(catalogue, header_id, filament_json['inherits'])
 
 		return header_value
 
 	#Get local path to filament
 	@classmethod
 	def pathToFilament(cls, filament_id):
-		from octoprint.server import slicingManager
-		slicer_profile_path = slicingManager.get_slicer_profile_path("curaX")+'/'
-
-		for entry in os.listdir(slicer_profile_path + "Variants/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if filament_id.lower() == entry.lower()[:-len(".json")]:
-				return slicer_profile_path + "Variants/" + entry
-
-		for entry in os.listdir(slicer_profile_path + "Quality/"):
-			if not entry.endswith(".json"):
-				# we are only interested in profiles and no hidden files
-				continue
-
-			if filament_id.lower() == entry.lower()[:-len(".json")]:
-				return slicer_profile_path + "Quality/" + entry
-
-		return None
+		return cls.slicerCatalogue().filament_path(filament_id)
 
 	#check if printer(printer_id) with a nozzle size (nozzle_id) on extruder can use a especific filament(filament_id)
 	@classmethod
 	def isPrinterAndNozzleCompatible(cls, filament_id, printer_id, nozzle_id='400'):
 		# check if printer is can use this filament profile
-		from octoprint.server import slicingManager
 		logger = logging.getLogger("octoprint.plugin.curaX.profileReader")
-		slicer_profile_path= slicingManager.get_slicer_profile_path("curaX")+'/'
 
 		try:
-			#check nozzle
-			for entry in os.listdir(slicer_profile_path + "Printers/"):
-				if not entry.endswith(".json"):
-					# we are only interested in profiles and no hidden files
-					continue
-
-				if printer_id == entry.lower()[:-len(".json")]:
-					with open(slicer_profile_path + "Printers/" + entry) as data_file:
-						printer_json = json.load(data_file)
+			catalogue = cls.slicerCatalogue()
+			return catalogue.memoize(("compatible", filament_id.lower(), printer_id, str(nozzle_id)),
+			                         lambda: cls._checkPrinterAndNozzleCompatible(catalogue, filament_id, printer_id, nozzle_id))
+		except Exception:
+			logger.error("Error while getting Values from profile", exc_info=True)
 
-						if 'nozzles_supported' in printer_json and printer_json is not None:
-							if str(float(nozzle_id) / 1000) not in str(printer_json['nozzles_supported']):
-								return False
-					break
+		return False
 
-			#Check filament with nozzle
-			custom = False
+	@classmethod
+	def _checkPrinterAndNozzleCompatible(cls, catalogue, filament_id, printer_id, nozzle_id):
+		#check nozzle
+		printer_json = catalogue.lookup("Printers", printer_id)
+		if printer_json is not None and 'nozzles_supported' in printer_json:
+			if str(float(nozzle_id) / 1000) not in str(printer_json['nozzles_supported']):
+				return False
+
+		#Check filament with nozzle
+		filament_json = catalogue.filament(filament_id)
+		if filament_json is None:
 			filament_json = dict()
-			for entry in os.listdir(slicer_profile_path + "Variants/"):
-				if not entry.endswith(".json"):
-					# we are only interested in profiles and no hidden files
-					continue
-
-				if filament_id.lower() == entry.lower()[:-len(".json")]:
-					with open(slicer_profile_path + 'Variants/' + entry) as data_file:
-						filament_json = json.load(data_file)
-						custom = True
-					break
 
-			if not custom:
-				for entry in os.listdir(slicer_profile_path + "Quality/"):
-					if not entry.endswith(".json"):
-						# we are only interested in profiles and no hidden files
-						continue
+		#Check if nozzle is supported
+		if 'nozzles_supported' in filament_json:
+			if str(float(nozzle_id)/1000) not in str(filament_json['nozzles_supported']):
+				return False
 
-					if filament_id.lower() == entry.lower()[:-len(".json")]:
-						with open(slicer_profile_path + 'Quality/' + entry) as data_file:
-							filament_json = json.load(data_file)
-						break
-
-			#Check if nozzle is supported
-			if 'nozzles_supported' in filament_json:
-				if str(float(nozzle_id)/1000) not in str(filament_json['nozzles_supported']):
-					return False
-
-			# Check if printer is supported
-			if 'PrinterGroups' in filament_json:
-				for printer_list in filament_json['PrinterGroups']:
-					if printer_id.lower() in printer_list['group_printers']:
-						return True
-		except Exception:
-			logger.error("Error while getting Values from profile", exc_info=True)
+		# Check if printer is supported
+		if 'PrinterGroups' in filament_json:
+			for printer_list in filament_json['PrinterGroups']:
+				if printer_id.lower() in printer_list['group_printers']:
+					return True
 
 		return False
 
@@ -0,0 +1,202 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import octoprint.util
+
+class SliceCache(object):
+	r"""
+	SliceCache Class
+
+	Persistent cache of sliced G-code plus the analysis reported by CuraEngine, keyed by the contents of the sliced
+	model(s) and the effective engine settings (see key). Allows to skip CuraEngine when the same model is sliced
+	again with the same printer, nozzle, filament, resolution and overrides, e.g. to print it on several printers.
+
+	The cache lives in folder and holds at most max_size bytes of G-code, the least recently used entries are evicted
+	first. Hits and misses since startup are counted for the statistics.
+
+
+	key									Cache key of a slicing job
+
+	get									Copy cached G-code for a key to a target path, returning the cached analysis
+
+	put									Add the G-code at a path plus its analysis for a key
+
+	statistics							Hit/miss and size statistics
+
+	clear								Remove all cached entries
+
+	"""
+
+	INDEX = "index.json"
+
+	def __init__(self, folder, max_size):
+		self._logger = logging.getLogger("octoprint.plugins.curaX.sliceCache")
+		self._folder = folder
+		self._max_size = max_size
+		self._mutex = threading.RLock()
+
+		# key -> dict(size, analysis), least recently used first
+		self._entries = collections.OrderedDict()
+		self._hits = 0
+		self._misses = 0
+
+		self._load()
+
+	@classmethod
+	def key(cls, model_paths, engine_settings, extruder_settings=None, engine=None):
+		"""
+		Hash of the bytes of the models in model_paths plus the canonicalised settings, that is only the values that
+		make it onto the CuraEngine command line, sorted by setting name. engine identifies the CuraEngine build, e.g.
+		its path and modification time.
+		"""
+		def canonical(settings):
+			if settings is None:
+				return None
+			return sorted((key, str(value["default_value"])) for key, value in settings.items() if "default_value" in value)
+
+		hash = hashlib.sha1()
+		for model_path in model_paths:
+			if model_path is None:
+				continue
+			with open(model_path, "rb") as f:
+				for chunk in iter(lambda: f.read(65536), b""):
+					hash.update(chunk)
+			hash.update(b"\0")
+
+		extruders = None
+		if extruder_settings is not None:
+			extruders = sorted((str(extruder), canonical(settings)) for extruder, settings in extruder_settings.items())
+
+		parameters = dict(settings=canonical(engine_settings), extruders=extruders, engine=engine)
+		hash.update(json.dumps(parameters, sort_keys=True).encode("utf-8"))
+		return hash.hexdigest()
+
+	def get(self, key, target_path):
+		"""
+		Copies the G-code cached for key to target_path.
+
+		:param key: cache key as returned by key
+		:param target_path: path to copy the cached G-code to
+		:return: 2-tuple (hit, analysis)
+		"""
+		with self._mutex:
+			if key not in self._entries or not os.path.isfile(self._path(key)):
+				self._entries.pop(key, None)
+				self._misses += 1
+				return False, None
+
+			try:
+				shutil.copyfile(self._path(key), target_path)
+			except:
+				self._logger.exception("Could not copy cached G-code for {} to {}".format(key, target_path))
+				self._misses += 1
+				return False, None
+
+			entry = self._entries.pop(key)
+			self._entries[key] = entry
+			self._hits += 1
+			self._save()
+			return True, copy.deepcopy(entry["analysis"])
+
+	def put(self, key, source_path, analysis=None):
+		"""
+		Adds the G-code at source_path with its analysis as entry for key, evicting least recently used entries
+		to stay within the maximum size.
+		"""
+		if not self._max_size:
+			return
+
+		try:
+			size = os.stat(source_path).st_size
+		except OSError:
+			return
+
+		if size > self._max_size:
+			return
+
+		with self._mutex:
+			try:
+				if not os.path.isdir(self._folder):
+					os.makedirs(self._folder)
+				shutil.copyfile(source_path, self._path(key))
+			except:
+				self._logger.exception("Could not add G-code from {} to the slice cache".format(source_path))
+				return
+
+			self._entries.pop(key, None)
+			self._entries[key] = dict(size=size, analysis=copy.deepcopy(analysis))
+
+			while self._size() > self._max_size:
+				evicted, _ = self._entries.popitem(last=False)
+				self._remove(evicted)
+
+			self._save()
+
+	def statistics(self):
+		with self._mutex:
+			lookups = self._hits + self._misses
+			return dict(hits=self._hits,
+			            misses=self._misses,
+			            hitRatio=float(self._hits) / lookups if lookups else None,
+			            entries=len(self._entries),
+			            size=self._size(),
+			            maxSize=self._max_size)
+
+	def clear(self):
+		with self._mutex:
+			for key in self._entries.keys():
+				self._remove(key)
+			self._entries.clear()
+			self._save()
+
+	def _path(self, key):
+		return os.path.join(self._folder, key + ".gco")
+
+	def _size(self):
+		return sum(entry["size"] for entry in self._entries.values())
+
+	def _remove(self, key):
+		try:
+			os.remove(self._path(key))
+		except OSError:
+			pass
+
+	def _load(self):
+		index_path = os.path.join(self._folder, self.INDEX)
+		if not os.path.isfile(index_path):
+			return
+
+		try:
+			with open(index_path) as f:
+				entries = json.load(f)
+		except:
+			self._logger.exception("Could not read slice cache index from {}, starting with an empty cache".format(index_path))
+			return
+
+		for entry in entries:
+			if os.path.isfile(self._path(entry["key"])):
+				self._entries[entry["key"]] = dict(size=entry["size"], analysis=entry.get("analysis"))
+
+	def _save(self):
+		if not os.path.isdir(self._folder):
+			return
+
+		# entries are persisted from least to most recently used
+		entries = [dict(key=key, size=entry["size"], analysis=entry["analysis"]) for key, entry in self._entries.items()]
+		try:
+			with octoprint.util.atomic_write(os.path.join(self._folder, self.INDEX), mode="w") as f:
+				json.dump(entries, f)
+		except:
+			self._logger.exception("Could not write slice cache index to {}".format(self._folder))
@@ -0,0 +1,75 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+class SlicePreset(object):
+	r"""
+	SlicePreset Class
+
+	Compiled slicing settings of a printer, nozzle, filament and quality combination: the settings merged from the
+	printer definitions and its inherits chain, the filament and its parents and the nozzle, plus the CuraEngine
+	setting arguments built from them. Presets are built once by ProfileReader.getSlicePreset and kept until the
+	profile tree changes, the interface overrides of a slicing job (fill density, adhesion, support) are applied as a
+	small delta on top.
+
+	The settings of a preset are shared and must not be modified.
+
+
+	settings							Engine and extruder settings with a delta of overrides applied
+
+	arguments							CuraEngine setting arguments with a delta of overrides applied
+
+	"""
+
+	def __init__(self, engine_settings, extruder_settings=None):
+		self.engine_settings = engine_settings
+		self.extruder_settings = extruder_settings
+
+		self._engine_arguments = self._setting_arguments(engine_settings)
+		self._extruder_arguments = None
+		if extruder_settings is not None:
+			self._extruder_arguments = [(extruder, self._setting_arguments(extruder_settings[extruder]))
+			                            for extruder in extruder_settings]
+
+	def settings(self, delta=None):
+		"""
+		:param delta: engine settings overriding the preset's
+		:return: 2-tuple (engine_settings, extruder_settings)
+		"""
+		if not delta:
+			return dict(self.engine_settings), self.extruder_settings
+
+		engine_settings = dict(self.engine_settings)
+		engine_settings.update(delta)
+		return engine_settings, self.extruder_settings
+
+	def arguments(self, delta=None):
+		"""
+		:param delta: engine settings overriding the preset's
+		:return: the "-s" (and for multiple extruders "-g"/"-e") arguments for the CuraEngine command line
+		"""
+		args = []
+		for key, argument in self._engine_arguments:
+			if delta and key in delta:
+				continue
+			args += ["-s", argument]
+
+		if delta:
+			for key, argument in self._setting_arguments(delta):
+				args += ["-s", argument]
+
+		if self._extruder_arguments is not None:
+			args += ["-g"]
+			for extruder, arguments in self._extruder_arguments:
+				args += ["-e" + str(extruder)]
+				for _, argument in arguments:
+					args += ["-s", argument]
+
+		return args
+
+	@staticmethod
+	def _setting_arguments(settings):
+		return [(key, "%s=%s" % (key, str(value["default_value"])))
+		        for key, value in settings.items() if "default_value" in value]
@@ -1101,7 +1101,8 @@ class VirtualPrinter(object):
 		if self._prepared_oks:
 			ok = self._prepared_oks.pop(0)
 
-		return ok.format(ok, lastN=self.lastN, buffer=self.buffered.maxsize - self.buffered.qsize())
+		free = self.buffered.maxsize - self.buffered.qsize()
+		return ok.format(ok, lastN=self.lastN, buffer=free, planner=free)
 
 class CharCountingQueue(queue.Queue):
 
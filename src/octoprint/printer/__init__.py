@@ -478,6 +478,18 @@ class PrinterInterface(object):
 		"""
 		raise NotImplementedError()
 
+	def send_initial_data(self, callback):
+		"""
+		Sends the initial data (state, log and temperature history etc) to a :class:`PrinterCallback` via its
+		:meth:`~PrinterCallback.on_printer_send_initial_data` method without registering it with the instance.
+
+		Used by callbacks that receive the actual updates through some other party registered with the instance.
+
+		Arguments:
+		    callback (PrinterCallback): The callback object to send the initial data to.
+		"""
+		raise NotImplementedError()
+
 
 class PrinterCallback(object):
 	def on_printer_add_log(self, data):
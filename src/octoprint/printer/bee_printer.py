@@ -20,7 +20,7 @@ from octoprint.slicing import SlicingManager
 from octoprint.filemanager import FileDestinations
 from octoprint.util.comm import PrintingFileInformation
 from octoprint.printer.statistics import BaseStatistics, PrintEventStatistics, PrinterStatistics, StatisticsServerClient
-from octoprint.printer.estimation import TimeEstimationHelper
+from octoprint.printer.estimation import TimeEstimationHelper, PrintTimeCurveRecorder
 from octoprint.plugins.curaX import ProfileReader
 
 __author__ = "BEEVC - Electronic Systems "
@@ -285,6 +285,8 @@ class BeePrinter(Printer):
         self._timeEstimationData = TimeEstimationHelper(rolling_window=rolling_window,
                                                         threshold=threshold,
                                                         countdown=countdown)
+        # a print resumed from a position would only record part of the curve
+        self._printTimeCurveRecorder = PrintTimeCurveRecorder() if pos is None else None
 
         self._fileManager.delete_recovery_data()
 
@@ -319,6 +321,7 @@ class BeePrinter(Printer):
             self._comm.cancelPrint()
 
             # reset progress, height, print time
+            self._printTimeCurveRecorder = None
             self._setCurrentZ(None)
             self._setProgressData()
             self._resetPrintProgress()
@@ -1591,6 +1594,8 @@ class BeePrinter(Printer):
                         self._selectedFile["estimatedPrintTime"] = estimatedPrintTime
                         self._selectedFile["estimatedPrintTimeType"] = "analysis"
 
+                    self._selectedFile["printTimeCurve"] = self._getPrintTimeCurve(fileData)
+
             self._stateMonitor.set_job_data({
                 "file": {
                     "name": name_in_storage,
@@ -1660,12 +1665,6 @@ class BeePrinter(Printer):
         :return:
         """
         try:
-            if self._selectedFile and "estimatedPrintTime" in self._selectedFile \
-                    and self._selectedFile["estimatedPrintTime"]:
-                totalPrintTime = self._selectedFile["estimatedPrintTime"]
-            else:
-                totalPrintTime = self._estimatedTime # This information comes from the progress update from the printer
-
             self._progress = completion
 
             # if the printTime information is null, probably the current file object being used by the comm layer
@@ -1674,6 +1673,23 @@ class BeePrinter(Printer):
             if printTime is None:
                 printTime = self._elapsedTime
 
+            # the progress of file transfers and heating is reported through here as well, but only the print
+            # itself follows the curve
+            printing = self._comm is not None and self._comm.isPrinting()
+
+            printTimeCurve = self._selectedFile.get("printTimeCurve") if self._selectedFile else None
+            if self._printTimeCurveRecorder is not None and completion and printing:
+                self._printTimeCurveRecorder.record(completion, printTime)
+
+            if printTimeCurve is not None and completion and printTime and printing:
+                # the progress curve learned from former prints of this file knows best
+                totalPrintTime = printTimeCurve.estimate_total(completion, printTime)
+            elif self._selectedFile and "estimatedPrintTime" in self._selectedFile \
+                    and self._selectedFile["estimatedPrintTime"]:
+                totalPrintTime = self._selectedFile["estimatedPrintTime"]
+            else:
+                totalPrintTime = self._estimatedTime # This information comes from the progress update from the printer
+
             self._printTimeLeft = totalPrintTime - printTime if (totalPrintTime is not None and printTime is not None) else None
 
         except Exception as ex:
@@ -71,4 +71,142 @@ class TimeEstimationHelper(object):
 		if not self._count or self._count < self._rolling_window + 1:
 			return None
 		else:
-			return sum(self._distances) / len(self._distances)
\ No newline at end of file
+			return sum(self._distances) / len(self._distances)
+
+class PrintTimeCurve(object):
+	"""
+	Learned progress curve of a print job.
+
+	For every percent of file progress the curve holds the fraction of the total (cleaned) print time that had
+	elapsed when that progress was reached during former prints of the same file on the same printer profile.
+	Combined with the time elapsed so far this allows to estimate the total print time of a running job long
+	before the linear or rolling estimates have stabilized.
+	"""
+
+	RESOLUTION = 100
+
+	# up to this elapsed fraction the recorded total is blended with the scaled estimate
+	BLEND_UNTIL = 0.05
+
+	def __init__(self, fractions, total, prints=1):
+		self.fractions = fractions
+		self.total = total
+		self.prints = prints
+
+	@classmethod
+	def from_dict(cls, data):
+		try:
+			fractions = [float(x) for x in data["fractions"]]
+			total = float(data["total"])
+			prints = int(data.get("prints", 1))
+		except (KeyError, TypeError, ValueError, AttributeError):
+			return None
+
+		if len(fractions) != cls.RESOLUTION + 1 or total <= 0:
+			return None
+		return cls(fractions, total, prints=prints)
+
+	def as_dict(self):
+		return dict(fractions=[round(fraction, 5) for fraction in self.fractions],
+		            total=self.total,
+		            prints=self.prints)
+
+	def fraction_at(self, progress):
+		if progress <= 0:
+			return 0.0
+		if progress >= 1:
+			return 1.0
+
+		position = progress * self.RESOLUTION
+		index = int(position)
+		lower = self.fractions[index]
+		upper = self.fractions[index + 1]
+		return lower + (upper - lower) * (position - index)
+
+	def estimate_total(self, progress, elapsed):
+		"""
+		Estimates the total print time of the current job.
+
+		Right at the start the recorded total is used. The further into the print, the more the estimate
+		is based on the time elapsed so far scaled by the expected fraction at the current progress, which
+		adjusts the prediction for the speed of the current print compared to the recorded ones.
+
+		Args:
+		    progress (float): Current progress in the printed file, 0.0 to 1.0
+		    elapsed (float): (Cleaned) print time elapsed so far
+
+		Returns:
+		    (float or None) estimated total print time or None if no estimate could be made
+		"""
+		if progress is None or elapsed is None:
+			return None
+
+		fraction = self.fraction_at(progress)
+		if fraction <= 0:
+			return self.total
+
+		scaled = elapsed / fraction
+		weight = min(fraction / self.BLEND_UNTIL, 1.0)
+		return (1.0 - weight) * self.total + weight * scaled
+
+	def merged(self, other, weight):
+		"""
+		Returns a new curve that is the exponential moving average of this curve and ``other``, with
+		``weight`` being the weight of ``other``.
+		"""
+		fractions = [(1.0 - weight) * mine + weight * theirs for mine, theirs in zip(self.fractions, other.fractions)]
+		total = (1.0 - weight) * self.total + weight * other.total
+		return PrintTimeCurve(fractions, total, prints=self.prints + other.prints)
+
+
+class PrintTimeCurveRecorder(object):
+	"""
+	Records when each percent of file progress was reached during a print, to be turned into a
+	:class:`PrintTimeCurve` once the print finished successfully.
+	"""
+
+	MIN_SAMPLES = 10
+
+	def __init__(self):
+		self._samples = dict()
+		self._last_elapsed = None
+
+	def record(self, progress, elapsed):
+		if progress is None or elapsed is None:
+			return
+
+		step = min(max(int(progress * PrintTimeCurve.RESOLUTION), 0), PrintTimeCurve.RESOLUTION)
+		if not step in self._samples:
+			self._samples[step] = elapsed
+		self._last_elapsed = elapsed
+
+	def to_curve(self, total=None):
+		if total is None:
+			total = self._last_elapsed
+		if not total or total <= 0 or len(self._samples) < self.MIN_SAMPLES:
+			return None
+
+		points = dict(self._samples)
+		points[0] = 0.0
+		points[PrintTimeCurve.RESOLUTION] = total
+		known = sorted(points.items())
+
+		fractions = []
+		index = 0
+		for step in range(PrintTimeCurve.RESOLUTION + 1):
+			while known[index + 1][0] < step:
+				index += 1
+			lower_step, lower_elapsed = known[index]
+			if lower_step == step:
+				elapsed = lower_elapsed
+			else:
+				upper_step, upper_elapsed = known[index + 1]
+				elapsed = lower_elapsed + (upper_elapsed - lower_elapsed) * (step - lower_step) / (upper_step - lower_step)
+
+			fraction = min(max(elapsed / total, 0.0), 1.0)
+			if fractions and fraction < fractions[-1]:
+				# progress can't take back time
+				fraction = fractions[-1]
+			fractions.append(fraction)
+
+		return PrintTimeCurve(fractions, total)
@@ -9,6 +9,7 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
+import array
 import copy
 import logging
 import os
@@ -20,10 +21,9 @@ from octoprint.events import eventManager, Events
 from octoprint.filemanager import FileDestinations, NoSuchStorage
 from octoprint.plugin import plugin_manager, ProgressPlugin
 from octoprint.printer import PrinterInterface, PrinterCallback, UnknownScript, InvalidFileLocation
-from octoprint.printer.estimation import TimeEstimationHelper
+from octoprint.printer.estimation import TimeEstimationHelper, PrintTimeCurve, PrintTimeCurveRecorder
 from octoprint.settings import settings
 from octoprint.util import comm as comm
-from octoprint.util import InvariantContainer
 from octoprint.util import to_unicode
 
 
@@ -48,7 +48,8 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		self._bedTemp = None
 		self._targetTemp = None
 		self._targetBedTemp = None
-		self._temps = TemperatureHistory(cutoff=settings().getInt(["temperature", "cutoff"])*60)
+		self._temps = TemperatureHistory(cutoff=settings().getInt(["temperature", "cutoff"])*60,
+		                                 tiers=[(tier["resolution"], tier["entries"]) for tier in settings().get(["temperature", "historyTiers"])])
 		self._tempBacklog = []
 
 		self._messages = deque([], 300)
@@ -77,6 +78,9 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		self._timeEstimationValidityRange = settings().getFloat(["estimation", "printTime", "validityRange"])
 		self._timeEstimationForceDumbFromPercent = settings().getFloat(["estimation", "printTime", "forceDumbFromPercent"])
 		self._timeEstimationForceDumbAfterMin = settings().getFloat(["estimation", "printTime", "forceDumbAfterMin"])
+		self._timeEstimationCurveEnabled = settings().getBoolean(["estimation", "printTime", "curveEnabled"])
+		self._timeEstimationCurveWeight = settings().getFloat(["estimation", "printTime", "curveWeight"])
+		self._printTimeCurveRecorder = None
 
 		# comm
 		self._comm = None
@@ -133,6 +137,9 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		if callback in self._callbacks:
 			self._callbacks.remove(callback)
 
+	def send_initial_data(self, callback):
+		self._sendInitialStateUpdate(callback)
+
 	def _sendAddTemperatureCallbacks(self, data):
 		for callback in self._callbacks:
 			try: callback.on_printer_add_temperature(data)
@@ -461,6 +468,9 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		                                                threshold=threshold,
 		                                                countdown=countdown)
 
+		# only a print from the very beginning yields a usable progress curve
+		self._printTimeCurveRecorder = PrintTimeCurveRecorder() if pos is None else None
+
 		self._fileManager.delete_recovery_data()
 
 		self._lastProgressReport = None
@@ -706,8 +716,14 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 					and self._selectedFile["estimatedPrintTime"]:
 				statisticalTotalPrintTime = self._selectedFile["estimatedPrintTime"]
 				statisticalTotalPrintTimeType = self._selectedFile.get("estimatedPrintTimeType", None)
+			printTimeCurve = self._selectedFile.get("printTimeCurve", None) if self._selectedFile else None
+
+		if self._printTimeCurveRecorder is not None and self._comm is not None and self._comm.isPrinting():
+			self._printTimeCurveRecorder.record(progress, cleanedPrintTime)
 
-		printTimeLeft, printTimeLeftOrigin = self._estimatePrintTimeLeft(progress, printTime, cleanedPrintTime, statisticalTotalPrintTime, statisticalTotalPrintTimeType)
+		printTimeLeft, printTimeLeftOrigin = self._estimatePrintTimeLeft(progress, printTime, cleanedPrintTime,
+		                                                                 statisticalTotalPrintTime, statisticalTotalPrintTimeType,
+		                                                                 printTimeCurve=printTimeCurve)
 
 		if progress is not None:
 			progress_int = int(progress * 100)
@@ -721,7 +737,8 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		            printTimeLeft=int(printTimeLeft) if printTimeLeft is not None else None,
 		            printTimeLeftOrigin=printTimeLeftOrigin)
 
-	def _estimatePrintTimeLeft(self, progress, printTime, cleanedPrintTime, statisticalTotalPrintTime, statisticalTotalPrintTimeType):
+	def _estimatePrintTimeLeft(self, progress, printTime, cleanedPrintTime, statisticalTotalPrintTime, statisticalTotalPrintTimeType,
+	                           printTimeCurve=None):
 		"""
 		Tries to estimate the print time left for the print job
 
@@ -737,6 +754,10 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		the same print time with the heat up times subtracted (if possible) and if available also
 		some statistical total print time (former prints or a result from the GCODE analysis).
 
+		  0. If former successful prints of the file against the current printer profile left us with a learned
+		     progress curve (see :class:`~octoprint.printer.estimation.PrintTimeCurve`), we use that right away. It
+		     knows how the print time is distributed over the file and hence doesn't need to wait for anything
+		     to stabilize. Only if it produces nothing usable we continue with the steps below.
 		  1. First get an "intelligent" estimate based on the :class:`~octoprint.printer.estimation.TimeEstimationHelper`.
 		     That thing tries to detect if the estimation based on our progress and time needed for that becomes
 		     stable over time through a rolling window and only returns a result once that appears to be the
@@ -772,6 +793,7 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		        or estimated total print time from GCODE analysis.
 		    statisticalTotalPrintTimeType (str or None): Type of statistical print time, either "average" (total time
 		        of former prints) or "analysis"
+		    printTimeCurve (PrintTimeCurve or None): Progress curve learned from former prints, if available
 
 		Returns:
 		    (2-tuple) estimated print time left or None if not proper estimate could be made at all, origin of estimation
@@ -780,6 +802,11 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 		if progress is None or printTime is None or cleanedPrintTime is None:
 			return None, None
 
+		if printTimeCurve is not None:
+			curveTotalPrintTime = printTimeCurve.estimate_total(progress, cleanedPrintTime)
+			if curveTotalPrintTime is not None and curveTotalPrintTime > cleanedPrintTime:
+				return curveTotalPrintTime - cleanedPrintTime, "curve"
+
 		dumbTotalPrintTime = printTime / progress
 		estimatedTotalPrintTime = self._estimateTotalPrintTime(progress, cleanedPrintTime)
 		totalPrintTime = estimatedTotalPrintTime
@@ -837,6 +864,35 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 
 		return printTimeLeft, printTimeLeftOrigin
 
+	def _getPrintTimeCurve(self, fileData):
+		if not self._timeEstimationCurveEnabled or not fileData or not "printTimeCurves" in fileData:
+			return None
+
+		printer_profile = self._printerProfileManager.get_current_or_default()["id"]
+		return PrintTimeCurve.from_dict(fileData["printTimeCurves"].get(printer_profile))
+
+	def _storePrintTimeCurve(self, origin, path, printer_profile):
+		recorder = self._printTimeCurveRecorder
+		self._printTimeCurveRecorder = None
+
+		if not self._timeEstimationCurveEnabled or recorder is None or origin != FileDestinations.LOCAL:
+			return
+
+		curve = recorder.to_curve()
+		if curve is None:
+			return
+
+		try:
+			former = self._getPrintTimeCurve(self._fileManager.get_metadata(origin, path))
+			if former is not None:
+				curve = former.merged(curve, self._timeEstimationCurveWeight)
+
+			self._fileManager.set_additional_metadata(origin, path, "printTimeCurves",
+			                                          {printer_profile: curve.as_dict()},
+			                                          merge=True)
+		except:
+			self._logger.exception("Error while storing the print time curve for {}".format(path))
+
 	def _addTemperatureData(self, temp, bedTemp):
 		currentTimeUtc = int(time.time())
 
@@ -943,6 +999,8 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 						self._selectedFile["estimatedPrintTime"] = estimatedPrintTime
 						self._selectedFile["estimatedPrintTimeType"] = "analysis"
 
+					self._selectedFile["printTimeCurve"] = self._getPrintTimeCurve(fileData)
+
 			self._stateMonitor.set_job_data({
 				"file": {
 					"name": name_in_storage,
@@ -991,6 +1049,12 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 	def on_comm_temperature_update(self, temp, bedTemp):
 		self._addTemperatureData(copy.deepcopy(temp), copy.deepcopy(bedTemp))
 
+	def has_temperature_subscribers(self):
+		"""
+		 Callback method for the comm object, whether anybody is registered for the temperature updates right now.
+		"""
+		return len(self._callbacks) > 0
+
 	def on_comm_position_update(self, position, reason=None):
 		payload = dict(reason=reason)
 		payload.update(position)
@@ -1107,6 +1171,9 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 			                            payload["time"],
 			                            True,
 			                            self._printerProfileManager.get_current_or_default()["id"])
+			self._storePrintTimeCurve(payload["origin"],
+			                          payload["path"],
+			                          self._printerProfileManager.get_current_or_default()["id"])
 
 			eventManager().fire(Events.PRINT_DONE, payload)
 		else:
@@ -1115,10 +1182,12 @@ class Printer(PrinterInterface, comm.MachineComPrintCallback):
 
 
 	def on_comm_print_job_failed(self):
+		self._printTimeCurveRecorder = None
 		payload = self._payload_for_print_job_event()
 		eventManager().fire(Events.PRINT_FAILED, payload)
 
 	def on_comm_print_job_cancelled(self):
+		self._printTimeCurveRecorder = None
 		self._setCurrentZ(None)
 		self._updateProgressData()
 
@@ -1340,12 +1409,213 @@ class StateMonitor(object):
 		}
 
 
-class TemperatureHistory(InvariantContainer):
-	def __init__(self, cutoff=30 * 60):
+class TemperatureHistory(object):
+	"""
+	Temperature history of the printer, kept in array backed ring buffers of fixed size.
+
+	The raw data points added via :meth:`append` are kept for ``cutoff`` seconds. Additionally they are downsampled
+	into tiers of coarser resolution, each keeping the average, minimum and maximum of the actual temperatures and the
+	last target temperature per bucket. With the default tiers that's one data point per minute for a day and one
+	per ten minutes for a week.
+
+	Iterating over the history yields the raw data points within the cutoff, :meth:`query` allows to fetch data by
+	time range and resolution.
+
+	Arguments:
+	    cutoff (int): How long to keep the raw data points, in seconds.
+	    tiers (list): A list of ``(resolution, entries)`` tuples, one per downsampled tier, ``resolution`` being the
+	        length of a bucket in seconds and ``entries`` the number of buckets to keep.
+	"""
+
+	DEFAULT_TIERS = ((60, 24 * 60), (600, 7 * 24 * 6))
+
+	def __init__(self, cutoff=30 * 60, tiers=None):
+		if tiers is None:
+			tiers = self.DEFAULT_TIERS
+
+		self._cutoff = cutoff
+		self._raw = _TemperatureRing(max(cutoff, 1), ("actual", "target"))
+		self._tiers = [_TemperatureTier(resolution, entries) for resolution, entries in sorted(tiers)]
+		self._mutex = threading.RLock()
+
+	def append(self, item):
+		"""
+		Adds a data point as created by the printer, ``{"time": ..., "tool0": {"actual": ..., "target": ...}, ...}``.
+		"""
+		timestamp = item["time"]
+		values = dict((key, (value.get("actual"), value.get("target")))
+		              for key, value in item.items() if key != "time" and isinstance(value, dict))
+
+		with self._mutex:
+			self._raw.append(timestamp, values)
+			for tier in self._tiers:
+				tier.add(timestamp, values)
+
+	def query(self, start=None, end=None, resolution=None):
+		"""
+		Fetches the temperature history between ``start`` and ``end``.
+
+		The data is taken from the raw data points if they reach back far enough, otherwise from the finest tier that
+		does. If a ``resolution`` is provided the coarsest tier not exceeding it is used instead, if it reaches back far
+		enough. Data points from tiers contain ``min`` and ``max`` besides ``actual`` (the average) and ``target``.
+
+		Arguments:
+		    start (int): Timestamp of the oldest data point to return, defaults to the cutoff of the raw data.
+		    end (int): Timestamp of the newest data point to return, defaults to now.
+		    resolution (int): Desired distance between the data points in seconds.
+
+		Returns:
+		    list: The data points in chronological order.
+		"""
+		now = int(time.time())
+		if start is None:
+			start = now - self._cutoff
+		if end is None:
+			end = now
+
+		with self._mutex:
+			covering = [tier for tier in self._tiers if tier.covers(start, now)]
+			candidates = [tier for tier in covering if resolution is not None and tier.resolution <= resolution]
+
+			if candidates:
+				source = candidates[-1]
+			elif start >= now - self._cutoff or not self._tiers:
+				source = None
+			elif covering:
+				source = covering[0]
+			else:
+				source = self._tiers[-1]
+
+			if source is None:
+				return self._raw.query(max(start, now - self._cutoff), end)
+			return source.query(start, end)
+
+	def __len__(self):
+		with self._mutex:
+			return self._raw.count_since(int(time.time()) - self._cutoff)
+
+	def __iter__(self):
+		return iter(self.query())
+
+
+class _TemperatureRing(object):
+	"""
+	Fixed size ring buffer of temperature data points, with one ``array`` per time and per field and sensor.
+	"""
+
+	def __init__(self, capacity, fields):
+		self._capacity = capacity
+		self._fields = fields
+		self._times = array.array("d", [0.0]) * capacity
+		self._series = dict()
+		self._start = 0
+		self._count = 0
+
+	@property
+	def oldest(self):
+		if not self._count:
+			return None
+		return self._times[self._start]
+
+	def append(self, timestamp, values):
+		index = (self._start + self._count) % self._capacity
+		if self._count < self._capacity:
+			self._count += 1
+		else:
+			self._start = (self._start + 1) % self._capacity
+
+		self._times[index] = timestamp
+		for key in values:
+			if key not in self._series:
+				self._series[key] = [array.array("d", [_NAN]) * self._capacity for _ in self._fields]
+		for key, columns in self._series.items():
+			entry = values.get(key)
+			for field, column in enumerate(columns):
+				value = entry[field] if entry is not None else None
+				column[index] = value if value is not None else _NAN
+
+	def count_since(self, start):
+		return self._count - self._first_at_or_after(start)
+
+	def query(self, start, end):
+		result = []
+		for position in range(self._first_at_or_after(start), self._count):
+			index = (self._start + position) % self._capacity
+			timestamp = self._times[index]
+			if timestamp > end:
+				break
+
+			item = dict(time=int(timestamp))
+			for key, columns in self._series.items():
+				if columns[0][index] != columns[0][index]:
+					# no actual temperature for this sensor at that time
+					continue
+				item[key] = dict((field, _nan_to_none(column[index])) for field, column in zip(self._fields, columns))
+			result.append(item)
+		return result
+
+	def _first_at_or_after(self, start):
+		# binary search, the data points are in chronological order
+		low, high = 0, self._count
+		while low < high:
+			middle = (low + high) // 2
+			if self._times[(self._start + middle) % self._capacity] < start:
+				low = middle + 1
+			else:
+				high = middle
+		return low
+
+
+class _TemperatureTier(object):
+	"""
+	Downsampled temperature history, one data point per ``resolution`` seconds with average, minimum and maximum of the
+	actual temperatures and the last target temperature.
+	"""
+
+	def __init__(self, resolution, entries):
+		self.resolution = resolution
+		self._ring = _TemperatureRing(entries, ("actual", "target", "min", "max"))
+		self._bucket = None
+		self._pending = dict()
+
+	def covers(self, start, now):
+		oldest = self._ring.oldest
+		if oldest is None:
+			oldest = self._bucket
+		return (oldest is not None and oldest <= start) or start >= now - self.resolution
+
+	def add(self, timestamp, values):
+		bucket = timestamp - timestamp % self.resolution
+		if self._bucket is not None and bucket != self._bucket:
+			self._ring.append(self._bucket, self._aggregate())
+			self._pending.clear()
+		self._bucket = bucket
+
+		for key, (actual, target) in values.items():
+			if actual is None:
+				continue
+			if key in self._pending:
+				count, total, minimum, maximum, _ = self._pending[key]
+				self._pending[key] = (count + 1, total + actual, min(minimum, actual), max(maximum, actual), target)
+			else:
+				self._pending[key] = (1, actual, actual, actual, target)
+
+	def query(self, start, end):
+		result = self._ring.query(start, end)
+		if self._bucket is not None and start <= self._bucket <= end and self._pending:
+			# the bucket still being filled
+			item = dict(time=int(self._bucket))
+			for key, (actual, target, minimum, maximum) in self._aggregate().items():
+				item[key] = dict(actual=actual, target=target, min=minimum, max=maximum)
+			result.append(item)
+		return result
+
+	def _aggregate(self):
+		return dict((key, (total / count, target, minimum, maximum))
+		            for key, (count, total, minimum, maximum, target) in self._pending.items())
+
 
-		def temperature_invariant(data):
-			data.sort(key=lambda x: x["time"])
-			now = int(time.time())
-			return [item for item in data if item["time"] >= now - cutoff]
+_NAN = float("nan")
 
-		InvariantContainer.__init__(self, guarantee_invariant=temperature_invariant)
+def _nan_to_none(value):
+	return None if value != value else value
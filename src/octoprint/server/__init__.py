@@ -131,6 +131,7 @@ class Server(object):
 		self._allow_root = allow_root
 		self._octoprint_daemon = octoprint_daemon
 		self._server = None
+		self._printer_state_broadcaster = None
 
 		self._logger = None
 
@@ -212,7 +213,10 @@ class Server(object):
 		slicingManager = octoprint.slicing.SlicingManager(self._settings.getBaseFolder("slicingProfiles"), printerProfileManager)
 
 		storage_managers = dict()
-		storage_managers[octoprint.filemanager.FileDestinations.LOCAL] = octoprint.filemanager.storage.LocalFileStorage(self._settings.getBaseFolder("uploads"))
+		storage_managers[octoprint.filemanager.FileDestinations.LOCAL] = octoprint.filemanager.storage.LocalFileStorage(self._settings.getBaseFolder("uploads"),
+		                                                                                                            metadata_backend=self._settings.get(["server", "uploads", "metadataBackend"]),
+		                                                                                                            watch=self._settings.getBoolean(["server", "uploads", "watchForChanges"]),
+		                                                                                                            hash_algorithm=self._settings.get(["server", "uploads", "hashAlgorithm"]))
 
 		fileManager = octoprint.filemanager.FileManager(analysisQueue, slicingManager, printerProfileManager, initial_storage_managers=storage_managers)
 		appSessionManager = util.flask.AppSessionManager()
@@ -257,6 +261,9 @@ class Server(object):
 			printer = BeePrinter(fileManager, analysisQueue, printerProfileManager)
 		components.update(dict(printer=printer))
 
+		# push messages to connected clients are assembled once and fanned out to all of them
+		self._printer_state_broadcaster = util.sockjs.PrinterStateBroadcaster(printer, fileManager, eventManager, pluginManager)
+
 		def octoprint_plugin_inject_factory(name, implementation):
 			"""Factory for injections for all OctoPrintPlugins"""
 			if not isinstance(implementation, octoprint.plugin.OctoPrintPlugin):
@@ -448,7 +455,7 @@ class Server(object):
 						self._logger.debug("Adding additional route {route} handled by handler {handler} and with additional arguments {kwargs!r}".format(**locals()))
 						server_routes.append((route, handler, kwargs))
 
-		server_routes.append((r".*", util.tornado.UploadStorageFallbackHandler, dict(fallback=util.tornado.WsgiInputContainer(app.wsgi_app), file_prefix="octoprint-file-upload-", file_suffix=".tmp", suffixes=upload_suffixes)))
+		server_routes.append((r".*", util.tornado.UploadStorageFallbackHandler, dict(fallback=util.tornado.WsgiInputContainer(app.wsgi_app), file_prefix="octoprint-file-upload-", file_suffix=".tmp", suffixes=upload_suffixes, hash_algorithm=self._settings.get(["server", "uploads", "hashAlgorithm"]))))
 
 		self._tornado_app = Application(server_routes)
 		max_body_sizes = [
@@ -609,7 +616,8 @@ class Server(object):
 	def _create_socket_connection(self, session):
 		global printer, fileManager, analysisQueue, userManager, eventManager
 		return util.sockjs.PrinterStateConnection(printer, fileManager, analysisQueue, userManager,
-		                                          eventManager, pluginManager, session)
+		                                          eventManager, pluginManager, self._printer_state_broadcaster,
+		                                          session)
 
 	def _check_for_root(self):
 		if "geteuid" in dir(os) and os.geteuid() == 0:
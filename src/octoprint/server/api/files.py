@@ -63,6 +63,14 @@ def _create_lastmodified(path, recursive):
 		return None
 
 
+def _get_version(origin):
+	try:
+		return fileManager.version(origin)
+	except:
+		logging.getLogger(__name__).exception("There was an error retrieving the version from storage {}".format(origin))
+		return None
+
+
 def _create_etag(path, filter, recursive, lm=None):
 	if lm is None:
 		lm = _create_lastmodified(path, recursive)
@@ -75,6 +83,10 @@ def _create_etag(path, filter, recursive, lm=None):
 	hash.update(str(filter))
 	hash.update(str(recursive))
 
+	if path.endswith("/files") or path.endswith("/files/local"):
+		# include the version of the local file list in etag, changes of the metadata don't necessarily change lm
+		hash.update(str(_get_version(FileDestinations.LOCAL)))
+
 	if path.endswith("/files") or path.endswith("/files/sdcard"):
 		# include sd data in etag
 		hash.update(repr(sorted(printer.get_sd_files(), key=lambda x: x[0])))
@@ -162,13 +174,21 @@ def _getFileList(origin, path=None, filter=None, recursive=False, allow_from_cac
 		if filter:
 			filter_func = lambda entry, entry_data: octoprint.filemanager.valid_file_type(entry, type=filter)
 
+		# the cached list already contains the refs, which depend on the requested host
+		cache_key = "{}:{}:{}:{}:{}".format(origin, path, recursive, filter, request.url_root)
+
+		# the version of the storage tells us if the list is still current, if it doesn't track its version we have
+		# to fall back to the last modification date
+		version = _get_version(origin)
+		if version is None:
+			version = fileManager.last_modified(origin, path=path, recursive=recursive)
+
 		with _file_cache_mutex:
-			cache_key = "{}:{}:{}:{}".format(origin, path, recursive, filter)
-			files, lastmodified = _file_cache.get(cache_key, ([], None))
-			if not allow_from_cache or lastmodified is None or lastmodified < fileManager.last_modified(origin, path=path, recursive=recursive):
-				files = fileManager.list_files(origin, path=path, filter=filter_func, recursive=recursive)[origin].values()
-				lastmodified = fileManager.last_modified(origin, path=path, recursive=recursive)
-				_file_cache[cache_key] = (files, lastmodified)
+			files, cached_version = _file_cache.get(cache_key, ([], None))
+			if allow_from_cache and cached_version is not None and cached_version == version:
+				return list(files)
+
+		files = fileManager.list_files(origin, path=path, filter=filter_func, recursive=recursive)[origin].values()
 
 		def analyse_recursively(files, path=None):
 			if path is None:
@@ -225,6 +245,10 @@ def _getFileList(origin, path=None, filter=None, recursive=False, allow_from_cac
 
 		files = analyse_recursively(files)
 
+		with _file_cache_mutex:
+			_file_cache[cache_key] = (files, version)
+		files = list(files)
+
 	return files
 
 
@@ -259,7 +283,10 @@ def uploadGcodeFile(target):
 		if not target in [FileDestinations.LOCAL, FileDestinations.SDCARD]:
 			return make_response("Unknown target: %s" % target, 404)
 
-		upload = octoprint.filemanager.util.DiskFileWrapper(request.values[input_upload_name], request.values[input_upload_path])
+		# the upload handler hashed the file already while receiving it
+		upload = octoprint.filemanager.util.DiskFileWrapper(request.values[input_upload_name], request.values[input_upload_path],
+		                                                    digest=request.values.get(input_name + ".hash"),
+		                                                    hash_algorithm=request.values.get(input_name + ".hash_algorithm"))
 
 		# Store any additional user data the caller may have passed.
 		userdata = None
@@ -626,7 +653,8 @@ def gcodeFileCommand(filename, target):
 							  resolution=resolution,
 							  nozzle_size=nozzle,
 			                  callback=slicing_done,
-			                  callback_args=(target, full_path, select_after_slicing, print_after_slicing, model_to_remove_after_slicing))
+			                  callback_args=(target, full_path, select_after_slicing, print_after_slicing, model_to_remove_after_slicing),
+			                  high_priority=select_after_slicing)
 		except octoprint.slicing.UnknownProfile:
 			return make_response("Profile {profile} doesn't exist".format(**locals()), 400)
 
@@ -391,7 +391,15 @@ def _get_temperature_data(preprocessor):
 		if "limit" in request.values.keys() and unicode(request.values["limit"]).isnumeric():
 			limit = int(request.values["limit"])
 
-		history = list(tempHistory)
+		query = dict()
+		for key in ("start", "end", "resolution"):
+			if key in request.values.keys() and unicode(request.values[key]).isnumeric():
+				query[key] = int(request.values[key])
+
+		if query:
+			history = tempHistory.query(**query)
+		else:
+			history = list(tempHistory)
 		limit = min(limit, len(history))
 
 		tempData.update({
@@ -89,6 +89,30 @@ def slicingListAll():
 
 	return jsonify(result)
 
+@api.route("/slicing/<string:slicer>/cache", methods=["GET"])
+def slicingGetSlicerCache(slicer):
+	try:
+		slicer_impl = slicingManager.get_slicer(slicer, require_configured=False)
+	except UnknownSlicer:
+		return make_response("Unknown slicer {slicer}".format(**locals()), 404)
+
+	statistics = slicer_impl.get_slicer_cache_statistics()
+	if statistics is None:
+		return make_response("Slicer {slicer} does not cache slicing results".format(**locals()), 404)
+
+	return jsonify(statistics)
+
+@api.route("/slicing/<string:slicer>/cache", methods=["DELETE"])
+@restricted_access
+def slicingClearSlicerCache(slicer):
+	try:
+		slicer_impl = slicingManager.get_slicer(slicer, require_configured=False)
+	except UnknownSlicer:
+		return make_response("Unknown slicer {slicer}".format(**locals()), 404)
+
+	slicer_impl.clear_slicer_cache()
+	return NO_CONTENT
+
 @api.route("/slicing/<string:slicer>/profiles", methods=["GET"])
 def slicingListSlicerProfiles(slicer):
 	configured = False
@@ -5,9 +5,11 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
 
+import collections
 import logging
 import threading
 import sockjs.tornado
+import sockjs.tornado.proto
 import time
 
 import octoprint.timelapse
@@ -21,18 +23,295 @@ from octoprint.settings import settings
 import octoprint.printer
 
 
-class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.PrinterCallback):
-	def __init__(self, printer, fileManager, analysisQueue, userManager, eventManager, pluginManager, session):
-		sockjs.tornado.SockJSConnection.__init__(self, session)
+class PrinterStateBroadcaster(octoprint.printer.PrinterCallback):
+	"""
+	Fans out push messages to all subscribed :class:`PrinterStateConnection` instances.
+
+	Current state updates, events and plugin messages are assembled and JSON encoded only once and the encoded
+	frame is then handed to every subscriber, instead of each connection building and encoding its own copy.
+	Connections with a throttle factor skip frames, the temperatures, log lines and messages of the frames they
+	skipped are taken from a shared backlog of the last ``backlog_ticks`` updates.
+	"""
 
+	def __init__(self, printer, fileManager, eventManager, pluginManager, backlog_ticks=100):
 		self._logger = logging.getLogger(__name__)
 
+		self._printer = printer
+		self._fileManager = fileManager
+		self._eventManager = eventManager
+		self._pluginManager = pluginManager
+
+		self._subscribers = dict()
+		self._subscriberMutex = threading.RLock()
+
 		self._temperatureBacklog = []
-		self._temperatureBacklogMutex = threading.Lock()
 		self._logBacklog = []
-		self._logBacklogMutex = threading.Lock()
 		self._messageBacklog = []
-		self._messageBacklogMutex = threading.Lock()
+		self._backlogMutex = threading.Lock()
+
+		self._ticks = collections.deque(maxlen=backlog_ticks)
+		self._tick = 0
+
+		self._baseRateLimit = 0.5
+
+	def subscribe(self, connection):
+		with self._subscriberMutex:
+			if connection in self._subscribers:
+				return
+
+			first = not self._subscribers
+			self._subscribers[connection] = _Subscription(self._tick)
+
+			if first:
+				self._printer.register_callback(self)
+				self._pluginManager.register_message_receiver(self.on_plugin_message)
+				for event in octoprint.events.all_events():
+					self._eventManager.subscribe(event, self._onEvent)
+
+	def unsubscribe(self, connection):
+		with self._subscriberMutex:
+			if self._subscribers.pop(connection, None) is None:
+				return
+
+			if not self._subscribers:
+				self._printer.unregister_callback(self)
+				self._pluginManager.unregister_message_receiver(self.on_plugin_message)
+				for event in octoprint.events.all_events():
+					self._eventManager.unsubscribe(event, self._onEvent)
+
+				with self._backlogMutex:
+					self._temperatureBacklog = []
+					self._logBacklog = []
+					self._messageBacklog = []
+					self._ticks.clear()
+
+	@property
+	def subscribers(self):
+		with self._subscriberMutex:
+			return list(self._subscribers.keys())
+
+	def set_delta_updates(self, connection, enabled):
+		with self._subscriberMutex:
+			subscription = self._subscribers.get(connection)
+			if subscription is None:
+				return
+			subscription.delta = enabled
+			subscription.resync = True
+
+	def request_resync(self, connection):
+		with self._subscriberMutex:
+			subscription = self._subscribers.get(connection)
+			if subscription is not None:
+				subscription.resync = True
+
+	def on_printer_send_current_data(self, data):
+		now = time.time()
+
+		# collect the backlogs accumulated since the last update under a new tick
+		with self._backlogMutex:
+			self._tick += 1
+			tick = self._tick
+			entry = [tick, self._temperatureBacklog, self._logBacklog, self._messageBacklog, None]
+			self._ticks.append(entry)
+			self._temperatureBacklog = []
+			self._logBacklog = []
+			self._messageBacklog = []
+			ticks = list(self._ticks)
+
+		snapshots = dict((t[0], t[4]) for t in ticks if t[4] is not None)
+
+		# make sure we rate limit the updates according to each subscriber's throttle factor
+		due = []
+		with self._subscriberMutex:
+			for connection, subscription in self._subscribers.items():
+				if now < subscription.last_sent + self._baseRateLimit * connection.throttle_factor:
+					continue
+
+				if not subscription.delta:
+					kind = "current"
+				elif subscription.resync or subscription.last_tick not in snapshots:
+					kind = "currentSnapshot"
+				else:
+					kind = "currentPatch"
+
+				due.append((connection, kind, subscription.last_tick))
+				subscription.last_sent = now
+				subscription.last_tick = tick
+				subscription.resync = False
+
+		if not due:
+			return
+
+		busy_files = [dict(origin=v[0], path=v[1]) for v in self._fileManager.get_busy_files()]
+		if "job" in data and data["job"] is not None \
+				and "file" in data["job"] and "path" in data["job"]["file"] and "origin" in data["job"]["file"] \
+				and data["job"]["file"]["path"] is not None and data["job"]["file"]["origin"] is not None \
+				and (self._printer.is_printing() or self._printer.is_paused()):
+			busy_files.append(dict(origin=data["job"]["file"]["origin"], path=data["job"]["file"]["path"]))
+
+		data["busyFiles"] = busy_files
+		entry[4] = dict(data)
+		server_time = time.time()
+
+		# subscribers that were last served on the same tick in the same mode receive the very same frame
+		frames = dict()
+		for connection, kind, last_tick in due:
+			key = (kind, last_tick)
+			if key not in frames:
+				temperatures = []
+				logs = []
+				messages = []
+				for t, temps, log, msgs, _ in ticks:
+					if t > last_tick:
+						temperatures += temps
+						logs += log
+						messages += msgs
+
+				backlogs = {
+					"serverTime": server_time,
+					"temps": temperatures,
+					"logs": logs,
+					"messages": messages
+				}
+
+				if kind == "currentPatch":
+					payload = dict(seq=tick, base=last_tick, patch=create_patch(snapshots[last_tick], data))
+					payload.update(backlogs)
+				else:
+					payload = dict(data)
+					payload.update(backlogs)
+					if kind == "currentSnapshot":
+						payload = dict(seq=tick, data=payload)
+
+				message = {kind: payload}
+				frames[key] = (message, sockjs.tornado.proto.json_encode(message))
+
+			connection.send_encoded(*frames[key])
+
+	def on_printer_send_initial_data(self, data):
+		# subscribers fetch their initial data on their own when they open
+		pass
+
+	def on_printer_add_log(self, data):
+		with self._backlogMutex:
+			self._logBacklog.append(data)
+
+	def on_printer_add_message(self, data):
+		with self._backlogMutex:
+			self._messageBacklog.append(data)
+
+	def on_printer_add_temperature(self, data):
+		with self._backlogMutex:
+			self._temperatureBacklog.append(data)
+
+	def on_plugin_message(self, plugin, data):
+		self._broadcast("plugin", dict(plugin=plugin, data=data))
+
+	def sendFlashingFirmware(self, firmwareVersion):
+		self._broadcast("flashing", dict(version=firmwareVersion))
+
+	def sendFinishedFlashingFirmware(self, firmwareFlashResult):
+		self._broadcast("flashingFinished", dict(result=firmwareFlashResult))
+
+	def sendFirmwareUpdateAvailable(self, firmwareVersion):
+		self._broadcast("firmwareUpdate", dict(version=firmwareVersion))
+
+	def _onEvent(self, event, payload):
+		self._broadcast("event", {"type": event, "payload": payload})
+
+	def _broadcast(self, type, payload):
+		connections = self.subscribers
+		if not connections:
+			return
+
+		message = {type: payload}
+		try:
+			encoded = sockjs.tornado.proto.json_encode(message)
+		except:
+			self._logger.exception("Could not encode {} message for clients".format(type))
+			return
+
+		for connection in connections:
+			connection.send_encoded(message, encoded)
+
+
+class _Subscription(object):
+	def __init__(self, last_tick):
+		self.last_sent = 0
+		self.last_tick = last_tick
+		self.delta = False
+		self.resync = False
+
+
+def create_patch(old, new, path=""):
+	"""
+	Creates a list of JSON patch (RFC 6902) style operations that turn ``old`` into ``new``.
+
+	Dicts are compared key by key, any other value that differs is replaced as a whole.
+
+	Arguments:
+	    old: The document the receiver already has
+	    new: The document the receiver should end up with
+	    path (str): JSON pointer of ``old`` and ``new`` within the full document
+
+	Returns:
+	    (list) A list of ``add``, ``remove`` and ``replace`` operations, empty if both documents are equal
+	"""
+	if isinstance(old, dict) and isinstance(new, dict):
+		patch = []
+		for key, value in new.items():
+			pointer = path + "/" + _escape_pointer(key)
+			if key in old:
+				patch += create_patch(old[key], value, path=pointer)
+			else:
+				patch.append(dict(op="add", path=pointer, value=value))
+		for key in old:
+			if key not in new:
+				patch.append(dict(op="remove", path=path + "/" + _escape_pointer(key)))
+		return patch
+
+	if type(old) == type(new) and old == new:
+		return []
+	return [dict(op="replace", path=path, value=new)]
+
+
+def apply_patch(document, patch):
+	"""
+	Applies a list of operations as created by :func:`create_patch` to ``document`` in place.
+
+	Returns:
+	    The patched document, which is a new object if the whole document was replaced
+	"""
+	for operation in patch:
+		segments = [_unescape_pointer(segment) for segment in operation["path"].split("/")[1:]]
+		if not segments:
+			document = operation.get("value")
+			continue
+
+		target = document
+		for segment in segments[:-1]:
+			target = target[segment]
+
+		if operation["op"] == "remove":
+			del target[segments[-1]]
+		else:
+			target[segments[-1]] = operation["value"]
+	return document
+
+
+def _escape_pointer(key):
+	return key.replace("~", "~0").replace("/", "~1")
+
+
+def _unescape_pointer(segment):
+	return segment.replace("~1", "/").replace("~0", "~")
+
+
+class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.PrinterCallback):
+	def __init__(self, printer, fileManager, analysisQueue, userManager, eventManager, pluginManager, broadcaster, session):
+		sockjs.tornado.SockJSConnection.__init__(self, session)
+
+		self._logger = logging.getLogger(__name__)
 
 		self._printer = printer
 		self._fileManager = fileManager
@@ -40,12 +319,11 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 		self._userManager = userManager
 		self._eventManager = eventManager
 		self._pluginManager = pluginManager
+		self._broadcaster = broadcaster
 
 		self._remoteAddress = None
 
 		self._throttleFactor = 1
-		self._lastCurrent = 0
-		self._baseRateLimit = 0.5
 
 		self._emit_mutex = threading.RLock()
 
@@ -82,14 +360,12 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 			safe_mode=octoprint.server.safe_mode
 		))
 
-		self._printer.register_callback(self)
+		self._printer.send_initial_data(self)
 		self._fileManager.register_slicingprogress_callback(self)
 		octoprint.timelapse.register_callback(self)
-		self._pluginManager.register_message_receiver(self.on_plugin_message)
 
 		self._eventManager.fire(Events.CLIENT_OPENED, {"remoteAddress": self._remoteAddress})
-		for event in octoprint.events.all_events():
-			self._eventManager.subscribe(event, self._onEvent)
+		self._broadcaster.subscribe(self)
 
 		octoprint.timelapse.notify_callbacks(octoprint.timelapse.current)
 
@@ -106,14 +382,11 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 
 	def on_close(self):
 		self._logger.info("Client connection closed: %s" % self._remoteAddress)
-		self._printer.unregister_callback(self)
+		self._broadcaster.unsubscribe(self)
 		self._fileManager.unregister_slicingprogress_callback(self)
 		octoprint.timelapse.unregister_callback(self)
-		self._pluginManager.unregister_message_receiver(self.on_plugin_message)
 
 		self._eventManager.fire(Events.CLIENT_CLOSED, {"remoteAddress": self._remoteAddress})
-		for event in octoprint.events.all_events():
-			self._eventManager.unsubscribe(event, self._onEvent)
 
 	def on_message(self, message):
 		try:
@@ -134,41 +407,18 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 				self._throttleFactor = throttle
 				self._logger.debug("Set throttle factor for client {} to {}".format(self._remoteAddress, self._throttleFactor))
 
-	def on_printer_send_current_data(self, data):
-		# make sure we rate limit the updates according to our throttle factor
-		now = time.time()
-		if now < self._lastCurrent + self._baseRateLimit * self._throttleFactor:
-			return
-		self._lastCurrent = now
+		if "delta" in message:
+			# opt-in: send a snapshot of the current state once and patches against the previous update after that
+			self._broadcaster.set_delta_updates(self, bool(message["delta"]))
+			self._logger.debug("Set delta updates for client {} to {}".format(self._remoteAddress, bool(message["delta"])))
 
-		# add current temperature, log and message backlogs to sent data
-		with self._temperatureBacklogMutex:
-			temperatures = self._temperatureBacklog
-			self._temperatureBacklog = []
-
-		with self._logBacklogMutex:
-			logs = self._logBacklog
-			self._logBacklog = []
-
-		with self._messageBacklogMutex:
-			messages = self._messageBacklog
-			self._messageBacklog = []
-
-		busy_files = [dict(origin=v[0], path=v[1]) for v in self._fileManager.get_busy_files()]
-		if "job" in data and data["job"] is not None \
-				and "file" in data["job"] and "path" in data["job"]["file"] and "origin" in data["job"]["file"] \
-				and data["job"]["file"]["path"] is not None and data["job"]["file"]["origin"] is not None \
-				and (self._printer.is_printing() or self._printer.is_paused()):
-			busy_files.append(dict(origin=data["job"]["file"]["origin"], path=data["job"]["file"]["path"]))
+		if "resync" in message:
+			# the client missed an update, start over with a snapshot
+			self._broadcaster.request_resync(self)
 
-		data.update({
-			"serverTime": time.time(),
-			"temps": temperatures,
-			"logs": logs,
-			"messages": messages,
-			"busyFiles": busy_files,
-		})
-		self._emit("current", data)
+	@property
+	def throttle_factor(self):
+		return self._throttleFactor
 
 	def on_printer_send_initial_data(self, data):
 		data_to_send = dict(data)
@@ -195,24 +445,6 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 	def sendFirmwareUpdateAvailable(self, firmwareVersion):
 		self._emit("firmwareUpdate", dict(version=firmwareVersion))
 
-	def on_plugin_message(self, plugin, data):
-		self._emit("plugin", dict(plugin=plugin, data=data))
-
-	def on_printer_add_log(self, data):
-		with self._logBacklogMutex:
-			self._logBacklog.append(data)
-
-	def on_printer_add_message(self, data):
-		with self._messageBacklogMutex:
-			self._messageBacklog.append(data)
-
-	def on_printer_add_temperature(self, data):
-		with self._temperatureBacklogMutex:
-			self._temperatureBacklog.append(data)
-
-	def _onEvent(self, event, payload):
-		self.sendEvent(event, payload)
-
 	def _emit(self, type, payload):
 		with self._emit_mutex:
 			try:
@@ -222,3 +454,112 @@ class PrinterStateConnection(sockjs.tornado.SockJSConnection, octoprint.printer.
 					self._logger.exception("Could not send message to client {}".format(self._remoteAddress))
 				else:
 					self._logger.warn("Could not send message to client {}: {}".format(self._remoteAddress, e))
+
+	def send_encoded(self, message, encoded):
+		"""
+		Sends a message that was already JSON encoded by the :class:`PrinterStateBroadcaster`.
+
+		Arguments:
+		    message (dict): The message to send, used for sessions that do their own encoding
+		    encoded (str): The JSON encoded ``message``
+		"""
+		with self._emit_mutex:
+			try:
+				if self.is_closed:
+					return
+				if getattr(self.session, "send_expects_json", False):
+					self.session.send_jsonified(encoded)
+				else:
+					self.session.send_message(message)
+			except Exception as e:
+				if self._logger.isEnabledFor(logging.DEBUG):
+					self._logger.exception("Could not send message to client {}".format(self._remoteAddress))
+				else:
+					self._logger.warn("Could not send message to client {}: {}".format(self._remoteAddress, e))
+
+
+def benchmark_cli():
+	"""
+	Usage: python -m octoprint.server.util.sockjs [<hours>]
+
+	Simulates the "current" updates of a print job running for <hours> hours (default 4) with one update every
+	0.5s and a temperature report every second, and reports the bytes sent to a client with and without delta
+	updates.
+	"""
+
+	import sys
+
+	hours = float(sys.argv[1]) if len(sys.argv) > 1 else 4.0
+
+	class Printer(object):
+		def register_callback(self, callback):
+			pass
+
+		def unregister_callback(self, callback):
+			pass
+
+		def is_printing(self):
+			return True
+
+		def is_paused(self):
+			return False
+
+	class FileManager(object):
+		def get_busy_files(self):
+			return []
+
+	class Manager(object):
+		def __getattr__(self, item):
+			return lambda *args, **kwargs: None
+
+	class Client(object):
+		# no throttling at all, every simulated update is sent right away
+		throttle_factor = 0
+
+		def __init__(self):
+			self.frames = 0
+			self.bytes = 0
+
+		def send_encoded(self, message, encoded):
+			self.frames += 1
+			self.bytes += len(encoded)
+
+	broadcaster = PrinterStateBroadcaster(Printer(), FileManager(), Manager(), Manager())
+	full = Client()
+	delta = Client()
+	broadcaster.subscribe(full)
+	broadcaster.subscribe(delta)
+	broadcaster.set_delta_updates(delta, True)
+
+	total = int(hours * 3600)
+	size = 25 * 1024 * 1024
+	updates = int(hours * 3600 * 2)
+	for update in range(updates):
+		print_time = update // 2
+		if update % 2 == 0:
+			broadcaster.on_printer_add_temperature(dict(time=1500000000 + print_time,
+			                                            tool0=dict(actual=210.0 + (update % 7) * 0.1, target=210.0),
+			                                            bed=dict(actual=60.0 - (update % 3) * 0.1, target=60.0)))
+		broadcaster.on_printer_send_current_data({
+			"state": {"text": "Printing", "flags": dict(operational=True, printing=True, closedOrError=False,
+			                                            error=False, paused=False, ready=False, sdReady=False)},
+			"job": {"file": dict(name="benchmark.gcode", path="benchmark.gcode", origin="local", size=size,
+			                     date=1500000000),
+			        "estimatedPrintTime": total, "averagePrintTime": None, "lastPrintTime": None,
+			        "filament": dict(tool0=dict(length=25000.0, volume=60.0))},
+			"currentZ": round(0.2 + (update * 200 // updates) * 0.2, 1),
+			"progress": {"completion": update * 100.0 / updates, "filepos": update * size // updates,
+			             "printTime": print_time, "printTimeLeft": total - print_time,
+			             "printTimeLeftOrigin": "estimate"},
+			"offsets": {}
+		})
+
+	print("{} updates over a simulated print of {}h".format(updates, hours))
+	print("full updates:  {} bytes, {:.1f} bytes per update".format(full.bytes, full.bytes / full.frames))
+	print("delta updates: {} bytes, {:.1f} bytes per update ({:.1f}% of full)".format(delta.bytes,
+	                                                                                 delta.bytes / delta.frames,
+	                                                                                 delta.bytes * 100.0 / full.bytes))
+
+
+if __name__ == "__main__":
+	benchmark_cli()
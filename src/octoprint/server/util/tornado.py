@@ -126,12 +126,17 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 
 	The underlying application can then access the contained files via their respective paths and just move them
 	where necessary.
+
+	If ``hash_algorithm`` is set (see :func:`octoprint.filemanager.util.create_hash`), files are hashed while they are
+	written to disk and the hex digest and algorithm are supplied as additional fields ``file.hash`` and
+	``file.hash_algorithm``, so the file doesn't have to be read again for hashing. Fields in the request named like
+	one of the fields supplied for a file are dropped.
 	"""
 
 	BODY_METHODS = ("POST", "PATCH", "PUT")
 	""" The request methods that may contain a request body. """
 
-	def initialize(self, fallback, file_prefix="tmp", file_suffix="", path=None, suffixes=None):
+	def initialize(self, fallback, file_prefix="tmp", file_suffix="", path=None, suffixes=None, hash_algorithm=None):
 		if not suffixes:
 			suffixes = dict()
 
@@ -139,8 +144,9 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		self._file_prefix = file_prefix
 		self._file_suffix = file_suffix
 		self._path = path
+		self._hash_algorithm = hash_algorithm
 
-		self._suffixes = dict((key, key) for key in ("name", "path", "content_type", "size"))
+		self._suffixes = dict((key, key) for key in ("name", "path", "content_type", "size", "hash", "hash_algorithm"))
 		for suffix_type, suffix in suffixes.items():
 			if suffix_type in self._suffixes and suffix is not None:
 				self._suffixes[suffix_type] = suffix
@@ -338,6 +344,7 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		* ``content_type``: content type of the part
 		* ``file``: file handle for the temporary file (mode "wb", not deleted on close, will be deleted however after
 		  handling of the request has finished in :func:`_handle_method`)
+		* ``hash``: hash object fed with the file's data, if a ``hash_algorithm`` is configured
 
 		Structure of ``data`` parts:
 
@@ -354,11 +361,15 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 			# this is a file
 			import tempfile
 			handle = tempfile.NamedTemporaryFile(mode="wb", prefix=self._file_prefix, suffix=self._file_suffix, dir=self._path, delete=False)
-			return dict(name=tornado.escape.utf8(name),
-						filename=tornado.escape.utf8(filename),
-						path=tornado.escape.utf8(handle.name),
-						content_type=tornado.escape.utf8(content_type),
-						file=handle)
+			part = dict(name=tornado.escape.utf8(name),
+			            filename=tornado.escape.utf8(filename),
+			            path=tornado.escape.utf8(handle.name),
+			            content_type=tornado.escape.utf8(content_type),
+			            file=handle)
+			if self._hash_algorithm:
+				from octoprint.filemanager.util import create_hash
+				part["hash"] = create_hash(self._hash_algorithm)
+			return part
 
 		else:
 			return dict(name=tornado.escape.utf8(name), content_type=tornado.escape.utf8(content_type), data=b"")
@@ -372,6 +383,8 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		"""
 		if "file" in part:
 			part["file"].write(data)
+			if "hash" in part:
+				part["hash"].update(data)
 		else:
 			part["data"] += data
 
@@ -395,6 +408,11 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 		logged parts, turning ``file`` parts into new ``data`` parts.
 		"""
 
+		# names of the fields supplied for files, the request must not set them itself
+		file_fields = set(name + "." + suffix
+		                  for name, part in self._parts.items() if "filename" in part
+		                  for suffix in self._suffixes.values())
+
 		self._new_body = b""
 		for name, part in self._parts.items():
 			if "filename" in part:
@@ -409,6 +427,9 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 				)
 				if "content_type" in part:
 					parameters["content_type"] = part["content_type"]
+				if "hash" in part:
+					parameters["hash"] = tornado.escape.utf8(part["hash"].hexdigest())
+					parameters["hash_algorithm"] = tornado.escape.utf8(self._hash_algorithm)
 
 				fields = dict((self._suffixes[key], value) for (key, value) in parameters.items())
 				for n, p in fields.items():
@@ -419,6 +440,10 @@ class UploadStorageFallbackHandler(tornado.web.RequestHandler):
 					self._new_body += b"\r\n"
 					self._new_body += b"%s\r\n" % p
 			elif "data" in part:
+				if name in file_fields:
+					self._logger.warn("Ignoring field {} in request, it is reserved for uploaded files".format(name))
+					continue
+
 				self._new_body += b"--%s\r\n" % self._multipart_boundary
 				value = part["data"]
 				self._new_body += b"Content-Disposition: form-data; name=\"%s\"\r\n" % name
@@ -93,7 +93,14 @@ default_settings = {
 		"autoconnect": True,
 
 		# Flag that controls the if the driver is connected in virtual/dummy printer mode
-        "dummyPrinter": False
+        "dummyPrinter": False,
+
+		# Preprocessing of G-code files before transferring them to the printer's SD card
+		"transfer": {
+			"minify": True,			# leave out comments, empty lines and superfluous whitespace
+			"compactNumbers": False,	# also drop trailing zeros from numbers, e.g. X10.500 becomes X10.5
+			"pollInterval": 0.5		# maximum interval in seconds between two transfer progress checks
+		}
 	},
 	"serial": {
 		"port": None,
@@ -106,6 +113,7 @@ default_settings = {
 			"communication": 30,
 			"temperature": 5,
 			"temperatureTargetSet": 2,
+			"temperatureUnobserved": 30,
 			"sdStatus": 1
 		},
 		"maxCommunicationTimeouts": {
@@ -123,6 +131,11 @@ default_settings = {
 		"ignoreErrorsFromFirmware": False,
 		"logResends": True,
 		"supportResendsWithoutOk": False,
+		"sendWindow": {
+			"enabled": False,	# keep several commands in flight instead of waiting for the ok of each
+			"commands": 4,		# maximum of unacknowledged commands, capped by what the firmware reports via "ok N.. P.. B.."
+			"bufferSize": 128	# firmware's serial receive buffer in bytes
+		},
 
 		# command specific flags
 		"triggerOkForM29": True
@@ -150,7 +163,10 @@ default_settings = {
 		"uploads": {
 			"maxSize":  1 * 1024 * 1024 * 1024, # 1GB
 			"nameSuffix": "name",
-			"pathSuffix": "path"
+			"pathSuffix": "path",
+			"metadataBackend": "yaml",	# "yaml" keeps a .metadata.yaml per folder, "sqlite" one database for all folders
+			"watchForChanges": False,	# watch the upload folder for files added or removed from outside
+			"hashAlgorithm": "sha1"		# "sha1" or the faster, non-cryptographic "fingerprint" for the file hashes
 		},
 		"maxSize": 100 * 1024, # 100 KB
 		"commands": {
@@ -196,6 +212,9 @@ default_settings = {
 		"throttle_normalprio": 0.01,
 		"throttle_highprio": 0.0,
 		"throttle_lines": 100,
+		"backend": "thread",	# "thread" analyses in the server process, "process" in a pool of worker processes
+		"workers": None,		# number of worker processes for the "process" backend, None for one per CPU
+		"cache_size": 1000,		# number of analysis results to keep for files with identical contents, 0 to disable
 		"analyser": "BVC_4.0.11"	# If this option is set for BVC it uses the custom gcode analyser from previous BEESOFT version;
 									# else (if it is set to another value such as "default") it uses the CURAX estimator.
 	},
@@ -223,7 +242,8 @@ default_settings = {
 		"printCancelConfirmation": True,
 		"blockWhileDwelling": False,
 		"g90InfluencesExtruder": False,
-		"checkSufficientFilament": False
+		"checkSufficientFilament": False,
+		"preparePrintJobs": False
 	},
 	"folder": {
 		"uploads": None,
@@ -248,7 +268,11 @@ default_settings = {
 			{"name": "ABS", "extruder" : 210, "bed" : 100 },
 			{"name": "PLA", "extruder" : 180, "bed" : 60 }
 		],
-		"cutoff": 30
+		"cutoff": 30,
+		"historyTiers": [
+			{"resolution": 60, "entries": 1440},	# one data point per minute for a day
+			{"resolution": 600, "entries": 1008}	# one data point per ten minutes for a week
+		]
 	},
 	"printerProfile": {
 		"default": "beethefirst"
@@ -308,10 +332,15 @@ default_settings = {
 		"enabled": True,
 		"defaultSlicer": "curaX",
 		"defaultProfiles": None,
+		"workers": None,		# number of slicing jobs to run concurrently, None for one per CPU
+		"progressStep": 0.01,	# minimum slicing progress between two progress updates
+		"progressInterval": 0.25,	# minimum time in seconds between two slicing progress updates
 	},
 	"events": {
 		"enabled": True,
-		"subscriptions": []
+		"subscriptions": [],
+		"slowHandlerThreshold": 1.0,	# log event handlers taking longer than this many seconds
+		"backlogWarning": 50		# log subscribers with this many events waiting for delivery
 	},
 	"api": {
 		"enabled": True,
@@ -342,7 +371,9 @@ default_settings = {
 			"validityRange": 0.15,
 			"forceDumbFromPercent": 0.3,
 			"forceDumbAfterMin": 30,
-			"stableThreshold": 60
+			"stableThreshold": 60,
+			"curveEnabled": True,
+			"curveWeight": 0.5
 		}
 	},
 	"devel": {
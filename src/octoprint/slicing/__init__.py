@@ -35,6 +35,8 @@ from octoprint.settings import settings
 import logging
 
 from .exceptions import *
+from .progress import SlicingProgressCoalescer
+from .scheduler import SlicingJob, SlicingScheduler
 
 
 class SlicingProfile(object):
@@ -123,6 +125,8 @@ class SlicingManager(object):
 		self._slicers = dict()
 		self._slicer_names = dict()
 
+		self._scheduler = SlicingScheduler(workers=settings().getInt(["slicing", "workers"]))
+
 	def initialize(self):
 		"""
 		Initializes the slicing manager by loading and initializing all available
@@ -209,7 +213,8 @@ class SlicingManager(object):
 
 	def slice(self, slicer_name, source_path, dest_path, profile_name, callback,
 	          callback_args=None, callback_kwargs=None, overrides=None, resolution=None, nozzle_size=None,
-	          on_progress=None, on_progress_args=None, on_progress_kwargs=None, printer_profile_id=None, position=None):
+	          on_progress=None, on_progress_args=None, on_progress_kwargs=None, printer_profile_id=None, position=None,
+	          high_priority=False, on_queue_position=None, on_queue_position_args=None, on_queue_position_kwargs=None):
 		"""
 		Slices ``source_path`` to ``dest_path`` using slicer ``slicer_name`` and slicing profile ``profile_name``.
 		Since slicing happens asynchronously, ``callback`` will be called when slicing has finished (either successfully
@@ -235,6 +240,8 @@ class SlicingManager(object):
 		arguments and keyword arguments to call upon progress reports from the slicing job. The progress callback will
 		be called with a keyword argument ``_progress`` containing the current slicing progress as a value between 0
 		and 1 plus all additionally specified args and kwargs.
+		Progress reports are coalesced to the rate configured via ``slicing.progressStep`` and
+		``slicing.progressInterval``, see :class:`~octoprint.slicing.progress.SlicingProgressCoalescer`.
 
 		If a different printer profile than the currently selected one is to be used for slicing, its id can be provided
 		via the keyword argument ``printer_profile_id``.
@@ -242,6 +249,13 @@ class SlicingManager(object):
 		If the ``source_path`` is to be a sliced at a different position than the print bed center, this ``position`` can
 		be supplied as a dictionary defining the ``x`` and ``y`` coordinate in print bed coordinates of the model's center.
 
+		Slicing jobs are run by a pool of workers, further jobs wait in a queue. Jobs with ``high_priority`` set, e.g.
+		because the user is waiting to print the result, are started before all others. With ``on_queue_position``,
+		``on_queue_position_args`` and ``on_queue_position_kwargs``, callees may specify a callback plus arguments and
+		keyword arguments to call whenever the job's position in the queue changes. It will be called with the keyword
+		arguments ``_position`` (1 based position in the queue, 0 once the job was started) and ``_queued`` (number
+		of queued jobs) plus all additionally specified args and kwargs.
+
 		Arguments:
 		    slicer_name (str): The identifier of the slicer to use for slicing.
 		    source_path (str): The absolute path to the source file to slice.
@@ -263,6 +277,11 @@ class SlicingManager(object):
 		    position (dict): Dictionary containing the ``x`` and ``y`` coordinate in the print bed's coordinate system
 		        of the sliced model's center. If not provided the model will be positioned at the print bed's center.
 		        Example: ``dict(x=10,y=20)``.
+		    high_priority (boolean): Whether to start the job before all queued jobs without high priority.
+		    on_queue_position (callable): Callback to call upon changes of the job's queue position.
+		    on_queue_position_args (list or tuple): Arguments of the queue position callback. Defaults to an empty list.
+		    on_queue_position_kwargs (dict): Keyword arguments of the queue position callback, will be extended by
+		        ``_position`` and ``_queued`` as described above! Defaults to an empty dictionary.
 
 		Raises:
 		    ~octoprint.slicing.exceptions.UnknownSlicer: The slicer specified via ``slicer_name`` is unknown.
@@ -294,6 +313,11 @@ class SlicingManager(object):
 		if printer_profile is None:
 			printer_profile = self._printer_profile_manager.get_current_or_default()
 
+		if on_progress is not None:
+			on_progress = SlicingProgressCoalescer(on_progress,
+			                                       min_step=settings().getFloat(["slicing", "progressStep"]),
+			                                       min_interval=settings().getFloat(["slicing", "progressInterval"]))
+
 		if slicer_name == "curaX":
 			def slicer_worker(slicer, model_path, machinecode_path, profile_name, overrides, printer_profile, position, callback, callback_args, callback_kwargs):
 				try:
@@ -345,15 +369,23 @@ class SlicingManager(object):
 				finally:
 					callback(*callback_args, **callback_kwargs)
 
-		import threading
-		slicer_worker_thread = threading.Thread(target=slicer_worker,
-		                                        args=(slicer, source_path, dest_path, profile_name, overrides, printer_profile, position, callback, callback_args, callback_kwargs))
-		slicer_worker_thread.daemon = True
-		slicer_worker_thread.start()
+		def slicer_cancelled():
+			callback_kwargs.update(dict(_cancelled=True))
+			callback(*callback_args, **callback_kwargs)
+
+		job = SlicingJob(slicer_name, source_path, dest_path,
+		                 lambda: slicer_worker(slicer, source_path, dest_path, profile_name, overrides, printer_profile, position, callback, callback_args, callback_kwargs),
+		                 slicer_cancelled,
+		                 high_priority=high_priority,
+		                 on_queue_position=on_queue_position,
+		                 on_queue_position_args=on_queue_position_args,
+		                 on_queue_position_kwargs=on_queue_position_kwargs)
+		self._scheduler.submit(job)
 
 	def cancel_slicing(self, slicer_name, source_path, dest_path):
 		"""
-		Cancels the slicing job on slicer ``slicer_name`` from ``source_path`` to ``dest_path``.
+		Cancels the slicing job on slicer ``slicer_name`` from ``source_path`` to ``dest_path``. A job still waiting
+		in the queue is removed from it, a running job is cancelled through its slicer.
 
 		Arguments:
 		    slicer_name (str): Identifier of the slicer on which to cancel the job.
@@ -364,6 +396,10 @@ class SlicingManager(object):
 		    ~octoprint.slicing.exceptions.UnknownSlicer: The slicer specified via ``slicer_name`` is unknown.
 		"""
 
+		if self._scheduler.cancel(slicer_name, dest_path):
+			# job was still queued, no need to bother the slicer
+			return
+
 		slicer = self.get_slicer(slicer_name)
 		slicer.cancel_slicing(dest_path)
 
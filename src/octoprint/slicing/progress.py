@@ -0,0 +1,58 @@
+# coding=utf-8
+"""
+Aggregation of slicing progress reports.
+
+.. autoclass:: SlicingProgressCoalescer
+"""
+
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import time
+
+
+class SlicingProgressCoalescer(object):
+	"""
+	Progress callback wrapper that forwards the progress reports of a slicing job only at a limited rate.
+
+	Slicers may report progress many times per second. A report is only forwarded to ``callback`` if the progress
+	advanced by at least ``min_step`` and at least ``min_interval`` seconds passed since the last forwarded report.
+	Reports of a finished job (progress of 1.0 or more) are always forwarded.
+
+	Instances are called like the wrapped callback, that is with the callback's arguments and keyword arguments plus
+	the keyword argument ``_progress``.
+
+	Arguments:
+	    callback (callable): The progress callback to forward reports to.
+	    min_step (float): Minimum progress between two forwarded reports, as a value between 0 and 1.
+	    min_interval (float): Minimum time in seconds between two forwarded reports.
+	"""
+
+	def __init__(self, callback, min_step=0.01, min_interval=0.25):
+		self._callback = callback
+		self._min_step = min_step if min_step else 0.0
+		self._min_interval = min_interval if min_interval else 0.0
+
+		self._last_progress = None
+		self._last_time = None
+
+	def __call__(self, *args, **kwargs):
+		progress = kwargs.get("_progress")
+		if progress is None:
+			return
+
+		now = time.time()
+		if self._last_progress is not None and progress < 1.0:
+			if progress - self._last_progress < self._min_step:
+				return
+			if now - self._last_time < self._min_interval:
+				return
+		if self._last_progress is not None and self._last_progress >= 1.0:
+			return
+
+		self._last_progress = progress
+		self._last_time = now
+		self._callback(*args, **kwargs)
@@ -0,0 +1,209 @@
+# coding=utf-8
+"""
+Scheduling of slicing jobs.
+
+.. autoclass:: SlicingJob
+
+.. autoclass:: SlicingScheduler
+"""
+
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import bisect
+import itertools
+import logging
+import multiprocessing
+import threading
+
+
+class SlicingJob(object):
+	"""
+	A slicing job to run through the :class:`SlicingScheduler`.
+
+	Arguments:
+	    slicer_name (str): Identifier of the slicer to slice with.
+	    source_path (str): The absolute path to the source file to slice.
+	    dest_path (str): The absolute path to the destination file to slice to.
+	    work (callable): Performs the slicing, including the call of the job's completion callback.
+	    cancelled (callable): Called instead of ``work`` if the job gets cancelled while still queued.
+	    high_priority (boolean): Whether to process the job before all jobs without high priority, e.g. because
+	        the user is waiting for it to print.
+	    on_queue_position (callable): Callback to call whenever the job's position in the queue changes, with the
+	        keyword arguments ``_position`` (1 based position among the queued jobs, 0 once a worker started the
+	        job) and ``_queued`` (number of queued jobs) plus all additionally specified args and kwargs.
+	    on_queue_position_args (list or tuple): Arguments of the queue position callback.
+	    on_queue_position_kwargs (dict): Keyword arguments of the queue position callback.
+	"""
+
+	def __init__(self, slicer_name, source_path, dest_path, work, cancelled, high_priority=False,
+	             on_queue_position=None, on_queue_position_args=None, on_queue_position_kwargs=None):
+		self.slicer_name = slicer_name
+		self.source_path = source_path
+		self.dest_path = dest_path
+		self.high_priority = high_priority
+
+		self._work = work
+		self._cancelled = cancelled
+
+		self._on_queue_position = on_queue_position
+		self._on_queue_position_args = on_queue_position_args if on_queue_position_args else ()
+		self._on_queue_position_kwargs = on_queue_position_kwargs if on_queue_position_kwargs else dict()
+
+		self.position = None
+
+	def run(self):
+		self._work()
+
+	def cancel(self):
+		self._cancelled()
+
+	def report_position(self, position, queued):
+		if self._on_queue_position is None:
+			return
+
+		kwargs = dict(self._on_queue_position_kwargs)
+		kwargs.update(dict(_position=position, _queued=queued))
+		self._on_queue_position(*self._on_queue_position_args, **kwargs)
+
+	def __str__(self):
+		return "{slicer}:{source} -> {dest}".format(slicer=self.slicer_name, source=self.source_path, dest=self.dest_path)
+
+
+class SlicingScheduler(object):
+	"""
+	Runs :class:`SlicingJob` instances on a bounded pool of worker threads.
+
+	Queued jobs are processed in order of submission, jobs with high priority before all others. Jobs still
+	waiting in the queue can be cancelled through :meth:`cancel`, running jobs have to be cancelled through
+	their slicer. Every change of a job's position in the queue is reported through its queue position callback.
+
+	Arguments:
+	    workers (int): Number of jobs to run concurrently, defaults to the number of CPUs.
+	"""
+
+	HIGH_PRIO = 0
+	LOW_PRIO = 100
+
+	def __init__(self, workers=None):
+		if not workers:
+			workers = multiprocessing.cpu_count()
+		self.workers = workers
+
+		self._logger = logging.getLogger(__name__)
+		self._condition = threading.Condition(threading.RLock())
+		self._sequence = itertools.count()
+		self._pending = []
+		self._running = []
+		self._threads = []
+
+	@property
+	def queued(self):
+		with self._condition:
+			return len(self._pending)
+
+	@property
+	def running(self):
+		with self._condition:
+			return len(self._running)
+
+	def submit(self, job):
+		"""
+		Enqueues ``job`` for processing by the next free worker.
+
+		Arguments:
+		    job (SlicingJob): The job to enqueue.
+		"""
+		priority = self.__class__.HIGH_PRIO if job.high_priority else self.__class__.LOW_PRIO
+
+		with self._condition:
+			self._start_workers()
+			bisect.insort(self._pending, (priority, next(self._sequence), job))
+			changes = self._position_changes()
+			self._condition.notify()
+
+		self._report_positions(changes)
+
+	def cancel(self, slicer_name, dest_path):
+		"""
+		Cancels the queued job of slicer ``slicer_name`` slicing to ``dest_path``. The job's cancellation callback
+		will be called asynchronously.
+
+		Arguments:
+		    slicer_name (str): Identifier of the slicer of the job to cancel.
+		    dest_path (str): The absolute path to the destination file of the job to cancel.
+
+		Returns:
+		    boolean: True if a queued job was cancelled, False if there is no such job in the queue (it might already
+		        be running though).
+		"""
+		with self._condition:
+			for entry in self._pending:
+				job = entry[2]
+				if job.slicer_name == slicer_name and job.dest_path == dest_path:
+					self._pending.remove(entry)
+					break
+			else:
+				return False
+			changes = self._position_changes()
+
+		self._logger.info("Cancelled queued slicing job {}".format(job))
+
+		# run on a separate thread, the caller might hold locks the callback needs
+		thread = threading.Thread(target=job.cancel, name="SlicingCancel")
+		thread.daemon = True
+		thread.start()
+
+		self._report_positions(changes)
+		return True
+
+	def _start_workers(self):
+		if self._threads:
+			return
+
+		for index in range(self.workers):
+			thread = threading.Thread(target=self._work, name="SlicingWorker-{}".format(index))
+			thread.daemon = True
+			thread.start()
+			self._threads.append(thread)
+		self._logger.info("Slicing up to {} jobs concurrently".format(self.workers))
+
+	def _work(self):
+		while True:
+			with self._condition:
+				while not self._pending:
+					self._condition.wait()
+				_, _, job = self._pending.pop(0)
+				self._running.append(job)
+				job.position = 0
+				changes = [(job, 0)] + self._position_changes()
+
+			self._report_positions(changes)
+
+			try:
+				job.run()
+			except:
+				self._logger.exception("Error while running slicing job {}".format(job))
+			finally:
+				with self._condition:
+					self._running.remove(job)
+
+	def _position_changes(self):
+		changes = []
+		for position, entry in enumerate(self._pending, 1):
+			job = entry[2]
+			if job.position != position:
+				job.position = position
+				changes.append((job, position))
+		return changes
+
+	def _report_positions(self, changes):
+		queued = self.queued
+		for job, position in changes:
+			try:
+				job.report_position(position, queued)
+			except:
+				self._logger.exception("Error while reporting the queue position of slicing job {}".format(job))
@@ -13,7 +13,8 @@
 
         this.options = {
             timeouts: [0, 1, 1, 2, 3, 5, 8, 13, 20, 40, 100],
-            rateSlidingWindowSize: 20
+            rateSlidingWindowSize: 20,
+            deltaUpdates: false
         };
 
         this.socket = undefined;
@@ -24,6 +25,9 @@
         this.rateThrottleFactor = 1;
         this.rateBase = 500;
         this.rateLastMeasurements = [];
+
+        this.currentState = undefined;
+        this.currentSeq = undefined;
     };
 
     OctoPrintSocketClient.prototype.propagateMessage = function(event, data) {
@@ -91,6 +95,56 @@
         this.socket.send(JSON.stringify(data));
     };
 
+    OctoPrintSocketClient.prototype.processCurrentSnapshot = function(data) {
+        this.currentSeq = data.seq;
+        this.currentState = $.extend(true, {}, _.omit(data.data, "serverTime", "temps", "logs", "messages"));
+        this.propagateMessage("current", data.data);
+    };
+
+    OctoPrintSocketClient.prototype.processCurrentPatch = function(data) {
+        if (this.currentState === undefined || data.base !== this.currentSeq) {
+            // we missed an update, ask for a new snapshot
+            this.currentState = undefined;
+            this.currentSeq = undefined;
+            this.sendMessage("resync", true);
+            return;
+        }
+
+        var state = this.currentState;
+        _.each(data.patch, function(operation) {
+            var segments = _.map(operation.path.split("/").slice(1), function(segment) {
+                return segment.replace(/~1/g, "/").replace(/~0/g, "~");
+            });
+            if (!segments.length) {
+                state = operation.value;
+                return;
+            }
+
+            var target = state;
+            _.each(segments.slice(0, -1), function(segment) {
+                target = target[segment];
+            });
+
+            var key = segments[segments.length - 1];
+            if (operation.op == "remove") {
+                delete target[key];
+            } else {
+                target[key] = operation.value;
+            }
+        });
+
+        this.currentSeq = data.seq;
+        this.currentState = state;
+
+        // handlers get their own copy so they can't tamper with the state the next patch applies to
+        var current = $.extend(true, {}, state);
+        current.serverTime = data.serverTime;
+        current.temps = data.temps;
+        current.logs = data.logs;
+        current.messages = data.messages;
+        this.propagateMessage("current", current);
+    };
+
     OctoPrintSocketClient.prototype.connect = function(opts) {
         opts = opts || {};
 
@@ -106,6 +160,12 @@
         var onOpen = function() {
             self.reconnecting = false;
             self.reconnectTrial = 0;
+
+            self.currentState = undefined;
+            self.currentSeq = undefined;
+            if (self.options.deltaUpdates) {
+                self.sendMessage("delta", true);
+            }
         };
 
         var onClose = function(e) {
@@ -128,7 +188,13 @@
 
         var onMessage = function(msg) {
             _.each(msg.data, function(data, key) {
-                self.propagateMessage(key, data);
+                if (key == "currentSnapshot") {
+                    self.processCurrentSnapshot(data);
+                } else if (key == "currentPatch") {
+                    self.processCurrentPatch(data);
+                } else {
+                    self.propagateMessage(key, data);
+                }
             });
         };
 
@@ -270,6 +270,9 @@ $(function() {
                 case "estimate": {
                     return gettext("Based on the calculated estimate (best accuracy)");
                 }
+                case "curve": {
+                    return gettext("Based on the progress curve learned from past prints of this model with the same printer profile (best accuracy)");
+                }
                 default: {
                     return "";
                 }
@@ -288,7 +291,8 @@ $(function() {
                 }
                 case "average":
                 case "mixed-average":
-                case "estimate": {
+                case "estimate":
+                case "curve": {
                     return "text-success";
                 }
             }
@@ -1,8 +1,10 @@
 # coding=utf-8
 from __future__ import absolute_import
 import os
+import re
 import threading
 import time
+import tempfile
 import Queue as queue
 import logging
 
@@ -15,6 +17,43 @@ from octoprint.util import comm, get_exception_string, sanitize_ascii, RepeatedT
 __author__ = "BEEVC - Electronic Systems"
 __license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agpl.html"
 
+# Dispatch table of the printer responses that need special treatment, mapping the marker identifying a response to
+# the name of the BeeCom method handling it
+_response_handlers = {
+    "SD init fail": "_onSdInitFailed",
+    "volume.init failed": "_onSdInitFailed",
+    "openRoot failed": "_onSdInitFailed",
+    "Not SD printing": "_onNotSdPrinting",
+    "SD card ok": "_onSdCardOk",
+    "Begin file list": "_onBeginFileList",
+    "End file list": "_onEndFileList",
+    "SD printing byte": "_onSdPrintingByte",
+    "File opened": "_onFileOpened",
+    "File selected": "_onFileSelected",
+    "Writing to file": "_onWritingToFile",
+    "Done saving file": "_onDoneSavingFile",
+    "File deleted": "_onFileDeleted"
+}
+
+_temperature_response_regex = re.compile("(^| )(T0?|B):")
+_response_marker_regex = re.compile("|".join(re.escape(marker) for marker in _response_handlers))
+
+
+def classify_response(line):
+    """
+    Classifies a response from the printer with a single regex search instead of checking for every marker in turn
+    :param line: the response line
+    :return: the name of the BeeCom method handling the response or None if it doesn't need special treatment
+    """
+    if _temperature_response_regex.search(line) is not None:
+        return "_onTemperatures"
+
+    match = _response_marker_regex.search(line)
+    if match is not None:
+        return _response_handlers[match.group(0)]
+
+    return None
+
 class BeeCom(MachineCom):
     STATE_PREPARING_PRINT = 22
     STATE_HEATING = 23
@@ -24,7 +63,6 @@ class BeeCom(MachineCom):
     _beeConn = None
     _beeCommands = None
 
-    _responseQueue = queue.Queue()
     _statusQueue = queue.Queue()
 
     _monitor_print_progress = True
@@ -33,11 +71,13 @@ class BeeCom(MachineCom):
     _preparing_print = False
     _resume_print_thread = None
     _transferProgress = 0
+    _transferThroughput = None
     _heatingProgress = 0
 
     def __init__(self, callbackObject=None, printerProfileManager=None):
         super(BeeCom, self).__init__(None, None, callbackObject, printerProfileManager)
 
+        self._responseQueue = queue.Queue()
         self._openConnection()
         self._heating = False
 
@@ -259,6 +299,10 @@ class BeeCom(MachineCom):
         if self._beeCommands is not None:
             self._beeCommands.stopPrintStatusMonitor()
 
+        # wakes up the monitor thread blocked on the response queue so that it can exit
+        self._monitoring_active = False
+        self._responseQueue.put(None)
+
         if self._beeConn is not None:
             try:
                 self._beeConn.close()
@@ -644,31 +688,57 @@ class BeeCom(MachineCom):
 
     def startFileTransfer(self, filename, localFilename, remoteFilename):
         """
-        Transfers a file to the printer's SD Card
+        Transfers a file to the printer's SD Card. Unless disabled, the file is minified first (see
+        usb.transfer.minify) so that less data goes across the link.
         """
         if not self.isOperational() or self.isBusy():
             self._log("Printer is not operation or busy")
             return
 
+        transferFilename = filename
         try:
             self._currentFile = comm.StreamingGcodeFileInformation(filename, localFilename, remoteFilename)
             self._currentFile.start()
 
-            # starts the transfer
-            self._beeCommands.transferSDFile(filename, localFilename)
+            originalSize = self._currentFile.getFilesize()
+            transferSize = originalSize
+            if settings().getBoolean(["usb", "transfer", "minify"]):
+                transferFilename = self._prepareTransferFile(filename)
+                transferSize = os.stat(transferFilename).st_size
+                self._logger.info("Minified %s for the transfer from %d to %d bytes" % (localFilename, originalSize, transferSize))
 
-            eventManager().fire(Events.TRANSFER_STARTED, {"local": localFilename, "remote": remoteFilename})
-            self._callback.on_comm_file_transfer_started(remoteFilename, self._currentFile.getFilesize())
+            # starts the transfer
+            startTime = time.time()
+            self._beeCommands.transferSDFile(transferFilename, localFilename)
+
+            eta = None
+            if self._transferThroughput:
+                eta = transferSize / self._transferThroughput
+            eventManager().fire(Events.TRANSFER_STARTED, {
+                "local": localFilename,
+                "remote": remoteFilename,
+                "size": transferSize,
+                "originalSize": originalSize,
+                "throughput": self._transferThroughput,
+                "eta": eta
+            })
+            self._callback.on_comm_file_transfer_started(remoteFilename, transferSize)
 
             # waits for transfer to end
-            while self._beeCommands.getTransferCompletionState() > 0:
-                time.sleep(2)
+            self._waitForTransfer(localFilename, remoteFilename, transferSize, startTime)
+
+            # transfers shorter than a poll interval don't tell the throughput reliably
+            elapsed = time.time() - startTime
+            if elapsed >= settings().getFloat(["usb", "transfer", "pollInterval"]):
+                self._transferThroughput = transferSize / elapsed
 
             remote = self._currentFile.getRemoteFilename()
             payload = {
                 "local": self._currentFile.getLocalFilename(),
                 "remote": remote,
-                "time": self.getPrintTime()
+                "time": elapsed,
+                "size": transferSize,
+                "throughput": self._transferThroughput
             }
 
             self._currentFile = None
@@ -678,7 +748,75 @@ class BeeCom(MachineCom):
             self.refreshSdFiles()
 
         except Exception as ex:
-            self._logger.error("Error setting printer in shutdown mode: %s", str(ex))
+            self._logger.error("Error transferring file to the printer: %s", str(ex))
+        finally:
+            if transferFilename != filename:
+                try:
+                    os.remove(transferFilename)
+                except OSError:
+                    self._logger.warn("Could not remove the prepared transfer file %s" % transferFilename)
+
+    def _prepareTransferFile(self, filename):
+        """
+        Writes a minified copy of the file to transfer into a temporary file
+        :param filename: path of the file to transfer
+        :return: path of the temporary file, to be removed after the transfer
+        """
+        handle, transferFilename = tempfile.mkstemp(prefix="transfer-", suffix=".gcode")
+        os.close(handle)
+
+        try:
+            comm.minify_gcode_file(filename, transferFilename,
+                                   compact_numbers=settings().getBoolean(["usb", "transfer", "compactNumbers"]))
+        except:
+            os.remove(transferFilename)
+            raise
+
+        return transferFilename
+
+    def _waitForTransfer(self, localFilename, remoteFilename, size, startTime):
+        """
+        Waits for the transfer to start and then to finish. Fires a TRANSFER_PROGRESS event with the current
+        throughput and the estimated time left whenever the progress advanced by at least a percent. The checks become
+        more frequent as the end of the transfer approaches, so that its end is noticed without delay.
+        :param localFilename: the file's name as stored locally
+        :param remoteFilename: the file's name as stored on SD
+        :param size: the number of bytes transferred
+        :param startTime: the time the transfer started at
+        :return:
+        """
+        interval = settings().getFloat(["usb", "transfer", "pollInterval"])
+        lastReported = 0
+
+        # the transfer thread only flags the transfer once it runs, until then there's a transfer state while it's
+        # alive but it isn't transferring yet
+        while not self._beeCommands.isTransferring() and self._beeCommands.getTransferCompletionState() is not None:
+            time.sleep(0.05)
+
+        while self._beeCommands.isTransferring():
+            progress = self._beeCommands.getTransferState() or 0.0
+            elapsed = time.time() - startTime
+
+            eta = None
+            if progress > 0 and elapsed > 0:
+                throughput = progress * size / elapsed
+                eta = (1.0 - progress) * size / throughput
+
+                if int(progress * 100) > lastReported:
+                    lastReported = int(progress * 100)
+                    self._callback._setProgressData(progress, int(progress * size), elapsed, eta)
+                    eventManager().fire(Events.TRANSFER_PROGRESS, {
+                        "local": localFilename,
+                        "remote": remoteFilename,
+                        "progress": lastReported,
+                        "throughput": throughput,
+                        "eta": eta
+                    })
+
+            if eta is not None:
+                time.sleep(max(0.05, min(interval, eta)))
+            else:
+                time.sleep(interval)
 
     def startPrintStatusProgressMonitor(self):
         """
@@ -810,11 +948,11 @@ class BeeCom(MachineCom):
         Auxiliar method to read the command response queue
         :return:
         """
-        self.none = self._beeConn is None
-        if self.none:
-            return None
         try:
+            # blocks until there is a response, close() wakes us up with None
             ret = self._responseQueue.get()
+            if ret is None or self._beeConn is None:
+                return None
         except:
             self._log("Exception raised while reading from command response queue: %s" % (get_exception_string()))
             self._errorValue = get_exception_string()
@@ -904,69 +1042,14 @@ class BeeCom(MachineCom):
                     self._clear_to_send.set()
                     self._long_running_command = False
 
-                ##~~ Temperature processing
-                if ' T:' in line or line.startswith('T:') or ' T0:' in line or line.startswith('T0:') \
-                        or ' B:' in line or line.startswith('B:'):
-
-                    self._processTemperatures(line)
-                    self._callback.on_comm_temperature_update(self._temp, self._bedTemp)
-
-                ##~~ SD Card handling
-                elif 'SD init fail' in line or 'volume.init failed' in line or 'openRoot failed' in line:
-                    self._sdAvailable = False
-                    self._sdFiles = []
-                    self._callback.on_comm_sd_state_change(self._sdAvailable)
-                elif 'Not SD printing' in line:
-                    if self.isSdFileSelected() and self.isPrinting():
-                        # something went wrong, printer is reporting that we actually are not printing right now...
-                        self._sdFilePos = 0
-                        self._changeState(self.STATE_OPERATIONAL)
-                elif 'SD card ok' in line and not self._sdAvailable:
-                    self._sdAvailable = True
-                    self.refreshSdFiles()
-                    self._callback.on_comm_sd_state_change(self._sdAvailable)
-                elif 'Begin file list' in line:
-                    self._sdFiles = []
-                    self._sdFileList = True
-                elif 'End file list' in line:
-                    self._sdFileList = False
-                    self._callback.on_comm_sd_files(self._sdFiles)
-                elif 'SD printing byte' in line and self.isSdPrinting():
-                    # answer to M27, at least on Marlin, Repetier and Sprinter: "SD printing byte %d/%d"
-                    match = regex_sdPrintingByte.search(line)
-                    self._currentFile.setFilepos(int(match.group(1)))
-                    self._callback.on_comm_progress()
-                elif 'File opened' in line and not self._ignore_select:
-                    # answer to M23, at least on Marlin, Repetier and Sprinter: "File opened:%s Size:%d"
-                    match = regex_sdFileOpened.search(line)
-                    if self._sdFileToSelect:
-                        name = self._sdFileToSelect
-                        self._sdFileToSelect = None
-                    else:
-                        name = match.group(1)
-                    self._currentFile = comm.PrintingSdFileInformation(name, int(match.group(2)))
-                elif 'File selected' in line:
-                    if self._ignore_select:
-                        self._ignore_select = False
-                    elif self._currentFile is not None:
-                        # final answer to M23, at least on Marlin, Repetier and Sprinter: "File selected"
-                        self._callback.on_comm_file_selected(self._currentFile.getFilename(), self._currentFile.getFilesize(), True)
-                        eventManager().fire(Events.FILE_SELECTED, {
-                            "file": self._currentFile.getFilename(),
-                            "origin": self._currentFile.getFileLocation()
-                        })
-                elif 'Writing to file' in line:
-                    # answer to M28, at least on Marlin, Repetier and Sprinter: "Writing to file: %s"
-                    self._changeState(self.STATE_PRINTING)
-                    self._clear_to_send.set()
-                    line = "ok"
+                ##~~ Response handling
+                handled = None
+                handler = classify_response(line) if line.strip() != "ok" else None
+                if handler is not None:
+                    handled = getattr(self, handler)(line)
 
-                elif 'Done saving file' in line:
-                    self.refreshSdFiles()
-                elif 'File deleted' in line and line.strip().endswith("ok"):
-                    # buggy Marlin version that doesn't send a proper \r after the "File deleted" statement, fixed in
-                    # current versions
-                    self._clear_to_send.set()
+                if handled is not None:
+                    line = handled
 
                 ##~~ Message handling
                 elif line.strip() != '' \
@@ -1030,6 +1113,97 @@ class BeeCom(MachineCom):
         self._log("Connection closed, closing down monitor")
 
 
+    ##~~ response handlers, see classify_response. They return the line to continue processing with or None if
+    ##~~ the line should be treated as a message
+
+    def _onTemperatures(self, line):
+        self._processTemperatures(line)
+        self._callback.on_comm_temperature_update(self._temp, self._bedTemp)
+        return line
+
+    def _onSdInitFailed(self, line):
+        self._sdAvailable = False
+        self._sdFiles = []
+        self._callback.on_comm_sd_state_change(self._sdAvailable)
+        return line
+
+    def _onNotSdPrinting(self, line):
+        if self.isSdFileSelected() and self.isPrinting():
+            # something went wrong, printer is reporting that we actually are not printing right now...
+            self._sdFilePos = 0
+            self._changeState(self.STATE_OPERATIONAL)
+        return line
+
+    def _onSdCardOk(self, line):
+        if self._sdAvailable:
+            return None
+        self._sdAvailable = True
+        self.refreshSdFiles()
+        self._callback.on_comm_sd_state_change(self._sdAvailable)
+        return line
+
+    def _onBeginFileList(self, line):
+        self._sdFiles = []
+        self._sdFileList = True
+        return line
+
+    def _onEndFileList(self, line):
+        self._sdFileList = False
+        self._callback.on_comm_sd_files(self._sdFiles)
+        return line
+
+    def _onSdPrintingByte(self, line):
+        if not self.isSdPrinting():
+            return None
+        # answer to M27, at least on Marlin, Repetier and Sprinter: "SD printing byte %d/%d"
+        match = regex_sdPrintingByte.search(line)
+        self._currentFile.setFilepos(int(match.group(1)))
+        self._callback.on_comm_progress()
+        return line
+
+    def _onFileOpened(self, line):
+        if self._ignore_select:
+            return None
+        # answer to M23, at least on Marlin, Repetier and Sprinter: "File opened:%s Size:%d"
+        match = regex_sdFileOpened.search(line)
+        if self._sdFileToSelect:
+            name = self._sdFileToSelect
+            self._sdFileToSelect = None
+        else:
+            name = match.group(1)
+        self._currentFile = comm.PrintingSdFileInformation(name, int(match.group(2)))
+        return line
+
+    def _onFileSelected(self, line):
+        if self._ignore_select:
+            self._ignore_select = False
+        elif self._currentFile is not None:
+            # final answer to M23, at least on Marlin, Repetier and Sprinter: "File selected"
+            self._callback.on_comm_file_selected(self._currentFile.getFilename(), self._currentFile.getFilesize(), True)
+            eventManager().fire(Events.FILE_SELECTED, {
+                "file": self._currentFile.getFilename(),
+                "origin": self._currentFile.getFileLocation()
+            })
+        return line
+
+    def _onWritingToFile(self, line):
+        # answer to M28, at least on Marlin, Repetier and Sprinter: "Writing to file: %s"
+        self._changeState(self.STATE_PRINTING)
+        self._clear_to_send.set()
+        return "ok"
+
+    def _onDoneSavingFile(self, line):
+        self.refreshSdFiles()
+        return line
+
+    def _onFileDeleted(self, line):
+        if not line.strip().endswith("ok"):
+            return None
+        # buggy Marlin version that doesn't send a proper \r after the "File deleted" statement, fixed in
+        # current versions
+        self._clear_to_send.set()
+        return line
+
     def _statusProgressQueueCallback(self, status_obj):
         """
         Auxiliar callback method to push the status object that comes from the printer into the queue
@@ -1049,7 +1223,7 @@ class BeeCom(MachineCom):
         # starts the connection monitor thread
         self._beeConn.startConnectionMonitor()
 
-        self._temperature_timer = RepeatedTimer(self._timeout_intervals.get("temperature", 4.0), self._poll_temperature, run_first=True)
+        self._temperature_timer = RepeatedTimer(self._getTemperatureTimerInterval, self._poll_temperature, run_first=True)
         self._temperature_timer.start()
 
         if self._sdAvailable:
@@ -1060,6 +1234,15 @@ class BeeCom(MachineCom):
         payload = dict(port=self._port, baudrate=self._baudrate)
         eventManager().fire(Events.CONNECTED, payload)
 
+    def _getTemperatureTimerInterval(self):
+        """
+        Polls at the regular intervals while somebody is subscribed to the temperatures or the printer is busy,
+        otherwise only every serial.timeout.temperatureUnobserved seconds
+        """
+        if self.isBusy() or self._heating or self._callback.has_temperature_subscribers():
+            return super(BeeCom, self)._getTemperatureTimerInterval()
+        return self._timeout_intervals.get("temperatureUnobserved", 30.0)
+
     def _poll_temperature(self):
         """
         Polls the temperature after the temperature timeout, re-enqueues itself.
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Printrun.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import sys
 import re
 import math
@@ -568,6 +569,349 @@ class GCode(object):
         self.duration = totaltime
         return self.duration.total_seconds()
 
+class AnalysisAborted(Exception):
+    def __init__(self, reenqueue = True, *args, **kwargs):
+        Exception.__init__(self, *args, **kwargs)
+        self.reenqueue = reenqueue
+
+class GCodeAnalyser(object):
+    """Single pass, constant memory counterpart to :class:`GCode`.
+
+    Lines are fed one at a time through :meth:`feed` and discarded right
+    away, only the running state of the preprocessing, layer detection,
+    dimension and duration passes of :class:`GCode` is kept. The numbers
+    returned by :meth:`result` match those of a full :class:`GCode` object
+    built from the same data."""
+
+    acceleration = 2000.0  # mm/s^2, see GCode.estimate_duration
+
+    # number of lines between two progress reports in load
+    report_interval = 1000
+
+    def __init__(self, home_pos = None):
+        self.home_x, self.home_y, self.home_z = home_pos if home_pos else (0, 0, 0)
+
+        self.line_count = 0
+
+        self._abort = False
+        self._reenqueue = True
+
+        # _preprocess_lines
+        self.imperial = False
+        self.relative = False
+        self.relative_e = False
+        self.current_tool = 0
+        self.current_x = self.current_y = self.current_z = 0
+        self.offset_x = self.offset_y = self.offset_z = 0
+
+        # _preprocess_extrusion
+        self.current_e = 0
+        self.offset_e = 0
+        self.total_e = 0
+        self.max_e = 0
+
+        # _create_layers, only the z of each layer is kept
+        self.est_layer_height = None
+        self._layer_zs = []
+        self._layers_with_moves = set()
+        self._last_layer_z = None
+        self._prev_z = None
+        self._prev_base_z = (None, None)
+        self._cur_z = None
+        self._cur_lines = 0
+        self._cur_has_movement = False
+
+        # _preprocess_layers, bounds of extruding moves and of all moves since
+        # the latter are used if the file does not extrude at all
+        inf = float("inf")
+        self._bounds_e = [inf, -inf, inf, -inf, 0, -inf]
+        self._bounds_all = [inf, -inf, inf, -inf, 0, -inf]
+
+        # estimate_duration
+        self._lastx = self._lasty = self._lastz = self._laste = self._lastf = 0.0
+        self._lastdx = self._lastdy = 0
+        self._totalduration = 0.0
+
+    def load(self, filePath, progress_callback = None, throttle = None):
+        """Feeds the whole file at ``filePath`` through the analyser.
+
+        The abort flag set by :meth:`abort` is checked on every line, in which
+        case :class:`AnalysisAborted` is raised. Every ``report_interval``
+        lines ``progress_callback`` is called with the fraction of the file
+        read so far, ``throttle`` is called on every line with the number of
+        lines and bytes read, like in gcodeInterpreter."""
+        file_size = os.stat(filePath).st_size
+        read_bytes = 0
+        line_no = 0
+
+        with open(filePath, "rU") as f:
+            for line in f:
+                if self._abort:
+                    raise AnalysisAborted(reenqueue = self._reenqueue)
+
+                line_no += 1
+                read_bytes += len(line)
+                self.feed(line)
+
+                if progress_callback is not None and line_no % self.report_interval == 0 and file_size:
+                    progress_callback(min(float(read_bytes) / file_size, 1.0))
+                if throttle is not None:
+                    throttle(line_no, read_bytes)
+
+        if progress_callback is not None:
+            progress_callback(1.0)
+
+    def abort(self, reenqueue = True):
+        self._abort = True
+        self._reenqueue = reenqueue
+
+    def feed(self, raw):
+        raw = raw.strip()
+        if not raw:
+            return
+        self.line_count += 1
+
+        line = Line(raw)
+        self._preprocess_line(line)
+        self._preprocess_extrusion(line)
+        self._track_layers(line)
+        self._track_bounds(line)
+        self._track_duration(line)
+
+    def _preprocess_line(self, line):
+        split_raw = split(line)
+        if not line.command:
+            return
+
+        if line.is_move:
+            line.relative = self.relative
+            line.relative_e = self.relative_e
+            line.current_tool = self.current_tool
+        elif line.command == "G20":
+            self.imperial = True
+        elif line.command == "G21":
+            self.imperial = False
+        elif line.command == "G90":
+            self.relative = False
+            self.relative_e = False
+        elif line.command == "G91":
+            self.relative = True
+            self.relative_e = True
+        elif line.command == "M82":
+            self.relative_e = False
+        elif line.command == "M83":
+            self.relative_e = True
+        elif line.command[0] == "T":
+            self.current_tool = int(line.command[1:])
+
+        if line.command[0] == "G":
+            parse_coordinates(line, split_raw, self.imperial)
+
+        if line.is_move:
+            x = line.x
+            y = line.y
+            z = line.z
+
+            if line.relative:
+                x = self.current_x + (x or 0)
+                y = self.current_y + (y or 0)
+                z = self.current_z + (z or 0)
+            else:
+                if x is not None: x = x + self.offset_x
+                if y is not None: y = y + self.offset_y
+                if z is not None: z = z + self.offset_z
+
+            if x is not None: self.current_x = x
+            if y is not None: self.current_y = y
+            if z is not None: self.current_z = z
+
+        elif line.command == "G28":
+            home_all = not any([line.x, line.y, line.z])
+            if home_all or line.x is not None:
+                self.offset_x = 0
+                self.current_x = self.home_x
+            if home_all or line.y is not None:
+                self.offset_y = 0
+                self.current_y = self.home_y
+            if home_all or line.z is not None:
+                self.offset_z = 0
+                self.current_z = self.home_z
+
+        elif line.command == "G92":
+            if line.x is not None: self.offset_x = self.current_x - line.x
+            if line.y is not None: self.offset_y = self.current_y - line.y
+            if line.z is not None: self.offset_z = self.current_z - line.z
+
+        line.current_x = self.current_x
+        line.current_y = self.current_y
+        line.current_z = self.current_z
+
+    def _preprocess_extrusion(self, line):
+        if line.e is None:
+            return
+        if line.is_move:
+            if line.relative_e:
+                line.extruding = line.e > 0
+                self.total_e += line.e
+                self.current_e += line.e
+            else:
+                new_e = line.e + self.offset_e
+                line.extruding = new_e > self.current_e
+                self.total_e += new_e - self.current_e
+                self.current_e = new_e
+            self.max_e = max(self.max_e, self.total_e)
+        elif line.command == "G92":
+            self.offset_e = self.current_e - line.e
+
+    def _track_layers(self, line):
+        if line.command == "G92" and line.z is not None:
+            self._cur_z = line.z
+        elif line.is_move:
+            if line.z is not None:
+                if line.relative and self._cur_z is not None:
+                    self._cur_z += line.z
+                else:
+                    self._cur_z = line.z
+
+        cur_z = self._cur_z
+        prev_z = self._prev_z
+        if cur_z != prev_z:
+            if prev_z is not None and self._last_layer_z is not None:
+                offset = self.est_layer_height if self.est_layer_height else 0.01
+                if abs(prev_z - self._last_layer_z) < offset:
+                    if self.est_layer_height is None:
+                        zs = sorted([z for z in self._layer_zs if z is not None])
+                        heights = [round(zs[i + 1] - zs[i], 3) for i in range(len(zs) - 1)]
+                        heights = [height for height in heights if height]
+                        if len(heights) >= 2: self.est_layer_height = heights[1]
+                        elif heights: self.est_layer_height = heights[0]
+                        else: self.est_layer_height = 0.1
+                    base_z = round(prev_z - (prev_z % self.est_layer_height), 2)
+                else:
+                    base_z = round(prev_z, 2)
+            else:
+                base_z = prev_z
+
+            if base_z != self._prev_base_z:
+                # GCode files the finished lines under the new base z
+                self._layer_zs.append(base_z)
+                if self._cur_has_movement:
+                    self._layers_with_moves.add(base_z)
+                self._cur_lines = 0
+                self._cur_has_movement = False
+                self._last_layer_z = base_z
+
+            self._prev_base_z = base_z
+
+        self._cur_lines += 1
+        if line.is_move and line.e is not None:
+            self._cur_has_movement = True
+        self._prev_z = cur_z
+
+    def _track_bounds(self, line):
+        if not line.is_move:
+            return
+
+        bounds = [self._bounds_all]
+        if line.extruding:
+            bounds.append(self._bounds_e)
+
+        for b in bounds:
+            if line.current_x is not None:
+                b[0] = min(b[0], line.current_x)
+                b[1] = max(b[1], line.current_x)
+            if line.current_y is not None:
+                b[2] = min(b[2], line.current_y)
+                b[3] = max(b[3], line.current_y)
+            if line.current_z is not None:
+                b[4] = min(b[4], line.current_z)
+                b[5] = max(b[5], line.current_z)
+
+    def _track_duration(self, line):
+        if line.command not in ["G1", "G0", "G4"]:
+            return
+        if line.command == "G4":
+            moveduration = P(line)
+            if moveduration:
+                self._totalduration += moveduration / 1000.0
+            return
+
+        lastx = self._lastx
+        lasty = self._lasty
+        lastz = self._lastz
+        laste = self._laste
+        lastf = self._lastf
+
+        x = line.x if line.x is not None else lastx
+        y = line.y if line.y is not None else lasty
+        z = line.z if line.z is not None else lastz
+        e = line.e if line.e is not None else laste
+        # mm/s vs mm/m => divide by 60
+        f = line.f / 60.0 if line.f is not None else lastf
+
+        # see GCode.estimate_duration for the reasoning behind this
+        dx = x - lastx
+        dy = y - lasty
+        if dx * self._lastdx + dy * self._lastdy <= 0:
+            lastf = 0
+
+        currenttravel = math.hypot(dx, dy)
+        if currenttravel == 0:
+            if line.z is not None:
+                currenttravel = abs(line.z) if line.relative else abs(line.z - lastz)
+            elif line.e is not None:
+                currenttravel = abs(line.e) if line.relative_e else abs(line.e - laste)
+        if f == lastf:
+            moveduration = currenttravel / f if f != 0 else 0.
+        else:
+            distance = 2 * abs(((lastf + f) * (f - lastf) * 0.5) / self.acceleration)
+            if distance <= currenttravel and lastf + f != 0 and f != 0:
+                moveduration = 2 * distance / (lastf + f)
+                moveduration += (currenttravel - distance) / f
+            else:
+                moveduration = 2 * currenttravel / (lastf + f)
+
+        self._lastdx = dx
+        self._lastdy = dy
+        self._totalduration += moveduration
+
+        self._lastx = x
+        self._lasty = y
+        self._lastz = z
+        self._laste = e
+        self._lastf = f
+
+    def num_layers(self):
+        layers = set(self._layers_with_moves)
+        if self._cur_lines and self._cur_has_movement:
+            layers.add(self._prev_z)
+        return len(layers)
+
+    def dimensions(self):
+        # Count moves without extrusion if filament length is lower than 0
+        bounds = self._bounds_all if self.max_e <= 0 else self._bounds_e
+        xmin, xmax, ymin, ymax, zmin, zmax = [v if not math.isinf(v) else 0 for v in bounds]
+        return dict(xmin=xmin, xmax=xmax, width=xmax - xmin,
+                    ymin=ymin, ymax=ymax, depth=ymax - ymin,
+                    zmin=zmin, zmax=zmax, height=zmax - zmin)
+
+    def estimate_duration(self):
+        return datetime.timedelta(seconds = int(self._totalduration)).total_seconds()
+
+    def result(self):
+        dims = self.dimensions()
+
+        result = dict()
+        result['xdims'] = {'min': dims['xmin'], 'max': dims['xmax'], 'width': dims['width']}
+        result['ydims'] = {'min': dims['ymin'], 'max': dims['ymax'], 'width': dims['depth']}
+        result['zdims'] = {'min': dims['zmin'], 'max': dims['zmax'], 'width': dims['height']}
+
+        result['filament_used'] = self.max_e
+        result['num_layers'] = self.num_layers()
+        result['estimated_duration'] = self.estimate_duration()
+        result['gcode_lines'] = self.line_count
+        return result
+
 def main():
     if len(sys.argv) < 2:
         print "usage: %s filename.gcode" % sys.argv[0]
@@ -591,19 +935,9 @@ def analyse(filePath):
     if filePath is None:
         return None
 
-    gCode = GCode(open(filePath, "rU"))
-
-    result = dict()
-    result['xdims'] = {'min': gCode.xmin, 'max': gCode.xmax, 'width': gCode.width}
-    result['ydims'] = {'min': gCode.ymin, 'max': gCode.ymax, 'width': gCode.depth}
-    result['ydims'] = {'min': gCode.zmin, 'max': gCode.zmax, 'width': gCode.height}
-
-    result['filament_used'] = gCode.filament_length
-    result['num_layers'] = gCode.num_layers()
-    result['estimated_duration'] = gCode.estimate_duration()
-    result['gcode_lines'] = len(gCode.lines)
-
-    return result
+    analyser = GCodeAnalyser()
+    analyser.load(filePath)
+    return analyser.result()
 
 if __name__ == '__main__':
     main()
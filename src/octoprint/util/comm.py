@@ -10,6 +10,11 @@ import glob
 import time
 import re
 import threading
+import operator
+import codecs
+import struct
+import mmap
+import hashlib
 try:
 	import queue
 except ImportError:
@@ -19,6 +24,7 @@ import serial
 import octoprint.plugin
 
 from collections import deque
+from functools import reduce
 
 from octoprint.util.avr_isp import stk500v2
 from octoprint.util.avr_isp import ispBase
@@ -28,7 +34,7 @@ from octoprint.events import eventManager, Events
 from octoprint.filemanager import valid_file_type
 from octoprint.filemanager.destinations import FileDestinations
 from octoprint.util import get_exception_string, sanitize_ascii, filter_non_ascii, CountedEvent, RepeatedTimer, \
-	to_unicode, bom_aware_open, TypedQueue, TypeAlreadyInQueue, chunks
+	to_unicode, bom_aware_open, TypedQueue, TypeAlreadyInQueue, chunks, atomic_write
 
 try:
 	import _winreg
@@ -130,6 +136,17 @@ regex_firmware_splitter = re.compile("\s*([A-Z0-9_]+):")
 regex_resend_linenumber = re.compile("(N|N:)?(?P<n>%s)" % regex_int_pattern)
 """Regex to use for request line numbers in resend requests"""
 
+regex_advanced_ok = re.compile("^ok(\s+N(?P<line>%s))?\s+P(?P<planner>%s)\s+B(?P<buffer>%s)" % (regex_int_pattern, regex_int_pattern, regex_int_pattern))
+"""Regex for matching acknowledgements that report the firmware's free buffer space (Marlin's ``ADVANCED_OK``), e.g.
+``ok N123 P15 B3``.
+
+Groups will be as follows:
+
+  * ``line``: line number of the acknowledged command, optional
+  * ``planner``: free slots in the planner buffer
+  * ``buffer``: free slots in the serial command buffer
+"""
+
 def serialList():
 	baselist=[]
 	if os.name=="nt":
@@ -350,10 +367,19 @@ class MachineCom(object):
 		self._log_resends_max = 5
 		self._log_resends_rate_frame = 60
 
-		self._long_running_commands = settings().get(["serial", "longRunningCommands"])
-		self._checksum_requiring_commands = settings().get(["serial", "checksumRequiringCommands"])
+		self._long_running_commands = frozenset()
+		self._checksum_requiring_commands = frozenset()
 
 		self._clear_to_send = CountedEvent(max=10, name="comm.clear_to_send")
+		self._send_window = None
+		if settings().getBoolean(["serial", "sendWindow", "enabled"]):
+			self._send_window = SendWindow(self._clear_to_send,
+			                               size=settings().getInt(["serial", "sendWindow", "commands"]),
+			                               buffer_size=settings().getInt(["serial", "sendWindow", "bufferSize"]))
+		self._last_sent_length = 0
+		self._last_sent_linenumber = None
+		self._send_window_lock = threading.Lock()
+		self._deferred_entries = deque()
 		self._send_queue = TypedQueue()
 		self._temperature_timer = None
 		self._sd_status_timer = None
@@ -361,12 +387,11 @@ class MachineCom(object):
 		# hooks
 		self._pluginManager = octoprint.plugin.plugin_manager()
 
-		self._gcode_hooks = dict(
-			queuing=self._pluginManager.get_hooks("octoprint.comm.protocol.gcode.queuing"),
-			queued=self._pluginManager.get_hooks("octoprint.comm.protocol.gcode.queued"),
-			sending=self._pluginManager.get_hooks("octoprint.comm.protocol.gcode.sending"),
-			sent=self._pluginManager.get_hooks("octoprint.comm.protocol.gcode.sent")
-		)
+		self._gcode_hooks = dict()
+		self._command_phase_handlers = dict()
+		self._supportFAsCommand = False
+		self._prepare_line_processing()
+
 		self._received_message_hooks = self._pluginManager.get_hooks("octoprint.comm.protocol.gcode.received")
 
 		self._printer_action_hooks = self._pluginManager.get_hooks("octoprint.comm.protocol.action")
@@ -753,6 +778,7 @@ class MachineCom(object):
 
 		try:
 			with self._jobLock:
+				self._prepare_line_processing()
 				self._currentFile.start()
 
 				self._changeState(self.STATE_PRINTING)
@@ -823,6 +849,10 @@ class MachineCom(object):
 
 			self._sdFileToSelect = filename
 			self.sendCommand("M23 %s" % filename)
+		elif settings().getBoolean(["feature", "preparePrintJobs"]):
+			self._currentFile = PreparedGcodeFileInformation(filename, offsets_callback=self.getOffsets, current_tool_callback=self.getCurrentTool)
+			self._currentFile.prepare(background=True)
+			self._callback.on_comm_file_selected(filename, self._currentFile.getFilesize(), False)
 		else:
 			self._currentFile = PrintingGcodeFileInformation(filename, offsets_callback=self.getOffsets, current_tool_callback=self.getCurrentTool)
 			self._callback.on_comm_file_selected(filename, self._currentFile.getFilesize(), False)
@@ -1153,7 +1183,7 @@ class MachineCom(object):
 				if line.startswith("ok") or (self.isPrinting() and supportWait and line == "wait"):
 					# ok only considered handled if it's alone on the line, might be
 					# a response to an M105 or an M114
-					self._handle_ok()
+					self._handle_ok(line)
 					needs_further_handling = "T:" in line or "T0:" in line or "B:" in line or "C:" in line or \
 					                         "X:" in line or "NAME:" in line
 					handled = (line == "wait" or line == "ok" or not needs_further_handling)
@@ -1424,7 +1454,7 @@ class MachineCom(object):
 					elif line.startswith("ok") or (supportWait and line == "wait"):
 						if line == "wait":
 							# if it was a wait we probably missed an ok, so let's simulate that now
-							self._handle_ok()
+							self._handle_ok(line)
 						self._onConnected()
 					elif time.time() > self._timeout:
 						self._log("There was a timeout while trying to connect to the printer")
@@ -1452,8 +1482,24 @@ class MachineCom(object):
 				self.close(is_error=True)
 		self._log("Connection closed, closing down monitor")
 
-	def _handle_ok(self):
-		self._clear_to_send.set()
+	def _handle_ok(self, line=None):
+		if self._send_window is None:
+			self._clear_to_send.set()
+		elif line == "wait":
+			# the firmware is idle and waiting for commands, so we probably missed an ok - let another command through,
+			# but don't consider any of those in flight as acknowledged
+			self._send_window.open()
+		elif self._send_window.take_stale_ack():
+			# acknowledgement for a line the firmware discarded after requesting a resend, the resend itself has
+			# already been taken care of
+			return
+		else:
+			linenumber = free_buffer = None
+			if line:
+				parsed = parse_advanced_ok_line(line)
+				if parsed is not None:
+					linenumber, _, free_buffer = parsed
+			self._send_window.acknowledge(free_buffer=free_buffer, linenumber=linenumber)
 
 		# reset long running commands, persisted current tools and heatup counters on ok
 
@@ -1474,7 +1520,7 @@ class MachineCom(object):
 			self._resendNextCommand()
 		else:
 			self._resendActive = False
-			self._continue_sending()
+			self._refill_send_queue()
 
 		return
 
@@ -1512,6 +1558,7 @@ class MachineCom(object):
 			message = "Communication timeout during an active resend, resending same line again to trigger response from printer."
 			self._logger.info(message)
 			self._log(message + " " + general_message)
+			self._reset_send_window()
 			if self._resendSameCommand():
 				self._clear_to_send.set()
 
@@ -1530,6 +1577,7 @@ class MachineCom(object):
 			message = "Communication timeout while printing, trying to trigger response from printer."
 			self._logger.info(message)
 			self._log(message + " " + general_message)
+			self._reset_send_window()
 			if self._sendCommand("M105", cmd_type="temperature"):
 				self._clear_to_send.set()
 
@@ -1538,14 +1586,48 @@ class MachineCom(object):
 			message = "Communication timeout while idle, trying to trigger response from printer."
 			self._logger.info(message)
 			self._log(message + " " + general_message)
+			self._reset_send_window()
 			self._clear_to_send.set()
 
+	def _reset_send_window(self):
+		if self._send_window is not None:
+			# acknowledgements of whatever is still considered in flight got lost, start over
+			self._send_window.reset()
+
 	def _finish_heatup(self):
 		if self._heatupWaitStartTime:
 			self._heatupWaitTimeLost = self._heatupWaitTimeLost + (time.time() - self._heatupWaitStartTime)
 			self._heatupWaitStartTime = None
 			self._heating = False
 
+	def _refill_send_queue(self):
+		"""
+		Enqueues the next command from the command queue or the print job for sending, once the previous one is on
+		its way.
+
+		Without a send window that happens on every ``ok``. With a send window commands are sent ahead of their
+		acknowledgements, so both sent commands and acknowledgements ask for the next one. Only a single command is
+		kept waiting in the send queue then, none while a resend is active, and the commands held back during a resend
+		go first once it's done.
+		"""
+		if self._send_window is None:
+			return self._continue_sending()
+
+		with self._send_window_lock:
+			if self._resendActive:
+				return False
+
+			if self._deferred_entries:
+				while self._deferred_entries:
+					command, linenumber, command_type, on_sent = self._deferred_entries.popleft()
+					self._enqueue_for_sending(command, linenumber=linenumber, command_type=command_type, on_sent=on_sent)
+				return True
+
+			if self._send_queue.qsize():
+				return False
+
+			return self._continue_sending()
+
 	def _continue_sending(self):
 		while self._active:
 
@@ -1907,6 +1989,12 @@ class MachineCom(object):
 			if lineToResend is None:
 				return False
 
+			if self._send_window is not None and self._send_window.take_discarded():
+				# with several lines in flight, the firmware rejects each one we sent after the requested line with
+				# another resend request
+				self._logger.debug("Ignoring resend request for line %d, that originates from a line we sent ahead before we got the first resend request" % lineToResend)
+				return True
+
 			if self._resendDelta is None and lineToResend == self._currentLine:
 				# We don't expect to have an active resend request and the printer is requesting a resend of
 				# a line we haven't yet sent.
@@ -1942,6 +2030,9 @@ class MachineCom(object):
 
 			self._resendActive = True
 			self._resendDelta = resendDelta
+			if self._send_window is not None:
+				# the firmware discarded everything we sent after the requested line
+				self._send_window.reset(discarded=max(0, resendDelta - 1))
 			self._lastResendNumber = lineToResend
 			self._currentResendCount = 0
 			self._resendSwallowRepetitionsCounter = settings().getInt(["feature", "identicalResendsCountdown"])
@@ -2081,76 +2172,9 @@ class MachineCom(object):
 						time.sleep(self._dwelling_until - now)
 						self._dwelling_until = False
 
-					# fetch command, command type and optional linenumber and sent callback from queue
-					command, linenumber, command_type, on_sent = entry
-
-					# some firmwares (e.g. Smoothie) might support additional in-band communication that will not
-					# stick to the acknowledgement behaviour of GCODE, so we check here if we have a GCODE command
-					# at hand here and only clear our clear_to_send flag later if that's the case
-					gcode = gcode_command_for_cmd(command)
-
-					if linenumber is not None:
-						# line number predetermined - this only happens for resends, so we'll use the number and
-						# send directly without any processing (since that already took place on the first sending!)
-						self._do_send_with_checksum(command, linenumber)
-
-					else:
-						# trigger "sending" phase
-						command, _, gcode = self._process_command_phase("sending", command, command_type, gcode=gcode)
-
-						if command is None:
-							# No, we are not going to send this, that was a last-minute bail.
-							# However, since we already are in the send queue, our _monitor
-							# loop won't be triggered with the reply from this unsent command
-							# now, so we try to tickle the processing of any active
-							# command queues manually
-							self._continue_sending()
-
-							# and now let's fetch the next item from the queue
-							continue
-
-						if command.strip() == "":
-							self._logger.info("Refusing to send an empty line to the printer")
-
-							# same here, tickle the queues manually
-							self._continue_sending()
-
-							# and fetch the next item
-							continue
-
-						# now comes the part where we increase line numbers and send stuff - no turning back now
-						command_requiring_checksum = gcode is not None and gcode in self._checksum_requiring_commands
-						command_allowing_checksum = gcode is not None or self._sendChecksumWithUnknownCommands
-						checksum_enabled = not self._neverSendChecksum and (self.isPrinting() or
-						                                                    self._alwaysSendChecksum or
-						                                                    not self._firmwareInfoReceived)
-
-						command_to_send = command.encode("ascii", errors="replace")
-						if command_requiring_checksum or (command_allowing_checksum and checksum_enabled):
-							self._do_increment_and_send_with_checksum(command_to_send)
-						else:
-							self._do_send_without_checksum(command_to_send)
-
-					# trigger "sent" phase and use up one "ok"
-					if on_sent is not None and callable(on_sent):
-						# we have a sent callback for this specific command, let's execute it now
-						on_sent()
-					self._process_command_phase("sent", command, command_type, gcode=gcode)
-
-					# we only need to use up a clear if the command we just sent was either a gcode command or if we also
-					# require ack's for unknown commands
-					use_up_clear = self._unknownCommandsNeedAck
-					if gcode is not None:
-						use_up_clear = True
-
-					if use_up_clear:
-						# if we need to use up a clear, do that now
-						self._clear_to_send.clear()
-					else:
-						# Otherwise we need to tickle the read queue - there might not be a reply
-						# to this command, so our _monitor loop will stay waiting until timeout. We
-						# definitely do not want that, so we tickle the queue manually here
-						self._continue_sending()
+					if not self._send_entry(entry):
+						# nothing was sent, so there's no "ok" to wait for, fetch the next item from the queue
+						continue
 
 				finally:
 					# no matter _how_ we exit this block, we signal that we
@@ -2163,15 +2187,146 @@ class MachineCom(object):
 				self._logger.exception("Caught an exception in the send loop")
 		self._log("Closing down send loop")
 
+	def _send_entry(self, entry):
+		"""
+		Sends a single entry fetched from the send queue.
+
+		Arguments:
+		    entry (tuple): The command, line number, command type and sent callback fetched from the send queue.
+
+		Returns:
+		    bool: Whether the command was actually sent.
+		"""
+
+		# fetch command, command type and optional linenumber and sent callback from queue
+		command, linenumber, command_type, on_sent = entry
+
+		if linenumber is None and self._send_window is not None and self._resendActive:
+			# enqueued before the resend request, this must not get ahead of the resent lines, so we'll hold it back
+			# until the resend is done
+			with self._send_window_lock:
+				self._deferred_entries.append(entry)
+			return False
+
+		# some firmwares (e.g. Smoothie) might support additional in-band communication that will not
+		# stick to the acknowledgement behaviour of GCODE, so we check here if we have a GCODE command
+		# at hand here and only clear our clear_to_send flag later if that's the case
+		gcode = gcode_command_for_cmd(command, support_f=self._supportFAsCommand)
+
+		if linenumber is not None:
+			# line number predetermined - this only happens for resends, so we'll use the number and
+			# send directly without any processing (since that already took place on the first sending!)
+			self._do_send_with_checksum(command, linenumber)
+
+		else:
+			# trigger "sending" phase
+			command, _, gcode = self._process_command_phase("sending", command, command_type, gcode=gcode)
+
+			if command is None:
+				# No, we are not going to send this, that was a last-minute bail.
+				# However, since we already are in the send queue, our _monitor
+				# loop won't be triggered with the reply from this unsent command
+				# now, so we try to tickle the processing of any active
+				# command queues manually
+				self._refill_send_queue()
+
+				# and now let's fetch the next item from the queue
+				return False
+
+			if command.strip() == "":
+				self._logger.info("Refusing to send an empty line to the printer")
+
+				# same here, tickle the queues manually
+				self._refill_send_queue()
+
+				# and fetch the next item
+				return False
+
+			# now comes the part where we increase line numbers and send stuff - no turning back now
+			command_requiring_checksum = gcode is not None and gcode in self._checksum_requiring_commands
+			command_allowing_checksum = gcode is not None or self._sendChecksumWithUnknownCommands
+			checksum_enabled = not self._neverSendChecksum and (self.isPrinting() or
+			                                                    self._alwaysSendChecksum or
+			                                                    not self._firmwareInfoReceived)
+
+			command_to_send = command.encode("ascii", errors="replace")
+			if command_requiring_checksum or (command_allowing_checksum and checksum_enabled):
+				self._do_increment_and_send_with_checksum(command_to_send)
+			else:
+				self._do_send_without_checksum(command_to_send)
+
+		# trigger "sent" phase and use up one "ok"
+		if on_sent is not None and callable(on_sent):
+			# we have a sent callback for this specific command, let's execute it now
+			on_sent()
+		self._process_command_phase("sent", command, command_type, gcode=gcode)
+
+		# we only need to use up a clear if the command we just sent was either a gcode command or if we also
+		# require ack's for unknown commands
+		use_up_clear = self._unknownCommandsNeedAck
+		if gcode is not None:
+			use_up_clear = True
+
+		if use_up_clear and self._send_window is not None:
+			# we may have several commands in flight, the window blocks sending once the firmware's buffer is full, but
+			# we can already line up the next command
+			self._send_window.add(self._last_sent_length, linenumber=self._last_sent_linenumber, single=self._resendActive)
+			self._refill_send_queue()
+		elif use_up_clear:
+			# if we need to use up a clear, do that now
+			self._clear_to_send.clear()
+		else:
+			# Otherwise we need to tickle the read queue - there might not be a reply
+			# to this command, so our _monitor loop will stay waiting until timeout. We
+			# definitely do not want that, so we tickle the queue manually here
+			self._refill_send_queue()
+
+		return True
+
+	def _prepare_line_processing(self):
+		"""
+		Looks up everything the processing of each single line depends on: the settings consulted while parsing
+		commands and the plugin hooks for the command phases. Called once per print instead of once per line.
+		"""
+		self._supportFAsCommand = settings().getBoolean(["feature", "supportFAsCommand"])
+		self._long_running_commands = frozenset(settings().get(["serial", "longRunningCommands"]) or [])
+		self._checksum_requiring_commands = frozenset(settings().get(["serial", "checksumRequiringCommands"]) or [])
+
+		self._gcode_hooks = dict()
+		for phase in ("queuing", "queued", "sending", "sent"):
+			hooks = self._pluginManager.get_hooks("octoprint.comm.protocol.gcode." + phase)
+			self._gcode_hooks[phase] = list(hooks.items())
+
+		self._command_phase_handlers = dict()
+
+	def _get_command_phase_handlers(self, phase, gcode):
+		"""
+		Returns the handler methods of this instance for ``gcode`` in ``phase``, as a list of ``(handler, passes_gcode)``
+		tuples. Looked up once per combination.
+		"""
+		key = (phase, gcode)
+		handlers = self._command_phase_handlers.get(key)
+		if handlers is None:
+			handlers = []
+			if gcode is not None:
+				gcodeHandler = getattr(self, "_gcode_" + gcode + "_" + phase, None)
+				if gcodeHandler is not None:
+					handlers.append((gcodeHandler, False))
+			commandPhaseHandler = getattr(self, "_command_phase_" + phase, None)
+			if commandPhaseHandler is not None:
+				handlers.append((commandPhaseHandler, True))
+			self._command_phase_handlers[key] = handlers
+		return handlers
+
 	def _process_command_phase(self, phase, command, command_type=None, gcode=None):
 		if (self.isStreaming() and self.isPrinting()) or phase not in ("queuing", "queued", "sending", "sent"):
 			return command, command_type, gcode
 
 		if gcode is None:
-			gcode = gcode_command_for_cmd(command)
+			gcode = gcode_command_for_cmd(command, support_f=self._supportFAsCommand)
 
 		# send it through the phase specific handlers provided by plugins
-		for name, hook in self._gcode_hooks[phase].items():
+		for name, hook in self._gcode_hooks[phase]:
 			try:
 				hook_result = hook(self, phase, command, command_type, gcode)
 			except:
@@ -2182,17 +2337,13 @@ class MachineCom(object):
 					# hook handler return None as command, so we'll stop here and return a full out None result
 					return None, None, None
 
-		# if it's a gcode command send it through the specific handler if it exists
-		if gcode is not None:
-			gcodeHandler = "_gcode_" + gcode + "_" + phase
-			if hasattr(self, gcodeHandler):
-				handler_result = getattr(self, gcodeHandler)(command, cmd_type=command_type)
-				command, command_type, gcode = self._handle_command_handler_result(command, command_type, gcode, handler_result)
-
-		# send it through the phase specific command handler if it exists
-		commandPhaseHandler = "_command_phase_" + phase
-		if hasattr(self, commandPhaseHandler):
-			handler_result = getattr(self, commandPhaseHandler)(command, cmd_type=command_type, gcode=gcode)
+		# if it's a gcode command send it through the specific handler if it exists, then send it through the phase
+		# specific command handler if that exists
+		for handler, passes_gcode in self._get_command_phase_handlers(phase, gcode):
+			if passes_gcode:
+				handler_result = handler(command, cmd_type=command_type, gcode=gcode)
+			else:
+				handler_result = handler(command, cmd_type=command_type)
 			command, command_type, gcode = self._handle_command_handler_result(command, command_type, gcode, handler_result)
 
 		# finally return whatever we resulted on
@@ -2223,7 +2374,7 @@ class MachineCom(object):
 			# handler returned a tuple of an unexpected length
 			return original_tuple
 
-		gcode = gcode_command_for_cmd(command)
+		gcode = gcode_command_for_cmd(command, support_f=self._supportFAsCommand)
 		return command, command_type, gcode
 
 	##~~ actual sending via serial
@@ -2237,11 +2388,10 @@ class MachineCom(object):
 
 	def _do_send_with_checksum(self, command, linenumber):
 		command_to_send = "N" + str(linenumber) + " " + command
-		checksum = 0
-		for c in command_to_send:
-			checksum ^= ord(c)
+		checksum = reduce(operator.xor, bytearray(command_to_send.encode("ascii", errors="replace")), 0)
 		command_to_send = command_to_send + "*" + str(checksum)
 		self._do_send_without_checksum(command_to_send)
+		self._last_sent_linenumber = linenumber
 
 	def _do_send_without_checksum(self, cmd):
 		if self._serial is None:
@@ -2250,6 +2400,8 @@ class MachineCom(object):
 		self._log("Send: " + str(cmd))
 
 		cmd += "\n"
+		self._last_sent_length = len(cmd)
+		self._last_sent_linenumber = None
 		written = 0
 		passes = 0
 		while written < len(cmd):
@@ -2563,6 +2715,9 @@ class MachineComPrintCallback(object):
 	def on_comm_record_fileposition(self, origin, name, pos):
 		pass
 
+	def has_temperature_subscribers(self):
+		return True
+
 ### Printing file information classes ##################################################################################
 
 class PrintingFileInformation(object):
@@ -2745,6 +2900,212 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 		self._logger.info("Finished in {:.3f} s.".format(duration))
 		pass
 
+class PreparedGcodeFileInformation(PrintingGcodeFileInformation):
+	"""
+	Like :class:`PrintingGcodeFileInformation`, but instead of reading and processing the file line by line while
+	printing, the file is processed once up front into a sidecar file which is then memory mapped for printing.
+
+	The sidecar contains every line that's left after stripping comments and whitespace, each prefixed with its length
+	and the position in the original file right after it, so file positions stay byte-exact for progress reporting and
+	recovery data. Temperature commands are flagged, only those still get the temperature offsets applied while
+	printing. Sidecars are kept in the ``jobs`` folder below the ``generated`` base folder and reused as long as the
+	original file doesn't change.
+	"""
+
+	HEADER = struct.Struct("<4sHQd")
+	"""Sidecar header: magic, format version, size and modification time of the original file."""
+
+	RECORD = struct.Struct("<IQ")
+	"""Line record: length of the line (plus flags), position in the original file after the line."""
+
+	MAGIC = b"OPGC"
+	VERSION = 1
+
+	FLAG_TEMPERATURE = 0x80000000
+	LENGTH_MASK = 0x7FFFFFFF
+
+	MAX_SIDECARS = 10
+
+	def __init__(self, filename, offsets_callback=None, current_tool_callback=None, sidecar_folder=None):
+		PrintingGcodeFileInformation.__init__(self, filename,
+		                                      offsets_callback=offsets_callback,
+		                                      current_tool_callback=current_tool_callback)
+
+		if sidecar_folder is None:
+			sidecar_folder = os.path.join(settings().getBaseFolder("generated"), "jobs")
+		self._sidecar_folder = sidecar_folder
+		self._sidecar = os.path.join(sidecar_folder,
+		                             hashlib.sha1(to_unicode(os.path.abspath(filename)).encode("utf-8")).hexdigest() + ".job")
+
+		self._prepare_mutex = threading.Lock()
+
+		self._map = None
+		self._offset = 0
+
+	def getSidecar(self):
+		return self._sidecar
+
+	def prepare(self, background=False):
+		"""
+		Creates the sidecar for the file unless an up to date one already exists. Whether it's up to date is checked
+		against the size and modification time of the file on every call, so a file overwritten after it was prepared
+		gets prepared again.
+
+		Arguments:
+		    background (bool): Whether to prepare in a background thread. Printing waits for it if it's started before
+		        the preparation has finished.
+		"""
+		if background:
+			thread = threading.Thread(target=self.prepare, name="comm.prepare_job")
+			thread.daemon = True
+			thread.start()
+			return
+
+		with self._prepare_mutex:
+			stat = os.stat(self._filename)
+			if not self._is_sidecar_current(stat):
+				start = time.time()
+				lines = self._write_sidecar(stat)
+				self._logger.info("Prepared {} lines of {} for printing in {:.3f}s".format(lines,
+				                                                                             self._filename,
+				                                                                             time.time() - start))
+				self._cleanup_sidecars()
+
+	def _is_sidecar_current(self, stat):
+		try:
+			with open(self._sidecar, "rb") as f:
+				header = f.read(self.HEADER.size)
+		except IOError:
+			return False
+
+		if len(header) < self.HEADER.size:
+			return False
+
+		magic, version, size, mtime = self.HEADER.unpack(header)
+		return magic == self.MAGIC and version == self.VERSION and size == stat.st_size and mtime == stat.st_mtime
+
+	def _write_sidecar(self, stat):
+		if not os.path.isdir(self._sidecar_folder):
+			os.makedirs(self._sidecar_folder)
+
+		lines = 0
+		pos = 0
+		with open(self._filename, "rb") as source:
+			with atomic_write(self._sidecar, "wb") as sidecar:
+				sidecar.write(self.HEADER.pack(self.MAGIC, self.VERSION, stat.st_size, stat.st_mtime))
+
+				for raw in source:
+					# split like the line by line reading would on mac style line endings too
+					for chunk in raw.splitlines(True):
+						if pos == 0 and chunk.startswith(codecs.BOM_UTF8):
+							line = chunk[len(codecs.BOM_UTF8):]
+						else:
+							line = chunk
+						pos += len(chunk)
+
+						processed = process_gcode_line(line.decode("utf-8", "replace"))
+						if not processed:
+							continue
+
+						data = processed.encode("utf-8")
+						length = len(data)
+						if processed.startswith(_temp_command_prefixes):
+							length |= self.FLAG_TEMPERATURE
+						sidecar.write(self.RECORD.pack(length, pos))
+						sidecar.write(data)
+						lines += 1
+		return lines
+
+	def _cleanup_sidecars(self):
+		try:
+			sidecars = [os.path.join(self._sidecar_folder, name) for name in os.listdir(self._sidecar_folder)
+			            if name.endswith(".job")]
+			sidecars.sort(key=os.path.getmtime, reverse=True)
+			for path in sidecars[self.MAX_SIDECARS:]:
+				if path != self._sidecar:
+					os.remove(path)
+		except:
+			self._logger.exception("Error while cleaning up prepared print jobs in {}".format(self._sidecar_folder))
+
+	def seek(self, offset):
+		with self._handle_mutex:
+			if self._map is None:
+				return
+
+			# continue with the first line that ends behind offset - for offsets at line boundaries that's the line
+			# starting at offset, same as when reading the original file from there
+			record_offset = self.HEADER.size
+			while record_offset < len(self._map):
+				length, position = self.RECORD.unpack_from(self._map, record_offset)
+				if position > offset:
+					break
+				record_offset += self.RECORD.size + (length & self.LENGTH_MASK)
+
+			self._offset = record_offset
+			self._pos = offset
+			self._read_lines = 0
+
+	def start(self):
+		"""
+		Prepares the file if that didn't happen yet or it changed since and maps the sidecar for reading.
+		"""
+		PrintingFileInformation.start(self)
+		self.prepare()
+		with self._handle_mutex:
+			with open(self._sidecar, "rb") as f:
+				self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+			# the file might have been overwritten since it was selected, the positions in the sidecar are those of
+			# the file it was prepared from
+			_, _, self._size, _ = self.HEADER.unpack_from(self._map, 0)
+			self._offset = self.HEADER.size
+			self._pos = 0
+			self._read_lines = 0
+
+	def close(self):
+		"""
+		Unmaps the sidecar if it's still mapped.
+		"""
+		PrintingFileInformation.close(self)
+		with self._handle_mutex:
+			if self._map is not None:
+				try:
+					self._map.close()
+				except:
+					pass
+			self._map = None
+
+	def getNext(self):
+		"""
+		Retrieves the next line for printing.
+		"""
+		with self._handle_mutex:
+			if self._map is None:
+				raise ValueError("File %s is not open for reading" % self._filename)
+
+			try:
+				if self._offset >= len(self._map):
+					self.close()
+					self._pos = self._size
+					self._report_stats()
+					return None
+
+				length, self._pos = self.RECORD.unpack_from(self._map, self._offset)
+				start = self._offset + self.RECORD.size
+				self._offset = start + (length & self.LENGTH_MASK)
+				line = self._map[start:self._offset].decode("utf-8")
+
+				if length & self.FLAG_TEMPERATURE and self._offsets_callback is not None:
+					current_tool = self._current_tool_callback() if self._current_tool_callback is not None else None
+					line = apply_temperature_offsets(line, self._offsets_callback(), current_tool=current_tool)
+
+				self._read_lines += 1
+				return line
+			except Exception as e:
+				self.close()
+				self._logger.exception("Exception while processing line")
+				raise e
+
 class StreamingGcodeFileInformation(PrintingGcodeFileInformation):
 	def __init__(self, path, localFilename, remoteFilename):
 		PrintingGcodeFileInformation.__init__(self, path)
@@ -2772,6 +3133,153 @@ class StreamingGcodeFileInformation(PrintingGcodeFileInformation):
 		             duration=duration)
 		self._logger.info("Finished in {duration:.3f} s. Approx. transfer rate of {rate:.3f} lines/s or {time_per_line:.3f} ms per line".format(**stats))
 
+class SendWindow(object):
+	"""
+	Keeps track of the commands sent to the printer that haven't been acknowledged yet, for sending several commands
+	without waiting for the ``ok`` of each.
+
+	Up to ``size`` commands may be in flight at the same time, as long as they fit into the firmware's serial receive
+	buffer of ``buffer_size`` bytes. If the firmware reports its free command buffer slots along with its
+	acknowledgements (``ok N123 P15 B3``), the window follows those. The window opens and closes the provided
+	``clear_to_send`` event, that the send loop waits on before sending the next command.
+
+	Arguments:
+	    clear_to_send (CountedEvent): The event to set while there's room for another command.
+	    size (int): The maximum number of unacknowledged commands.
+	    buffer_size (int): The size of the firmware's serial receive buffer in bytes, ``None`` or 0 for no limit.
+	"""
+
+	def __init__(self, clear_to_send, size=4, buffer_size=None):
+		self._clear_to_send = clear_to_send
+		self._size = max(1, size)
+		self._buffer_size = buffer_size if buffer_size else None
+
+		self._limit = self._size
+		self._inflight = deque()
+		self._bytes = 0
+		self._discarded = 0
+		self._stale_acks = 0
+		self._mutex = threading.Lock()
+
+	@property
+	def inflight(self):
+		with self._mutex:
+			return len(self._inflight)
+
+	@property
+	def limit(self):
+		with self._mutex:
+			return self._limit
+
+	def add(self, length, linenumber=None, single=False):
+		"""
+		Registers a sent command.
+
+		Arguments:
+		    length (int): The number of bytes sent for the command, including line number, checksum and newline.
+		    linenumber (int): The line number the command was sent with, if any.
+		    single (bool): Whether only one command may be in flight right now, e.g. during an active resend.
+
+		Returns:
+		    bool: Whether there's room for another command.
+		"""
+		with self._mutex:
+			self._inflight.append((length, linenumber))
+			self._bytes += length
+			return self._update_clear_to_send(single=single)
+
+	def acknowledge(self, free_buffer=None, linenumber=None):
+		"""
+		Registers an acknowledgement for the oldest command in flight.
+
+		If the firmware reports the line number it acknowledges, all commands in flight up to that line are
+		acknowledged with it, in case the firmware dropped one of them without acknowledging it.
+
+		Arguments:
+		    free_buffer (int): The free command buffer slots reported by the firmware, if any.
+		    linenumber (int): The acknowledged line number reported by the firmware, if any.
+
+		Returns:
+		    bool: Whether there's room for another command.
+		"""
+		with self._mutex:
+			if self._inflight:
+				length, oldest = self._inflight.popleft()
+				self._bytes -= length
+
+				if linenumber is not None and oldest is not None:
+					while self._inflight and self._inflight[0][1] is not None and oldest < self._inflight[0][1] <= linenumber:
+						self._bytes -= self._inflight.popleft()[0]
+			if free_buffer is not None:
+				self._limit = min(self._size, max(1, free_buffer))
+			return self._update_clear_to_send()
+
+	def open(self):
+		"""
+		Lets another command through without acknowledging any of those in flight, e.g. if the firmware reports to be
+		idle with a ``wait``.
+		"""
+		with self._mutex:
+			self._clear_to_send.set()
+
+	def take_discarded(self):
+		"""
+		Registers the rejection of a command the firmware discarded after requesting a resend, which it answers with
+		another resend request and an acknowledgement that must not open the window.
+
+		Returns:
+		    bool: Whether a discarded command was still expected to be rejected.
+		"""
+		with self._mutex:
+			if self._discarded > 0:
+				self._discarded -= 1
+				self._stale_acks += 1
+				return True
+			return False
+
+	def take_stale_ack(self):
+		"""
+		Returns:
+		    bool: Whether the acknowledgement at hand was expected to be stale and has to be ignored.
+		"""
+		with self._mutex:
+			if self._stale_acks > 0:
+				self._stale_acks -= 1
+				return True
+			return False
+
+	def reset(self, discarded=0):
+		"""
+		Forgets about all commands in flight, e.g. after the firmware discarded them while requesting a resend or if
+		their acknowledgements got lost.
+
+		Arguments:
+		    discarded (int): The number of commands in flight the firmware discarded after requesting a resend, and
+		        that it will reject one by one.
+		"""
+		with self._mutex:
+			self._inflight.clear()
+			self._bytes = 0
+			self._discarded = discarded
+			self._stale_acks = 0
+			self._limit = self._size
+
+	def _update_clear_to_send(self, single=False):
+		count = len(self._inflight)
+		limit = 1 if single else self._limit
+
+		room = count < limit
+		if room and count and self._buffer_size is not None:
+			# we don't know the length of the next command yet, so we assume it to be as long as the average one in flight
+			room = self._bytes + self._bytes // count <= self._buffer_size
+
+		if room:
+			self._clear_to_send.set()
+		else:
+			self._clear_to_send.clear(completely=True)
+		return room
+
+
 def get_new_timeout(type, intervals):
 	now = time.time()
 	return now + intervals.get(type, 0.0)
@@ -2779,10 +3287,16 @@ def get_new_timeout(type, intervals):
 
 _temp_command_regex = re.compile("^M(?P<command>104|109|140|190)(\s+T(?P<tool>\d+)|\s+S(?P<temperature>[-+]?\d*\.?\d*))+")
 
+_temp_command_prefixes = ("M104", "M109", "M140", "M190")
+
 def apply_temperature_offsets(line, offsets, current_tool=None):
 	if offsets is None:
 		return line
 
+	if not line.startswith(_temp_command_prefixes):
+		# shortcut, not a temperature command
+		return line
+
 	match = _temp_command_regex.match(line)
 	if match is None:
 		return line
@@ -2819,14 +3333,18 @@ def strip_comment(line):
 		# shortcut
 		return line
 
-	escaped = False
-	result = []
-	for c in line:
-		if c == ";" and not escaped:
-			break
-		result += c
-		escaped = (c == "\\") and not escaped
-	return "".join(result)
+	if not "\\" in line:
+		# shortcut, nothing escaped, so the first ; starts the comment
+		return line[:line.index(";")]
+
+	# a ; only starts the comment if it's preceded by an even number of backslashes
+	index = line.index(";")
+	while index >= 0:
+		prefix = line[:index]
+		if (len(prefix) - len(prefix.rstrip("\\"))) % 2 == 0:
+			return prefix
+		index = line.find(";", index + 1)
+	return line
 
 def process_gcode_line(line, offsets=None, current_tool=None):
 	line = strip_comment(line).strip()
@@ -2838,6 +3356,69 @@ def process_gcode_line(line, offsets=None, current_tool=None):
 
 	return line
 
+_compact_number_regex = re.compile("^([A-Za-z])([-+]?\d+)\.(\d*?)0*$")
+
+_verbatim_commands = ("M117", "M118")
+
+def minify_gcode_line(line, compact_numbers=False):
+	"""
+	Minifies the provided G-code line for transfer to the printer: strips the comment and all superfluous whitespace
+	and optionally writes numbers without trailing zeros (``X10.500`` becomes ``X10.5``, ``E2.000`` becomes ``E2``).
+	The text of messages (``M117``, ``M118``) is kept as is.
+
+	Arguments:
+	    line (str): The line to minify.
+	    compact_numbers (bool): Whether to drop trailing zeros from numbers.
+
+	Returns:
+	    str: The minified line, empty if nothing but a comment or whitespace was left.
+	"""
+	line = strip_comment(line).strip()
+	if not line or line.startswith(_verbatim_commands):
+		return line
+
+	words = line.split()
+	if compact_numbers:
+		words = [_compact_number(word) for word in words]
+	return " ".join(words)
+
+def _compact_number(word):
+	match = _compact_number_regex.match(word)
+	if match is None:
+		return word
+
+	letter, integer, fraction = match.groups()
+	if fraction:
+		return letter + integer + "." + fraction
+	return letter + integer
+
+def minify_gcode_file(path, target, compact_numbers=False):
+	"""
+	Writes a minified copy of the G-code file at ``path`` to ``target``, see :func:`minify_gcode_line`. Lines with
+	nothing left are dropped.
+
+	Arguments:
+	    path (str): Path of the G-code file to minify.
+	    target (str): Path to write the minified copy to.
+	    compact_numbers (bool): Whether to drop trailing zeros from numbers.
+
+	Returns:
+	    tuple: The number of lines written and the size of the minified copy in bytes.
+	"""
+	lines = 0
+	size = 0
+	with open(path, "rb") as source:
+		with open(target, "wb") as output:
+			for line in source:
+				line = minify_gcode_line(line, compact_numbers=compact_numbers)
+				if not line:
+					continue
+				line += b"\n"
+				output.write(line)
+				lines += 1
+				size += len(line)
+	return lines, size
+
 def convert_pause_triggers(configured_triggers):
 	if not configured_triggers:
 		return dict()
@@ -3077,12 +3658,37 @@ def parse_resend_line(line):
 	return None
 
 
-def gcode_command_for_cmd(cmd):
+def parse_advanced_ok_line(line):
+	"""
+	Parses the provided acknowledgement for the free buffer space reported by the firmware.
+
+	Arguments:
+	    line (str): the line to parse
+
+	Returns:
+	    tuple or None: a tuple ``(linenumber, planner, buffer)`` of the acknowledged line number (or ``None`` if not
+	        reported), the free planner slots and the free command buffer slots, or None if the line doesn't report
+	        any buffer space
+	"""
+
+	match = regex_advanced_ok.match(line)
+	if match is None:
+		return None
+
+	linenumber = match.group("line")
+	if linenumber is not None:
+		linenumber = int(linenumber)
+	return linenumber, int(match.group("planner")), int(match.group("buffer"))
+
+
+def gcode_command_for_cmd(cmd, support_f=None):
 	"""
 	Tries to parse the provided ``cmd`` and extract the GCODE command identifier from it (e.g. "G0" for "G0 X10.0").
 
 	Arguments:
 	    cmd (str): The command to try to parse.
+	    support_f (bool): Whether to treat ``F`` as a command. Looked up from the ``feature.supportFAsCommand`` setting
+	        if ``None``, callers parsing lots of commands should provide it.
 
 	Returns:
 	    str or None: The GCODE command identifier if it could be parsed, or None if not.
@@ -3099,8 +3705,10 @@ def gcode_command_for_cmd(cmd):
 		return values["commandGM"]
 	elif "commandT" in values and values["commandT"]:
 		return values["commandT"]
-	elif settings().getBoolean(["feature", "supportFAsCommand"]) and "commandF" in values and values["commandF"]:
-		return values["commandF"]
+	elif "commandF" in values and values["commandF"]:
+		if support_f is None:
+			support_f = settings().getBoolean(["feature", "supportFAsCommand"])
+		return values["commandF"] if support_f else None
 	else:
 		# this should never happen
 		return None
@@ -3192,5 +3800,94 @@ def upload_cli():
 
 	logger.info("Done, exiting...")
 
+def benchmark_cli():
+	"""
+	Usage: python -m octoprint.util.comm benchmark <local path> [<runs>]
+
+	Pushes every line of <local path> through the same processing a line of a print job goes through (reading and
+	preprocessing, the queuing, queued, sending and sent phases, line number and checksum) against a serial port that
+	accepts everything right away, and reports the lines per second for each of <runs> runs (default 3). This is the
+	processing overhead per line, without any waiting for the printer. Every run reads the file directly and from a
+	prepared job (see :class:`PreparedGcodeFileInformation`), the start of the first prepared run includes writing
+	the sidecar.
+	"""
+
+	import sys
+	from octoprint.util import Object
+
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+	logger = logging.getLogger(__name__)
+
+	# fetch filename and number of runs from commandline
+	if len(sys.argv) < 3:
+		print("Usage: comm.py benchmark <local path> [<runs>]")
+		sys.exit(-1)
+
+	path = sys.argv[2]
+	runs = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+	# init settings & plugin manager
+	settings(init=True)
+	octoprint.plugin.plugin_manager(init=True)
+
+	# serial port that takes everything we write to it
+	class NullSerial(object):
+		timeout = None
+
+		def write(self, data):
+			return len(data)
+
+		def close(self):
+			pass
+
+	# mock printer profile manager
+	profile = dict(heatedBed=False,
+	               extruder=dict(count=1))
+	printer_profile_manager = Object()
+	printer_profile_manager.get_current_or_default = lambda: profile
+
+	comm = MachineCom(port="BENCHMARK", baudrate=0, callbackObject=MachineComPrintCallback(), printerProfileManager=printer_profile_manager)
+	comm._serial = NullSerial()
+
+	for run in range(runs):
+		for file_information_class in (PrintingGcodeFileInformation, PreparedGcodeFileInformation):
+			comm._currentFile = file_information_class(path,
+			                                           offsets_callback=lambda: comm._tempOffsets,
+			                                           current_tool_callback=lambda: comm._currentTool)
+
+			start = time.time()
+			comm._prepare_line_processing()
+			comm._currentFile.start()
+			comm._state = MachineCom.STATE_PRINTING
+			comm._currentLine = 1
+			preparation = time.time() - start
+
+			lines = 0
+			start = time.time()
+			while True:
+				line = comm._getNext()
+				if line is None:
+					break
+
+				if comm._sendCommand(line):
+					comm._send_entry(comm._send_queue.get())
+					comm._send_queue.task_done()
+					lines += 1
+			duration = time.time() - start
+
+			logger.info("Run {}, {}: started in {:.3f} s, {} lines in {:.3f} s, {:.0f} lines/s".format(run + 1,
+			                                                                                          file_information_class.__name__,
+			                                                                                          preparation,
+			                                                                                          lines,
+			                                                                                          duration,
+			                                                                                          lines / duration))
+
+	comm._serial = None
+	comm._currentFile = None
+
 if __name__ == "__main__":
-	upload_cli()
+	import sys
+	if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+		benchmark_cli()
+	else:
+		upload_cli()
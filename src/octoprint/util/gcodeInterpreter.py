@@ -178,6 +178,8 @@ class AnalysisAborted(Exception):
 
 
 class gcode(object):
+	PROGRESS_UPDATES = 1000
+
 	def __init__(self, cb=None):
 		self._logger = logging.getLogger(__name__)
 		self.layerList = None
@@ -207,20 +209,20 @@ class gcode(object):
 		            maxY=self._minMax.max.y,
 		            maxZ=self._minMax.max.z)
 
-	def load(self, filename, printer_profile, throttle=None):
+	def load(self, filename, printer_profile, throttle=None, g90_extruder=None, max_extruders=None):
 		if os.path.isfile(filename):
 			self.filename = filename
 			self._fileSize = os.stat(filename).st_size
 
 			import codecs
 			with codecs.open(filename, encoding="utf-8", errors="replace") as f:
-				self._load(f, printer_profile, throttle=throttle)
+				self._load(f, printer_profile, throttle=throttle, g90_extruder=g90_extruder, max_extruders=max_extruders)
 
 	def abort(self, reenqueue=True):
 		self._abort = True
 		self._reenqueue = reenqueue
 
-	def _load(self, gcodeFile, printer_profile, throttle=None):
+	def _load(self, gcodeFile, printer_profile, throttle=None, g90_extruder=None, max_extruders=None):
 		## print("LOADING...")
 		
 		lineNo = 0
@@ -244,43 +246,32 @@ class gcode(object):
 			feedrate = 2000
 		offsets = printer_profile["extruder"]["offsets"]
 
-		g90InfluencesExtruder = settings().getBoolean(["feature", "g90InfluencesExtruder"])
+		# the settings are only read if not supplied, they are not available in analysis worker processes
+		if g90_extruder is None:
+			g90_extruder = settings().getBoolean(["feature", "g90InfluencesExtruder"])
+		if max_extruders is None:
+			max_extruders = settings().getInt(["gcodeAnalysis", "maxExtruders"])
 
 
-		i=0
-		n_lines = sum(1 for line in gcodeFile)	##get the total number of lines of the file;
-		gcodeFile.seek(0)						##go to the beginning of the file;
+		# progress is based on the bytes read from files of known size (lines read from lists) and reported at most
+		# PROGRESS_UPDATES times, so no separate pass over the file is needed to count its lines
+		progressByLines = isinstance(gcodeFile, list)
+		progressTotal = len(gcodeFile) if progressByLines else getattr(self, "_fileSize", None)
+		progressStep = float(progressTotal) / self.PROGRESS_UPDATES if progressTotal else None
+		nextProgress = progressStep
 
-##		import subprocess
-##		n_lines = int(subprocess.check_output(['wc', '-l', filename]).split()[0])
-		
 		self.pct = "0.0"
 		for line in gcodeFile:
-			cur_pct = (("%.1f" %(100.0*i/n_lines)))
-			if cur_pct!=self.pct:
-				print(cur_pct+"%")
-				self.pct=cur_pct
-				self.progressCallback["pct_progress"]=self.pct
-			i+=1
 			if self._abort:
 				raise AnalysisAborted(reenqueue=self._reenqueue)
 			lineNo += 1
 			readBytes += len(line)
 
-			if isinstance(gcodeFile, (file)):
-				percentage = float(readBytes) / float(self._fileSize)
-			elif isinstance(gcodeFile, (list)):
-				percentage = float(lineNo) / float(len(gcodeFile))
-			else:
-				percentage = None
-
-			'''try:		- old version: NOK.
-				if self.progressCallback is not None and (lineNo % 1000 == 0) and percentage is not None:
-					self.progressCallback(percentage)
-			except:
-				print("ERROR: computing pct.")
-				pass
-'''
+			if nextProgress is not None:
+				progressDone = lineNo if progressByLines else readBytes
+				if progressDone >= nextProgress:
+					self._reportProgress(100.0 * progressDone / progressTotal)
+					nextProgress = (math.floor(progressDone / progressStep) + 1) * progressStep
 
 			if ';' in line:
 				comment = line[line.find(';')+1:].strip()
@@ -413,11 +404,11 @@ class gcode(object):
 							pos.z = center.z
 				elif G == 90:	#Absolute position
 					relativeMode = False
-					if g90InfluencesExtruder:
+					if g90_extruder:
 						relativeE = False
 				elif G == 91:	#Relative position
 					relativeMode = True
-					if g90InfluencesExtruder:
+					if g90_extruder:
 						relativeE = True
 				elif G == 92:
 					x = getCodeFloat(line, 'X')
@@ -458,7 +449,7 @@ class gcode(object):
 							fwrecoverTime = (fwretractDist + s) / f
 
 			elif T is not None:
-				if T > settings().getInt(["gcodeAnalysis", "maxExtruders"]):
+				if T > max_extruders:
 					self._logger.warn("GCODE tried to select tool %d, that looks wrong, ignoring for GCODE analysis" % T)
 				else:
 					toolOffset.x -= offsets[currentExtruder][0] if currentExtruder < len(offsets) else 0
@@ -482,10 +473,8 @@ class gcode(object):
 			if throttle is not None:
 				throttle(lineNo, readBytes)
 		
-		try:
+		if self.progressCallback is not None:
 			self.progressCallback["pct_progress"]=100.0
-		except:
-			print("ERROR: sending pct. of checking of the gcode")
 
 		self.extrusionAmount = maxExtrusion
 		self.extrusionVolume = [0] * len(maxExtrusion)
@@ -495,6 +484,11 @@ class gcode(object):
 		self.totalMoveTimeMinute = totalMoveTimeMinute
 		## print("LOADING... end.")
 
+	def _reportProgress(self, percentage):
+		self.pct = "%.1f" % min(percentage, 100.0)
+		if self.progressCallback is not None:
+			self.progressCallback["pct_progress"] = self.pct
+
 	def _parseCuraProfileString(self, comment, prefix):
 		return {key: value for (key, value) in map(lambda x: x.split("=", 1), zlib.decompress(base64.b64decode(comment[len(prefix):])).split("\b"))}
 
@@ -525,3 +519,52 @@ def getCodeFloat(line, code):
 		return val if not (math.isnan(val) or math.isinf(val)) else None
 	except:
 		return None
+
+
+# --- Test code for benchmarking the analysis via command line follows
+
+
+def benchmark_cli():
+	"""
+	Usage: python -m octoprint.util.gcodeInterpreter <path> [<runs>]
+
+	Analyses <path> <runs> times (default 3) and reports the time needed and the achieved throughput per run.
+
+	Place <path> on the storage to benchmark (e.g. the SD card of a Raspberry Pi) and drop the page cache before
+	running (``sync; echo 3 > /proc/sys/vm/drop_caches``) to include the read speed of the storage in the first run.
+	"""
+
+	import sys
+	import time
+
+	if len(sys.argv) < 2:
+		print("Usage: gcodeInterpreter.py <path> [<runs>]")
+		sys.exit(-1)
+
+	path = sys.argv[1]
+	runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+	# init settings
+	settings(init=True)
+
+	# dummy printer profile
+	profile = dict(axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+	               extruder=dict(offsets=[(0, 0)]))
+
+	size = os.stat(path).st_size
+	for run in range(runs):
+		cb = dict()
+		analysis = gcode(cb)
+
+		start = time.time()
+		analysis.load(path, profile)
+		duration = time.time() - start
+
+		print("Run {}: {:.2f}s, {:.2f} MB/s, estimated print time {:.0f}min, filament {}".format(run + 1,
+		                                                                                           duration,
+		                                                                                           size / duration / 1024 / 1024,
+		                                                                                           analysis.totalMoveTimeMinute,
+		                                                                                           analysis.extrusionAmount))
+
+if __name__ == "__main__":
+	benchmark_cli()
@@ -0,0 +1,135 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2017 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import mock
+
+from octoprint.filemanager.analysis import AnalysisWorkerPool, AnalysisAborted, AnalysisResultCache, _pool_worker_throttle, _analyse_gcode
+
+BP_CASE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "_files", "bp_case.gcode")
+
+
+def _add(slot, a, b):
+	return a + b
+
+
+def _throttled_loop(slot, path):
+	throttle = _pool_worker_throttle(slot, path, 0.001, 1)
+	for line_no in range(1, 100000):
+		throttle(line_no, line_no)
+	return "not aborted"
+
+
+class AnalysisWorkerPoolTest(unittest.TestCase):
+
+	def setUp(self):
+		self.pool = AnalysisWorkerPool(workers=2)
+
+	def tearDown(self):
+		self.pool._pool.terminate()
+
+	def test_run(self):
+		self.assertEqual(3, self.pool.run(0, _add, 1, 2))
+		self.assertEqual(5, self.pool.run(1, _add, 2, 3))
+
+	def test_abort(self):
+		import threading
+
+		timer = threading.Timer(0.2, self.pool.abort, args=(1,))
+		timer.start()
+
+		start = time.time()
+		self.assertRaises(AnalysisAborted, self.pool.run, 1, _throttled_loop, BP_CASE)
+		self.assertTrue(time.time() - start < 5.0)
+
+		# the slot is usable again afterwards
+		self.assertEqual(3, self.pool.run(1, _add, 1, 2))
+
+	def test_analyse_gcode_without_settings(self):
+		printer_profile = dict(axes=dict(x=dict(speed=6000), y=dict(speed=6000)),
+		                       extruder=dict(offsets=[(0, 0)]))
+
+		# like in worker processes started through spawn, the settings are not available
+		with mock.patch("octoprint.util.gcodeInterpreter.settings") as settings_mock:
+			settings_mock.side_effect = ValueError("Settings not initialized yet")
+			pool = AnalysisWorkerPool(workers=1)
+		try:
+			result = pool.run(0, _analyse_gcode, BP_CASE, printer_profile, 0, 1000, False, 10)
+		finally:
+			pool._pool.terminate()
+
+		self.assertTrue(result["estimatedPrintTime"] > 0)
+		self.assertTrue(result["filament"]["tool0"]["length"] > 0)
+
+
+class AnalysisResultCacheTest(unittest.TestCase):
+
+	def setUp(self):
+		self.basefolder = tempfile.mkdtemp()
+		self.path = os.path.join(self.basefolder, "analysis_cache.json")
+
+		# caches flush on exit, after the folder is gone
+		atexit_patcher = mock.patch("atexit.register")
+		atexit_patcher.start()
+		self.addCleanup(atexit_patcher.stop)
+
+	def tearDown(self):
+		shutil.rmtree(self.basefolder)
+
+	def test_get_put(self):
+		cache = AnalysisResultCache(self.path, size=2)
+		self.assertIsNone(cache.get("a"))
+
+		result = dict(estimatedPrintTime=1.0)
+		cache.put("a", result)
+		self.assertEqual(result, cache.get("a"))
+
+		# results are copied in and out
+		result["estimatedPrintTime"] = 2.0
+		cache.get("a")["estimatedPrintTime"] = 3.0
+		self.assertEqual(dict(estimatedPrintTime=1.0), cache.get("a"))
+
+	def test_eviction_and_persistence(self):
+		cache = AnalysisResultCache(self.path, size=2)
+		cache.put("a", dict(value="a"))
+		cache.put("b", dict(value="b"))
+		cache.get("a")
+		cache.put("c", dict(value="c"))
+		cache.flush()
+
+		reloaded = AnalysisResultCache(self.path, size=2)
+		for c in (cache, reloaded):
+			self.assertIsNone(c.get("b"))
+			self.assertEqual(dict(value="a"), c.get("a"))
+			self.assertEqual(dict(value="c"), c.get("c"))
+
+		# order of use survived the reload, "a" is the least recently used now
+		reloaded.get("c")
+		reloaded.put("d", dict(value="d"))
+		self.assertIsNone(reloaded.get("a"))
+
+	def test_batched_saves(self):
+		cache = AnalysisResultCache(self.path, size=2, save_delay=0.1)
+		cache.put("a", dict(value="a"))
+		cache.put("b", dict(value="b"))
+		self.assertFalse(os.path.exists(self.path))
+
+		end = time.time() + 5.0
+		while not os.path.exists(self.path) and time.time() < end:
+			time.sleep(0.01)
+		self.assertEqual(dict(value="b"), AnalysisResultCache(self.path, size=2).get("b"))
+
+	def test_key(self):
+		key = AnalysisResultCache.key("abcdef", "gcode", None, analyser="bvc", filament_diameter=1750)
+
+		self.assertEqual(key, AnalysisResultCache.key("abcdef", "gcode", None, analyser="bvc", filament_diameter=1750))
+		self.assertNotEqual(key, AnalysisResultCache.key("abcdef", "gcode", None, analyser="bvc", filament_diameter=2850))
+		self.assertNotEqual(key, AnalysisResultCache.key("abcdef", "gcode", None, analyser="bvc", filament_diameter=1750, g90_influences_extruder=True))
+		self.assertNotEqual(key, AnalysisResultCache.key("abcdef", "gcode", None, analyser="octoprint", filament_diameter=1750))
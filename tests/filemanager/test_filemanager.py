@@ -132,9 +132,14 @@ class FileManagerTest(unittest.TestCase):
 
 		self.settings = mock.create_autospec(octoprint.settings.Settings)
 		self.settings.getBaseFolder.return_value = "/path/to/a/base_folder"
+		self.settings.getInt.return_value = 0 # no analysis cache
 
 		self.settings_getter.return_value = self.settings
 
+		# octoprint.filemanager imports settings directly
+		self.filemanager_settings_patcher = mock.patch("octoprint.filemanager.settings", self.settings_getter)
+		self.filemanager_settings_patcher.start()
+
 		self.analysis_queue = mock.MagicMock(spec=octoprint.filemanager.AnalysisQueue)
 
 		self.slicing_manager = mock.MagicMock(spec=octoprint.slicing.SlicingManager)
@@ -153,6 +158,7 @@ class FileManagerTest(unittest.TestCase):
 		self.event_manager_patcher.stop()
 		self.plugin_manager_patcher.stop()
 		self.settings_patcher.stop()
+		self.filemanager_settings_patcher.stop()
 
 	def test_add_file(self):
 		wrapper = object()
@@ -176,6 +182,27 @@ class FileManagerTest(unittest.TestCase):
 		                   mock.call(octoprint.filemanager.Events.UPDATED_FILES, dict(type="printables"))]
 		self.fire_event.call_args_list = expected_events
 
+	def test_add_file_cached_analysis(self):
+		wrapper = object()
+
+		self.local_storage.add_file.return_value = ("", "test.gcode")
+		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
+		self.local_storage.split_path.return_value = ("", "test.gcode")
+		self.local_storage.get_metadata.return_value = dict(hash="abcdef")
+
+		test_profile = dict(id="_default", name="My Default Profile")
+		self.printer_profile_manager.get_current_or_default.return_value = test_profile
+
+		analysis = dict(estimatedPrintTime=1234)
+		analysis_cache = mock.MagicMock(spec=octoprint.filemanager.AnalysisResultCache)
+		analysis_cache.get.return_value = analysis
+		self.file_manager._analysis_cache = analysis_cache
+
+		self.file_manager.add_file(octoprint.filemanager.FileDestinations.LOCAL, "test.gcode", wrapper)
+
+		self.assertFalse(self.analysis_queue.enqueue.called)
+		self.local_storage.set_additional_metadata.assert_called_once_with(("", "test.gcode"), "analysis", analysis, overwrite=True)
+
 	def test_remove_file(self):
 		self.local_storage.path_on_disk.return_value = "prefix/test.gcode"
 		self.local_storage.split_path.return_value = ("", "test.gcode")
@@ -370,11 +397,11 @@ class FileManagerTest(unittest.TestCase):
 
 	@mock.patch("octoprint.filemanager.util.atomic_write")
 	@mock.patch("io.FileIO")
-	@mock.patch("shutil.copyfileobj")
+	@mock.patch("octoprint.filemanager.util.copy_and_hash")
 	@mock.patch("os.remove")
 	@mock.patch("tempfile.NamedTemporaryFile")
 	@mock.patch("time.time", side_effect=[1411979916.422, 1411979932.116])
-	def test_slice(self, mocked_time, mocked_tempfile, mocked_os, mocked_shutil, mocked_fileio, mocked_atomic_write):
+	def test_slice(self, mocked_time, mocked_tempfile, mocked_os, mocked_copy, mocked_fileio, mocked_atomic_write):
 		callback = mock.MagicMock()
 		callback_args = ("one", "two", "three")
 
@@ -415,7 +442,7 @@ class FileManagerTest(unittest.TestCase):
 		self.local_storage.add_file.side_effect = add_file
 
 		# mock slice method on slicing manager
-		def slice(slicer_name, source_path, dest_path, profile, done_cb, printer_profile_id=None, position=None, callback_args=None, overrides=None, on_progress=None, on_progress_args=None, on_progress_kwargs=None):
+		def slice(slicer_name, source_path, dest_path, profile, done_cb, printer_profile_id=None, position=None, callback_args=None, overrides=None, resolution=None, nozzle_size=None, on_progress=None, on_progress_args=None, on_progress_kwargs=None, high_priority=False, on_queue_position=None, on_queue_position_args=None, on_queue_position_kwargs=None):
 			self.assertEqual("some_slicer", slicer_name)
 			self.assertEqual("prefix/source.file", source_path)
 			self.assertEqual("tmp.file", dest_path)
@@ -427,6 +454,8 @@ class FileManagerTest(unittest.TestCase):
 			self.assertIsNotNone(on_progress_args)
 			self.assertTupleEqual(("some_slicer", octoprint.filemanager.FileDestinations.LOCAL, "source.file", octoprint.filemanager.FileDestinations.LOCAL, "dest.file"), on_progress_args)
 			self.assertIsNone(on_progress_kwargs)
+			self.assertFalse(high_priority)
+			self.assertTupleEqual((octoprint.filemanager.FileDestinations.LOCAL, "source.file", octoprint.filemanager.FileDestinations.LOCAL, "dest.file"), on_queue_position_args)
 
 			if not callback_args:
 				callback_args = ()
@@ -454,11 +483,11 @@ class FileManagerTest(unittest.TestCase):
 		self.assertEqual(mocked_atomic_write.call_args_list, expected_atomic_write_calls)
 		#mocked_open.return_value.write.assert_called_once_with(";Generated from source.file aabbccddeeff\r")
 
-		# assert that shutil was asked to copy the concatenated multistream
-		self.assertEqual(1, len(mocked_shutil.call_args_list))
-		shutil_call_args = mocked_shutil.call_args_list[0]
-		self.assertTrue(isinstance(shutil_call_args[0][0], octoprint.filemanager.util.MultiStream))
-		multi_stream = shutil_call_args[0][0]
+		# assert that the concatenated multistream was copied
+		self.assertEqual(1, len(mocked_copy.call_args_list))
+		copy_call_args = mocked_copy.call_args_list[0]
+		self.assertTrue(isinstance(copy_call_args[0][0], octoprint.filemanager.util.MultiStream))
+		multi_stream = copy_call_args[0][0]
 		self.assertEqual(2, len(multi_stream.streams))
 		self.assertTrue(isinstance(multi_stream.streams[0], io.BytesIO))
 
@@ -492,7 +521,7 @@ class FileManagerTest(unittest.TestCase):
 		self.local_storage.path_on_disk.side_effect = path_on_disk
 
 		# mock slice method on slicing manager
-		def slice(slicer_name, source_path, dest_path, profile, done_cb, printer_profile_id=None, position=None, callback_args=None, overrides=None, on_progress=None, on_progress_args=None, on_progress_kwargs=None):
+		def slice(slicer_name, source_path, dest_path, profile, done_cb, printer_profile_id=None, position=None, callback_args=None, overrides=None, resolution=None, nozzle_size=None, on_progress=None, on_progress_args=None, on_progress_kwargs=None, high_priority=False, on_queue_position=None, on_queue_position_args=None, on_queue_position_kwargs=None):
 			self.assertEqual("some_slicer", slicer_name)
 			self.assertEqual("prefix/source.file", source_path)
 			self.assertEqual("tmp.file", dest_path)
@@ -504,6 +533,8 @@ class FileManagerTest(unittest.TestCase):
 			self.assertIsNotNone(on_progress_args)
 			self.assertTupleEqual(("some_slicer", octoprint.filemanager.FileDestinations.LOCAL, "source.file", octoprint.filemanager.FileDestinations.LOCAL, "dest.file"), on_progress_args)
 			self.assertIsNone(on_progress_kwargs)
+			self.assertFalse(high_priority)
+			self.assertTupleEqual((octoprint.filemanager.FileDestinations.LOCAL, "source.file", octoprint.filemanager.FileDestinations.LOCAL, "dest.file"), on_queue_position_args)
 
 			if not callback_args:
 				callback_args = ()
@@ -523,3 +554,34 @@ class FileManagerTest(unittest.TestCase):
 
 		# assert that time.time was only called once
 		self.assertEqual(mocked_time.call_count, 1)
+
+	@mock.patch("os.remove")
+	@mock.patch("tempfile.NamedTemporaryFile")
+	def test_slicing_progress_per_job(self, mocked_tempfile, mocked_os):
+		local = octoprint.filemanager.FileDestinations.LOCAL
+
+		progress_callback = mock.MagicMock()
+		self.file_manager.register_slicingprogress_callback(progress_callback)
+
+		temp_file = mock.MagicMock()
+		temp_file.name = "tmp.file"
+		mocked_tempfile.return_value = temp_file
+
+		# two jobs reporting the same progress in turn, each update gets through
+		self.file_manager.on_slicing_progress("some_slicer", local, "one.stl", local, "one.gcode", _progress=0.5)
+		self.file_manager.on_slicing_progress("some_slicer", local, "two.stl", local, "two.gcode", _progress=0.5)
+		self.file_manager.on_slicing_progress("some_slicer", local, "one.stl", local, "one.gcode", _progress=0.5)
+		self.file_manager.on_slicing_progress("some_slicer", local, "two.stl", local, "two.gcode", _progress=0.6)
+
+		expected_calls = [mock.call("some_slicer", local, "one.stl", local, "one.gcode", 50),
+		                  mock.call("some_slicer", local, "two.stl", local, "two.gcode", 50),
+		                  mock.call("some_slicer", local, "two.stl", local, "two.gcode", 60)]
+		self.assertListEqual(expected_calls, progress_callback.sendSlicingProgress.call_args_list)
+
+		# the progress of a job is forgotten once it ended
+		def slice(slicer_name, source_path, dest_path, profile, done_cb, callback_args=None, **kwargs):
+			done_cb(*callback_args, _error="Something went wrong")
+		self.slicing_manager.slice.side_effect = slice
+
+		self.file_manager.slice("some_slicer", local, "one.stl", local, "one.gcode")
+		self.assertDictEqual({(local, "two.gcode"): 60}, self.file_manager._last_slicing_progress)
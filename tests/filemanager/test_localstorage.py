@@ -40,10 +40,12 @@ FILE_CRAZYRADIO_STL = FileWrapper("crazyradio.stl")
 @ddt
 class LocalStorageTest(unittest.TestCase):
 
+	metadata_backend = "yaml"
+
 	def setUp(self):
 		import tempfile
 		self.basefolder = os.path.realpath(os.path.abspath(tempfile.mkdtemp()))
-		self.storage = LocalFileStorage(self.basefolder)
+		self.storage = LocalFileStorage(self.basefolder, metadata_backend=self.metadata_backend)
 
 		# mock file manager module
 		self.filemanager_patcher = mock.patch("octoprint.filemanager")
@@ -79,6 +81,109 @@ class LocalStorageTest(unittest.TestCase):
 
 		self._add_and_verify_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL, overwrite=True)
 
+	def test_add_file_stream_hashed_while_saving(self):
+		from octoprint.filemanager.util import StreamWrapper
+
+		with open(FILE_BP_CASE_STL.path, "rb") as f:
+			file_object = StreamWrapper("bp_case.stl", f)
+			file_object.hash = FILE_BP_CASE_STL.hash
+			with mock.patch("octoprint.filemanager.storage.hash_file") as hash_file_mock:
+				hash_file_mock.side_effect = AssertionError("saved file was read back for hashing")
+				self._add_and_verify_file("bp_case.stl", "bp_case.stl", file_object)
+
+	@data(True, False)
+	def test_add_file_disk_file_hashed_while_saving(self, move):
+		import shutil
+		import tempfile
+		from octoprint.filemanager.util import DiskFileWrapper
+
+		source_folder = tempfile.mkdtemp()
+		try:
+			source = os.path.join(source_folder, "bp_case.stl")
+			shutil.copy(FILE_BP_CASE_STL.path, source)
+
+			file_object = DiskFileWrapper("bp_case.stl", source, move=move)
+			file_object.hash = FILE_BP_CASE_STL.hash
+
+			self._add_and_verify_file("bp_case.stl", "bp_case.stl", file_object)
+			self.assertEqual(not move, os.path.exists(source))
+		finally:
+			shutil.rmtree(source_folder)
+
+	@data(True, False)
+	def test_add_file_disk_file_known_digest(self, move):
+		import shutil
+		import tempfile
+		from octoprint.filemanager.util import DiskFileWrapper
+
+		source_folder = tempfile.mkdtemp()
+		try:
+			source = os.path.join(source_folder, "bp_case.stl")
+			shutil.copy(FILE_BP_CASE_STL.path, source)
+
+			file_object = DiskFileWrapper("bp_case.stl", source, move=move, digest=FILE_BP_CASE_STL.hash, hash_algorithm="sha1")
+			file_object.hash = FILE_BP_CASE_STL.hash
+
+			with mock.patch("octoprint.filemanager.util.hash_file") as hash_file_mock, \
+					mock.patch("octoprint.filemanager.storage.hash_file") as storage_hash_file_mock:
+				hash_file_mock.side_effect = storage_hash_file_mock.side_effect = AssertionError("saved file was read back for hashing")
+				self._add_and_verify_file("bp_case.stl", "bp_case.stl", file_object)
+		finally:
+			shutil.rmtree(source_folder)
+
+	def test_add_file_disk_file_digest_of_other_algorithm(self):
+		import shutil
+		import tempfile
+		from octoprint.filemanager.util import DiskFileWrapper
+
+		source_folder = tempfile.mkdtemp()
+		try:
+			source = os.path.join(source_folder, "bp_case.stl")
+			shutil.copy(FILE_BP_CASE_STL.path, source)
+
+			# a digest of another algorithm must not end up in the metadata
+			file_object = DiskFileWrapper("bp_case.stl", source, digest="aabbccddeeff", hash_algorithm="md5")
+			file_object.hash = FILE_BP_CASE_STL.hash
+
+			self._add_and_verify_file("bp_case.stl", "bp_case.stl", file_object)
+		finally:
+			shutil.rmtree(source_folder)
+
+	def test_add_file_fingerprint(self):
+		from octoprint.filemanager.util import Fingerprint
+
+		self.storage = LocalFileStorage(self.basefolder, metadata_backend=self.metadata_backend, hash_algorithm="fingerprint")
+		self.storage.add_file("bp_case.stl", FILE_BP_CASE_STL)
+
+		fingerprint = Fingerprint()
+		with open(FILE_BP_CASE_STL.path, "rb") as f:
+			fingerprint.update(f.read())
+
+		self.assertEqual(fingerprint.hexdigest(), self.storage.get_metadata("bp_case.stl")["hash"])
+		self.assertNotEqual(FILE_BP_CASE_STL.hash, self.storage.get_metadata("bp_case.stl")["hash"])
+
+	def test_hash_algorithm_changed(self):
+		stl_name = self._add_and_verify_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		gcode_name = self._add_and_verify_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE, links=[("model", dict(name=stl_name))])
+
+		self.storage = LocalFileStorage(self.basefolder, metadata_backend=self.metadata_backend, hash_algorithm="fingerprint")
+
+		# the same file again keeps its metadata, and the hashes links use
+		self.storage.add_file(stl_name, FILE_BP_CASE_STL, allow_overwrite=True)
+		stl_metadata = self.storage.get_metadata(stl_name)
+		self.assertEqual(FILE_BP_CASE_STL.hash, stl_metadata["hash"])
+		self.assertEqual("sha1", stl_metadata["hashAlgorithm"])
+		self.assertEqual(1, len(stl_metadata["links"]))
+
+		self.storage.remove_link(gcode_name, "model", dict(name=stl_name))
+		self.assertEqual(0, len(self.storage.get_metadata(stl_name)["links"]))
+
+		# a changed file is hashed with the new algorithm
+		self.storage.add_file(stl_name, FILE_CRAZYRADIO_STL, allow_overwrite=True)
+		stl_metadata = self.storage.get_metadata(stl_name)
+		self.assertNotEqual(FILE_CRAZYRADIO_STL.hash, stl_metadata["hash"])
+		self.assertEqual("fingerprint", stl_metadata["hashAlgorithm"])
+
 	def test_add_file_with_web(self):
 		import time
 		href = "http://www.example.com"
@@ -267,7 +372,8 @@ class LocalStorageTest(unittest.TestCase):
 		self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "source", "crazyradio.stl")))
 		self.assertTrue(os.path.isdir(os.path.join(self.basefolder, "destination")))
 		self.assertTrue(os.path.isdir(os.path.join(self.basefolder, "destination", "copied")))
-		self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "destination", "copied", ".metadata.yaml")))
+		if self.metadata_backend == "yaml":
+			self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "destination", "copied", ".metadata.yaml")))
 		self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "destination", "copied", "crazyradio.stl")))
 
 		self.assertIsNotNone(source_metadata)
@@ -288,7 +394,8 @@ class LocalStorageTest(unittest.TestCase):
 		self.assertFalse(os.path.isfile(os.path.join(self.basefolder, "source", "crazyradio.stl")))
 		self.assertTrue(os.path.isdir(os.path.join(self.basefolder, "destination")))
 		self.assertTrue(os.path.isdir(os.path.join(self.basefolder, "destination", "copied")))
-		self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "destination", "copied", ".metadata.yaml")))
+		if self.metadata_backend == "yaml":
+			self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "destination", "copied", ".metadata.yaml")))
 		self.assertTrue(os.path.isfile(os.path.join(self.basefolder, "destination", "copied", "crazyradio.stl")))
 
 		self.assertIsNotNone(before_source_metadata)
@@ -432,6 +539,46 @@ class LocalStorageTest(unittest.TestCase):
 		stl_metadata = self.storage.get_metadata(stl_name)
 		self.assertEqual(1, len(stl_metadata["links"]))
 
+	def test_history(self):
+		gcode_name = self._add_and_verify_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
+
+		self.storage.add_history(gcode_name, dict(timestamp=1, success=True, printTime=100.0, printerProfile="_default"))
+		self.storage.add_history(gcode_name, dict(timestamp=2, success=True, printTime=200.0, printerProfile="_default"))
+		self.storage.update_history(gcode_name, 0, dict(printTime=50.0))
+
+		gcode_metadata = self.storage.get_metadata(gcode_name)
+		self.assertEqual(2, len(gcode_metadata["history"]))
+		self.assertEqual(125.0, gcode_metadata["statistics"]["averagePrintTime"]["_default"])
+		self.assertEqual(200.0, gcode_metadata["statistics"]["lastPrintTime"]["_default"])
+
+	def test_get_metadata_copy(self):
+		stl_name = self._add_and_verify_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
+		self.storage.add_link(stl_name, "web", dict(href="http://www.example.com"))
+
+		# modifying the returned metadata must not modify the stored (and cached) one
+		stl_metadata = self.storage.get_metadata(stl_name)
+		stl_metadata["links"].append(dict(rel="web", href="http://www.example2.com"))
+		stl_metadata["foo"] = "bar"
+
+		stl_metadata = self.storage.get_metadata(stl_name)
+		self.assertEqual(1, len(stl_metadata["links"]))
+		self.assertFalse("foo" in stl_metadata)
+
+	def test_get_entry_view(self):
+		from octoprint.filemanager.metadata import FrozenDict, FrozenList
+
+		stl_name = self._add_and_verify_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL, links=[("web", dict(href="http://www.example.com"))])
+
+		# read-only view, whether the folder is cached or not
+		storage = LocalFileStorage(self.basefolder, metadata_backend=self.metadata_backend)
+		entry = storage._metadata.get_entry(self.basefolder, stl_name)
+		self.assertIsInstance(entry, FrozenDict)
+		self.assertIsInstance(entry["links"], FrozenList)
+
+		storage._metadata.get_folder(self.basefolder)
+		self.assertIsInstance(storage._metadata.get_entry(self.basefolder, stl_name), FrozenDict)
+		self.assertEqual(entry, storage._metadata.get_entry(self.basefolder, stl_name))
+
 	def test_remove_link_bidirectional(self):
 		stl_name = self._add_and_verify_file("bp_case.stl", "bp_case.stl", FILE_BP_CASE_STL)
 		gcode_name = self._add_and_verify_file("bp_case.gcode", "bp_case.gcode", FILE_BP_CASE_GCODE)
@@ -453,6 +600,76 @@ class LocalStorageTest(unittest.TestCase):
 		self.assertEqual(0, len(gcode_metadata["links"]))
 		self.assertEqual(1, len(stl_metadata["links"]))
 
+	def test_list_from_index(self):
+		self._add_file("bp_case.stl", FILE_BP_CASE_STL)
+
+		# the folder was just modified, pretend the file system's mtime resolution is fine enough to trust the index
+		self.storage.MTIME_RESOLUTION = -1.0
+		self.storage.list_files()
+
+		with mock.patch("octoprint.filemanager.storage.scandir") as scandir_mock:
+			scandir_mock.side_effect = AssertionError("folder was scanned again")
+			file_list = self.storage.list_files()
+
+		self.assertEqual(["bp_case.stl"], list(file_list.keys()))
+
+		# modifying the listing must not modify the index
+		file_list["bp_case.stl"]["foo"] = "bar"
+		self.assertFalse("foo" in self.storage.list_files()["bp_case.stl"])
+
+	def test_version(self):
+		version = self.storage.version
+		self._add_file("bp_case.stl", FILE_BP_CASE_STL)
+		self.assertTrue(self.storage.version > version)
+
+		version = self.storage.version
+		self.storage.set_additional_metadata("bp_case.stl", "foo", "bar")
+		self.assertTrue(self.storage.version > version)
+		self.assertEqual("bar", self.storage.list_files()["bp_case.stl"]["foo"])
+
+		version = self.storage.version
+		self.storage.remove_file("bp_case.stl")
+		self.assertTrue(self.storage.version > version)
+		self.assertEqual(0, len(self.storage.list_files()))
+
+	def test_external_change(self):
+		import time
+
+		self._add_file("bp_case.stl", FILE_BP_CASE_STL)
+		self.storage.MTIME_RESOLUTION = -1.0
+		self.storage.list_files()
+		version = self.storage.version
+
+		FILE_CRAZYRADIO_STL.save(os.path.join(self.basefolder, "crazyradio.stl"))
+		mtime = time.time() + 10
+		os.utime(self.basefolder, (mtime, mtime))
+
+		self.assertTrue(self.storage.version > version)
+		self.assertEqual(["bp_case.stl", "crazyradio.stl"], sorted(self.storage.list_files().keys()))
+
+	def test_version_recently_modified_folder(self):
+		self._add_file("bp_case.stl", FILE_BP_CASE_STL)
+		version = self.storage.version
+		last_modified = self.storage.last_modified()
+
+		# the index isn't current right after the modification, but validating it doesn't change anything
+		self.storage.list_files()
+		self.assertEqual(version, self.storage.version)
+		self.assertEqual(last_modified, self.storage.last_modified())
+
+	def test_external_change_within_mtime_resolution(self):
+		self._add_file("bp_case.stl", FILE_BP_CASE_STL)
+		version = self.storage.version
+		self.storage.list_files()
+
+		# a file system with a coarse timestamp resolution doesn't change the folder's mtime
+		mtime = os.stat(self.basefolder).st_mtime
+		FILE_CRAZYRADIO_STL.save(os.path.join(self.basefolder, "crazyradio.stl"))
+		os.utime(self.basefolder, (mtime, mtime))
+
+		self.assertTrue(self.storage.version > version)
+		self.assertEqual(["bp_case.stl", "crazyradio.stl"], sorted(self.storage.list_files().keys()))
+
 	@data(
 		("some_file.gco", "some_file.gco"),
 		("some_file with (parentheses) and ümläuts and digits 123.gco", "some_file_with_(parentheses)_and_umlauts_and_digits_123.gco"),
@@ -550,7 +767,8 @@ class LocalStorageTest(unittest.TestCase):
 			folder_path = os.path.join(self.basefolder, os.path.join(*split_path[:-1]))
 
 		self.assertTrue(os.path.isfile(file_path))
-		self.assertTrue(os.path.isfile(os.path.join(folder_path, ".metadata.yaml")))
+		if self.metadata_backend == "yaml":
+			self.assertTrue(os.path.isfile(os.path.join(folder_path, ".metadata.yaml")))
 
 		metadata = self.storage.get_metadata(sanitized_path)
 		self.assertIsNotNone(metadata)
@@ -583,3 +801,41 @@ class LocalStorageTest(unittest.TestCase):
 		self.assertTrue(os.path.isdir(os.path.join(self.basefolder, os.path.join(*sanitized_path.split("/")))))
 		return sanitized_path
 
+
+class SqliteLocalStorageTest(LocalStorageTest):
+
+	metadata_backend = "sqlite"
+
+	def test_metadata_database(self):
+		self._add_file("bp_case.stl", FILE_BP_CASE_STL)
+
+		self.assertTrue(os.path.isfile(os.path.join(self.basefolder, ".metadata.db")))
+		self.assertFalse(os.path.exists(os.path.join(self.basefolder, ".metadata.yaml")))
+		self.assertEqual(["bp_case.stl"], list(self.storage.list_files().keys()))
+
+	def test_migrate_yaml(self):
+		import shutil
+		import tempfile
+		import yaml
+
+		basefolder = os.path.realpath(os.path.abspath(tempfile.mkdtemp()))
+		try:
+			os.mkdir(os.path.join(basefolder, "folder"))
+			FILE_BP_CASE_GCODE.save(os.path.join(basefolder, "folder", "bp_case.gcode"))
+
+			metadata = {"bp_case.gcode": dict(hash=FILE_BP_CASE_GCODE.hash,
+			                                  links=[],
+			                                  history=[dict(timestamp=1, success=True, printTime=100.0, printerProfile="_default")])}
+			with open(os.path.join(basefolder, "folder", ".metadata.yaml"), "w") as f:
+				yaml.safe_dump(metadata, stream=f)
+
+			storage = LocalFileStorage(basefolder, metadata_backend="sqlite")
+			self.assertDictEqual(metadata["bp_case.gcode"], storage.get_metadata("folder/bp_case.gcode"))
+
+			# the migration only runs once
+			os.remove(os.path.join(basefolder, "folder", ".metadata.yaml"))
+			storage.remove_history("folder/bp_case.gcode", 0)
+			storage = LocalFileStorage(basefolder, metadata_backend="sqlite")
+			self.assertEqual(0, len(storage.get_metadata("folder/bp_case.gcode")["history"]))
+		finally:
+			shutil.rmtree(basefolder)
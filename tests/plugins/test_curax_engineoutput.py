@@ -0,0 +1,52 @@
+# coding=utf-8
+"""
+Unit tests for the CuraEngine output parser of bundled plugin "curaX".
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+
+from ddt import ddt, data, unpack
+
+from octoprint.plugins.curaX.engineOutput import EngineOutput
+
+@ddt
+class EngineOutputTests(unittest.TestCase):
+
+	def setUp(self):
+		self.output = EngineOutput()
+
+	@data(
+		(u"Progress:inset+skin:10:100 \t0.049177%", 0.049177),
+		(u"Progress:export:100:100\t1%\n", 1.0),
+		(u"Progress:export:100:100", None),
+		(u"Progress:export:100:100\tdone%", None),
+		(u"Layer count: 100", None),
+		(u"Some other line", None)
+	)
+	@unpack
+	def test_parse_progress(self, line, expected):
+		self.assertEqual(expected, self.output.parse(line))
+
+	def test_analysis(self):
+		for line in (u"Layer count: 120", u"Layer count: 130", u"Print time: 3600", u"Filament: 1000", u"Filament2: 500"):
+			self.output.parse(line)
+
+		analysis = self.output.analysis(filament_diameter=1.75, filament_density=1.24)
+
+		self.assertEqual(120, analysis["layerCount"])
+		self.assertEqual(3600, analysis["estimatedPrintTime"])
+		self.assertEqual(dict(length=1000, volume=2.41, weight=3.0), analysis["filament"]["tool0"])
+		self.assertEqual(dict(length=500, volume=1.2, weight=1.5), analysis["filament"]["tool1"])
+
+	def test_analysis_without_density(self):
+		self.output.parse(u"Filament: 1000")
+		self.assertEqual(dict(length=1000, volume=2.41), self.output.analysis()["filament"]["tool0"])
+
+	def test_no_analysis(self):
+		self.output.parse(u"Layer count: 120")
+		self.assertIsNone(self.output.analysis())
@@ -0,0 +1,136 @@
+# coding=utf-8
+"""
+Unit tests for the profile catalogue of bundled plugin "curaX".
+"""
+
+from __future__ import absolute_import
+
+__author__ = "Bruno Andrade"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from octoprint.plugins.curaX.profileReader import ProfileCatalogue, ProfileReader
+
+class ProfileCatalogueTests(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		for folder in ProfileCatalogue.FOLDERS:
+			os.mkdir(os.path.join(self.basedir, folder))
+
+		self._write("Printers", "beethefirst", dict(id="BEEVERYCREATIVE-beethefirst", inherits="fdmprinter", nozzles_supported=[0.4], overrides=dict(machine=dict(machine_width=dict(default_value=190)))))
+		self._write("Printers", "fdmprinter.def", dict(id="fdmprinter", overrides=dict()))
+		self._write("Materials", "pla", dict(brand="BEEVERYCREATIVE", overrides=dict(material=dict(material_diameter=dict(default_value=1.75)))))
+		self._write("Materials", "pla_a0xx", dict(inherits="pla", overrides=dict(material=dict(material_print_temperature=dict(default_value=210)))))
+		self._write("Quality", "A026-blue", dict(inherits="pla_a0xx", color="#0000ff", nozzles_supported=[0.4, 0.6],
+		                                         PrinterGroups=[dict(group_printers=["beethefirst"], quality=dict())]))
+
+		self.catalogue = ProfileCatalogue(self.basedir)
+
+		self.listdir = mock.patch("os.listdir", wraps=os.listdir)
+		self.listdir_mock = self.listdir.start()
+
+	def tearDown(self):
+		self.listdir.stop()
+		shutil.rmtree(self.basedir)
+
+	def _write(self, folder, name, profile, mtime=None):
+		path = os.path.join(self.basedir, folder, name + ".json")
+		with open(path, "w") as f:
+			json.dump(profile, f)
+		if mtime is not None:
+			os.utime(path, (mtime, mtime))
+
+	def test_lookup(self):
+		self.assertEqual("#0000ff", self.catalogue.lookup("Quality", "a026-BLUE")["color"])
+		self.assertIsNone(self.catalogue.lookup("Quality", "a026-BLUE", ignore_case=False))
+		self.assertIsNone(self.catalogue.lookup("Quality", "unknown"))
+
+	def test_printer_by_id(self):
+		printer = self.catalogue.printer("BEEVERYCREATIVE-beethefirst")
+		self.assertEqual(190, printer["overrides"]["machine"]["machine_width"]["default_value"])
+
+		# a private copy
+		printer["overrides"]["machine"]["machine_width"]["default_value"] = 0
+		self.assertEqual(190, self.catalogue.printer("BEEVERYCREATIVE-beethefirst")["overrides"]["machine"]["machine_width"]["default_value"])
+
+	def test_variants_override_quality(self):
+		self._write("Variants", "A026-blue", dict(color="#00ff00"))
+
+		self.assertEqual("#00ff00", self.catalogue.filament("A026-blue")["color"])
+		self.assertEqual(os.path.join(self.basedir, "Variants", "A026-blue.json"), self.catalogue.filament_path("A026-blue"))
+
+	def test_scans_once(self):
+		for _ in range(10):
+			self.catalogue.lookup("Quality", "A026-blue")
+			self.catalogue.printer("fdmprinter")
+
+		self.assertEqual(len(ProfileCatalogue.FOLDERS), self.listdir_mock.call_count)
+
+	def test_file_change(self):
+		self.assertEqual("#0000ff", self.catalogue.lookup("Quality", "A026-blue")["color"])
+
+		self._write("Quality", "A026-blue", dict(color="#ff0000"), mtime=1)
+		self.catalogue.invalidate()
+
+		self.assertEqual("#ff0000", self.catalogue.lookup("Quality", "A026-blue")["color"])
+
+	def test_file_removed(self):
+		self.assertIsNotNone(self.catalogue.lookup("Materials", "pla"))
+
+		os.remove(os.path.join(self.basedir, "Materials", "pla.json"))
+		self.catalogue.invalidate()
+
+		self.assertIsNone(self.catalogue.lookup("Materials", "pla"))
+
+	def test_memoize_reset_on_change(self):
+		factory = mock.Mock(return_value=1)
+
+		self.assertEqual(1, self.catalogue.memoize("key", factory))
+		self.assertEqual(1, self.catalogue.memoize("key", factory))
+		self.assertEqual(1, factory.call_count)
+
+		self._write("Quality", "A027-red", dict(color="#ff0000"))
+		self.catalogue.invalidate()
+
+		self.catalogue.memoize("key", factory)
+		self.assertEqual(2, factory.call_count)
+
+	def test_parent_overrides(self):
+		overrides = ProfileReader.getParentOverrides("pla_a0xx", "0.4", self.basedir)
+		self.assertEqual(dict(material_diameter=dict(default_value=1.75),
+		                      material_print_temperature=dict(default_value=210)),
+		                 overrides)
+
+	def test_filament_header(self):
+		self.assertEqual("BEEVERYCREATIVE", ProfileReader.getFilamentHeader("brand", "A026-blue", self.basedir))
+		self.assertEqual("#0000ff", ProfileReader.getFilamentHeader("color", "A026-blue", self.basedir))
+
+	def test_compatible(self):
+		with mock.patch.object(ProfileReader, "slicerCatalogue", return_value=self.catalogue):
+			self.assertTrue(ProfileReader.isPrinterAndNozzleCompatible("A026-blue", "beethefirst", "400"))
+			self.assertFalse(ProfileReader.isPrinterAndNozzleCompatible("A026-blue", "beethefirst", "600"))
+			self.assertFalse(ProfileReader.isPrinterAndNozzleCompatible("A026-blue", "beethefirstplus", "400"))
+
+	def test_slice_preset_memoized(self):
+		with mock.patch.object(ProfileReader, "slicerCatalogue", return_value=self.catalogue), \
+		     mock.patch.object(ProfileReader, "_compileSlicePreset") as compile_mock:
+			preset = ProfileReader.getSlicePreset("beethefirst", "0.4", "A026-blue", "medium")
+			self.assertIs(preset, ProfileReader.getSlicePreset("beethefirst", "0.4", "A026-blue", "medium"))
+			self.assertEqual(1, compile_mock.call_count)
+
+			ProfileReader.getSlicePreset("beethefirst", "0.4", "A026-blue", "high")
+			self.assertEqual(2, compile_mock.call_count)
+
+			self._write("Quality", "A026-blue", dict(color="#ff0000"), mtime=1)
+			self.catalogue.invalidate()
+
+			ProfileReader.getSlicePreset("beethefirst", "0.4", "A026-blue", "medium")
+			self.assertEqual(3, compile_mock.call_count)
@@ -0,0 +1,103 @@
+# coding=utf-8
+"""
+Unit tests for the slice cache of bundled plugin "curaX".
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from octoprint.plugins.curaX.sliceCache import SliceCache
+
+class SliceCacheTests(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+		self.folder = os.path.join(self.basedir, "slices")
+
+		self.model = self._write("model.stl", b"solid model")
+		self.settings = dict(layer_height=dict(default_value=0.2), infill_sparse_density=dict(default_value=20))
+
+		self.cache = SliceCache(self.folder, 100)
+
+	def tearDown(self):
+		shutil.rmtree(self.basedir)
+
+	def _write(self, name, content):
+		path = os.path.join(self.basedir, name)
+		with open(path, "wb") as f:
+			f.write(content)
+		return path
+
+	def _read(self, path):
+		with open(path, "rb") as f:
+			return f.read()
+
+	def test_key_stable(self):
+		reordered = dict(infill_sparse_density=dict(default_value=20, label="Infill"), layer_height=dict(default_value=0.2))
+		self.assertEqual(SliceCache.key([self.model], self.settings), SliceCache.key([self.model], reordered))
+
+	def test_key_sensitive(self):
+		key = SliceCache.key([self.model], self.settings, engine="CuraEngine:1")
+
+		changed = dict(self.settings, layer_height=dict(default_value=0.1))
+		other_model = self._write("other.stl", b"solid other")
+
+		self.assertNotEqual(key, SliceCache.key([self.model], changed, engine="CuraEngine:1"))
+		self.assertNotEqual(key, SliceCache.key([other_model], self.settings, engine="CuraEngine:1"))
+		self.assertNotEqual(key, SliceCache.key([self.model], self.settings, engine="CuraEngine:2"))
+		self.assertNotEqual(key, SliceCache.key([self.model], self.settings, {0: dict(extruder_nr=dict(default_value=0))}, engine="CuraEngine:1"))
+
+	def test_miss_then_hit(self):
+		target = os.path.join(self.basedir, "target.gco")
+
+		self.assertEqual((False, None), self.cache.get("key", target))
+		self.assertFalse(os.path.exists(target))
+
+		self.cache.put("key", self._write("sliced.gco", b"G28"), dict(print_time=60))
+
+		self.assertEqual((True, dict(print_time=60)), self.cache.get("key", target))
+		self.assertEqual(b"G28", self._read(target))
+
+		statistics = self.cache.statistics()
+		self.assertEqual(1, statistics["hits"])
+		self.assertEqual(1, statistics["misses"])
+		self.assertEqual(0.5, statistics["hitRatio"])
+		self.assertEqual(1, statistics["entries"])
+		self.assertEqual(3, statistics["size"])
+
+	def test_evicts_least_recently_used(self):
+		target = os.path.join(self.basedir, "target.gco")
+
+		self.cache.put("first", self._write("first.gco", b"1" * 40))
+		self.cache.put("second", self._write("second.gco", b"2" * 40))
+		self.cache.get("first", target)
+		self.cache.put("third", self._write("third.gco", b"3" * 40))
+
+		self.assertTrue(self.cache.get("first", target)[0])
+		self.assertFalse(self.cache.get("second", target)[0])
+		self.assertTrue(self.cache.get("third", target)[0])
+		self.assertEqual(80, self.cache.statistics()["size"])
+
+	def test_too_large(self):
+		self.cache.put("key", self._write("sliced.gco", b"G" * 101))
+		self.assertEqual(0, self.cache.statistics()["entries"])
+
+	def test_persistence(self):
+		self.cache.put("key", self._write("sliced.gco", b"G28"), dict(print_time=60))
+
+		cache = SliceCache(self.folder, 100)
+		self.assertEqual((True, dict(print_time=60)), cache.get("key", os.path.join(self.basedir, "target.gco")))
+
+	def test_clear(self):
+		self.cache.put("key", self._write("sliced.gco", b"G28"))
+		self.cache.clear()
+
+		self.assertEqual(0, self.cache.statistics()["entries"])
+		self.assertEqual(["index.json"], os.listdir(self.folder))
@@ -0,0 +1,52 @@
+# coding=utf-8
+"""
+Unit tests for the slice presets of bundled plugin "curaX".
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+
+from octoprint.plugins.curaX.slicePreset import SlicePreset
+
+class SlicePresetTests(unittest.TestCase):
+
+	def setUp(self):
+		self.engine_settings = dict(layer_height=dict(default_value=0.2),
+		                            infill_sparse_density=dict(default_value=20),
+		                            machine_name=dict(label="Machine"))
+		self.preset = SlicePreset(self.engine_settings)
+
+	def _pairs(self, args):
+		return sorted(zip(args[::2], args[1::2]))
+
+	def test_arguments(self):
+		self.assertEqual([("-s", "infill_sparse_density=20"), ("-s", "layer_height=0.2")],
+		                 self._pairs(self.preset.arguments()))
+
+	def test_arguments_delta(self):
+		delta = dict(infill_sparse_density=dict(default_value=50), support_enable=dict(default_value=True))
+		self.assertEqual([("-s", "infill_sparse_density=50"), ("-s", "layer_height=0.2"), ("-s", "support_enable=True")],
+		                 self._pairs(self.preset.arguments(delta)))
+
+		# the preset itself is left untouched
+		self.assertEqual([("-s", "infill_sparse_density=20"), ("-s", "layer_height=0.2")],
+		                 self._pairs(self.preset.arguments()))
+
+	def test_settings_delta(self):
+		engine_settings, extruder_settings = self.preset.settings(dict(layer_height=dict(default_value=0.1)))
+
+		self.assertEqual(dict(default_value=0.1), engine_settings["layer_height"])
+		self.assertEqual(dict(default_value=20), engine_settings["infill_sparse_density"])
+		self.assertIsNone(extruder_settings)
+		self.assertEqual(dict(default_value=0.2), self.preset.engine_settings["layer_height"])
+
+	def test_extruder_arguments(self):
+		preset = SlicePreset(dict(), {0: dict(material_print_temperature=dict(default_value=210)),
+		                              1: dict(material_print_temperature=dict(default_value=230))})
+
+		self.assertEqual(["-g", "-e0", "-s", "material_print_temperature=210", "-e1", "-s", "material_print_temperature=230"],
+		                 preset.arguments())
@@ -0,0 +1,55 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import logging
+import unittest
+import mock
+
+from octoprint.printer.bee_printer import BeePrinter
+from octoprint.printer.estimation import PrintTimeCurve, PrintTimeCurveRecorder
+
+class BeePrinterPrintTimeCurveTestCase(unittest.TestCase):
+
+	def setUp(self):
+		# only the state _setProgressData works on
+		self.printer = BeePrinter.__new__(BeePrinter)
+		self.printer._logger = logging.getLogger(__name__)
+		self.printer._comm = mock.MagicMock()
+		self.printer._stateMonitor = mock.MagicMock()
+		self.printer._selectedFile = dict(filesize=1000, estimatedPrintTime=None)
+		self.printer._elapsedTime = None
+		self.printer._estimatedTime = None
+		self.printer._targetTemperature = None
+		self.printer._lastProgressReport = None
+		self.printer._reportPrintProgressToPlugins = mock.MagicMock()
+		self.printer._printTimeCurveRecorder = PrintTimeCurveRecorder()
+
+		self.printing = False
+		self.printer._comm.isPrinting.side_effect = lambda: self.printing
+
+	def test_records_only_while_printing(self):
+		# file transfer and heating report their progress with an elapsed time of 0
+		for step in range(101):
+			self.printer._setProgressData(step / 100, 0, 0, 0)
+
+		self.printing = True
+		for step in range(101):
+			self.printer._setProgressData(step / 100, step * 10, step * 36.0, None)
+
+		curve = self.printer._printTimeCurveRecorder.to_curve()
+		self.assertIsNotNone(curve)
+		self.assertAlmostEqual(0.5, curve.fraction_at(0.5))
+
+	def test_curve_not_used_while_heating(self):
+		self.printer._selectedFile["printTimeCurve"] = PrintTimeCurve([step / 100 for step in range(101)], 3600)
+
+		self.printer._setProgressData(0.5, 0, 0, 0)
+		self.assertIsNone(self.printer._printTimeLeft)
+
+		self.printing = True
+		self.printer._setProgressData(0.5, 500, 1800.0, None)
+		self.assertAlmostEqual(1800.0, self.printer._printTimeLeft)
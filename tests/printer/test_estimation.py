@@ -1,6 +1,6 @@
 # coding=utf-8
 from __future__ import absolute_import, division, print_function
-from octoprint.printer.estimation import TimeEstimationHelper
+from octoprint.printer.estimation import TimeEstimationHelper, PrintTimeCurve, PrintTimeCurveRecorder
 
 __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
@@ -73,3 +73,93 @@ class EstimationTestCase(unittest.TestCase):
 
 		self.assertEqual(self.estimation_helper.is_stable(), expected)
 
+
+
+@ddt
+class PrintTimeCurveTestCase(unittest.TestCase):
+
+	def _record(self, elapsed_for_progress, steps=100):
+		recorder = PrintTimeCurveRecorder()
+		for step in range(steps + 1):
+			progress = step / float(steps)
+			recorder.record(progress, elapsed_for_progress(progress))
+		return recorder
+
+	def test_record_linear(self):
+		curve = self._record(lambda progress: progress * 1000.0).to_curve()
+
+		self.assertEqual(1000.0, curve.total)
+		self.assertEqual(101, len(curve.fractions))
+		self.assertAlmostEqual(0.5, curve.fraction_at(0.5))
+		self.assertAlmostEqual(0.255, curve.fraction_at(0.255))
+
+	def test_record_interpolates_gaps(self):
+		recorder = PrintTimeCurveRecorder()
+		for step in range(0, 101, 10):
+			recorder.record(step / 100.0, step * 10.0)
+
+		curve = recorder.to_curve()
+		self.assertAlmostEqual(0.15, curve.fractions[15])
+
+	def test_record_keeps_first_sample_per_step(self):
+		recorder = PrintTimeCurveRecorder()
+		for step in range(101):
+			recorder.record(step / 100.0, step * 10.0)
+			recorder.record(step / 100.0 + 0.001, step * 10.0 + 5.0)
+
+		curve = recorder.to_curve()
+		self.assertAlmostEqual(0.5, curve.fractions[50], places=2)
+
+	def test_record_too_few_samples(self):
+		recorder = PrintTimeCurveRecorder()
+		recorder.record(0.0, 0.0)
+		recorder.record(0.5, 10.0)
+
+		self.assertIsNone(recorder.to_curve())
+
+	@data(
+		(0.1, 200.0, 4000.0),   # same speed as recorded, 10% of the file after 5% of the time
+		(0.1, 100.0, 2000.0),   # twice as fast as recorded
+		(0.8, 3500.0, 5000.0),  # slower than recorded, 80% of the file after 70% of the time
+	)
+	@unpack
+	def test_estimate_total_nonlinear(self, progress, elapsed, expected):
+		# the first 50% of the file take only a quarter of the time
+		curve = self._record(lambda progress: progress * 2000.0 if progress <= 0.5 else 1000.0 + (progress - 0.5) * 6000.0).to_curve()
+
+		self.assertAlmostEqual(expected, curve.estimate_total(progress, elapsed))
+
+	def test_estimate_total_start(self):
+		curve = self._record(lambda progress: progress * 1000.0).to_curve()
+
+		self.assertEqual(1000.0, curve.estimate_total(0.0, 0.0))
+
+		# within the blending range, half recorded total, half scaled estimate
+		self.assertAlmostEqual(0.5 * 1000.0 + 0.5 * 2000.0, curve.estimate_total(0.025, 50.0))
+
+	def test_merged(self):
+		first = self._record(lambda progress: progress * 1000.0).to_curve()
+		second = self._record(lambda progress: progress * 2000.0).to_curve()
+
+		merged = first.merged(second, 0.25)
+		self.assertEqual(1250.0, merged.total)
+		self.assertEqual(2, merged.prints)
+		self.assertAlmostEqual(0.5, merged.fraction_at(0.5))
+
+	def test_round_trip(self):
+		curve = self._record(lambda progress: progress * 1000.0).to_curve()
+
+		restored = PrintTimeCurve.from_dict(curve.as_dict())
+		self.assertEqual(curve.total, restored.total)
+		self.assertEqual(curve.prints, restored.prints)
+		self.assertAlmostEqual(curve.fraction_at(0.33), restored.fraction_at(0.33))
+
+	@data(
+		None,
+		dict(),
+		dict(fractions=[0.0, 1.0], total=100),
+		dict(fractions=[0.0] * 101, total=0),
+		dict(fractions="invalid", total=100),
+	)
+	def test_from_dict_invalid(self, value):
+		self.assertIsNone(PrintTimeCurve.from_dict(value))
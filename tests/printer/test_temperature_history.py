@@ -0,0 +1,77 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2017 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import unittest
+import mock
+
+from octoprint.printer.standard import TemperatureHistory
+
+def _data_point(timestamp, tool, bed=None, target=210.0):
+	result = dict(time=timestamp, tool0=dict(actual=tool, target=target))
+	if bed is not None:
+		result["bed"] = dict(actual=bed, target=60.0)
+	return result
+
+class TemperatureHistoryTest(unittest.TestCase):
+
+	def setUp(self):
+		self.now = 100020 # aligned to all tiers
+		time_patcher = mock.patch("time.time", side_effect=lambda: self.now)
+		time_patcher.start()
+		self.addCleanup(time_patcher.stop)
+
+		self.history = TemperatureHistory(cutoff=60, tiers=[(10, 6), (60, 10)])
+
+	def _fill(self, start, end, step=2):
+		for timestamp in range(start, end, step):
+			self.now = timestamp
+			self.history.append(_data_point(timestamp, float(timestamp - start)))
+
+	def test_raw_cutoff(self):
+		self._fill(self.now, self.now + 200)
+
+		points = list(self.history)
+		self.assertEqual(31, len(points))
+		self.assertEqual(31, len(self.history))
+		self.assertEqual(self.now - 60, points[0]["time"])
+		self.assertEqual(self.now, points[-1]["time"])
+		self.assertDictEqual(dict(actual=198.0, target=210.0), points[-1]["tool0"])
+
+	def test_missing_sensor(self):
+		self.history.append(_data_point(self.now, 20.0, bed=30.0))
+		self.now += 1
+		self.history.append(_data_point(self.now, 21.0))
+
+		points = list(self.history)
+		self.assertIn("bed", points[0])
+		self.assertNotIn("bed", points[1])
+
+	def test_query_tier(self):
+		start = self.now
+		self._fill(start, start + 60)
+
+		points = self.history.query(start=start, resolution=10)
+		self.assertEqual([start + 10 * i for i in range(6)], [point["time"] for point in points])
+
+		# first bucket: 0, 2, 4, 6, 8
+		self.assertDictEqual(dict(actual=4.0, target=210.0, min=0.0, max=8.0), points[0]["tool0"])
+
+	def test_query_falls_back_to_coarser_tier(self):
+		start = self.now
+		self._fill(start, start + 600, step=5)
+
+		# the 10s tier only reaches back 60s, so the 60s tier has to be used
+		points = self.history.query(start=start + 120)
+		self.assertEqual(start + 120, points[0]["time"])
+		self.assertEqual(60, points[1]["time"] - points[0]["time"])
+
+	def test_query_range(self):
+		start = self.now
+		self._fill(start, start + 60)
+
+		points = self.history.query(start=start + 10, end=start + 20)
+		self.assertEqual([start + 10 + 2 * i for i in range(6)], [point["time"] for point in points])
@@ -0,0 +1,202 @@
+# coding=utf-8
+"""
+Unit tests for ``octoprint.server.util.sockjs``.
+"""
+
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2017 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+
+import unittest
+import mock
+import json
+import copy
+from ddt import ddt, data, unpack
+
+
+##~~ PrinterStateBroadcaster
+
+class PrinterStateBroadcasterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.printer = mock.MagicMock()
+		self.printer.is_printing.return_value = False
+		self.printer.is_paused.return_value = False
+
+		self.file_manager = mock.MagicMock()
+		self.file_manager.get_busy_files.return_value = []
+
+		self.event_manager = mock.MagicMock()
+		self.plugin_manager = mock.MagicMock()
+
+		from octoprint.server.util.sockjs import PrinterStateBroadcaster
+		self.broadcaster = PrinterStateBroadcaster(self.printer, self.file_manager, self.event_manager,
+		                                           self.plugin_manager)
+
+	def _connection(self, throttle_factor=1):
+		connection = mock.MagicMock()
+		connection.throttle_factor = throttle_factor
+		return connection
+
+	def _current(self, connection):
+		return [json.loads(call[0][1])["current"] for call in connection.send_encoded.call_args_list]
+
+	def _frames(self, connection):
+		return [json.loads(call[0][1]) for call in connection.send_encoded.call_args_list]
+
+	def test_subscribe_registers_once(self):
+		first = self._connection()
+		second = self._connection()
+
+		self.broadcaster.subscribe(first)
+		self.broadcaster.subscribe(second)
+		self.printer.register_callback.assert_called_once_with(self.broadcaster)
+
+		self.broadcaster.unsubscribe(first)
+		self.assertFalse(self.printer.unregister_callback.called)
+
+		self.broadcaster.unsubscribe(second)
+		self.printer.unregister_callback.assert_called_once_with(self.broadcaster)
+
+	def test_current_encoded_once(self):
+		connections = [self._connection() for _ in range(10)]
+		for connection in connections:
+			self.broadcaster.subscribe(connection)
+
+		self.broadcaster.on_printer_add_temperature(dict(bed=dict(actual=20.0, target=0.0)))
+		self.broadcaster.on_printer_add_log("Recv: ok")
+
+		with mock.patch("sockjs.tornado.proto.json_encode", wraps=json.dumps) as json_encode:
+			self.broadcaster.on_printer_send_current_data(dict(state=dict(text="Operational")))
+		self.assertEqual(1, json_encode.call_count)
+		self.assertEqual(1, self.file_manager.get_busy_files.call_count)
+
+		encoded = set()
+		for connection in connections:
+			self.assertEqual(1, connection.send_encoded.call_count)
+			encoded.add(connection.send_encoded.call_args[0][1])
+		self.assertEqual(1, len(encoded))
+
+		current = json.loads(encoded.pop())["current"]
+		self.assertEqual("Operational", current["state"]["text"])
+		self.assertEqual([dict(bed=dict(actual=20.0, target=0.0))], current["temps"])
+		self.assertEqual(["Recv: ok"], current["logs"])
+		self.assertEqual([], current["messages"])
+		self.assertEqual([], current["busyFiles"])
+
+	@mock.patch("time.time")
+	def test_throttled_subscriber_skips_frames(self, mock_time):
+		fast = self._connection()
+		slow = self._connection(throttle_factor=2)
+		self.broadcaster.subscribe(fast)
+		self.broadcaster.subscribe(slow)
+
+		for i in range(4):
+			mock_time.return_value = 100.0 + i * 0.5
+			self.broadcaster.on_printer_add_log("line {}".format(i))
+			self.broadcaster.on_printer_send_current_data(dict())
+
+		self.assertEqual([["line 0"], ["line 1"], ["line 2"], ["line 3"]],
+		                 [current["logs"] for current in self._current(fast)])
+
+		# the throttled subscriber skips every other frame but doesn't miss any lines
+		self.assertEqual([["line 0"], ["line 1", "line 2"]],
+		                 [current["logs"] for current in self._current(slow)])
+
+	def test_event_broadcast(self):
+		connections = [self._connection() for _ in range(3)]
+		for connection in connections:
+			self.broadcaster.subscribe(connection)
+
+		self.broadcaster._onEvent("PrintStarted", dict(name="test.gco"))
+
+		for connection in connections:
+			message, encoded = connection.send_encoded.call_args[0]
+			self.assertDictEqual(dict(event=dict(type="PrintStarted", payload=dict(name="test.gco"))), message)
+			self.assertDictEqual(message, json.loads(encoded))
+
+	def test_delta_updates(self):
+		from octoprint.server.util.sockjs import apply_patch
+
+		legacy = self._connection(throttle_factor=0)
+		delta = self._connection(throttle_factor=0)
+		self.broadcaster.subscribe(legacy)
+		self.broadcaster.subscribe(delta)
+		self.broadcaster.set_delta_updates(delta, True)
+
+		states = [dict(state=dict(text="Printing"), progress=dict(completion=float(i), printTime=i)) for i in range(3)]
+		for i, state in enumerate(states):
+			self.broadcaster.on_printer_add_log("line {}".format(i))
+			self.broadcaster.on_printer_send_current_data(copy.deepcopy(state))
+
+		current = self._current(legacy)
+		frames = self._frames(delta)
+
+		self.assertEqual(["currentSnapshot", "currentPatch", "currentPatch"], [list(frame.keys())[0] for frame in frames])
+
+		snapshot = frames[0]["currentSnapshot"]
+		self.assertEqual(1, snapshot["seq"])
+		self.assertDictEqual(current[0], snapshot["data"])
+
+		document = dict((key, value) for key, value in snapshot["data"].items()
+		                if key not in ("serverTime", "temps", "logs", "messages"))
+		seq = snapshot["seq"]
+		for i, frame in enumerate(frames[1:]):
+			patch = frame["currentPatch"]
+			self.assertEqual(seq, patch["base"])
+			self.assertEqual(["line {}".format(i + 1)], patch["logs"])
+			self.assertEqual([dict(op="replace", path="/progress/completion", value=float(i + 1)),
+			                  dict(op="replace", path="/progress/printTime", value=i + 1)],
+			                 sorted(patch["patch"], key=lambda op: op["path"]))
+
+			document = apply_patch(document, patch["patch"])
+			seq = patch["seq"]
+
+			expected = dict(current[i + 1])
+			for key in ("serverTime", "temps", "logs", "messages"):
+				del expected[key]
+			self.assertDictEqual(expected, document)
+
+	def test_delta_resync(self):
+		connection = self._connection(throttle_factor=0)
+		self.broadcaster.subscribe(connection)
+		self.broadcaster.set_delta_updates(connection, True)
+
+		self.broadcaster.on_printer_send_current_data(dict(progress=dict(printTime=0)))
+		self.broadcaster.on_printer_send_current_data(dict(progress=dict(printTime=1)))
+		self.broadcaster.request_resync(connection)
+		self.broadcaster.on_printer_send_current_data(dict(progress=dict(printTime=2)))
+
+		frames = self._frames(connection)
+		self.assertEqual(["currentSnapshot", "currentPatch", "currentSnapshot"], [list(frame.keys())[0] for frame in frames])
+		self.assertEqual(3, frames[2]["currentSnapshot"]["seq"])
+		self.assertEqual(dict(printTime=2), frames[2]["currentSnapshot"]["data"]["progress"])
+
+
+##~~ create_patch & apply_patch
+
+@ddt
+class PatchTest(unittest.TestCase):
+
+	@data(
+		(dict(a=1), dict(a=1), []),
+		(dict(a=1), dict(a=2), [dict(op="replace", path="/a", value=2)]),
+		(dict(a=1), dict(a=1, b=2), [dict(op="add", path="/b", value=2)]),
+		(dict(a=1, b=2), dict(a=1), [dict(op="remove", path="/b")]),
+		(dict(a=dict(b=dict(c=1))), dict(a=dict(b=dict(c=2))), [dict(op="replace", path="/a/b/c", value=2)]),
+		(dict(a=[1, 2]), dict(a=[1, 2, 3]), [dict(op="replace", path="/a", value=[1, 2, 3])]),
+		(dict(a=1), dict(a=1.0), [dict(op="replace", path="/a", value=1.0)]),
+		(dict(a=None), dict(a=dict(b=1)), [dict(op="replace", path="/a", value=dict(b=1))]),
+		({"a/b": 1, "c~d": 1}, {"a/b": 2, "c~d": 2}, [dict(op="replace", path="/a~1b", value=2),
+		                                               dict(op="replace", path="/c~0d", value=2)]),
+		(dict(a=1), [1], [dict(op="replace", path="", value=[1])])
+	)
+	@unpack
+	def test_create_and_apply(self, old, new, expected):
+		from octoprint.server.util.sockjs import create_patch, apply_patch
+
+		patch = create_patch(old, new)
+		self.assertEqual(sorted(expected, key=lambda op: op["path"]), sorted(patch, key=lambda op: op["path"]))
+		self.assertEqual(new, apply_patch(copy.deepcopy(old), patch))
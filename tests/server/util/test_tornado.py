@@ -93,3 +93,101 @@ class ExtendedHeaderValueTest(unittest.TestCase):
 		actual = _extended_header_value(value)
 
 		self.assertEqual(expected, actual)
+
+##~~ UploadStorageFallbackHandler
+
+class UploadStorageFallbackHandlerTest(unittest.TestCase):
+
+	boundary = b"----WebKitFormBoundarypYiSUx63abAmhT5C"
+
+	def setUp(self):
+		import tempfile
+		self.upload_folder = tempfile.mkdtemp()
+		self.storage_folder = tempfile.mkdtemp()
+
+	def tearDown(self):
+		import shutil
+		shutil.rmtree(self.upload_folder)
+		shutil.rmtree(self.storage_folder)
+
+	def _upload(self, fields, filename, content, hash_algorithm="sha1"):
+		from octoprint.server.util.tornado import UploadStorageFallbackHandler
+
+		body = b""
+		for name, value in fields:
+			body += b"--%s\r\n" % self.boundary
+			body += b"Content-Disposition: form-data; name=\"%s\"\r\n" % name
+			body += b"\r\n"
+			body += value + b"\r\n"
+		body += b"--%s\r\n" % self.boundary
+		body += b"Content-Disposition: form-data; name=\"file\"; filename=\"%s\"\r\n" % filename
+		body += b"Content-Type: application/octet-stream\r\n"
+		body += b"\r\n"
+		body += content + b"\r\n"
+		body += b"--%s--\r\n" % self.boundary
+		content_type = b"multipart/form-data; boundary=%s" % self.boundary
+
+		handler = UploadStorageFallbackHandler.__new__(UploadStorageFallbackHandler)
+		handler.request = mock.MagicMock()
+		handler.request.method = "POST"
+		handler.request.headers = {"Content-Length": str(len(body)), "Content-Type": content_type}
+		handler.initialize(mock.MagicMock(), path=self.upload_folder, hash_algorithm=hash_algorithm)
+
+		handler.prepare()
+		for offset in range(0, len(body), 1024):
+			handler.data_received(body[offset:offset + 1024])
+		while len(handler._buffer):
+			handler._process_multipart_data(handler._buffer)
+		handler._on_request_body_finish()
+
+		from tornado.httputil import parse_body_arguments
+		arguments = dict()
+		parse_body_arguments(content_type, handler._new_body, arguments, dict())
+		return dict((key, value[0]) for key, value in arguments.items())
+
+	def test_upload_hashed_while_receiving(self):
+		import hashlib
+		from octoprint.filemanager.storage import LocalFileStorage
+		from octoprint.filemanager.util import DiskFileWrapper
+
+		content = b"G28\nG1 X10 Y10\n" * 1000
+		values = self._upload([], b"test.gcode", content)
+
+		self.assertEqual(hashlib.sha1(content).hexdigest(), values["file.hash"])
+		self.assertEqual(b"sha1", values["file.hash_algorithm"])
+
+		# same as the files API does it
+		file_object = DiskFileWrapper(values["file.name"], values["file.path"],
+		                              digest=values.get("file.hash"),
+		                              hash_algorithm=values.get("file.hash_algorithm"))
+
+		storage = LocalFileStorage(self.storage_folder)
+		with mock.patch("octoprint.filemanager.util.hash_file") as hash_file_mock, \
+				mock.patch("octoprint.filemanager.storage.hash_file") as storage_hash_file_mock, \
+				mock.patch("octoprint.filemanager") as filemanager_mock:
+			filemanager_mock.valid_file_type.return_value = True
+			filemanager_mock.get_file_type.return_value = ["machinecode", "gcode"]
+			hash_file_mock.side_effect = storage_hash_file_mock.side_effect = AssertionError("uploaded file was read back for hashing")
+			storage.add_file("test.gcode", file_object)
+
+		self.assertEqual(hashlib.sha1(content).hexdigest(), storage.get_metadata("test.gcode")["hash"])
+
+	def test_upload_without_hash_algorithm(self):
+		values = self._upload([], b"test.gcode", b"G28\n", hash_algorithm=None)
+
+		self.assertTrue("file.path" in values)
+		self.assertFalse("file.hash" in values)
+		self.assertFalse("file.hash_algorithm" in values)
+
+	def test_upload_reserved_fields_dropped(self):
+		import hashlib
+
+		content = b"G28\n"
+		values = self._upload([(b"file.hash", b"aabbccddeeff"),
+		                       (b"file.path", b"/etc/passwd"),
+		                       (b"select", b"true")],
+		                      b"test.gcode", content)
+
+		self.assertEqual(hashlib.sha1(content).hexdigest(), values["file.hash"])
+		self.assertNotEqual(b"/etc/passwd", values["file.path"])
+		self.assertEqual(b"true", values["select"])
@@ -0,0 +1,55 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+import mock
+
+from octoprint.slicing.progress import SlicingProgressCoalescer
+
+class TestSlicingProgressCoalescer(unittest.TestCase):
+
+	def setUp(self):
+		self.callback = mock.MagicMock()
+		self.coalescer = SlicingProgressCoalescer(self.callback, min_step=0.01, min_interval=0.25)
+
+	def _report(self, progress, now):
+		with mock.patch("time.time", return_value=now):
+			self.coalescer("arg", kwarg="kwarg", _progress=progress)
+
+	def _forwarded(self):
+		return [call[1]["_progress"] for call in self.callback.call_args_list]
+
+	def test_forwards_args(self):
+		self._report(0.0, 0.0)
+		self.callback.assert_called_once_with("arg", kwarg="kwarg", _progress=0.0)
+
+	def test_min_step(self):
+		coalescer = SlicingProgressCoalescer(self.callback, min_step=0.125, min_interval=0.25)
+		for index in range(64):
+			with mock.patch("time.time", return_value=100.0 + index):
+				coalescer(_progress=index / 64)
+
+		self.assertEqual([0.0, 0.125, 0.25, 0.375, 0.5, 0.625, 0.75, 0.875], self._forwarded())
+
+	def test_min_interval(self):
+		for index in range(10):
+			self._report(index * 0.1, index * 0.1)
+
+		self.assertEqual([0.0, 0.3, 0.6, 0.9], [round(progress, 1) for progress in self._forwarded()])
+
+	def test_final_always_forwarded_once(self):
+		self._report(0.5, 0.0)
+		self._report(1.0, 0.01)
+		self._report(1.0, 0.02)
+
+		self.assertEqual([0.5, 1.0], self._forwarded())
+
+	def test_unlimited(self):
+		coalescer = SlicingProgressCoalescer(self.callback, min_step=0, min_interval=None)
+		for index in range(10):
+			coalescer(_progress=index * 0.0001)
+
+		self.assertEqual(10, self.callback.call_count)
@@ -0,0 +1,117 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import threading
+import time
+import unittest
+import mock
+
+from octoprint.slicing.scheduler import SlicingJob, SlicingScheduler
+
+class TestSlicingScheduler(unittest.TestCase):
+
+	def setUp(self):
+		self.scheduler = SlicingScheduler(workers=1)
+		self.release = threading.Event()
+		self.done = []
+
+	def tearDown(self):
+		self.release.set()
+
+	def _job(self, name, high_priority=False, block=False, on_queue_position=None):
+		def work():
+			if block:
+				self.release.wait(5)
+			self.done.append(name)
+
+		return SlicingJob("mock", "/source/" + name, "/dest/" + name, work, mock.MagicMock(name="cancelled_" + name),
+		                  high_priority=high_priority,
+		                  on_queue_position=on_queue_position,
+		                  on_queue_position_args=(name,))
+
+	def _wait_for(self, condition, timeout=5.0):
+		end = time.time() + timeout
+		while not condition() and time.time() < end:
+			time.sleep(0.01)
+		self.assertTrue(condition())
+
+	def test_workers_default_to_cpu_count(self):
+		import multiprocessing
+		self.assertEqual(multiprocessing.cpu_count(), SlicingScheduler().workers)
+
+	def test_high_priority_first(self):
+		self.scheduler.submit(self._job("blocker", block=True))
+		self._wait_for(lambda: self.scheduler.running == 1)
+
+		self.scheduler.submit(self._job("batch1"))
+		self.scheduler.submit(self._job("batch2"))
+		self.scheduler.submit(self._job("interactive", high_priority=True))
+
+		self.release.set()
+		self._wait_for(lambda: len(self.done) == 4)
+
+		self.assertEqual(["blocker", "interactive", "batch1", "batch2"], self.done)
+
+	def test_concurrent_workers(self):
+		scheduler = SlicingScheduler(workers=2)
+		scheduler.submit(self._job("first", block=True))
+		scheduler.submit(self._job("second", block=True))
+
+		self._wait_for(lambda: scheduler.running == 2)
+		self.assertEqual(0, scheduler.queued)
+
+	def test_queue_positions(self):
+		positions = []
+		def on_queue_position(name, _position=None, _queued=None):
+			positions.append((name, _position, _queued))
+
+		self.scheduler.submit(self._job("blocker", block=True))
+		self._wait_for(lambda: self.scheduler.running == 1)
+
+		self.scheduler.submit(self._job("batch", on_queue_position=on_queue_position))
+		self.scheduler.submit(self._job("interactive", high_priority=True, on_queue_position=on_queue_position))
+
+		self.release.set()
+		self._wait_for(lambda: len(self.done) == 3)
+
+		self.assertEqual([("batch", 1, 1),
+		                  ("interactive", 1, 2),
+		                  ("batch", 2, 2),
+		                  ("interactive", 0, 1),
+		                  ("batch", 1, 1),
+		                  ("batch", 0, 0)],
+		                 positions)
+
+	def test_cancel_queued(self):
+		self.scheduler.submit(self._job("blocker", block=True))
+		self._wait_for(lambda: self.scheduler.running == 1)
+
+		job = self._job("queued")
+		self.scheduler.submit(job)
+
+		self.assertTrue(self.scheduler.cancel("mock", "/dest/queued"))
+		self._wait_for(lambda: job._cancelled.called)
+		self.assertEqual(0, self.scheduler.queued)
+
+		self.release.set()
+		self._wait_for(lambda: len(self.done) == 1)
+		self.assertEqual(["blocker"], self.done)
+
+	def test_cancel_unknown_or_running(self):
+		self.scheduler.submit(self._job("blocker", block=True))
+		self._wait_for(lambda: self.scheduler.running == 1)
+
+		self.assertFalse(self.scheduler.cancel("mock", "/dest/blocker"))
+		self.assertFalse(self.scheduler.cancel("mock", "/dest/unknown"))
+
+	def test_failing_job_keeps_worker(self):
+		def fail():
+			raise RuntimeError("failed")
+		self.scheduler.submit(SlicingJob("mock", "/source/fail", "/dest/fail", fail, mock.MagicMock()))
+		self.scheduler.submit(self._job("after"))
+
+		self._wait_for(lambda: len(self.done) == 1)
+		self.assertEqual(["after"], self.done)
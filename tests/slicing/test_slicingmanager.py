@@ -80,10 +80,9 @@ class TestSlicingManager(unittest.TestCase):
 
 		self.assertIsNone(self.slicing_manager.default_slicer)
 
-	@mock.patch("threading.Thread")
 	@mock.patch("tempfile.NamedTemporaryFile")
 	@mock.patch("os.remove")
-	def test_slice(self, mocked_os_remove, mocked_tempfile, mocked_thread):
+	def test_slice(self, mocked_os_remove, mocked_tempfile):
 		# mock temporary file
 		temp_file = mock.MagicMock()
 		temp_file.name = "tmp.file"
@@ -97,24 +96,10 @@ class TestSlicingManager(unittest.TestCase):
 		default_profile = octoprint.slicing.SlicingProfile("mock", "default", dict(layer_height=0.2, fill_density=40))
 		self.slicer_plugin.get_slicer_default_profile.return_value = default_profile
 
-		# mock threading
-		class MockThread(object):
-			def __init__(self):
-				self.target = None
-				self.args = None
-				self.mock = None
-
-			def constructor(self, target=None, args=None):
-				self.target = target
-				self.args = args
-				self.mock = mock.MagicMock()
-				self.mock.start.side_effect = self.start
-				return self.mock
-
-			def start(self):
-				self.target(*self.args)
-		mock_thread = MockThread()
-		mocked_thread.side_effect = mock_thread.constructor
+		# mock scheduling, run job right away
+		scheduler = mock.MagicMock()
+		scheduler.submit.side_effect = lambda job: job.run()
+		self.slicing_manager._scheduler = scheduler
 
 		# mock slicing
 		self.slicer_plugin.do_slice.return_value = True, None
@@ -142,10 +127,13 @@ class TestSlicingManager(unittest.TestCase):
 
 		# assert that temporary profile was created properly
 		self.slicer_plugin.save_slicer_profile.assert_called_once_with("tmp.file", default_profile, overrides=overrides)
-		# assert that slicing thread was created properly
-		mocked_thread.assert_called_once_with(target=mock.ANY, args=(self.slicer_plugin, source_path, dest_path, profile_name, overrides, printer_profile, position, callback, callback_args, callback_kwargs))
-		self.assertTrue(mock_thread.mock.daemon)
-		self.assertEqual(mock_thread.mock.start.call_count, 1)
+		# assert that slicing job was scheduled properly
+		self.assertEqual(scheduler.submit.call_count, 1)
+		job = scheduler.submit.call_args[0][0]
+		self.assertEqual(slicer_name, job.slicer_name)
+		self.assertEqual(source_path, job.source_path)
+		self.assertEqual(dest_path, job.dest_path)
+		self.assertFalse(job.high_priority)
 
 		# assert that slicer was called correctly
 		self.slicer_plugin.do_slice.assert_called_once_with(source_path, printer_profile, machinecode_path=dest_path, profile_path="tmp.file", position=position, on_progress=None, on_progress_args=None, on_progress_kwargs=None)
@@ -155,3 +143,22 @@ class TestSlicingManager(unittest.TestCase):
 
 		# assert that callback was called property
 		callback.assert_called_once_with(*callback_args, **callback_kwargs)
+
+	def test_cancel_slicing_queued(self):
+		scheduler = mock.MagicMock()
+		scheduler.cancel.return_value = True
+		self.slicing_manager._scheduler = scheduler
+
+		self.slicing_manager.cancel_slicing("mock", "prefix/source.file", "prefix/dest.file")
+
+		scheduler.cancel.assert_called_once_with("mock", "prefix/dest.file")
+		self.assertFalse(self.slicer_plugin.cancel_slicing.called)
+
+	def test_cancel_slicing_running(self):
+		scheduler = mock.MagicMock()
+		scheduler.cancel.return_value = False
+		self.slicing_manager._scheduler = scheduler
+
+		self.slicing_manager.cancel_slicing("mock", "prefix/source.file", "prefix/dest.file")
+
+		self.slicer_plugin.cancel_slicing.assert_called_once_with("prefix/dest.file")
@@ -0,0 +1,110 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+import threading
+import time
+import unittest
+import mock
+
+from octoprint.events import EventManager, Events
+
+class EventManagerTest(unittest.TestCase):
+
+	def setUp(self):
+		plugin_manager_patcher = mock.patch("octoprint.plugin.plugin_manager")
+		plugin_manager = plugin_manager_patcher.start()
+		plugin_manager.return_value.get_implementations.return_value = []
+		self.addCleanup(plugin_manager_patcher.stop)
+
+		self.event_manager = EventManager(slow_handler_threshold=0.1, backlog_warning=10)
+
+	def tearDown(self):
+		self.event_manager.fire(Events.SHUTDOWN)
+		self.event_manager.join(timeout=5.0)
+
+	def test_delivery_order(self):
+		received = []
+		done = threading.Event()
+
+		def callback(event, payload):
+			received.append((event, payload["index"]))
+			if len(received) == 20:
+				done.set()
+
+		self.event_manager.subscribe("Foo", callback)
+		self.event_manager.subscribe("Bar", callback)
+		for index in range(10):
+			self.event_manager.fire("Foo", dict(index=index))
+			self.event_manager.fire("Bar", dict(index=index))
+
+		self.assertTrue(done.wait(5.0))
+		expected = []
+		for index in range(10):
+			expected += [("Foo", index), ("Bar", index)]
+		self.assertListEqual(expected, received)
+
+	def test_slow_subscriber_does_not_block_others(self):
+		release = threading.Event()
+		fast_done = threading.Event()
+
+		def slow(event, payload):
+			release.wait(5.0)
+
+		def fast(event, payload):
+			fast_done.set()
+
+		self.event_manager.subscribe("Foo", slow)
+		self.event_manager.subscribe("Foo", fast)
+		self.event_manager.fire("Foo")
+
+		try:
+			self.assertTrue(fast_done.wait(1.0))
+		finally:
+			release.set()
+
+	def test_unsubscribe(self):
+		done = threading.Event()
+
+		def slow(event, payload):
+			time.sleep(0.2)
+			done.set()
+
+		self.event_manager.subscribe("Foo", slow)
+		self.event_manager.fire("Foo")
+		self.assertTrue(done.wait(5.0))
+
+		self.assertIn("slow", self.event_manager.get_metrics())
+
+		# not subscribed to anything any more
+		self.event_manager.unsubscribe("Foo", slow)
+		self.assertDictEqual(dict(), self.event_manager.get_metrics())
+
+	def test_metrics_slow_handler(self):
+		done = threading.Event()
+
+		def slow(event, payload):
+			time.sleep(0.2)
+			done.set()
+
+		self.event_manager.subscribe("Foo", slow)
+		self.event_manager.fire("Foo")
+		self.assertTrue(done.wait(5.0))
+		time.sleep(0.1)
+
+		metrics = self.event_manager.get_metrics()["slow"]
+		self.assertEqual(1, metrics["delivered"])
+		self.assertEqual(1, metrics["slow"])
+		self.assertGreaterEqual(metrics["maxDuration"], 0.2)
+
+	def test_shutdown_joins_subscribers(self):
+		received = []
+
+		def callback(event, payload):
+			time.sleep(0.1)
+			received.append(event)
+
+		self.event_manager.subscribe(Events.SHUTDOWN, callback)
+		self.event_manager.fire(Events.SHUTDOWN)
+
+		self.assertFalse(self.event_manager.join(timeout=5.0))
+		self.assertListEqual([Events.SHUTDOWN], received)
@@ -0,0 +1,111 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__author__ = "BEEVC - Electronic Systems"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+import unittest
+
+from ddt import ddt, data, unpack
+
+@ddt
+class TestBeeCommHelpers(unittest.TestCase):
+
+	@data(
+		("ok", None),
+		("T:210.0 /210.0 B:60.0 /60.0", "_onTemperatures"),
+		("ok T0:210.0 /210.0", "_onTemperatures"),
+		("B:60.0 /60.0", "_onTemperatures"),
+		("SD init fail", "_onSdInitFailed"),
+		("echo:volume.init failed", "_onSdInitFailed"),
+		("SD card ok", "_onSdCardOk"),
+		("Begin file list", "_onBeginFileList"),
+		("End file list", "_onEndFileList"),
+		("SD printing byte 10/100", "_onSdPrintingByte"),
+		("File opened:test.gco Size:1234", "_onFileOpened"),
+		("File selected", "_onFileSelected"),
+		("Writing to file: test.gco", "_onWritingToFile"),
+		("Done saving file.", "_onDoneSavingFile"),
+		("File deleted:test.gco ok", "_onFileDeleted"),
+		("echo:busy: processing", None)
+	)
+	@unpack
+	def test_classify_response(self, line, expected):
+		from octoprint.util.bee_comm import classify_response
+		self.assertEqual(expected, classify_response(line))
+
+
+class TestBeeCommTransfer(unittest.TestCase):
+
+	def setUp(self):
+		import mock
+		from octoprint.util.bee_comm import BeeCom
+
+		self.comm = BeeCom.__new__(BeeCom)
+		self.comm._beeCommands = mock.MagicMock()
+		self.comm._callback = mock.MagicMock()
+		self.comm._logger = mock.MagicMock()
+
+		settings_patcher = mock.patch("octoprint.util.bee_comm.settings")
+		self.settings = settings_patcher.start().return_value
+		self.settings.getFloat.return_value = 0.5
+		self.settings.getBoolean.return_value = False
+		self.addCleanup(settings_patcher.stop)
+
+		event_manager_patcher = mock.patch("octoprint.util.bee_comm.eventManager")
+		self.fire_event = event_manager_patcher.start().return_value.fire
+		self.addCleanup(event_manager_patcher.stop)
+
+		sleep_patcher = mock.patch("time.sleep")
+		sleep_patcher.start()
+		self.addCleanup(sleep_patcher.stop)
+
+	def test_wait_for_transfer_not_started_yet(self):
+		import time
+
+		# the transfer thread is alive, but flags the transfer only a moment later
+		self.comm._beeCommands.isTransferring.side_effect = [False, False, True, True, True, False]
+		self.comm._beeCommands.getTransferCompletionState.return_value = 0.0
+		self.comm._beeCommands.getTransferState.return_value = 0.5
+
+		self.comm._waitForTransfer("local.gcode", "remote.gco", 1000, time.time() - 1)
+
+		self.assertEqual(2, self.comm._beeCommands.getTransferState.call_count)
+
+	def test_wait_for_transfer_already_done(self):
+		import time
+
+		self.comm._beeCommands.isTransferring.return_value = False
+		self.comm._beeCommands.getTransferCompletionState.return_value = None
+
+		self.comm._waitForTransfer("local.gcode", "remote.gco", 1000, time.time())
+
+		self.assertEqual(0, self.comm._beeCommands.getTransferState.call_count)
+
+	def test_short_transfer_keeps_throughput(self):
+		import mock
+		import os
+		import tempfile
+		from octoprint.events import Events
+
+		self.comm._beeCommands.isTransferring.return_value = False
+		self.comm._beeCommands.getTransferCompletionState.return_value = None
+		self.comm._transferThroughput = 1000.0
+
+		handle, path = tempfile.mkstemp(suffix=".gcode")
+		os.write(handle, b"G28\n")
+		os.close(handle)
+		try:
+			with mock.patch.object(self.comm, "isOperational", return_value=True), \
+					mock.patch.object(self.comm, "isBusy", return_value=False), \
+					mock.patch.object(self.comm, "_changeState"), \
+					mock.patch.object(self.comm, "refreshSdFiles"):
+				self.comm.startFileTransfer(path, "local.gcode", "remote.gco")
+		finally:
+			os.remove(path)
+
+		# a transfer done within a poll interval doesn't replace the known throughput
+		self.assertEqual(1000.0, self.comm._transferThroughput)
+		done = [c for c in self.fire_event.call_args_list if c[0][0] == Events.TRANSFER_DONE]
+		self.assertEqual(1, len(done))
+		self.assertEqual(1000.0, done[0][0][1]["throughput"])
@@ -0,0 +1,110 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2017 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import os
+import unittest
+
+from ddt import ddt, data
+
+MULTI_LAYER = """; test file
+G21
+G90
+M82
+G28
+G92 E0
+G4 P500
+G1 Z0.2 F1200
+G1 X10 Y10 E1 F1800
+G1 X20 Y10 E2
+G0 X0 Y0 F9000
+G1 Z0.4 F1200
+G1 X10 Y20 E3 F1800 ; comment
+G1 E1 F2400
+G92 E0
+G91
+G1 Z1 F600
+G1 Z-1
+G90
+G1 Z0.6
+G1 X50 Y50 E4 F2400
+M107
+"""
+
+TRAVEL_ONLY = """G28
+G1 X10 Y10 F3000
+G1 X20 Y30 Z5
+"""
+
+@ddt
+class TestBvcGcoder(unittest.TestCase):
+
+	def setUp(self):
+		self.bp_case = os.path.join(os.path.abspath(os.path.dirname(__file__)), "..", "filemanager", "_files", "bp_case.gcode")
+
+	def _assert_same_result(self, lines):
+		from octoprint.util import bvc_gcoder
+
+		gcode = bvc_gcoder.GCode(lines)
+
+		analyser = bvc_gcoder.GCodeAnalyser()
+		for line in lines:
+			analyser.feed(line)
+		result = analyser.result()
+
+		self.assertEqual(dict(min=gcode.xmin, max=gcode.xmax, width=gcode.width), result["xdims"])
+		self.assertEqual(dict(min=gcode.ymin, max=gcode.ymax, width=gcode.depth), result["ydims"])
+		self.assertEqual(dict(min=gcode.zmin, max=gcode.zmax, width=gcode.height), result["zdims"])
+		self.assertEqual(gcode.filament_length, result["filament_used"])
+		self.assertEqual(gcode.num_layers(), result["num_layers"])
+		self.assertEqual(gcode.estimate_duration(), result["estimated_duration"])
+		self.assertEqual(len(gcode.lines), result["gcode_lines"])
+
+	@data(MULTI_LAYER, TRAVEL_ONLY)
+	def test_streaming_matches_gcode(self, content):
+		self._assert_same_result(content.splitlines())
+
+	def test_streaming_matches_gcode_reference_file(self):
+		with open(self.bp_case, "rU") as f:
+			lines = f.readlines()
+		self._assert_same_result(lines)
+
+	def test_analyse(self):
+		from octoprint.util import bvc_gcoder
+
+		result = bvc_gcoder.analyse(self.bp_case)
+
+		self.assertEqual(73, result["num_layers"])
+		self.assertEqual(56414, result["gcode_lines"])
+		self.assertEqual(3420.0, result["estimated_duration"])
+		self.assertAlmostEqual(1407.43451, result["filament_used"])
+		self.assertEqual(dict(min=0, max=15.0, width=15.0), result["zdims"])
+
+	def test_load_reports_progress(self):
+		from octoprint.util import bvc_gcoder
+
+		progress = []
+		analyser = bvc_gcoder.GCodeAnalyser()
+		analyser.load(self.bp_case, progress_callback=progress.append)
+
+		self.assertEqual(56416 // analyser.report_interval + 1, len(progress))
+		self.assertEqual(sorted(progress), progress)
+		self.assertEqual(1.0, progress[-1])
+
+	@data(True, False)
+	def test_load_abort(self, reenqueue):
+		from octoprint.util import bvc_gcoder
+
+		analyser = bvc_gcoder.GCodeAnalyser()
+
+		def progress_callback(progress):
+			analyser.abort(reenqueue=reenqueue)
+
+		try:
+			analyser.load(self.bp_case, progress_callback=progress_callback)
+			self.fail("Expected AnalysisAborted")
+		except bvc_gcoder.AnalysisAborted as ex:
+			self.assertEqual(reenqueue, ex.reenqueue)
+			self.assertTrue(analyser.line_count <= analyser.report_interval)
@@ -18,6 +18,9 @@ class TestCommHelpers(unittest.TestCase):
 		("M117 Test \\; foo", "M117 Test \\; foo"),
 		("M117 Test \\\\; foo", "M117 Test \\\\"),
 		("M117 Test \\\\\\; foo", "M117 Test \\\\\\; foo"),
+		("M117 Test \\; foo ; bar", "M117 Test \\; foo "),
+		("M117 Test \\\\; foo \\; bar", "M117 Test \\\\"),
+		("M117 Test \\ foo; bar", "M117 Test \\ foo"),
 		("; foo", "")
 	)
 	@unpack
@@ -198,6 +201,18 @@ class TestCommHelpers(unittest.TestCase):
 		result = gcode_command_for_cmd(cmd)
 		self.assertEqual(expected, result)
 
+	@data(
+		("F3000", True, "F"),
+		("F3000", False, None),
+		("G1 F3000", True, "G1"),
+		("G1 F3000", False, "G1")
+	)
+	@unpack
+	def test_gcode_command_for_cmd_support_f(self, cmd, support_f, expected):
+		from octoprint.util.comm import gcode_command_for_cmd
+		result = gcode_command_for_cmd(cmd, support_f=support_f)
+		self.assertEqual(expected, result)
+
 	@data(
 		("T:23.0 B:60.0", 0, dict(T0=(23.0, None), B=(60.0, None)), 0),
 		("T:23.0 B:60.0", 1, dict(T1=(23.0, None), B=(60.0, None)), 1),
@@ -261,3 +276,152 @@ class TestCommHelpers(unittest.TestCase):
 		from octoprint.util.comm import parse_resend_line
 		result = parse_resend_line(line)
 		self.assertEqual(expected, result)
+
+	@data(
+		("ok", None),
+		("ok T:210.0 /210.0", None),
+		("ok P15 B3", (None, 15, 3)),
+		("ok N123 P15 B3", (123, 15, 3)),
+		("ok N0 P0 B0", (0, 0, 0))
+	)
+	@unpack
+	def test_parse_advanced_ok_line(self, line, expected):
+		from octoprint.util.comm import parse_advanced_ok_line
+		result = parse_advanced_ok_line(line)
+		self.assertEqual(expected, result)
+
+	def test_send_window_commands(self):
+		from octoprint.util import CountedEvent
+		from octoprint.util.comm import SendWindow
+
+		clear_to_send = CountedEvent(max=10)
+		window = SendWindow(clear_to_send, size=3)
+
+		self.assertTrue(window.add(10))
+		self.assertTrue(window.add(10))
+		self.assertFalse(window.add(10))
+		self.assertTrue(clear_to_send.blocked())
+
+		self.assertTrue(window.acknowledge())
+		self.assertFalse(clear_to_send.blocked())
+		self.assertEqual(2, window.inflight)
+
+		# firmware reports a single free buffer slot
+		self.assertFalse(window.acknowledge(free_buffer=1))
+		self.assertEqual(1, window.limit)
+		self.assertTrue(clear_to_send.blocked())
+
+		self.assertTrue(window.acknowledge(free_buffer=8))
+		self.assertEqual(3, window.limit)
+
+	def test_send_window_buffer_size(self):
+		from octoprint.util import CountedEvent
+		from octoprint.util.comm import SendWindow
+
+		clear_to_send = CountedEvent(max=10)
+		window = SendWindow(clear_to_send, size=8, buffer_size=64)
+
+		self.assertTrue(window.add(20))
+		self.assertTrue(window.add(20))
+		self.assertFalse(window.add(20))
+		self.assertTrue(clear_to_send.blocked())
+
+		self.assertTrue(window.acknowledge())
+
+	def test_send_window_resend(self):
+		from octoprint.util import CountedEvent
+		from octoprint.util.comm import SendWindow
+
+		clear_to_send = CountedEvent(max=10)
+		window = SendWindow(clear_to_send, size=4)
+
+		window.add(10)
+		window.add(10)
+		window.add(10)
+
+		# resend requested for the first line, the firmware will reject the other two
+		window.reset(discarded=2)
+		self.assertEqual(0, window.inflight)
+
+		# only a single line in flight during a resend
+		self.assertFalse(window.add(10, single=True))
+
+		self.assertTrue(window.take_discarded())
+		self.assertTrue(window.take_stale_ack())
+		self.assertTrue(window.take_discarded())
+		self.assertTrue(window.take_stale_ack())
+		self.assertFalse(window.take_discarded())
+		self.assertFalse(window.take_stale_ack())
+
+	def test_send_window_acknowledged_line(self):
+		from octoprint.util import CountedEvent
+		from octoprint.util.comm import SendWindow
+
+		clear_to_send = CountedEvent(max=10)
+		window = SendWindow(clear_to_send, size=4)
+
+		# the firmware dropped line 5 without acknowledging it
+		window.add(10, linenumber=5)
+		window.add(10, linenumber=6)
+		window.add(10, linenumber=7)
+		window.acknowledge(linenumber=6)
+		self.assertEqual(1, window.inflight)
+
+		# line numbers restarted
+		window.add(10, linenumber=0)
+		window.acknowledge(linenumber=7)
+		self.assertEqual(1, window.inflight)
+
+	def test_send_window_open(self):
+		from octoprint.util import CountedEvent
+		from octoprint.util.comm import SendWindow
+
+		clear_to_send = CountedEvent(max=10)
+		window = SendWindow(clear_to_send, size=2)
+
+		window.add(10)
+		window.add(10)
+		self.assertTrue(clear_to_send.blocked())
+
+		# a "wait" lets another line through, but doesn't acknowledge any in flight
+		window.open()
+		self.assertFalse(clear_to_send.blocked())
+		self.assertEqual(2, window.inflight)
+
+	@data(
+		("G1 X10.500 Y20.000 E1.25000 ; move", False, "G1 X10.500 Y20.000 E1.25000"),
+		("G1 X10.500 Y20.000 E1.25000 ; move", True, "G1 X10.5 Y20 E1.25"),
+		("  G1   X-0.000\tY.500  ", True, "G1 X-0 Y.500"),
+		("; only a comment", True, ""),
+		("", True, ""),
+		("M117 Printing  10.00%", True, "M117 Printing  10.00%"),
+		("M104 S210.0 T1", True, "M104 S210 T1")
+	)
+	@unpack
+	def test_minify_gcode_line(self, line, compact_numbers, expected):
+		from octoprint.util.comm import minify_gcode_line
+		result = minify_gcode_line(line, compact_numbers=compact_numbers)
+		self.assertEqual(expected, result)
+
+	def test_minify_gcode_file(self):
+		import os
+		import shutil
+		import tempfile
+		from octoprint.util.comm import minify_gcode_file
+
+		folder = tempfile.mkdtemp()
+		try:
+			path = os.path.join(folder, "source.gcode")
+			target = os.path.join(folder, "target.gcode")
+			with open(path, "wb") as f:
+				f.write(b"; generated by a slicer\nG28 ; home\n\nG1 X10.000 Y20.500\r\nM117 Done  \n")
+
+			lines, size = minify_gcode_file(path, target, compact_numbers=True)
+
+			with open(target, "rb") as f:
+				contents = f.read()
+			self.assertEqual(b"G28\nG1 X10 Y20.5\nM117 Done\n", contents)
+			self.assertEqual(3, lines)
+			self.assertEqual(len(contents), size)
+		finally:
+			shutil.rmtree(folder)
@@ -0,0 +1,219 @@
+# coding=utf-8
+"""
+Integration tests for the send window of MachineCom, printing against the bundled virtual printer.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2014 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import copy
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+WINDOW_SIZE = 4
+FILE_LINES = 300
+TIMEOUT = 60.0
+
+class _Settings(object):
+	"""
+	Settings with the default values, plus a few of them changed.
+	"""
+
+	def __init__(self, basedir, changes):
+		from octoprint.settings import default_settings
+
+		self._basedir = basedir
+		self._config = copy.deepcopy(default_settings)
+		for path, value in changes.items():
+			node = self._config
+			for key in path[:-1]:
+				node = node[key]
+			node[path[-1]] = value
+
+	def get(self, path, **kwargs):
+		node = self._config
+		for key in path:
+			if not isinstance(node, dict) or not key in node:
+				return None
+			node = node[key]
+		return node
+
+	def getInt(self, path, **kwargs):
+		value = self.get(path)
+		return int(value) if value is not None else None
+
+	def getFloat(self, path, **kwargs):
+		value = self.get(path)
+		return float(value) if value is not None else None
+
+	def getBoolean(self, path, **kwargs):
+		return bool(self.get(path))
+
+	def getBaseFolder(self, folder, **kwargs):
+		path = os.path.join(self._basedir, folder)
+		if not os.path.exists(path):
+			os.makedirs(path)
+		return path
+
+	def loadScript(self, *args, **kwargs):
+		return None
+
+class SendWindowVirtualPrinterTest(unittest.TestCase):
+
+	def setUp(self):
+		self.basedir = tempfile.mkdtemp()
+
+		self.gcode = os.path.join(self.basedir, "test.gco")
+		with open(self.gcode, "w") as f:
+			for index in range(FILE_LINES):
+				f.write("M117 line {}\n".format(index))
+
+		settings = _Settings(self.basedir, {
+			("serial", "sendWindow", "enabled"): True,
+			("serial", "sendWindow", "commands"): WINDOW_SIZE,
+			("serial", "sendWindow", "bufferSize"): 64,
+			("serial", "timeout", "communication"): 0.5,
+			("feature", "firmwareDetection"): False,
+			("devel", "virtualPrinter", "enabled"): True,
+			("devel", "virtualPrinter", "rxBuffer"): 64,
+			("devel", "virtualPrinter", "echoOnM117"): True,
+			("devel", "virtualPrinter", "throttle"): 0.001,
+			("devel", "virtualPrinter", "waitInterval"): 0.2,
+			("devel", "virtualPrinter", "okFormatString"): "ok N{lastN} P{planner} B{buffer}"
+		})
+
+		def virtual_printer_factory(comm, port, baudrate, read_timeout):
+			if port != "VIRTUAL":
+				return None
+
+			from octoprint.plugins.virtual_printer.virtual import VirtualPrinter
+			return VirtualPrinter(read_timeout=read_timeout)
+
+		plugin_manager = mock.MagicMock()
+		plugin_manager.get_hooks.side_effect = lambda hook: dict(virtual=virtual_printer_factory) if hook == "octoprint.comm.transport.serial.factory" else dict()
+
+		patchers = [mock.patch("octoprint.util.comm.settings", return_value=settings),
+		            mock.patch("octoprint.plugins.virtual_printer.virtual.settings", return_value=settings),
+		            mock.patch("octoprint.plugins.virtual_printer.virtual.plugin_manager", return_value=plugin_manager),
+		            mock.patch("octoprint.plugin.plugin_manager", return_value=plugin_manager),
+		            mock.patch("octoprint.util.comm.eventManager")]
+		for patcher in patchers:
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		self.done = threading.Event()
+		self.callback = mock.MagicMock()
+		self.callback.on_comm_print_job_done.side_effect = lambda *args, **kwargs: self.done.set()
+
+		from octoprint.util.comm import MachineCom
+		self.comm = MachineCom(port="VIRTUAL", baudrate=115200, callbackObject=self.callback,
+		                       printerProfileManager=mock.MagicMock())
+
+		# queue depth and commands in flight whenever a command is sent
+		self.queue_depths = []
+		self.inflight = []
+		send_entry = self.comm._send_entry
+
+		def recording_send_entry(entry):
+			self.queue_depths.append(self.comm._send_queue.qsize())
+			result = send_entry(entry)
+			self.inflight.append(self.comm._send_window.inflight)
+			return result
+		self.comm._send_entry = recording_send_entry
+
+		handle_resend_request = self.comm._handleResendRequest
+		self.resend_requests = []
+
+		def recording_handle_resend_request(line):
+			self.resend_requests.append(line)
+			return handle_resend_request(line)
+		self.comm._handleResendRequest = recording_handle_resend_request
+
+		# MachineCom's threads are started by the subclass in use, which we don't have here
+		self.comm._monitoring_active = True
+		self.comm._send_queue_active = True
+		for target in (self.comm._monitor, self.comm._send_loop):
+			thread = threading.Thread(target=target)
+			thread.daemon = True
+			thread.start()
+
+		self._wait_for(self.comm.isOperational)
+
+	def tearDown(self):
+		self.comm.close()
+		shutil.rmtree(self.basedir)
+
+	def _wait_for(self, condition, timeout=TIMEOUT):
+		end = time.time() + timeout
+		while not condition():
+			if time.time() > end:
+				self.fail("Timed out waiting for {}".format(condition))
+			time.sleep(0.01)
+
+	def _wait_for_print_done(self):
+		self.assertTrue(self.done.wait(TIMEOUT))
+		self._wait_for(lambda: self.comm._send_window.inflight == 0)
+
+	def _assert_printed_in_order(self):
+		echoed = self._echoed_lines()
+
+		# the virtual printer requests resends for lines 100 and 105, nothing must be printed twice or out of order
+		self.assertEqual(sorted(set(echoed)), echoed)
+
+		# for its resend with timeout at line 105 the virtual printer drops the resent line without processing it,
+		# with or without a send window, so that's the only one allowed to be missing
+		missing = sorted(set(range(FILE_LINES)) - set(echoed))
+		self.assertLessEqual(len(missing), 1)
+		for index in missing:
+			self.assertTrue(95 <= index <= 105)
+
+	def _echoed_lines(self):
+		echoed = []
+		for args, _ in self.callback.on_comm_log.call_args_list:
+			match = re.match(r"Recv: echo:line (\d+)", args[0])
+			if match is not None:
+				echoed.append(int(match.group(1)))
+		return echoed
+
+	def test_print(self):
+		self.comm.selectFile(self.gcode, False)
+		self.comm.startPrint()
+
+		self._wait_for_print_done()
+
+		self._assert_printed_in_order()
+		self.assertTrue(self.resend_requests)
+
+		# apart from what starting the print enqueues, only ever one line waiting to be sent, and never more in flight
+		# than the window allows
+		self.assertLessEqual(max(self.queue_depths[5:]), 1)
+		self.assertLessEqual(max(self.inflight), WINDOW_SIZE)
+		self.assertGreater(max(self.inflight), 1)
+
+	def test_pause(self):
+		self.comm.selectFile(self.gcode, False)
+		self.comm.startPrint()
+
+		self._wait_for(lambda: len(self._echoed_lines()) > 20)
+		self.comm.setPause(True)
+		self._wait_for(self.comm.isPaused)
+
+		# let everything in flight arrive, after that nothing must be sent anymore
+		self._wait_for(lambda: self.comm._send_window.inflight == 0 and self.comm._send_queue.qsize() == 0)
+		echoed = len(self._echoed_lines())
+		time.sleep(0.5)
+		self.assertEqual(echoed, len(self._echoed_lines()))
+
+		self.comm.setPause(False)
+
+		self._wait_for_print_done()
+		self._assert_printed_in_order()
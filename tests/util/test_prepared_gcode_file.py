@@ -0,0 +1,130 @@
+# coding=utf-8
+from __future__ import absolute_import, division, print_function
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2017 The OctoPrint Project - Released under terms of the AGPLv3 License"
+
+import unittest
+import os
+import shutil
+import tempfile
+import codecs
+
+from ddt import ddt, data, unpack
+
+from octoprint.util.comm import PrintingGcodeFileInformation, PreparedGcodeFileInformation
+
+
+@ddt
+class PreparedGcodeFileInformationTest(unittest.TestCase):
+	"""
+	Tests for :class:`octoprint.util.comm.PreparedGcodeFileInformation`.
+	"""
+
+	def setUp(self):
+		self.basefolder = tempfile.mkdtemp()
+		self.sidecars = os.path.join(self.basefolder, "jobs")
+		self.path = os.path.join(self.basefolder, "test.gcode")
+
+	def tearDown(self):
+		shutil.rmtree(self.basefolder)
+
+	def _write(self, contents):
+		with open(self.path, "wb") as f:
+			f.write(contents)
+
+	def _prepared(self, **kwargs):
+		return PreparedGcodeFileInformation(self.path, sidecar_folder=self.sidecars, **kwargs)
+
+	def _read_all(self, file_information, offset=None):
+		file_information.start()
+		if offset is not None:
+			file_information.seek(offset)
+
+		result = []
+		while True:
+			line = file_information.getNext()
+			result.append((line, file_information.getFilepos()))
+			if line is None:
+				break
+		return result
+
+	@data(
+		b"G28\nG1 X10 Y10\nM104 S210\n",
+		b"G28\r\nG1 X10 Y10 ; move\r\n\r\n;comment only\r\nM117 Semi\; colon\r\n",
+		b"G28\rG1 X10\rG1 Y10",
+		codecs.BOM_UTF8 + b"G28\nM117 \xc3\xa4\xc3\xb6\xc3\xbc\nG1 X10",
+		b"\n\n   \n; nothing but comments\n",
+		b""
+	)
+	def test_same_lines_and_positions(self, contents):
+		self._write(contents)
+
+		expected = self._read_all(PrintingGcodeFileInformation(self.path))
+		actual = self._read_all(self._prepared())
+
+		self.assertEqual(expected, actual)
+		self.assertEqual((None, len(contents)), actual[-1])
+
+	@data(4, 15, 25, 32, 36, 100)
+	def test_seek(self, offset):
+		self._write(b"G28\nG1 X10 Y10\n; comment\nG1 Z10\nM84\n")
+
+		expected = self._read_all(PrintingGcodeFileInformation(self.path), offset=offset)
+		actual = self._read_all(self._prepared(), offset=offset)
+
+		self.assertEqual(expected, actual)
+
+	@data(
+		(0, "M104 S230.000000"),
+		(1, "M104 S240.000000")
+	)
+	@unpack
+	def test_temperature_offsets(self, tool, expected):
+		self._write(b"M104 S220\nG1 X10\nM140 S60\n")
+		offsets = dict(tool0=10, tool1=20, bed=5)
+
+		file_information = self._prepared(offsets_callback=lambda: offsets, current_tool_callback=lambda: tool)
+		lines = [line for line, _ in self._read_all(file_information)]
+
+		self.assertEqual([expected, "G1 X10", "M140 S65.000000", None], lines)
+
+	def test_sidecar_reused(self):
+		self._write(b"G28\nG1 X10\n")
+
+		first = self._prepared()
+		first.prepare()
+		sidecar = first.getSidecar()
+		self.assertTrue(os.path.isfile(sidecar))
+
+		# mark the sidecar, an up to date one must not be written again
+		os.utime(sidecar, (0, 0))
+		second = self._prepared()
+		second.prepare()
+		self.assertEqual(sidecar, second.getSidecar())
+		self.assertEqual(0, os.stat(sidecar).st_mtime)
+
+	def test_sidecar_outdated(self):
+		self._write(b"G28\nG1 X10\n")
+		self._prepared().prepare()
+
+		self._write(b"G28\nG1 X20 Y20\n")
+		lines = [line for line, _ in self._read_all(self._prepared())]
+
+		self.assertEqual(["G28", "G1 X20 Y20", None], lines)
+
+	@data(b"G28\nG1 X20 Y20\n", b"G28\nG1 X20\n")
+	def test_sidecar_outdated_after_prepare(self, contents):
+		self._write(b"G28\nG1 X10\n")
+		stat = os.stat(self.path)
+
+		file_information = self._prepared()
+		file_information.prepare()
+
+		# overwritten after selection, with the same size or not
+		self._write(contents)
+		os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+
+		result = self._read_all(file_information)
+		self.assertEqual(self._read_all(PrintingGcodeFileInformation(self.path)), result)
+		self.assertEqual(len(contents), file_information.getFilesize())